@@ -1,182 +1,559 @@
+import argparse
+from collections import Counter
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
-def summarize_csv(file_path):
+# Chunked mode: values kept per numeric column for quartiles and histograms.
+# Past this, a uniform reservoir sample of this size stands in for the column.
+SAMPLE_SIZE = 100_000
+
+# Chunked mode: distinct values tracked per categorical column (and distinct
+# dates for the time series) before that section is dropped to bound memory
+MAX_DISTINCT_VALUES = 100_000
+
+
+def summarize_csv(file_path, chunksize=None):
     """
     Comprehensively analyzes a CSV file and generates multiple visualizations.
-    
+
     Args:
         file_path (str): Path to the CSV file
-        
+        chunksize (int): If given, stream the file in chunks of this many rows
+            instead of loading it whole, so memory stays bounded by the chunk
+            size. The report is the same as the in-memory one; on files with
+            more than SAMPLE_SIZE values per numeric column, quartiles and
+            histograms come from a reservoir sample (noted in the report).
+
     Returns:
         str: Formatted comprehensive analysis of the dataset
     """
-    df = pd.read_csv(file_path)
+    if chunksize:
+        profile = _stream_profile(file_path, chunksize)
+    else:
+        profile = _frame_profile(pd.read_csv(file_path))
+    return _render_summary(profile)
+
+
+def _date_columns(columns):
+    return [c for c in columns if 'date' in c.lower() or 'time' in c.lower()]
+
+
+def _frame_profile(df):
+    """Everything the report shows, computed from a DataFrame in memory."""
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+    categorical_cols = [c for c in categorical_cols if 'id' not in c.lower()]
+    profile = {
+        "rows": df.shape[0],
+        "columns": df.columns.tolist(),
+        "dtypes": dict(df.dtypes.items()),
+        "nulls": df.isnull().sum(),
+        "numeric_cols": numeric_cols,
+        "describe": df[numeric_cols].describe() if numeric_cols else None,
+        "corr": df[numeric_cols].corr() if len(numeric_cols) > 1 else None,
+        "categorical_cols": categorical_cols,
+        "value_counts": {col: df[col].value_counts() for col in categorical_cols[:5]},
+        "dates": None,
+        "notes": [],
+    }
+
+    date_cols = _date_columns(df.columns)
+    if date_cols:
+        date_col = date_cols[0]
+        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        profile["dates"] = {
+            "column": date_col,
+            "min": df[date_col].min(),
+            "max": df[date_col].max(),
+            "daily_means": {num_col: df.groupby(date_col)[num_col].mean() for num_col in numeric_cols[:3]},
+        }
+
+    profile["histograms"] = {col: df[col].dropna() for col in numeric_cols[:4]}
+    return profile
+
+
+class ColumnStats:
+    """Mergeable running statistics of one numeric column.
+
+    Count, mean and sum of squared deviations (Welford's update, merged
+    chunk by chunk with Chan et al.'s pairwise formula), min and max.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=np.nan, maximum=np.nan):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = minimum
+        self.max = maximum
+
+    @classmethod
+    def from_values(cls, values):
+        """Statistics of an array of non-null values."""
+        if not len(values):
+            return cls()
+        mean = values.mean()
+        return cls(len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max())
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2, self.min, self.max = \
+                other.count, other.mean, other.m2, other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class CovarianceMatrix:
+    """Mergeable pairwise covariance of a set of numeric columns.
+
+    Like DataFrame.corr(), each pair of columns only counts the rows where
+    both are present, so every pair keeps its own count, means and sums of
+    squared deviations: `means[i, j]` is the mean of column i over the rows
+    where i and j are both present, `m2[i, j]` its sum of squared deviations
+    and `comoment[i, j]` the sum of products of deviations.
+    """
+
+    def __init__(self, size):
+        self.count = np.zeros((size, size))
+        self.means = np.zeros((size, size))
+        self.m2 = np.zeros((size, size))
+        self.comoment = np.zeros((size, size))
+
+    @classmethod
+    def from_values(cls, values):
+        """Pairwise moments of a rows x columns float array with NaN for nulls."""
+        result = cls(values.shape[1])
+        present = ~np.isnan(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Center on the column means first so the sums stay well conditioned
+            shift = np.where(present.any(axis=0), np.nanmean(np.where(present, values, np.nan), axis=0), 0.0)
+        x = np.where(present, values - shift, 0.0)
+        mask = present.astype(float)
+        result.count = mask.T @ mask
+        sums = x.T @ mask  # [i, j]: sum of column i over rows where j is present
+        squares = (x * x).T @ mask
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offsets = np.where(result.count > 0, sums / result.count, 0.0)
+        result.means = offsets + shift[:, None]
+        result.m2 = squares - result.count * offsets ** 2
+        result.comoment = x.T @ x - result.count * offsets * offsets.T
+        return result
+
+    def merge(self, other):
+        count = self.count + other.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(count > 0, self.count * other.count / count, 0.0)
+            share = np.where(count > 0, other.count / count, 0.0)
+        delta = other.means - self.means
+        self.means = self.means + delta * share
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.count = count
+
+    def drop(self, index):
+        """Forget column `index`."""
+        for name in ("count", "means", "m2", "comoment"):
+            matrix = np.delete(np.delete(getattr(self, name), index, axis=0), index, axis=1)
+            setattr(self, name, matrix)
+
+    def corr(self):
+        """Pearson correlation matrix (NaN where a pair has no variance)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.comoment / np.sqrt(self.m2 * self.m2.T)
+
+
+class ReservoirSample:
+    """All values of a column up to SAMPLE_SIZE, then a uniform sample of them."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.seen = 0
+        self.chunks = []
+        self.reservoir = None
+
+    def add(self, values):
+        if self.reservoir is None:
+            self.chunks.append(values)
+            self.seen += len(values)
+            if self.seen <= SAMPLE_SIZE:
+                return
+            values = np.concatenate(self.chunks)
+            self.chunks = None
+            self.reservoir = values[:SAMPLE_SIZE].copy()
+            self.seen = SAMPLE_SIZE
+            values = values[SAMPLE_SIZE:]
+        # Algorithm R: the t-th value replaces a random slot with probability SAMPLE_SIZE / t
+        slots = self.rng.integers(0, np.arange(self.seen + 1, self.seen + len(values) + 1))
+        keep = slots < SAMPLE_SIZE
+        self.reservoir[slots[keep]] = values[keep]
+        self.seen += len(values)
+
+    @property
+    def sampled(self):
+        return self.reservoir is not None
+
+    @property
+    def values(self):
+        if self.reservoir is not None:
+            return self.reservoir
+        return np.concatenate(self.chunks) if self.chunks else np.empty(0)
+
+
+def _is_numeric(dtype):
+    """What select_dtypes(include='number') picks."""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _is_text(dtype):
+    """What select_dtypes(include=['object']) picks (pandas 3 reads text as str)."""
+    return dtype == np.dtype(object) or isinstance(dtype, pd.StringDtype)
+
+
+def _merge_dtype(a, b):
+    """The dtype read_csv gives a column whose chunks were read as `a` and `b`."""
+    if a == b:
+        return a
+    if _is_numeric(a) and _is_numeric(b):
+        return np.promote_types(a, b)
+    for dtype in (a, b):
+        if isinstance(dtype, pd.StringDtype):
+            return dtype
+    return np.dtype(object)
+
+
+def _stream_profile(file_path, chunksize):
+    """The same profile as _frame_profile, from one pass over the file in chunks.
+
+    Every section is built from mergeable accumulators: null counts, a
+    ColumnStats and a ReservoirSample per numeric column, one pairwise
+    CovarianceMatrix, value counts per categorical column and per-date sums
+    and counts for the time series. Memory is bounded by the chunk size,
+    SAMPLE_SIZE and MAX_DISTINCT_VALUES.
+    """
+    rng = np.random.default_rng(0)
+    columns = None
+    rows = 0
+    dtypes = {}
+    nulls = None
+    numeric = []  # columns whose every chunk so far was numeric, in file order
+    stats = {}
+    samples = {}
+    covariance = None
+    counts = {}  # column -> Counter, or None once past MAX_DISTINCT_VALUES
+    parsed_as_numbers = set()  # text columns with values in chunks that were read as numeric
+    date_col = None
+    date_min = date_max = pd.NaT
+    daily_sums = daily_counts = None
+    notes = []
+
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        if columns is None:
+            columns = chunk.columns.tolist()
+            dtypes = dict(chunk.dtypes.items())
+            nulls = pd.Series(0, index=chunk.columns)
+            numeric = [c for c in columns if _is_numeric(dtypes[c])]
+            stats = {c: ColumnStats() for c in numeric}
+            samples = {c: ReservoirSample(rng) for c in numeric}
+            covariance = CovarianceMatrix(len(numeric))
+            date_cols = _date_columns(columns)
+            date_col = date_cols[0] if date_cols else None
+            daily_sums = {c: pd.Series(dtype=float) for c in numeric}
+            daily_counts = {c: pd.Series(dtype=float) for c in numeric}
+
+        rows += len(chunk)
+        nulls += chunk.isnull().sum()
+        for col in columns:
+            dtypes[col] = _merge_dtype(dtypes[col], chunk[col].dtype)
+
+        # A column read as numeric so far turns to text once a chunk has text in it
+        for col in [c for c in numeric if not _is_numeric(dtypes[c])]:
+            covariance.drop(numeric.index(col))
+            numeric.remove(col)
+            del stats[col], samples[col]
+            if daily_sums is not None:
+                del daily_sums[col], daily_counts[col]
+
+        values = chunk[numeric].to_numpy(dtype=float)
+        for i, col in enumerate(numeric):
+            column = values[:, i]
+            column = column[~np.isnan(column)]
+            stats[col].merge(ColumnStats.from_values(column))
+            samples[col].add(column)
+        covariance.merge(CovarianceMatrix.from_values(values))
+
+        for col in columns:
+            if 'id' in col.lower():
+                continue
+            if _is_numeric(chunk[col].dtype):
+                if chunk[col].notna().any():
+                    parsed_as_numbers.add(col)
+                continue
+            counter = counts.setdefault(col, Counter())
+            if counter is None:
+                continue
+            counter.update(chunk[col].value_counts(sort=False).to_dict())
+            if len(counter) > MAX_DISTINCT_VALUES:
+                counts[col] = None
+
+        if date_col is not None:
+            dates = pd.to_datetime(chunk[date_col], errors='coerce')
+            if dates.notna().any():
+                date_min = dates.min() if pd.isna(date_min) else min(date_min, dates.min())
+                date_max = dates.max() if pd.isna(date_max) else max(date_max, dates.max())
+            if daily_sums is not None and numeric:
+                grouped = chunk[numeric].groupby(dates)
+                sums, present = grouped.sum(), grouped.count()
+                for col in numeric:
+                    daily_sums[col] = daily_sums[col].add(sums[col], fill_value=0)
+                    daily_counts[col] = daily_counts[col].add(present[col], fill_value=0)
+                if len(daily_sums[numeric[0]]) > MAX_DISTINCT_VALUES:
+                    notes.append(f"{date_col}: more than {MAX_DISTINCT_VALUES:,} distinct dates; "
+                                 f"time-series chart skipped")
+                    daily_sums = daily_counts = None
+
+    describe = None
+    if numeric:
+        describe = pd.DataFrame(index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+        for col in numeric:
+            s = stats[col]
+            sample = samples[col].values
+            quartiles = np.quantile(sample, [0.25, 0.5, 0.75]) if len(sample) else [np.nan] * 3
+            describe[col] = [float(s.count), s.mean if s.count else np.nan, s.std, s.min,
+                             *quartiles, s.max]
+            if samples[col].sampled:
+                notes.append(f"{col}: quartiles and histogram estimated from a "
+                             f"{SAMPLE_SIZE:,}-value sample of {s.count:,}")
+
+    categorical_cols = [c for c in columns if _is_text(dtypes[c]) and 'id' not in c.lower()]
+    # Mixed columns: chunks read as numbers lost the values' text, so count those
+    # columns again as text, the way read_csv sees them in one piece
+    recount = [c for c in categorical_cols[:5] if c in parsed_as_numbers]
+    if recount:
+        counts.update({col: Counter() for col in recount})
+        for chunk in pd.read_csv(file_path, chunksize=chunksize, usecols=recount, dtype=str):
+            for col in recount:
+                counter = counts[col]
+                if counter is None:
+                    continue
+                counter.update(chunk[col].value_counts(sort=False).to_dict())
+                if len(counter) > MAX_DISTINCT_VALUES:
+                    counts[col] = None
+
+    value_counts = {}
+    for col in categorical_cols[:5]:
+        counter = counts.get(col, Counter())
+        if counter is None:
+            notes.append(f"{col}: more than {MAX_DISTINCT_VALUES:,} distinct values; not counted")
+            counter = Counter()
+        # value_counts order: by count, ties in order of first appearance
+        value_counts[col] = pd.Series(counter, dtype='int64', name='count').rename_axis(col) \
+            .sort_values(ascending=False, kind='stable')
+
+    dates = None
+    if date_col is not None:
+        daily_means = {}
+        if daily_sums is not None:
+            daily_means = {col: (daily_sums[col] / daily_counts[col]).rename_axis(date_col).rename(col)
+                           for col in numeric[:3]}
+        dates = {"column": date_col, "min": date_min, "max": date_max, "daily_means": daily_means}
+
+    return {
+        "rows": rows,
+        "columns": columns,
+        "dtypes": dtypes,
+        "nulls": nulls,
+        "numeric_cols": numeric,
+        "describe": describe,
+        "corr": pd.DataFrame(covariance.corr(), index=numeric, columns=numeric) if len(numeric) > 1 else None,
+        "categorical_cols": categorical_cols,
+        "value_counts": value_counts,
+        "dates": dates,
+        "histograms": {col: samples[col].values for col in numeric[:4]},
+        "notes": notes,
+    }
+
+
+def _render_summary(profile):
+    """Format a profile as the report text and write the charts."""
     summary = []
     charts_created = []
-    
+    rows = profile["rows"]
+    columns = profile["columns"]
+
     # Basic info
     summary.append("=" * 60)
     summary.append("📊 DATA OVERVIEW")
     summary.append("=" * 60)
-    summary.append(f"Rows: {df.shape[0]:,} | Columns: {df.shape[1]}")
-    summary.append(f"\nColumns: {', '.join(df.columns.tolist())}")
-    
+    summary.append(f"Rows: {rows:,} | Columns: {len(columns)}")
+    summary.append(f"\nColumns: {', '.join(columns)}")
+
     # Data types
     summary.append(f"\n📋 DATA TYPES:")
-    for col, dtype in df.dtypes.items():
+    for col, dtype in profile["dtypes"].items():
         summary.append(f"  • {col}: {dtype}")
-    
+
     # Missing data analysis
-    missing = df.isnull().sum().sum()
-    missing_pct = (missing / (df.shape[0] * df.shape[1])) * 100
+    missing = profile["nulls"].sum()
+    missing_pct = (missing / (rows * len(columns))) * 100
     summary.append(f"\n🔍 DATA QUALITY:")
     if missing:
         summary.append(f"Missing values: {missing:,} ({missing_pct:.2f}% of total data)")
         summary.append("Missing by column:")
-        for col in df.columns:
-            col_missing = df[col].isnull().sum()
+        for col in columns:
+            col_missing = profile["nulls"][col]
             if col_missing > 0:
-                col_pct = (col_missing / len(df)) * 100
+                col_pct = (col_missing / rows) * 100
                 summary.append(f"  • {col}: {col_missing:,} ({col_pct:.1f}%)")
     else:
         summary.append("✓ No missing values - dataset is complete!")
-    
+
     # Numeric analysis
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    numeric_cols = profile["numeric_cols"]
     if numeric_cols:
         summary.append(f"\n📈 NUMERICAL ANALYSIS:")
-        summary.append(str(df[numeric_cols].describe()))
-        
+        summary.append(str(profile["describe"]))
+
         # Correlations if multiple numeric columns
         if len(numeric_cols) > 1:
             summary.append(f"\n🔗 CORRELATIONS:")
-            corr_matrix = df[numeric_cols].corr()
+            corr_matrix = profile["corr"]
             summary.append(str(corr_matrix))
-            
+
             # Create correlation heatmap
             plt.figure(figsize=(10, 8))
-            sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, 
+            sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0,
                        square=True, linewidths=1)
             plt.title('Correlation Heatmap')
             plt.tight_layout()
             plt.savefig('correlation_heatmap.png', dpi=150)
             plt.close()
             charts_created.append('correlation_heatmap.png')
-    
+
     # Categorical analysis
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-    categorical_cols = [c for c in categorical_cols if 'id' not in c.lower()]
-    
+    categorical_cols = profile["categorical_cols"]
+
     if categorical_cols:
         summary.append(f"\n📊 CATEGORICAL ANALYSIS:")
         for col in categorical_cols[:5]:  # Limit to first 5
-            value_counts = df[col].value_counts()
+            value_counts = profile["value_counts"][col]
             summary.append(f"\n{col}:")
             for val, count in value_counts.head(10).items():
-                pct = (count / len(df)) * 100
+                pct = (count / rows) * 100
                 summary.append(f"  • {val}: {count:,} ({pct:.1f}%)")
-    
+
     # Time series analysis
-    date_cols = [c for c in df.columns if 'date' in c.lower() or 'time' in c.lower()]
-    if date_cols:
+    dates = profile["dates"]
+    if dates:
         summary.append(f"\n📅 TIME SERIES ANALYSIS:")
-        date_col = date_cols[0]
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        
-        date_range = df[date_col].max() - df[date_col].min()
-        summary.append(f"Date range: {df[date_col].min()} to {df[date_col].max()}")
+
+        date_range = dates["max"] - dates["min"]
+        summary.append(f"Date range: {dates['min']} to {dates['max']}")
         summary.append(f"Span: {date_range.days} days")
-        
+
         # Create time-series plots for numeric columns
-        if numeric_cols:
-            fig, axes = plt.subplots(min(3, len(numeric_cols)), 1, 
+        if numeric_cols and dates["daily_means"]:
+            fig, axes = plt.subplots(min(3, len(numeric_cols)), 1,
                                     figsize=(12, 4 * min(3, len(numeric_cols))))
             if len(numeric_cols) == 1:
                 axes = [axes]
-            
+
             for idx, num_col in enumerate(numeric_cols[:3]):
                 ax = axes[idx] if len(numeric_cols) > 1 else axes[0]
-                daily_data = df.groupby(date_col)[num_col].agg(['mean', 'sum', 'count'])
-                daily_data['mean'].plot(ax=ax, label='Average', linewidth=2)
+                dates["daily_means"][num_col].plot(ax=ax, label='Average', linewidth=2)
                 ax.set_title(f'{num_col} Over Time')
                 ax.set_xlabel('Date')
                 ax.set_ylabel(num_col)
                 ax.legend()
                 ax.grid(True, alpha=0.3)
-            
+
             plt.tight_layout()
             plt.savefig('time_series_analysis.png', dpi=150)
             plt.close()
             charts_created.append('time_series_analysis.png')
-    
+
     # Distribution plots for numeric columns
     if numeric_cols:
-        n_cols = min(4, len(numeric_cols))
         fig, axes = plt.subplots(2, 2, figsize=(12, 10))
         axes = axes.flatten()
-        
+
         for idx, col in enumerate(numeric_cols[:4]):
-            axes[idx].hist(df[col].dropna(), bins=30, edgecolor='black', alpha=0.7)
+            axes[idx].hist(profile["histograms"][col], bins=30, edgecolor='black', alpha=0.7)
             axes[idx].set_title(f'Distribution of {col}')
             axes[idx].set_xlabel(col)
             axes[idx].set_ylabel('Frequency')
             axes[idx].grid(True, alpha=0.3)
-        
+
         # Hide unused subplots
         for idx in range(len(numeric_cols[:4]), 4):
             axes[idx].set_visible(False)
-        
+
         plt.tight_layout()
         plt.savefig('distributions.png', dpi=150)
         plt.close()
         charts_created.append('distributions.png')
-    
+
     # Categorical distributions
     if categorical_cols:
         fig, axes = plt.subplots(2, 2, figsize=(14, 10))
         axes = axes.flatten()
-        
+
         for idx, col in enumerate(categorical_cols[:4]):
-            value_counts = df[col].value_counts().head(10)
+            value_counts = profile["value_counts"][col].head(10)
             axes[idx].barh(range(len(value_counts)), value_counts.values)
             axes[idx].set_yticks(range(len(value_counts)))
             axes[idx].set_yticklabels(value_counts.index)
             axes[idx].set_title(f'Top Values in {col}')
             axes[idx].set_xlabel('Count')
             axes[idx].grid(True, alpha=0.3, axis='x')
-        
+
         # Hide unused subplots
         for idx in range(len(categorical_cols[:4]), 4):
             axes[idx].set_visible(False)
-        
+
         plt.tight_layout()
         plt.savefig('categorical_distributions.png', dpi=150)
         plt.close()
         charts_created.append('categorical_distributions.png')
-    
+
+    # Approximations made by the chunked mode on large files
+    if profile["notes"]:
+        summary.append(f"\n⚠️ CHUNKED MODE NOTES:")
+        for note in profile["notes"]:
+            summary.append(f"  • {note}")
+
     # Summary of visualizations
     if charts_created:
         summary.append(f"\n📊 VISUALIZATIONS CREATED:")
         for chart in charts_created:
             summary.append(f"  ✓ {chart}")
-    
+
     summary.append("\n" + "=" * 60)
     summary.append("✅ COMPREHENSIVE ANALYSIS COMPLETE")
     summary.append("=" * 60)
-    
+
     return "\n".join(summary)
 
 
 if __name__ == "__main__":
-    # Test with sample data
-    import sys
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
-    else:
-        file_path = "resources/sample.csv"
-    
-    print(summarize_csv(file_path))
+    parser = argparse.ArgumentParser(description="Summarize a CSV file with statistics and charts.")
+    parser.add_argument("file_path", nargs="?", default="resources/sample.csv", help="CSV file")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the file N rows at a time instead of loading it whole")
+    args = parser.parse_args()
 
+    print(summarize_csv(args.file_path, chunksize=args.chunksize))
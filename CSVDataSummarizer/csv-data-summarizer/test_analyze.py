@@ -0,0 +1,112 @@
+"""
+Tests for the chunked mode of summarize_csv: streaming a file in chunks must
+give the same report as loading it whole, apart from the chunked-mode notes.
+
+Run with: python test_analyze.py
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+import analyze
+
+HERE = Path(__file__).resolve().parent
+SHOWCASE = HERE / "showcase_financial_pl_data.csv"
+NOTES_HEADER = "⚠️ CHUNKED MODE NOTES:"
+
+
+def report(path, chunksize=None):
+    """(report text without the chunked-mode notes, the notes)."""
+    if chunksize:
+        profile = analyze._stream_profile(path, chunksize)
+    else:
+        profile = analyze._frame_profile(pd.read_csv(path))
+    if profile["corr"] is not None:
+        # Uncorrelated columns come out as different float noise (~1e-15) either way
+        profile["corr"] = profile["corr"].round(12) + 0.0
+    lines = analyze._render_summary(profile).split("\n")
+    notes = []
+    if NOTES_HEADER in lines:
+        start = lines.index(NOTES_HEADER)
+        end = start + 1
+        while lines[end].startswith("  • "):
+            notes.append(lines[end][4:])
+            end += 1
+        del lines[start - 1:end]  # with the blank line before the header
+    return "\n".join(lines), notes
+
+
+def row_count(path):
+    with open(path) as f:
+        return sum(1 for _ in f) - 1
+
+
+class ChunkedParityTests(unittest.TestCase):
+    def setUp(self):
+        # Charts are written to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def assert_same_report(self, path):
+        expected, notes = report(path)
+        self.assertEqual(notes, [])
+        for chunksize in (1, 7, max(row_count(path), 1)):
+            with self.subTest(chunksize=chunksize):
+                actual, notes = report(path, chunksize)
+                self.assertEqual(actual, expected)
+                self.assertEqual(notes, [])
+        return expected
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_showcase(self):
+        text = self.assert_same_report(SHOWCASE)
+        self.assertIn("🔗 CORRELATIONS:", text)
+        self.assertIn("📅 TIME SERIES ANALYSIS:", text)
+
+    def test_mixed_type_column(self):
+        # "code" reads as numbers until row 3 in one file and until row 12 in the other
+        rows = [(f"2024-01-{i % 9 + 1:02d}", "North" if i % 3 else "South", i % 4, i * 1.5) for i in range(20)]
+        for text_rows in ((2, 11), (11,)):
+            lines = ["date,region,code,amount"]
+            for i, (date, region, code, amount) in enumerate(rows):
+                lines.append(f"{date},{region},{f'x{i}' if i in text_rows else code},{amount}")
+            path = self.write(f"mixed{len(text_rows)}.csv", "\n".join(lines) + "\n")
+            with self.subTest(text_rows=text_rows):
+                text = self.assert_same_report(path)
+                self.assertIn("\ncode:\n", text)
+                self.assertIn("  • x11: 1 (5.0%)", text)
+
+    def test_header_only(self):
+        path = self.write("empty.csv", "region,units,price\n")
+        text = self.assert_same_report(path)
+        self.assertIn("Rows: 0 | Columns: 3", text)
+
+    def test_sampled_columns_are_noted(self):
+        path = self.write("long.csv", "units\n" + "".join(f"{i}\n" for i in range(50)))
+        sample_size = analyze.SAMPLE_SIZE
+        analyze.SAMPLE_SIZE = 10
+        try:
+            _, notes = report(path, 7)
+        finally:
+            analyze.SAMPLE_SIZE = sample_size
+        self.assertEqual(notes, ["units: quartiles and histogram estimated from a 10-value sample of 50"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Portfolio index: audit results of many workbooks in one SQLite database.
+
+Answering "which workbooks have very hidden sheets and critical pattern
+breaks" across a shared drive should not mean re-reading thousands of JSON
+reports. This module loads the `extract_structure` and `extract_formulas`
+results (with the `calculate_risk_score` assessment they carry) into
+normalized tables:
+
+    workbooks       one row per distinct workbook content (SHA-256): format,
+                    size, VBA, formula count, risk score and level, purpose
+    files           path -> workbook, with the size and mtime it was indexed at
+    sheets          name, visibility, dimensions, formula count
+    findings        errors, pattern breaks, overrides, stale values, circular
+                    references, hidden rows/columns and other issues: type,
+                    severity, sheet, cell, detail
+    functions       function name -> count per workbook
+    external_links  link index, target, status, formula count
+
+Indexing is incremental. `scan` stats each file and skips it if its size
+and mtime match what was indexed; otherwise it hashes the file, and content
+that is already indexed under another path (or before a touch) is linked
+without auditing again. Only new content, content indexed by another
+analyzer version or scan budget, and earlier failures are audited, through
+batch_audit's worker pool. A workbook's rows are replaced as a whole on
+upsert.
+
+Queries run on indexed columns, so they take milliseconds on thousands of
+workbooks.
+
+Usage:
+    python audit_index.py scan <path|dir|glob> [...] [--db FILE] [--jobs 4] [--max-cells N]
+    python audit_index.py ingest audits.jsonl [...] [--db FILE]   (batch_audit.py output)
+    python audit_index.py query [--very-hidden] [--finding TYPE] [--severity LEVEL]
+                                [--function NAME] [--external TEXT] [--risk-level LEVEL]
+                                [--min-score N] [--since 30d|YYYY-MM-DD] [--json] [--db FILE]
+    python audit_index.py sql "SELECT ..." [--db FILE]
+    python audit_index.py stats [--db FILE]
+    python audit_index.py prune [--db FILE]     (forget files that no longer exist)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from batch_audit import find_workbooks, run_batch
+from extract_formulas import BACKENDS
+from result_cache import ANALYZER_FINGERPRINT, file_sha256
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "EXCEL_AUDITOR_INDEX", os.path.join(os.path.expanduser("~"), ".cache", "excel-auditor-index.sqlite"))
+INDEX_SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    format TEXT,
+    file_size_mb REAL,
+    has_vba INTEGER,
+    sheet_count INTEGER,
+    formula_count INTEGER,
+    risk_score INTEGER,
+    risk_level TEXT,
+    purpose TEXT,
+    error TEXT,
+    analyzer TEXT,
+    options TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    size INTEGER,
+    mtime_ns INTEGER,
+    modified_at REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    visibility TEXT,
+    dimensions TEXT,
+    row_count INTEGER,
+    col_count INTEGER,
+    formula_count INTEGER,
+    PRIMARY KEY (workbook_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    severity TEXT,
+    sheet TEXT,
+    cell TEXT,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS functions (
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (workbook_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS external_links (
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id) ON DELETE CASCADE,
+    link_index INTEGER NOT NULL,
+    target TEXT,
+    status TEXT,
+    formula_count INTEGER,
+    sheet_names TEXT,
+    PRIMARY KEY (workbook_id, link_index)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS workbooks_risk ON workbooks(risk_level, risk_score);
+CREATE INDEX IF NOT EXISTS workbooks_score ON workbooks(risk_score);
+CREATE INDEX IF NOT EXISTS files_workbook ON files(workbook_id);
+CREATE INDEX IF NOT EXISTS files_modified ON files(modified_at);
+CREATE INDEX IF NOT EXISTS sheets_visibility ON sheets(visibility, workbook_id);
+CREATE INDEX IF NOT EXISTS findings_workbook ON findings(workbook_id);
+CREATE INDEX IF NOT EXISTS findings_type ON findings(type, severity, workbook_id);
+CREATE INDEX IF NOT EXISTS findings_severity ON findings(severity, workbook_id);
+CREATE INDEX IF NOT EXISTS functions_name ON functions(name, workbook_id);
+CREATE INDEX IF NOT EXISTS external_links_target ON external_links(target);
+CREATE INDEX IF NOT EXISTS external_links_status ON external_links(status, workbook_id);
+"""
+_TABLES = ("external_links", "functions", "findings", "sheets", "files", "workbooks")
+
+# Detailed finding lists in the formula result: section -> default finding type
+FINDING_SECTIONS = {
+    "errors_found": "formula_error",
+    "formula_inconsistencies": "formula_inconsistency",
+    "hardcoded_overrides": "hardcoded_override",
+    "stale_cached_values": "stale_cached_value",
+}
+# Issue types that only summarize one of the detailed sections
+_SUMMARY_ISSUES = {"formula_inconsistency", "hardcoded_override", "stale_cached_value", "circular_reference"}
+DETAIL_LIMIT = 300  # characters of finding detail stored
+
+
+def _split_cell(cell):
+    """("Sheet", "A1") from "Sheet!A1"; a bare address has no sheet."""
+    if not cell:
+        return None, None
+    sheet = cell.rpartition('!')[0]
+    return (sheet.strip("'") or None), cell
+
+
+def iter_findings(formulas: dict):
+    """(type, severity, sheet, cell, detail) rows from an extract_formulas result."""
+    for section, default_type in FINDING_SECTIONS.items():
+        for item in formulas.get(section) or ():
+            sheet, cell = _split_cell(item.get("cell"))
+            detail = item.get("narrative") or item.get("detail") or item.get("error")
+            yield (item.get("type", default_type), item.get("severity"), item.get("sheet", sheet), cell,
+                   detail[:DETAIL_LIMIT] if detail else None)
+    for group in formulas.get("circular_reference_groups") or ():
+        sheet, cell = _split_cell(group[0])
+        yield ("circular_reference", "critical", sheet, cell,
+               f"{len(group)} cells: {', '.join(group[:10])}"[:DETAIL_LIMIT])
+    for issue in formulas.get("issues") or ():
+        if issue.get("type") in _SUMMARY_ISSUES:
+            continue
+        sheet, cell = _split_cell(issue.get("cell") or (issue.get("cells") or [None])[0])
+        detail = issue.get("detail")
+        yield (issue.get("type"), issue.get("severity"), sheet, cell, detail[:DETAIL_LIMIT] if detail else None)
+    hidden = formulas.get("hidden_content") or {}
+    for row in hidden.get("hidden_rows") or ():
+        yield ("hidden_row", "info", row["sheet"], f"{row['sheet']}!{row['row']}:{row['row']}", None)
+    for column in hidden.get("hidden_columns") or ():
+        yield ("hidden_column", "info", column["sheet"], f"{column['sheet']}!{column['column']}:{column['column']}",
+               None)
+
+
+def _sheet_rows(structure: dict, formulas: dict) -> list:
+    """(position, name, visibility, dimensions, rows, cols, formula count) per sheet."""
+    formula_counts = {s["sheet"]: s["formulas"] for s in (formulas.get("calc_cost") or {}).get("sheets", ())}
+    if structure.get("sheets"):
+        return [(position, s["name"], s.get("visibility"), s.get("dimensions"), s.get("row_count"),
+                 s.get("col_count"), formula_counts.get(s["name"]))
+                for position, s in enumerate(structure["sheets"])]
+    # Formula audit only: the hidden sheets it inventoried and the sheets with formulas
+    hidden = formulas.get("hidden_content") or {}
+    visibility = {s["name"]: "hidden" for s in hidden.get("hidden_sheets") or ()}
+    visibility.update({s["name"]: "veryHidden" for s in hidden.get("very_hidden_sheets") or ()})
+    names = list(formula_counts) + [name for name in visibility if name not in formula_counts]
+    return [(position, name, visibility.get(name), None, None, None, formula_counts.get(name))
+            for position, name in enumerate(names)]
+
+
+def _link_rows(structure: dict, formulas: dict) -> list:
+    """(index, target, status, formula count, sheet names) per external link."""
+    links = {}
+    for link in structure.get("external_links") or ():
+        if isinstance(link, dict):
+            links[link["index"]] = [link["index"], link.get("target"), None, None,
+                                    ", ".join(link.get("sheet_names") or ()) or None]
+    for ref in formulas.get("external_references") or ():
+        row = links.setdefault(ref["index"], [ref["index"], ref.get("target"), None, None,
+                                              ", ".join(ref.get("sheet_names") or ()) or None])
+        row[2], row[3] = ref.get("status"), ref.get("formula_count")
+    return [tuple(links[index]) for index in sorted(links)]
+
+
+def _record_results(record: dict) -> tuple:
+    """(structure, formulas) of a batch_audit record, with its error kept.
+
+    A timeout or a crashed worker leaves only the record's own error.
+    """
+    structure, formulas = record.get("structure") or {}, record.get("formulas") or {}
+    if record.get("status", "ok") != "ok" and not (structure.get("error") or formulas.get("error")):
+        formulas = {**formulas, "error": record.get("error")}
+    return structure, formulas
+
+
+def parse_since(value: str) -> float:
+    """Epoch seconds from "30d", "12h" or an ISO date such as 2026-09-01."""
+    units = {"d": 86400, "h": 3600}
+    if value and value[-1] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    return datetime.fromisoformat(value).timestamp()
+
+
+class AuditIndex:
+    """SQLite index of workbook audit results, keyed by workbook SHA-256."""
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_SCHEMA_VERSION:
+            # The index only holds derived data: rebuild it on a schema change
+            with self.conn:
+                for table in _TABLES:
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def index_workbook(self, filepath: str, structure: dict = None, formulas: dict = None, risk: dict = None,
+                       sha256: str = None, options: dict = None, analyzer: str = None) -> int:
+        """Upsert one workbook's audit results; returns its workbook id.
+
+        `structure` and `formulas` are extract_structure and extract_formulas
+        results, and `risk` a calculate_risk_score assessment (by default the
+        one in `formulas`). Any may be missing. The workbook's earlier rows
+        are replaced, and `filepath` is pointed at it. `analyzer` and
+        `options` record what produced the results; `scan` re-audits rows
+        whose analyzer is not the current one.
+        """
+        structure, formulas = structure or {}, formulas or {}
+        risk = risk or formulas.get("risk_assessment") or {}
+        st = os.stat(filepath)
+        sha256 = sha256 or file_sha256(filepath)
+        errors = [r["error"] for r in (structure, formulas) if r.get("error")]
+        metrics = formulas.get("complexity_metrics") or {}
+        now = time.time()
+        row = {
+            "sha256": sha256,
+            "filename": structure.get("filename") or formulas.get("filename") or os.path.basename(filepath),
+            "format": structure.get("format") or formulas.get("format"),
+            "file_size_mb": structure.get("file_size_mb", round(st.st_size / (1024 * 1024), 2)),
+            "has_vba": structure.get("has_vba"),
+            "sheet_count": len(structure["sheets"]) if structure.get("sheets") else None,
+            "formula_count": metrics.get("total_formulas"),
+            "risk_score": risk.get("workbook_score"),
+            "risk_level": risk.get("risk_level"),
+            "purpose": formulas.get("inferred_purpose"),
+            "error": "; ".join(errors) or None,
+            "analyzer": analyzer,
+            "options": json.dumps(options, sort_keys=True) if options is not None else None,
+            "indexed_at": now,
+        }
+        with self.conn:
+            columns = ", ".join(row)
+            updates = ", ".join(f"{column} = excluded.{column}" for column in row if column != "sha256")
+            workbook_id = self.conn.execute(
+                f"INSERT INTO workbooks ({columns}) VALUES ({', '.join('?' * len(row))}) "
+                f"ON CONFLICT(sha256) DO UPDATE SET {updates} RETURNING id", tuple(row.values())).fetchone()[0]
+            for table in ("sheets", "findings", "functions", "external_links"):
+                self.conn.execute(f"DELETE FROM {table} WHERE workbook_id = ?", (workbook_id,))
+            self.conn.executemany(
+                "INSERT INTO sheets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((workbook_id, *sheet) for sheet in _sheet_rows(structure, formulas)))
+            self.conn.executemany(
+                "INSERT INTO findings (workbook_id, type, severity, sheet, cell, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                ((workbook_id, *finding) for finding in iter_findings(formulas)))
+            self.conn.executemany(
+                "INSERT INTO functions VALUES (?, ?, ?)",
+                ((workbook_id, name, count) for name, count in (formulas.get("function_usage") or {}).items()))
+            self.conn.executemany(
+                "INSERT INTO external_links VALUES (?, ?, ?, ?, ?, ?)",
+                ((workbook_id, *link) for link in _link_rows(structure, formulas)))
+            self._link_file(filepath, workbook_id, st, now)
+        return workbook_id
+
+    def _link_file(self, filepath: str, workbook_id: int, st, now: float):
+        self.conn.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "workbook_id = excluded.workbook_id, size = excluded.size, mtime_ns = excluded.mtime_ns, "
+            "modified_at = excluded.modified_at, indexed_at = excluded.indexed_at",
+            (os.path.abspath(filepath), workbook_id, st.st_size, st.st_mtime_ns, st.st_mtime, now))
+
+    def _current_workbook(self, sha256: str, options: str):
+        """Id of an error-free row for this content from the current analyzer, or None."""
+        row = self.conn.execute(
+            "SELECT id FROM workbooks WHERE sha256 = ? AND analyzer = ? AND options = ? AND error IS NULL",
+            (sha256, ANALYZER_FINGERPRINT, options)).fetchone()
+        return row[0] if row else None
+
+    def scan(self, paths: list, options: dict, jobs: int = 1, timeout: float = None, progress=None) -> dict:
+        """Audit and index the workbooks under `paths` that are not indexed yet.
+
+        `options` are batch_audit's (max_cells, backend, skip_structure,
+        memory_mb, cache_dir, cache_max_bytes). Returns counts: files found,
+        unchanged (same size and mtime), relinked (content already indexed),
+        audited, and errors among the audited.
+        """
+        key = {"max_cells": options.get("max_cells"), "skip_structure": bool(options.get("skip_structure"))}
+        key_json = json.dumps(key, sort_keys=True)
+        counts = {"files": 0, "unchanged": 0, "relinked": 0, "audited": 0, "errors": 0}
+        pending = {}      # file to audit -> its hash
+        duplicates = {}   # hash -> further files with that content
+        for filepath in find_workbooks(paths):
+            counts["files"] += 1
+            st = os.stat(filepath)
+            known = self.conn.execute(
+                "SELECT f.size, f.mtime_ns, w.sha256 FROM files f JOIN workbooks w ON w.id = f.workbook_id "
+                "WHERE f.path = ?", (os.path.abspath(filepath),)).fetchone()
+            if known and (known["size"], known["mtime_ns"]) == (st.st_size, st.st_mtime_ns) \
+                    and self._current_workbook(known["sha256"], key_json):
+                counts["unchanged"] += 1
+                continue
+            sha256 = file_sha256(filepath)
+            workbook_id = self._current_workbook(sha256, key_json)
+            if workbook_id is not None:
+                with self.conn:
+                    self._link_file(filepath, workbook_id, st, time.time())
+                counts["relinked"] += 1
+            elif sha256 in duplicates:
+                duplicates[sha256].append(filepath)
+            else:
+                pending[filepath] = sha256
+                duplicates[sha256] = []
+
+        for record in run_batch(list(pending), options, jobs=jobs, timeout=timeout):
+            counts["audited"] += 1
+            filepath = record["file"]
+            if record["status"] != "ok":
+                counts["errors"] += 1
+            if not os.path.exists(filepath):
+                continue  # removed while it was being audited
+            structure, formulas = _record_results(record)
+            sha256 = pending[filepath]
+            workbook_id = self.index_workbook(filepath, structure, formulas, sha256=sha256,
+                                              options=key, analyzer=ANALYZER_FINGERPRINT)
+            with self.conn:
+                for copy in duplicates[sha256]:
+                    if os.path.exists(copy):
+                        self._link_file(copy, workbook_id, os.stat(copy), time.time())
+                        counts["relinked"] += 1
+            if progress:
+                progress(record)
+        return counts
+
+    def ingest(self, records) -> int:
+        """Index batch_audit.py records (one dict per workbook); returns how many were indexed.
+
+        Records whose file is no longer on disk are skipped: the index is
+        keyed by the file's hash. The producing analyzer is unknown, so a
+        later `scan` audits these files again.
+        """
+        indexed = 0
+        for record in records:
+            filepath = record.get("file")
+            if not filepath or not os.path.isfile(filepath):
+                continue
+            self.index_workbook(filepath, *_record_results(record))
+            indexed += 1
+        return indexed
+
+    def prune(self) -> dict:
+        """Forget files that no longer exist and workbooks no file points to."""
+        with self.conn:
+            gone = [row[0] for row in self.conn.execute("SELECT path FROM files") if not os.path.exists(row[0])]
+            self.conn.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in gone))
+            orphans = self.conn.execute(
+                "DELETE FROM workbooks WHERE id NOT IN (SELECT workbook_id FROM files)").rowcount
+        return {"files_removed": len(gone), "workbooks_removed": orphans}
+
+    def query(self, very_hidden: bool = False, hidden: bool = False, finding: str = None, severity: str = None,
+              functions: list = None, external: str = None, broken_links: bool = False, risk_level: str = None,
+              min_score: int = None, since: float = None, path: str = None, has_vba: bool = False,
+              limit: int = 100) -> list:
+        """Indexed files whose workbook matches every given filter, riskiest first.
+
+        `finding` is a finding type (formula_inconsistency, hardcoded_override,
+        formula_error, circular_reference, ...) and `severity` narrows it (or
+        alone, any finding of that severity); `matches` counts the findings
+        that matched. `since` is epoch seconds of the file's modification.
+        """
+        where, params = [], []
+        if very_hidden or hidden:
+            visibility = "s.visibility = 'veryHidden'" if very_hidden else "s.visibility IN ('hidden', 'veryHidden')"
+            where.append(f"EXISTS (SELECT 1 FROM sheets s WHERE {visibility} AND s.workbook_id = w.id)")
+        finding_filter, finding_params = [], []
+        if finding:
+            finding_filter.append("x.type = ?")
+            finding_params.append(finding)
+        if severity:
+            finding_filter.append("x.severity = ?")
+            finding_params.append(severity)
+        matches = "NULL"
+        if finding_filter:
+            condition = " AND ".join(finding_filter + ["x.workbook_id = w.id"])
+            where.append(f"EXISTS (SELECT 1 FROM findings x WHERE {condition})")
+            params.extend(finding_params)
+            matches = f"(SELECT COUNT(*) FROM findings x WHERE {condition})"
+        for name in functions or ():
+            where.append("EXISTS (SELECT 1 FROM functions fn WHERE fn.name = ? AND fn.workbook_id = w.id)")
+            params.append(name.upper())
+        if external:
+            where.append("EXISTS (SELECT 1 FROM external_links l WHERE l.target LIKE ? AND l.workbook_id = w.id)")
+            params.append(f"%{external}%")
+        if broken_links:
+            where.append("EXISTS (SELECT 1 FROM external_links l WHERE l.status = 'missing' AND l.workbook_id = w.id)")
+        if risk_level:
+            where.append("w.risk_level = ?")
+            params.append(risk_level)
+        if min_score is not None:
+            where.append("w.risk_score >= ?")
+            params.append(min_score)
+        if since is not None:
+            where.append("f.modified_at >= ?")
+            params.append(since)
+        if path:
+            where.append("f.path LIKE ?")
+            params.append(f"%{path}%")
+        if has_vba:
+            where.append("w.has_vba = 1")
+        sql = (f"SELECT f.path, w.sha256, w.risk_score, w.risk_level, w.formula_count, w.error, f.modified_at, "
+               f"{matches} AS matches FROM files f JOIN workbooks w ON w.id = f.workbook_id "
+               f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY w.risk_score IS NULL, w.risk_score DESC, f.path LIMIT ?")
+        # `matches` repeats the finding parameters ahead of the WHERE clause
+        rows = self.conn.execute(sql, [*(finding_params if finding_filter else ()), *params, limit])
+        return [dict(row) for row in rows]
+
+    def sql(self, statement: str, params=()) -> list:
+        """Run a read-only SQL statement against the index; returns its rows."""
+        self.conn.execute("PRAGMA query_only = ON")
+        try:
+            return [dict(row) for row in self.conn.execute(statement, params)]
+        finally:
+            self.conn.execute("PRAGMA query_only = OFF")
+
+    def stats(self) -> dict:
+        counts = {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in _TABLES}
+        return {
+            "db_path": self.db_path,
+            "analyzer_version": ANALYZER_FINGERPRINT,
+            **counts,
+            "risk_levels": dict(self.conn.execute(
+                "SELECT risk_level, COUNT(*) FROM workbooks GROUP BY risk_level ORDER BY COUNT(*) DESC").fetchall()),
+            "errors": self.conn.execute("SELECT COUNT(*) FROM workbooks WHERE error IS NOT NULL").fetchone()[0],
+        }
+
+
+def format_rows(rows: list) -> str:
+    """Query rows as an aligned text table."""
+    if not rows:
+        return "No matching workbooks"
+    columns = [c for c in rows[0] if c != "sha256" and any(row[c] is not None for row in rows)]
+    table = [columns]
+    for row in rows:
+        cells = []
+        for column in columns:
+            value = row[column]
+            if column == "modified_at" and value is not None:
+                value = datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M")
+            cells.append("" if value is None else str(value))
+        table.append(cells)
+    widths = [max(len(r[i]) for r in table) for i in range(len(columns))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(r, widths)).rstrip() for r in table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index audit results of many workbooks in SQLite and query them.")
+    parser.add_argument("--db", default=DEFAULT_INDEX_PATH, help="Index database (default %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="Audit and index new or changed workbooks")
+    scan.add_argument("paths", nargs="+", help="Workbook files, directories or glob patterns")
+    scan.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    scan.add_argument("--timeout", type=float, default=300,
+                      help="Seconds allowed per workbook; 0 disables (default 300)")
+    scan.add_argument("--memory-mb", type=int, default=None, help="Address-space cap per worker in MB (Unix only)")
+    scan.add_argument("--max-cells", type=int, default=0,
+                      help="Formula scan budget per workbook; 0 (the default) scans every cell")
+    scan.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl",
+                      help="XLSX reader for the formula scan")
+    scan.add_argument("--skip-structure", action="store_true", help="Run the formula audit only")
+    scan.add_argument("--cache-dir", default=None, help="Reuse results from this result cache")
+
+    ingest = commands.add_parser("ingest", help="Index batch_audit.py JSON lines")
+    ingest.add_argument("files", nargs="+", help="JSONL files written by batch_audit.py")
+
+    query = commands.add_parser("query", help="Find indexed workbooks")
+    query.add_argument("--very-hidden", action="store_true", help="Has a very hidden sheet")
+    query.add_argument("--hidden", action="store_true", help="Has a hidden or very hidden sheet")
+    query.add_argument("--finding", help="Has a finding of this type (e.g. formula_inconsistency)")
+    query.add_argument("--severity", help="Finding severity (critical, high, warning, ...)")
+    query.add_argument("--function", action="append", default=[], help="Uses this function (repeatable)")
+    query.add_argument("--external", help="Links to an external workbook whose target contains this text")
+    query.add_argument("--broken-links", action="store_true", help="Has formulas reading an undeclared link")
+    query.add_argument("--risk-level", choices=["low", "medium", "high", "critical"])
+    query.add_argument("--min-score", type=int, help="Minimum workbook risk score")
+    query.add_argument("--since", help="File modified within a period (30d, 12h) or since a date (2026-09-01)")
+    query.add_argument("--path", help="File path contains this text")
+    query.add_argument("--has-vba", action="store_true", help="Contains VBA")
+    query.add_argument("--limit", type=int, default=100, help="Maximum rows (default 100)")
+    query.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+
+    sql = commands.add_parser("sql", help="Run a SQL statement against the index")
+    sql.add_argument("statement")
+    commands.add_parser("stats", help="Index row counts")
+    commands.add_parser("prune", help="Forget files that no longer exist")
+    args = parser.parse_args()
+
+    with AuditIndex(args.db) as index:
+        start = time.perf_counter()
+        if args.command == "scan":
+            options = {
+                "max_cells": args.max_cells or None,
+                "backend": args.backend,
+                "skip_structure": args.skip_structure,
+                "memory_mb": args.memory_mb,
+                "cache_dir": args.cache_dir,
+                "cache_max_bytes": 512 * 1024 * 1024,
+            }
+            result = index.scan(args.paths, options, jobs=args.jobs, timeout=args.timeout or None,
+                                progress=lambda r: print(f"{r['status']:7} {r['file']}", file=sys.stderr))
+        elif args.command == "ingest":
+            result = {"indexed": 0}
+            for path in args.files:
+                with open(path, encoding='utf-8') as f:
+                    result["indexed"] += index.ingest(json.loads(line) for line in f if line.strip())
+        elif args.command == "query":
+            rows = index.query(very_hidden=args.very_hidden, hidden=args.hidden, finding=args.finding,
+                               severity=args.severity, functions=args.function, external=args.external,
+                               broken_links=args.broken_links, risk_level=args.risk_level,
+                               min_score=args.min_score, since=parse_since(args.since) if args.since else None,
+                               path=args.path, has_vba=args.has_vba, limit=args.limit)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(json.dumps(rows, indent=2) if args.json else format_rows(rows))
+            print(f"{len(rows)} workbook(s) in {elapsed_ms:.1f} ms", file=sys.stderr)
+            return
+        elif args.command == "sql":
+            try:
+                result = index.sql(args.statement)
+            except sqlite3.Error as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+        elif args.command == "stats":
+            result = index.stats()
+        else:
+            result = index.prune()
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
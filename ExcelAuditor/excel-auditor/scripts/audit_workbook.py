@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unified audit: structure and formula reports from one read of the workbook.
+
+`extract_structure` and `extract_formulas` each open and stream the whole
+workbook, and the structure pass loads it in openpyxl's full (non read-only)
+mode. For XLSX, `audit_workbook` opens one backend workbook, reads the
+workbook metadata once, streams every sheet once through the formula scan
+with the sheet properties the structure report needs (dimensions, freeze
+panes, filters, merged cells) and builds both reports from that pass.
+
+XLS files take the same single pass through the on-demand xlrd reader
+(see xls_reader.py); other formats fall back to the two separate
+extractors.
+
+Usage:
+    python audit_workbook.py <excel_file> [--backend xml] [--jobs N] [--max-cells N]
+                             [--memory-mb N] [--recalc]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from extract_formulas import (
+    BACKENDS,
+    HAS_XLRD,
+    READERS,
+    _new_result,
+    check_cached_values,
+    extract_formulas_dispatch,
+    merge_sheet_scans,
+    scan_workbook,
+)
+from extract_structure import extract_structure, structure_from_scan
+from spill_store import MemoryBudget, dump_json
+
+SINGLE_PASS_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+
+def audit_workbook(filepath: str, max_cells: int = None, backend: str = "openpyxl",
+                   jobs: int = 1, memory_mb: int = None, recalc: bool = False) -> dict:
+    """Structure and formula audit of one workbook.
+
+    Returns {"filename", "structure", "formulas"}, where the two reports
+    have the schemas of extract_structure and extract_formulas_dispatch.
+    Options are those of extract_formulas.
+    """
+    path = Path(filepath)
+    ext = path.suffix.lower()
+    if ext not in SINGLE_PASS_EXTENSIONS or (ext == '.xls' and not HAS_XLRD):
+        return {
+            "filename": path.name,
+            "structure": extract_structure(filepath),
+            "formulas": extract_formulas_dispatch(filepath, max_cells, backend=backend, jobs=jobs,
+                                                  memory_mb=memory_mb, recalc=recalc),
+        }
+
+    file_format = ext.lstrip('.')
+    if file_format == "xls":
+        backend, recalc = "xls", False  # cached values only: nothing to recalculate against
+    formulas = _new_result(filepath)
+    formulas["format"] = file_format
+    formulas["support_level"] = "basic" if file_format == "xls" else "full"
+    memory = MemoryBudget(memory_mb) if memory_mb else None
+    try:
+        wb = READERS[backend](filepath)
+        metadata = wb.metadata
+    except Exception as e:
+        formulas["error"] = f"Failed to load: {str(e)}"
+        # The structure extractor reports its own load error
+        return {"filename": path.name, "structure": extract_structure(filepath), "formulas": formulas}
+
+    try:
+        scans, sheets = scan_workbook(filepath, wb, backend, max_cells, jobs, memory, sheet_properties=True)
+        structure = structure_from_scan(filepath, metadata, scans, sheets, file_format)
+        stale = check_cached_values(filepath, backend, scans) if recalc else None
+        merge_sheet_scans(formulas, wb, scans, sheets, memory, stale, has_vba=metadata["has_vba"])
+    finally:
+        wb.close()
+    if file_format == "xls":
+        formulas["complexity_metrics"]["format_note"] = \
+            "XLS format - limited formula extraction (formula text not always available)"
+    return {"filename": path.name, "structure": structure, "formulas": formulas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Structure and formula audit from one read of an Excel file.")
+    parser.add_argument("filepath", help="Excel file (.xlsx, .xlsm, .xls)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl",
+                        help="XLSX reader: openpyxl read-only (default) or the direct XML reader")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Analyze sheets in N worker processes (default 1)")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 (the default) scans every cell")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="Spill formula lists to a temp file above this RSS")
+    parser.add_argument("--recalc", action="store_true",
+                        help="Recalculate common formulas and report stale cached values (XLSX only)")
+    args = parser.parse_args()
+
+    result = audit_workbook(args.filepath, args.max_cells or None, backend=args.backend,
+                            jobs=args.jobs, memory_mb=args.memory_mb, recalc=args.recalc)
+    dump_json(result, sys.stdout)
+    print()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Batch audit: run structure and formula extraction over many workbooks.
+
+Workbooks are taken from files, directories (searched recursively) and glob
+patterns, audited by a pool of long-lived worker processes, and streamed as
+one compact JSON line per workbook as each finishes. A workbook that fails,
+runs past its timeout or exceeds the memory cap gets an error line; the
+batch carries on.
+
+Usage:
+    python batch_audit.py <path|dir|glob> [...] [--jobs 4] [--timeout 300]
+                          [--memory-mb 2048] [--cache-dir DIR] [--output audits.jsonl]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from audit_workbook import audit_workbook
+from extract_formulas import BACKENDS, extract_formulas_dispatch
+from result_cache import ResultCache, cached_audit_workbook, cached_extract_formulas
+from spill_store import json_default
+
+# Memory caps use RLIMIT_AS, which is only available on Unix
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+WORKBOOK_EXTENSIONS = {'.xlsx', '.xlsm', '.xlsb', '.xls'}
+
+# One result cache per worker process, created on first use
+_worker_cache = None
+
+
+def _cache_for(options: dict):
+    global _worker_cache
+    if not options.get("cache_dir"):
+        return None
+    if _worker_cache is None:
+        _worker_cache = ResultCache(options["cache_dir"], options["cache_max_bytes"])
+    return _worker_cache
+
+
+def find_workbooks(patterns: list) -> list:
+    """Expand files, directories and globs into a sorted list of workbooks."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = (str(p) for p in Path(pattern).rglob('*'))
+        elif glob.has_magic(pattern):
+            candidates = glob.glob(pattern, recursive=True)
+        else:
+            candidates = [pattern]
+        for candidate in candidates:
+            name = os.path.basename(candidate)
+            # Skip Excel's lock files (~$Book1.xlsx)
+            if name.startswith('~$') or Path(candidate).suffix.lower() not in WORKBOOK_EXTENSIONS:
+                continue
+            if os.path.isfile(candidate):
+                found.add(os.path.normpath(candidate))
+    return sorted(found)
+
+
+def audit_file(filepath: str, options: dict) -> dict:
+    """Structure and formula audit of one workbook, as one output record."""
+    record = {"file": filepath, "status": "ok"}
+    start = time.perf_counter()
+    cache = _cache_for(options)
+    try:
+        if cache is not None:
+            hits, evictions = cache.hits, cache.evictions
+            if options.get("skip_structure"):
+                record["formulas"] = cached_extract_formulas(
+                    filepath, cache, options["max_cells"], backend=options["backend"])
+            else:
+                audit = cached_audit_workbook(filepath, cache, options["max_cells"], backend=options["backend"])
+                record["structure"], record["formulas"] = audit["structure"], audit["formulas"]
+            record["cache"] = {"hits": cache.hits - hits, "evictions": cache.evictions - evictions}
+        elif options.get("skip_structure"):
+            record["formulas"] = extract_formulas_dispatch(
+                filepath, options["max_cells"], backend=options["backend"])
+        else:
+            audit = audit_workbook(filepath, options["max_cells"], backend=options["backend"])
+            record["structure"], record["formulas"] = audit["structure"], audit["formulas"]
+        errors = [r["error"] for r in (record.get("structure"), record["formulas"]) if r and r.get("error")]
+        if errors:
+            record["status"] = "error"
+            record["error"] = "; ".join(errors)
+    except MemoryError:
+        record = {"file": filepath, "status": "error", "error": "Memory cap exceeded"}
+    except Exception as e:
+        record = {"file": filepath, "status": "error", "error": f"{type(e).__name__}: {e}",
+                  "traceback": traceback.format_exc(limit=5)}
+    record["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _worker(conn, options: dict):
+    """Worker loop: receive file paths, send back records, until None."""
+    memory_mb = options.get("memory_mb")
+    if memory_mb and HAS_RESOURCE:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        filepath = conn.recv()
+        if filepath is None:
+            break
+        conn.send(audit_file(filepath, options))
+
+
+class _WorkerSlot:
+    """One worker process and the file it is currently auditing."""
+
+    def __init__(self, options: dict):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=_worker, args=(child_conn, options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.filepath = None
+        self.started = None
+
+    def assign(self, filepath: str):
+        self.filepath = filepath
+        self.started = time.monotonic()
+        self.conn.send(filepath)
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+def run_batch(files: list, options: dict, jobs: int = 1, timeout: float = None):
+    """Audit files in worker processes; yield one record per file as it finishes."""
+    queue = list(reversed(files))
+    options = dict(options)
+    slots = [_WorkerSlot(options) for _ in range(max(1, min(jobs, len(files))))]
+    try:
+        for slot in slots:
+            if queue:
+                slot.assign(queue.pop())
+
+        while any(slot.filepath for slot in slots):
+            busy = [slot for slot in slots if slot.filepath]
+            wait_for = None
+            if timeout:
+                now = time.monotonic()
+                wait_for = max(0.0, min(slot.started + timeout - now for slot in busy))
+            ready = wait([slot.conn for slot in busy], timeout=wait_for)
+
+            for i, slot in enumerate(slots):
+                if not slot.filepath:
+                    continue
+                elapsed = round(time.monotonic() - slot.started, 3)
+                record = replace = None
+                if slot.conn in ready:
+                    try:
+                        record = slot.conn.recv()
+                    except (EOFError, OSError):
+                        # Killed by the OS (e.g. out of memory) or crashed in C code
+                        slot.process.join(timeout=5)
+                        record = {"file": slot.filepath, "status": "error",
+                                  "error": f"Worker died (exit code {slot.process.exitcode})"}
+                        replace = True
+                elif timeout and elapsed >= timeout:
+                    record = {"file": slot.filepath, "status": "timeout",
+                              "error": f"Timed out after {timeout:g}s"}
+                    replace = True
+                if record is None:
+                    continue
+
+                record.setdefault("elapsed_s", elapsed)
+                slot.filepath = None
+                if replace:
+                    slot.stop(kill=True)
+                    slot = slots[i] = _WorkerSlot(options)
+                yield record
+                if queue:
+                    slot.assign(queue.pop())
+    finally:
+        for slot in slots:
+            slot.stop(kill=bool(slot.filepath))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit many Excel workbooks, one JSON line per workbook.")
+    parser.add_argument("paths", nargs="+", help="Workbook files, directories or glob patterns")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="Seconds allowed per workbook; 0 disables (default 300)")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="Address-space cap per worker in MB (Unix only)")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget per workbook; 0 (the default) scans every cell")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl",
+                        help="XLSX reader for the formula scan")
+    parser.add_argument("--skip-structure", action="store_true",
+                        help="Run the formula audit only")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Reuse results for unchanged workbooks from this result cache")
+    parser.add_argument("--cache-mb", type=int, default=512,
+                        help="Result cache size limit in MB (default 512)")
+    parser.add_argument("--output", help="Write JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    files = find_workbooks(args.paths)
+    if not files:
+        print("No workbooks found", file=sys.stderr)
+        sys.exit(1)
+    if args.memory_mb and not HAS_RESOURCE:
+        print("Warning: --memory-mb is not supported on this platform; ignoring", file=sys.stderr)
+
+    options = {
+        "max_cells": args.max_cells or None,
+        "backend": args.backend,
+        "skip_structure": args.skip_structure,
+        "memory_mb": args.memory_mb,
+        "cache_dir": args.cache_dir,
+        "cache_max_bytes": args.cache_mb * 1024 * 1024,
+    }
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    lookups = cache_hits = evictions = 0
+    try:
+        for record in run_batch(files, options, jobs=args.jobs, timeout=args.timeout or None):
+            counts[record["status"]] += 1
+            if "cache" in record:
+                lookups += 1 if args.skip_structure else 2
+                cache_hits += record["cache"]["hits"]
+                evictions += record["cache"]["evictions"]
+            out.write(json.dumps(record, separators=(',', ':'), default=json_default) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Audited {len(files)} workbooks: {counts['ok']} ok, {counts['error']} errors, "
+          f"{counts['timeout']} timeouts", file=sys.stderr)
+    if args.cache_dir:
+        print(f"Result cache: {cache_hits} hits, {lookups - cache_hits} misses, {evictions} evictions",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the extractors, on generated workbooks.
+
+`generate_workbook` writes a synthetic XLSX model of a given size from a
+seed: a label column, numeric input columns and formula columns, most of
+them copied down (one R1C1 pattern per column) and the rest unique per
+row, with hardcoded overrides injected into the copied columns, hidden and
+very hidden input sheets and short circular chains. The same spec and seed
+always give the same cells, so a workbook can be regenerated instead of
+kept.
+
+`run_benchmark` times `extract_structure` and `extract_formulas_dispatch`
+on each size, each in a fresh process so peak RSS belongs to that one call.
+The formula run also records per-phase timings: the detectors and
+workbook-level steps are wrapped while it runs (see FORMULA_PHASES), and
+whatever is left over (workbook open, merge, JSON-ready conversion) is
+reported as `other`. The result is a JSON baseline; `compare_baselines`
+diffs two of them and flags slowdowns past a threshold.
+
+Usage:
+    python benchmark.py [--sizes 10k,100k,1m] [--backend xml] [--repeat 3]
+                        [--output bench.json] [--baseline old.json] [--fail-on-regression]
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+import extract_formulas
+import extract_structure
+from dependency_graph import DependencyGraph
+from formula_cache import parse_formula
+from formula_store import FormulaList
+from result_cache import ANALYZER_FINGERPRINT
+from spill_store import current_rss
+
+# Peak RSS comes from getrusage, which is only available on Unix
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+BASELINE_VERSION = 1
+GENERATOR_VERSION = 1  # bump when generate_workbook's output changes
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SIZES = ("10k", "100k")
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "excel-auditor-bench")
+
+DEFAULT_SPEC = {
+    "seed": 0,
+    "columns": 10,            # columns per model sheet, label and inputs included
+    "formula_density": 0.5,   # share of the columns holding formulas
+    "copied_ratio": 0.8,      # share of formula columns copied down unchanged
+    "overrides": 10,          # constants pasted over copied formulas
+    "hidden_sheets": 1,       # input sheets, alternately hidden and veryHidden
+    "circular_chains": 1,     # 5-cell reference loops
+    "sheets": 1,              # model sheets the cells are split across
+}
+HIDDEN_SHEET_ROWS = 20
+CHAIN_LENGTH = 5
+
+# (owner, attribute, phase): owner is a module or class whose attribute is
+# looked up at call time, so replacing it times every call
+FORMULA_PHASES = (
+    (extract_formulas, "scan_worksheet", "scan"),
+    (extract_formulas, "detect_formula_inconsistencies", "column_consistency"),
+    (extract_formulas, "detect_row_formula_inconsistencies", "row_consistency"),
+    (extract_formulas, "detect_hardcoded_overrides", "hardcoded_overrides"),
+    (extract_formulas.CellMatrix, "count_cells", "cell_counts"),
+    (extract_formulas, "build_dependency_graph", "dependency_graph"),
+    (DependencyGraph, "circular_groups", "circular_references"),
+    (extract_formulas, "profile_calc_cost", "calc_cost"),
+    (extract_formulas, "map_external_references", "external_references"),
+    (extract_formulas, "infer_purpose_detailed", "purpose"),
+    (extract_formulas, "detect_hidden_content", "hidden_content"),
+    (extract_formulas, "calculate_risk_score", "risk_score"),
+    (extract_formulas, "generate_forensic_narrative", "narrative"),
+)
+STRUCTURE_PHASES = (
+    (extract_structure, "load_workbook", "load_workbook"),
+    (extract_structure, "read_workbook_metadata", "package_metadata"),
+)
+
+# Compare_baselines ignores changes smaller than these (timer and allocator noise)
+MIN_SECONDS_DELTA = 0.05
+MIN_RSS_DELTA_MB = 5
+
+
+def _copied_formula(kind: int, r: int, inputs: list, own: str) -> str:
+    """Copied-down formula templates: the same R1C1 pattern on every row."""
+    a, b = inputs[kind % len(inputs)], inputs[(kind + 1) % len(inputs)]
+    templates = (
+        f"={a}{r}*{b}{r}",
+        f"={own}{r - 1}+{a}{r}",  # running total (row 2 reads the header row)
+        f"=ROUND({a}{r}/{b}{r},2)",
+        f"=IF({a}{r}>{b}{r},{a}{r}-{b}{r},0)",
+        f"=SUM({a}{r}:{b}{r})*1.1",
+    )
+    return templates[kind % len(templates)]
+
+
+def _layout(spec: dict) -> tuple:
+    """(input columns, copied formula columns, unique formula columns), 1-based."""
+    columns = max(spec["columns"], 3)
+    formula_cols = min(round(columns * spec["formula_density"]), columns - 2)  # keep label + 1 input
+    copied = round(formula_cols * spec["copied_ratio"])
+    first_formula = columns - formula_cols + 1
+    inputs = list(range(2, first_formula))
+    return inputs, list(range(first_formula, first_formula + copied)), \
+        list(range(first_formula + copied, columns + 1))
+
+
+def generate_workbook(path: str, cells: int, **spec) -> dict:
+    """Write a synthetic model of about `cells` non-empty cells to `path`.
+
+    Keyword arguments override DEFAULT_SPEC. Returns the full spec with the
+    layout actually written: model rows, formula and override counts, the
+    overridden cells and the sheets holding each feature.
+    """
+    spec = dict(DEFAULT_SPEC, **spec)
+    unknown = set(spec) - set(DEFAULT_SPEC)
+    if unknown:
+        raise ValueError(f"Unknown spec keys: {', '.join(sorted(unknown))}")
+    rng = random.Random(spec["seed"])
+    columns = max(spec["columns"], 3)
+    inputs, copied, unique = _layout(spec)
+    letters = {c: get_column_letter(c) for c in range(1, columns + 1)}
+    input_letters = [letters[c] for c in inputs]
+
+    fixed = spec["hidden_sheets"] * HIDDEN_SHEET_ROWS * 2 + spec["circular_chains"] * CHAIN_LENGTH
+    model_sheets = max(spec["sheets"], 1)
+    rows = max((cells - fixed) // (columns * model_sheets), 2)  # data rows per sheet, header excluded
+
+    # Overrides land in copied columns, below the first few rows
+    targets = set()
+    if copied and rows > 4:
+        while len(targets) < min(spec["overrides"], model_sheets * len(copied) * (rows - 3)):
+            targets.add((rng.randrange(model_sheets), rng.randint(5, rows + 1), rng.choice(copied)))
+
+    wb = Workbook(write_only=True)
+    formula_count = 0
+    model_names = []
+    for s in range(model_sheets):
+        name = f"Model{s + 1}" if model_sheets > 1 else "Model"
+        model_names.append(name)
+        ws = wb.create_sheet(name)
+        header = ["Item"] + [f"Input {i}" for i in range(1, len(inputs) + 1)] + \
+            [f"Calc {i}" for i in range(1, len(copied) + len(unique) + 1)]
+        ws.append(header)
+        for r in range(2, rows + 2):
+            row = [f"Item {r - 1}"]
+            row.extend(rng.randint(1, 1000) / 4 for _ in inputs)
+            for kind, c in enumerate(copied):
+                if (s, r, c) in targets:
+                    row.append(rng.randint(1, 50) * 100)
+                else:
+                    row.append(_copied_formula(kind, r, input_letters, letters[c]))
+                    formula_count += 1
+            for c in unique:
+                # A different constant per row: no pattern to be consistent with
+                row.append(f"={rng.choice(input_letters)}{r}*{rng.randint(2, 9)}+{rng.randint(1, 999)}")
+                formula_count += 1
+            ws.append(row)
+
+    hidden_names = []
+    for h in range(spec["hidden_sheets"]):
+        name = f"Inputs{h + 1}"
+        hidden_names.append(name)
+        ws = wb.create_sheet(name)
+        ws.sheet_state = "hidden" if h % 2 == 0 else "veryHidden"
+        for r in range(1, HIDDEN_SHEET_ROWS + 1):
+            ws.append([f"Assumption {r}", rng.randint(1, 100) / 100])
+
+    if spec["circular_chains"]:
+        ws = wb.create_sheet("Loops")
+        for chain in range(spec["circular_chains"]):
+            first = chain * CHAIN_LENGTH + 1
+            for r in range(first, first + CHAIN_LENGTH):
+                target = r + 1 if r < first + CHAIN_LENGTH - 1 else first
+                ws.append([f"=A{target}+1"])
+                formula_count += 1
+
+    wb.save(path)
+    return dict(spec, rows=rows, model_sheets=model_names, hidden_sheet_names=hidden_names,
+                formulas=formula_count, overrides_written=len(targets),
+                override_cells=sorted(f"{model_names[s]}!{letters[c]}{r}" for s, r, c in targets))
+
+
+def spec_key(cells: int, spec: dict) -> str:
+    """File name stem for a generated workbook: same spec, same file."""
+    payload = json.dumps({"generator": GENERATOR_VERSION, "cells": cells, **spec}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def workbook_for(cells: int, spec: dict, workdir: str) -> tuple:
+    """(path, seconds spent generating or None if reused) for one case."""
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, f"bench-{cells}-{spec_key(cells, spec)}.xlsx")
+    if os.path.exists(path):
+        return path, None
+    start = time.perf_counter()
+    partial = path + ".partial.xlsx"
+    generate_workbook(partial, cells, **spec)
+    os.replace(partial, path)
+    return path, round(time.perf_counter() - start, 3)
+
+
+@contextmanager
+def timed_phases(targets: tuple):
+    """Wrap each target so its calls and seconds are counted.
+
+    Yields {phase: {"calls", "seconds"}}; the originals are put back on exit.
+    Phases must not call each other, or their time is counted twice.
+    """
+    phases = {}
+    originals = []
+
+    def wrap(func, phase):
+        stats = phases.setdefault(phase, {"calls": 0, "seconds": 0.0})
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats["seconds"] += time.perf_counter() - start
+                stats["calls"] += 1
+        return timed
+
+    for owner, attr, phase in targets:
+        original = getattr(owner, attr)
+        originals.append((owner, attr, original))
+        setattr(owner, attr, wrap(original, phase))
+    try:
+        yield phases
+    finally:
+        for owner, attr, original in reversed(originals):
+            setattr(owner, attr, original)
+
+
+def _peak_rss_mb() -> float:
+    """High-water RSS of this process in MB (current RSS without getrusage)."""
+    if HAS_RESOURCE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024), 1)
+    rss = current_rss()
+    return round(rss / (1024 * 1024), 1) if rss else None
+
+
+def _findings(target: str, result: dict) -> dict:
+    """Finding counts of one report, to spot output drift next to the timings."""
+    if "error" in result:
+        return {"error": result["error"]}
+    if target == "extract_structure":
+        return {
+            "sheets": len(result["sheets"]),
+            "hidden_sheets": result["summary"]["hidden_sheets"],
+            "named_ranges": len(result["named_ranges"]),
+        }
+    return {
+        "formulas": result["complexity_metrics"]["total_formulas"],
+        "unique_patterns": result["complexity_metrics"]["unique_patterns"],
+        "formula_inconsistencies": len(result["formula_inconsistencies"]),
+        "hardcoded_overrides": len(result["hardcoded_overrides"]),
+        "circular_reference_groups": len(result["circular_reference_groups"]),
+        "hidden_sheets": len(result["hidden_content"]["hidden_sheets"])
+        + len(result["hidden_content"]["very_hidden_sheets"]),
+        "issues": len(result["issues"]),
+        "risk_score": result["risk_assessment"]["workbook_score"],
+    }
+
+
+def measure(target: str, path: str, backend: str = "openpyxl", max_cells: int = None) -> dict:
+    """Run one extractor on `path` and time it, phase by phase.
+
+    Meant to run in a fresh process (see run_benchmark): `peak_rss_mb` is
+    the process high-water mark and `start_rss_mb` what the imports had
+    already taken before the call.
+    """
+    rss = current_rss()
+    start_rss = round(rss / (1024 * 1024), 1) if rss else None
+    if target == "extract_structure":
+        targets, run = STRUCTURE_PHASES, lambda: extract_structure.extract_structure(path)
+    else:
+        targets, run = FORMULA_PHASES, lambda: extract_formulas.extract_formulas_dispatch(
+            path, max_cells, backend=backend)
+    cpu = time.process_time()
+    with timed_phases(targets) as phases:
+        start = time.perf_counter()
+        result = run()
+        wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    timed = sum(p["seconds"] for p in phases.values())
+    report = {name: {"calls": p["calls"], "seconds": round(p["seconds"], 4)}
+              for name, p in phases.items() if p["calls"]}
+    report["other"] = {"calls": 1, "seconds": round(max(wall - timed, 0.0), 4)}
+    return {
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "start_rss_mb": start_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases": report,
+        "findings": _findings(target, result),
+    }
+
+
+def measure_formula_memory(path: str, backend: str = "openpyxl") -> dict:
+    """Memory held by a full audit's formula records, compact and as dicts.
+
+    Traced with tracemalloc: `compact_mb` is what the scan's FormulaList
+    frees when dropped; `dict_records_mb` is the same records held the
+    pre-compact way, one dict per cell with its own formula string,
+    function and reference lists.
+    """
+    tracemalloc.start()
+    try:
+        wb = extract_formulas.READERS[backend](path)
+        scans, _ = extract_formulas.scan_workbook(path, wb, backend, None)
+        wb.close()
+        formulas = FormulaList(scan.formulas for scan in scans)
+        count = len(formulas)
+        del scans, wb
+        parse_formula.cache_clear()  # its records share strings with the formula table
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+        records = [dict(f, formula=f["formula"][:1] + f["formula"][1:]) for f in formulas]
+        gc.collect()
+        as_dicts = tracemalloc.get_traced_memory()[0] - held
+        del records, formulas
+        gc.collect()
+        compact = held - tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        "formulas": count,
+        "compact_mb": round(compact / (1024 * 1024), 2),
+        "dict_records_mb": round(as_dicts / (1024 * 1024), 2),
+        "bytes_per_formula": {"compact": round(compact / count) if count else 0,
+                              "dict_records": round(as_dicts / count) if count else 0},
+    }
+
+
+def _measure_isolated(target: str, path: str, backend: str, max_cells: int) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        if target == "formula_memory":
+            return pool.submit(measure_formula_memory, path, backend).result()
+        return pool.submit(measure, target, path, backend, max_cells).result()
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, backend: str = "openpyxl", max_cells: int = None,
+                  repeat: int = 1, workdir: str = DEFAULT_WORKDIR, isolate: bool = True,
+                  targets=("extract_structure", "extract_formulas"), spec: dict = None,
+                  formula_memory: bool = False, progress=None) -> dict:
+    """Benchmark each size and return the JSON baseline.
+
+    `sizes` are SIZES labels or cell counts. Each target runs `repeat`
+    times per size and the fastest run is kept. With `isolate=False` the
+    runs share this process, so `peak_rss_mb` is only an upper bound.
+    `formula_memory` adds measure_formula_memory to each case.
+    """
+    spec = dict(DEFAULT_SPEC, **(spec or {}))
+    baseline = {
+        "version": BASELINE_VERSION,
+        "analyzer": ANALYZER_FINGERPRINT,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {"backend": backend, "max_cells": max_cells, "repeat": repeat, "isolate": isolate},
+        "spec": spec,
+        "cases": {},
+    }
+    run = _measure_isolated if isolate else measure
+    for size in sizes:
+        label = size if size in SIZES else str(size)
+        cells = SIZES.get(size) or int(size)
+        path, generate_s = workbook_for(cells, spec, workdir)
+        case = {"cells": cells, "file_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+                "generate_s": generate_s}
+        for target in targets:
+            runs = [run(target, path, backend, max_cells) for _ in range(max(repeat, 1))]
+            case[target] = min(runs, key=lambda r: r["wall_s"])
+            if progress:
+                progress(f"{label} {target}: {case[target]['wall_s']:.2f}s, "
+                         f"{case[target]['peak_rss_mb']} MB peak")
+        if formula_memory:
+            case["formula_memory"] = memory = (
+                _measure_isolated("formula_memory", path, backend, None) if isolate
+                else measure_formula_memory(path, backend))
+            if progress:
+                progress(f"{label} formula records: {memory['compact_mb']} MB compact, "
+                         f"{memory['dict_records_mb']} MB as dicts ({memory['formulas']} formulas)")
+        baseline["cases"][label] = case
+    return baseline
+
+
+def compare_baselines(old: dict, new: dict, threshold: float = 0.10) -> list:
+    """Per-metric changes from `old` to `new`, for the cases both contain.
+
+    Each row is {case, target, metric, old, new, change, regression}, with
+    `change` the relative difference. A row is a regression when the new
+    value is more than `threshold` worse and the absolute difference is
+    above timer/allocator noise. Changed finding counts are reported with
+    metric `findings` and never count as regressions.
+    """
+    rows = []
+    for label, new_case in new.get("cases", {}).items():
+        old_case = old.get("cases", {}).get(label)
+        if not old_case:
+            continue
+        for target in ("extract_structure", "extract_formulas"):
+            before, after = old_case.get(target), new_case.get(target)
+            if not before or not after:
+                continue
+            metrics = [("wall_s", before["wall_s"], after["wall_s"], MIN_SECONDS_DELTA),
+                       ("peak_rss_mb", before["peak_rss_mb"], after["peak_rss_mb"], MIN_RSS_DELTA_MB)]
+            for phase in sorted(set(before["phases"]) & set(after["phases"])):
+                metrics.append((f"phase.{phase}", before["phases"][phase]["seconds"],
+                                after["phases"][phase]["seconds"], MIN_SECONDS_DELTA))
+            for metric, a, b, noise in metrics:
+                if a is None or b is None:
+                    continue
+                change = (b - a) / a if a else 0.0
+                rows.append({"case": label, "target": target, "metric": metric, "old": a, "new": b,
+                             "change": round(change, 4),
+                             "regression": change > threshold and b - a > noise})
+            if before["findings"] != after["findings"]:
+                rows.append({"case": label, "target": target, "metric": "findings",
+                             "old": before["findings"], "new": after["findings"], "change": None,
+                             "regression": False})
+    return rows
+
+
+def format_comparison(rows: list) -> str:
+    lines = []
+    for row in rows:
+        if row["metric"] == "findings":
+            changed = sorted(k for k in set(row["old"]) | set(row["new"])
+                             if row["old"].get(k) != row["new"].get(k))
+            lines.append(f"{row['case']:>6} {row['target']:<18} findings changed: {', '.join(changed)}")
+            continue
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['case']:>6} {row['target']:<18} {row['metric']:<32} "
+                     f"{row['old']:>10} -> {row['new']:>10} {row['change']:+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extractors on generated workbooks.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"Comma-separated sizes: {', '.join(SIZES)} or cell counts "
+                             f"(default {','.join(DEFAULT_SIZES)})")
+    parser.add_argument("--backend", choices=sorted(extract_formulas.BACKENDS), default="openpyxl",
+                        help="XLSX reader for the formula audit")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 scans every cell (default 0)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per case; the fastest is kept (default 1)")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR,
+                        help="Where generated workbooks are kept and reused")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SPEC["seed"])
+    parser.add_argument("--formula-density", type=float, default=DEFAULT_SPEC["formula_density"])
+    parser.add_argument("--copied-ratio", type=float, default=DEFAULT_SPEC["copied_ratio"])
+    parser.add_argument("--overrides", type=int, default=DEFAULT_SPEC["overrides"])
+    parser.add_argument("--hidden-sheets", type=int, default=DEFAULT_SPEC["hidden_sheets"])
+    parser.add_argument("--circular-chains", type=int, default=DEFAULT_SPEC["circular_chains"])
+    parser.add_argument("--skip-structure", action="store_true", help="Benchmark the formula audit only")
+    parser.add_argument("--formula-memory", action="store_true",
+                        help="Also trace the memory held by the formula records (slow: uses tracemalloc)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every case in this process (faster; peak RSS is then an upper bound)")
+    parser.add_argument("--output", help="Write the JSON baseline here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 if the comparison finds a regression")
+    args = parser.parse_args()
+
+    spec = {"seed": args.seed, "formula_density": args.formula_density, "copied_ratio": args.copied_ratio,
+            "overrides": args.overrides, "hidden_sheets": args.hidden_sheets,
+            "circular_chains": args.circular_chains}
+    targets = ("extract_formulas",) if args.skip_structure else ("extract_structure", "extract_formulas")
+    baseline = run_benchmark(
+        [s.strip() for s in args.sizes.split(",") if s.strip()], backend=args.backend,
+        max_cells=args.max_cells or None, repeat=args.repeat, workdir=args.workdir,
+        isolate=not args.in_process, targets=targets, spec=spec, formula_memory=args.formula_memory,
+        progress=lambda line: print(line, file=sys.stderr))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(baseline, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            rows = compare_baselines(json.load(f), baseline, args.threshold)
+        print(format_comparison(rows), file=sys.stderr)
+        regressions = sum(1 for row in rows if row["regression"])
+        print(f"{regressions} regressions past {args.threshold:.0%}", file=sys.stderr)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Recalculation cost model for an audited workbook.
+
+Estimates the work Excel does to recalculate the scanned formulas, on the
+dependency graph built for circular reference detection:
+
+- every formula costs one evaluation plus one read per cell its references
+  cover. Ranges are clipped to the target sheet's used range, the way Excel
+  bounds whole-column references such as `SUMIFS(A:A, ...)`;
+- volatile functions recalculate on every edit, and so does everything
+  downstream of them. Volatility is propagated to all transitive dependents
+  and that work is weighted by VOLATILE_EDIT_WEIGHT.
+
+The profile has a per-sheet breakdown, ranked hotspots and a 0-100 score.
+Hotspots are runs of one R1C1 pattern down a column, so a SUMIFS copied down
+50,000 rows is one entry. Figures are relative work units for ranking, not
+timings.
+"""
+
+import math
+from array import array
+from collections import deque
+
+from openpyxl.utils import get_column_letter
+
+from dependency_graph import MAX_COL, MAX_ROW, parse_reference, reverse_csr, sheet_key
+from formula_cache import parse_formula
+
+VOLATILE_EDIT_WEIGHT = 10     # a volatile cell recalculates on every edit
+LARGE_RANGE_CELLS = 10000     # ranges at least this big are called out in hotspots
+HOTSPOT_LIMIT = 10
+SCORE_FLOOR = 1000            # weighted work that scores 0; x10 adds 20 points
+COST_RATINGS = ((75, "severe"), (50, "high"), (25, "moderate"), (0, "low"))
+
+
+def calc_cost_score(weighted_work: int) -> int:
+    """0-100 on a log scale: 1k work units score 0, 100M score 100."""
+    if weighted_work <= SCORE_FLOOR:
+        return 0
+    return min(100, round(20 * math.log10(weighted_work / SCORE_FLOOR)))
+
+
+def calc_cost_rating(score: int) -> str:
+    for floor, rating in COST_RATINGS:
+        if score >= floor:
+            return rating
+    return "low"
+
+
+def _covered_cells(target: tuple, used_ranges: dict) -> int:
+    sheet, r1, c1, r2, c2 = target
+    bounds = used_ranges.get(sheet)
+    if bounds is not None:
+        r2 = min(r2, bounds[0])
+        c2 = min(c2, bounds[1])
+    return max(1, (r2 - r1 + 1) * (c2 - c1 + 1)) if r2 >= r1 and c2 >= c1 else 1
+
+
+class _Block:
+    """Formula cells of one R1C1 pattern in one column, the unit of a hotspot."""
+
+    __slots__ = ("first", "min_row", "max_row", "count", "work", "weighted", "largest",
+                 "whole_line", "origin", "calls_volatile")
+
+    def __init__(self, first: int, row: int):
+        self.first = first
+        self.min_row = self.max_row = row
+        self.count = self.work = self.weighted = self.largest = 0
+        self.whole_line = False
+        self.origin = -1               # volatile formula this block recalculates with
+        self.calls_volatile = False
+
+    def add(self, row: int, cost: int, largest: int, whole_line: bool):
+        self.min_row = min(self.min_row, row)
+        self.max_row = max(self.max_row, row)
+        self.count += 1
+        self.work += cost
+        self.weighted += cost
+        self.largest = max(self.largest, largest)
+        self.whole_line = self.whole_line or whole_line
+
+    def add_volatile(self, cost: int, origin: int, calls_volatile: bool):
+        self.weighted += VOLATILE_EDIT_WEIGHT * cost
+        if self.origin == -1:
+            self.origin = origin
+        self.calls_volatile = self.calls_volatile or calls_volatile
+
+
+def _propagate_volatility(graph, sources: list) -> array:
+    """For each node, the volatile formula it recalculates with (-1 if none).
+
+    Breadth-first over the reversed graph, so a range or segment node passes
+    volatility on to every formula that reads it.
+    """
+    origin = array('l', [-1]) * graph.node_count
+    if not sources:
+        return origin
+    offsets, targets = reverse_csr(graph.node_count, graph.offsets, graph.targets)
+    queue = deque(sources)
+    for node in sources:
+        origin[node] = node
+    while queue:
+        v = queue.popleft()
+        for pos in range(offsets[v], offsets[v + 1]):
+            w = targets[pos]
+            if origin[w] == -1:
+                origin[w] = origin[v]
+                queue.append(w)
+    return origin
+
+
+def profile_calc_cost(graph, formulas_by_cell: dict, references_by_cell: dict, sheets: list,
+                      volatile_functions) -> dict:
+    """Recalculation cost profile of the formulas in `graph`.
+
+    Uses the graph's `node_targets` when it was built with keep_targets.
+    `sheets` are the structure dicts of the audit (name, max_row, max_column),
+    used to clip whole-column and whole-row references.
+    """
+    used_ranges = {sheet_key(s["name"]): (s.get("max_row") or MAX_ROW, s.get("max_column") or MAX_COL)
+                   for s in sheets}
+    n = graph.formula_count
+    costs = [0] * n
+    block_of = [None] * n
+    blocks = {}
+    by_sheet = {}
+    sources = []
+    whole_line_formulas = 0
+    for node in range(n):
+        cell_addr = graph.cells[node]
+        sheet, row, col = graph.positions[node]
+        references = references_by_cell.get(cell_addr, ())
+        if graph.node_targets is not None:
+            targets = graph.node_targets[node]
+        else:
+            targets = [t for t in (parse_reference(ref, sheet) for ref in references) if t is not None]
+        reads = len(references) - len(targets)  # external workbooks: one cached read each
+        largest = 0
+        whole_line = False
+        for target in targets:
+            covered = _covered_cells(target, used_ranges)
+            reads += covered
+            largest = max(largest, covered)
+            whole_line = whole_line or (target[1] == 1 and target[3] == MAX_ROW) or \
+                (target[2] == 1 and target[4] == MAX_COL)
+        cost = costs[node] = 1 + reads
+        whole_line_formulas += whole_line
+
+        record = parse_formula(formulas_by_cell[cell_addr])
+        if volatile_functions.intersection(record.functions):
+            sources.append(node)
+        key = (sheet, col, record.signature(row, col))
+        block = blocks.get(key)
+        if block is None:
+            block = blocks[key] = _Block(node, row)
+        block.add(row, cost, largest, whole_line)
+        block_of[node] = block
+        stats = by_sheet.setdefault(sheet, [0, 0, 0, 0])
+        stats[0] += 1
+        stats[1] += cost
+
+    # Volatile cells recalculate on every edit: add their weight on top
+    origin = _propagate_volatility(graph, sources)
+    volatile_nodes = [node for node in range(n) if origin[node] != -1]
+    for node in volatile_nodes:
+        block_of[node].add_volatile(costs[node], origin[node], origin[node] == node)
+        stats = by_sheet[graph.positions[node][0]]
+        stats[2] += 1
+        stats[3] += costs[node]
+
+    total_work = sum(costs)
+    volatile_work = sum(costs[node] for node in volatile_nodes)
+    weighted_work = total_work + VOLATILE_EDIT_WEIGHT * volatile_work
+    score = calc_cost_score(weighted_work)
+
+    sheet_rows = []
+    for sheet, (formulas, work, volatile_formulas, sheet_volatile_work) in by_sheet.items():
+        sheet_rows.append({
+            "sheet": graph.sheet_names.get(sheet, sheet),
+            "formulas": formulas,
+            "work": work,
+            "volatile_formulas": volatile_formulas,
+            "volatile_work": sheet_volatile_work,
+            "share": round(100 * (work + VOLATILE_EDIT_WEIGHT * sheet_volatile_work) / weighted_work, 1),
+        })
+    sheet_rows.sort(key=lambda s: -s["share"])
+
+    ranked = sorted(blocks.items(), key=lambda kv: (-kv[1].weighted, kv[1].first))
+    hotspots = [_hotspot(graph, formulas_by_cell, key, block, weighted_work)
+                for key, block in ranked[:HOTSPOT_LIMIT]]
+
+    return {
+        "score": score,
+        "rating": calc_cost_rating(score),
+        "total_work": total_work,
+        "volatile_work": volatile_work,
+        "weighted_work": weighted_work,
+        "volatile_formulas": len(sources),
+        "volatile_dependents": len(volatile_nodes) - len(sources),
+        "whole_line_references": whole_line_formulas,
+        "sheets": sheet_rows,
+        "hotspots": hotspots,
+    }
+
+
+def _hotspot(graph, formulas_by_cell: dict, key: tuple, block: "_Block", weighted_work: int) -> dict:
+    sheet, col, _ = key
+    cells = graph.format_address(sheet, block.min_row, col, block.max_row, col)
+    reasons = []
+    if block.whole_line:
+        reasons.append("whole-column or whole-row reference")
+    if block.largest >= LARGE_RANGE_CELLS:
+        reasons.append(f"reads a {block.largest:,}-cell range")
+    if block.calls_volatile:
+        reasons.append("volatile function: recalculates on every edit")
+    elif block.origin != -1:
+        reasons.append(f"depends on volatile {graph.cells[block.origin]}: recalculates on every edit")
+    if block.count > 1:
+        reasons.append(f"copied to {block.count:,} cells")
+    return {
+        "cells": cells,
+        "column": get_column_letter(col),
+        "count": block.count,
+        "formula": formulas_by_cell[graph.cells[block.first]][:200],
+        "work": block.work,
+        "weighted_work": block.weighted,
+        "share": round(100 * block.weighted / weighted_work, 1),
+        "volatile": block.origin != -1,
+        "reasons": reasons,
+    }
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""Cell-level dependency graph over a workbook's formulas.
+
+Nodes are formula cells (optionally also the input cells they reference),
+plus two kinds of helper nodes that keep range references cheap:
+
+- range nodes, one per distinct referenced range, so a range shared by
+  thousands of formulas (`$B$2:$B$5000`) is expanded once;
+- segment nodes, forming a segment tree over the formula cells of each
+  column, so a range links to O(log n) segment nodes per column instead of
+  to every cell it covers (interval compression).
+
+Only formula cells can have precedents, so values and blanks never enter
+the cycle graph. Reachability through helper nodes is exactly reachability through
+the ranges they stand for, which keeps cycle detection exact.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+MAX_ROW = 1048576
+MAX_COL = 16384
+
+# One reference as returned by extract_references_from_formula:
+# optional sheet prefix, then A1, A1:B2, A:B or 1:2
+_REF_PARTS_RE = re.compile(r"""
+    ^(?:(?P<sheet>'(?:[^']|'')+'|[^!]+)!)?
+    (?:
+        \$?(?P<c1>[A-Za-z]{1,3})\$?(?P<r1>\d+)(?::\$?(?P<c2>[A-Za-z]{1,3})\$?(?P<r2>\d+))?
+      | \$?(?P<cc1>[A-Za-z]{1,3}):\$?(?P<cc2>[A-Za-z]{1,3})
+      | \$?(?P<rr1>\d+):\$?(?P<rr2>\d+)
+    )$
+""", re.VERBOSE)
+
+_COORD_RE = re.compile(r'^\$?([A-Za-z]{1,3})\$?(\d+)$')
+
+
+def unquote_sheet(name: str) -> str:
+    """Strip the quotes Excel puts around sheet names with spaces."""
+    if len(name) > 1 and name[0] == "'" and name[-1] == "'":
+        name = name[1:-1].replace("''", "'")
+    return name
+
+
+def sheet_key(name: str) -> str:
+    """Normalize a sheet name for lookups: unquoted and case-folded."""
+    return unquote_sheet(name).upper()
+
+
+def split_cell_address(cell_addr: str) -> tuple:
+    """Split 'Sheet!A1' into (sheet_name, row, col); sheet may be ''."""
+    if '!' in cell_addr:
+        sheet, coord = cell_addr.rsplit('!', 1)
+    else:
+        sheet, coord = '', cell_addr
+    m = _COORD_RE.match(coord)
+    if not m:
+        return None
+    return sheet, int(m.group(2)), column_index_from_string(m.group(1).upper())
+
+
+def parse_reference(ref: str, default_sheet: str) -> tuple:
+    """Parse a reference into (sheet_key, min_row, min_col, max_row, max_col).
+
+    Whole-column and whole-row references expand to the sheet bounds.
+    Returns None for external-workbook references and anything unparseable.
+    """
+    m = _REF_PARTS_RE.match(ref)
+    if not m or '[' in (m.group('sheet') or ''):
+        return None
+    sheet = sheet_key(m.group('sheet')) if m.group('sheet') else default_sheet
+
+    if m.group('c1'):
+        c1 = column_index_from_string(m.group('c1').upper())
+        r1 = int(m.group('r1'))
+        if m.group('c2'):
+            c2 = column_index_from_string(m.group('c2').upper())
+            r2 = int(m.group('r2'))
+        else:
+            c2, r2 = c1, r1
+    elif m.group('cc1'):
+        c1 = column_index_from_string(m.group('cc1').upper())
+        c2 = column_index_from_string(m.group('cc2').upper())
+        r1, r2 = 1, MAX_ROW
+    else:
+        r1, r2 = int(m.group('rr1')), int(m.group('rr2'))
+        c1, c2 = 1, MAX_COL
+
+    return sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+
+def reverse_csr(node_count: int, offsets, targets) -> tuple:
+    """Transpose a CSR adjacency (counting sort by target), keeping its array type."""
+    typecode = offsets.typecode
+    rev_offsets = array(typecode, [0]) * (node_count + 1)
+    for t in targets:
+        rev_offsets[t + 1] += 1
+    for i in range(node_count):
+        rev_offsets[i + 1] += rev_offsets[i]
+    rev_targets = array(typecode, [0]) * len(targets)
+    fill = array(typecode, rev_offsets[:node_count])
+    for src in range(node_count):
+        for pos in range(offsets[src], offsets[src + 1]):
+            t = targets[pos]
+            rev_targets[fill[t]] = src
+            fill[t] += 1
+    return rev_offsets, rev_targets
+
+
+class _ColumnIndex:
+    """Formula cells of one column, sorted by row, with a lazy segment tree."""
+
+    __slots__ = ("rows", "ids", "tree_base")
+
+    def __init__(self, rows: list, ids: list):
+        self.rows = rows
+        self.ids = ids
+        self.tree_base = None  # node id of segment node 0, once built
+
+
+class DependencyGraph:
+    """Directed graph: a formula cell points at the cells it reads.
+
+    Build with `from_formulas`; edges are stored in CSR form (`offsets`,
+    `targets`) once `finalize` has run.
+    """
+
+    def __init__(self):
+        self.cells = []          # node id -> original cell address
+        self.positions = []      # node id -> (sheet_key, row, col)
+        self.formula_count = 0   # formula cells are node ids [0, formula_count)
+        self.node_count = 0
+        self.sheet_names = {}    # sheet_key -> sheet name as written
+        self.range_nodes = {}    # (sheet_key, r1, c1, r2, c2) -> node id
+        self._columns = {}       # sheet_key -> {col: _ColumnIndex}
+        self._sheet_cols = {}    # sheet_key -> sorted columns with cell nodes
+        self._cell_ids = {}      # (sheet_key, row, col) -> node id
+        self._src = array('l')
+        self._dst = array('l')
+        self.offsets = None
+        self.targets = None
+        self.node_targets = None  # formula node id -> parsed references (keep_targets)
+
+    @classmethod
+    def from_formulas(cls, formulas_by_cell: dict, references_by_cell: dict,
+                      include_inputs: bool = False, keep_targets: bool = False) -> "DependencyGraph":
+        """Build the graph from cell -> formula and cell -> reference strings.
+
+        With include_inputs, cells referenced on their own (A1 rather than
+        inside A1:B5) become nodes too, after the formula cells. With
+        keep_targets, `node_targets` keeps each formula node's parsed
+        references, (sheet_key, r1, c1, r2, c2) tuples, for later passes.
+        """
+        graph = cls()
+        for cell_addr in formulas_by_cell:
+            parsed = split_cell_address(cell_addr)
+            if parsed is None:
+                continue
+            sheet, row, col = parsed
+            graph.sheet_names.setdefault(sheet_key(sheet), sheet)
+            graph._add_cell((sheet_key(sheet), row, col), cell_addr)
+        graph.formula_count = len(graph.cells)
+
+        targets_by_node = []
+        for node in range(graph.formula_count):
+            sheet = graph.positions[node][0]
+            targets = []
+            for ref in references_by_cell.get(graph.cells[node], ()):
+                target = parse_reference(ref, sheet)
+                if target is None:
+                    continue
+                if '!' in ref:
+                    graph.sheet_names.setdefault(target[0], unquote_sheet(ref.rsplit('!', 1)[0]))
+                targets.append(target)
+            targets_by_node.append(targets)
+
+        if include_inputs:
+            for targets in targets_by_node:
+                for sheet, r1, c1, r2, c2 in targets:
+                    if r1 == r2 and c1 == c2 and (sheet, r1, c1) not in graph._cell_ids:
+                        graph._add_cell((sheet, r1, c1), graph.format_address(sheet, r1, c1))
+
+        graph.node_count = len(graph.cells)
+        graph._index_columns()
+        for node, targets in enumerate(targets_by_node):
+            for target in targets:
+                graph._link(node, target)
+
+        graph.finalize()
+        if keep_targets:
+            graph.node_targets = targets_by_node
+        return graph
+
+    def _add_cell(self, key: tuple, cell_addr: str):
+        if key not in self._cell_ids:
+            self._cell_ids[key] = len(self.cells)
+            self.cells.append(cell_addr)
+            self.positions.append(key)
+
+    def format_address(self, sheet: str, row: int, col: int, row2: int = None, col2: int = None) -> str:
+        """Render a cell or range address using the sheet's written name."""
+        coord = f"{get_column_letter(col)}{row}"
+        if row2 is not None and (row2, col2) != (row, col):
+            coord += f":{get_column_letter(col2)}{row2}"
+        name = self.sheet_names.get(sheet, sheet)
+        return f"{name}!{coord}" if name else coord
+
+    def _index_columns(self):
+        by_column = defaultdict(list)
+        for node, (sheet, row, col) in enumerate(self.positions):
+            by_column[(sheet, col)].append((row, node))
+        for (sheet, col), entries in by_column.items():
+            entries.sort()
+            self._columns.setdefault(sheet, {})[col] = _ColumnIndex(
+                [r for r, _ in entries], [n for _, n in entries])
+        for sheet, cols in self._columns.items():
+            self._sheet_cols[sheet] = sorted(cols)
+
+    def _new_node(self) -> int:
+        node = self.node_count
+        self.node_count += 1
+        return node
+
+    def _edge(self, src: int, dst: int):
+        self._src.append(src)
+        self._dst.append(dst)
+
+    def _link(self, node: int, target: tuple):
+        sheet, r1, c1, r2, c2 = target
+        if r1 == r2 and c1 == c2:
+            dst = self._cell_ids.get((sheet, r1, c1))
+            if dst is not None:
+                self._edge(node, dst)
+            return
+
+        range_node = self.range_nodes.get(target)
+        if range_node is None:
+            range_node = self._new_node()
+            for dst in self._cover(target):
+                self._edge(range_node, dst)
+            self.range_nodes[target] = range_node
+        self._edge(node, range_node)
+
+    def _cover(self, target: tuple) -> list:
+        """Segment/cell nodes whose union is the formula cells in `target`."""
+        sheet, r1, c1, r2, c2 = target
+        columns = self._columns.get(sheet)
+        if not columns:
+            return []
+        sheet_cols = self._sheet_cols[sheet]
+        covers = []
+        for col in sheet_cols[bisect_left(sheet_cols, c1):bisect_right(sheet_cols, c2)]:
+            column = columns[col]
+            lo = bisect_left(column.rows, r1)
+            hi = bisect_right(column.rows, r2)
+            if lo < hi:
+                covers.extend(self._segments(column, lo, hi))
+        return covers
+
+    def _segments(self, column: _ColumnIndex, lo: int, hi: int) -> list:
+        """Bottom-up segment tree query for positions [lo, hi) of a column."""
+        m = len(column.ids)
+        if hi - lo == 1:
+            return [column.ids[lo]]
+        if column.tree_base is None:
+            self._build_tree(column)
+        nodes = []
+        lo += m
+        hi += m
+        while lo < hi:
+            if lo & 1:
+                nodes.append(self._tree_node(column, lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                nodes.append(self._tree_node(column, hi))
+            lo >>= 1
+            hi >>= 1
+        return nodes
+
+    @staticmethod
+    def _tree_node(column: _ColumnIndex, i: int) -> int:
+        m = len(column.ids)
+        return column.ids[i - m] if i >= m else column.tree_base + i
+
+    def _build_tree(self, column: _ColumnIndex):
+        m = len(column.ids)
+        column.tree_base = self.node_count
+        self.node_count += m  # slot 0 is unused so ids stay base + i
+        for i in range(1, m):
+            self._edge(column.tree_base + i, self._tree_node(column, 2 * i))
+            self._edge(column.tree_base + i, self._tree_node(column, 2 * i + 1))
+
+    def finalize(self):
+        """Pack the edge list into CSR arrays (counting sort by source)."""
+        n = self.node_count
+        counts = array('l', [0]) * (n + 1)
+        for s in self._src:
+            counts[s + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        targets = array('l', [0]) * len(self._src)
+        fill = array('l', counts[:n])
+        for s, d in zip(self._src, self._dst):
+            targets[fill[s]] = d
+            fill[s] += 1
+        self.offsets = counts
+        self.targets = targets
+        self._src = array('l')
+        self._dst = array('l')
+
+    def cyclic_components(self) -> list:
+        """Strongly connected components that contain a cycle.
+
+        Iterative Tarjan over the CSR arrays: O(nodes + edges), no recursion.
+        Each component is returned as a list of node ids.
+        """
+        offsets, targets = self.offsets, self.targets
+        n = self.node_count
+        index = array('l', [-1]) * n
+        low = array('l', [0]) * n
+        on_stack = bytearray(n)
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(self.formula_count):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+
+            while work:
+                frame = work[-1]
+                v, pos = frame
+                if pos < offsets[v + 1]:
+                    frame[1] = pos + 1
+                    w = targets[pos]
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append([w, offsets[w]])
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    if len(component) > 1 or self._has_self_edge(v):
+                        components.append(component)
+
+        return components
+
+    def _has_self_edge(self, v: int) -> bool:
+        return v in self.targets[self.offsets[v]:self.offsets[v + 1]]
+
+    def circular_groups(self) -> list:
+        """Cells in each reference cycle, one list per cycle.
+
+        Groups and their cells follow the order the formulas were given in.
+        """
+        groups = []
+        for component in self.cyclic_components():
+            members = sorted(n for n in component if n < self.formula_count)
+            if members:
+                groups.append(members)
+        groups.sort(key=lambda g: g[0])
+        return [[self.cells[n] for n in group] for group in groups]
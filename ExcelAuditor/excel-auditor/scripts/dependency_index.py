@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Precedent/dependent index for an audited workbook.
+
+Built from the `formulas` list of an extract_formulas.py audit and saved next
+to the audit JSON (audit.json -> audit.deps.gz), so "what feeds this cell" and
+"what breaks if I change B12" are answered without reopening the workbook.
+The index records the size, mtime and SHA-256 of the audit it was built from
+and is rebuilt when the audit JSON changes.
+
+That list is only complete when the scan was not truncated at max_cells and
+no formula is longer than the 500 characters of text kept per record; a
+partial index would silently miss links, so building one from such an audit
+is refused unless --allow-partial is given (queries then carry a warning).
+
+Layout: integer node ids (formula cells, then referenced input cells, then
+range and segment nodes from dependency_graph.py), with precedent and
+dependent adjacency both stored as CSR arrays.
+
+Usage:
+    python dependency_index.py build audit.json [--allow-partial]
+    python dependency_index.py precedents audit.json "Model!D12" [--direct]
+    python dependency_index.py dependents audit.json "Inputs!B12" [--direct]
+    python dependency_index.py longest-chain audit.json
+    python dependency_index.py hotspots audit.json [--top 10]
+"""
+
+import argparse
+import base64
+import gzip
+import heapq
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from pathlib import Path
+
+from openpyxl.utils import get_column_letter
+
+from dependency_graph import DependencyGraph, reverse_csr, sheet_key, split_cell_address
+from extract_formulas import extract_references_from_formula
+from result_cache import file_sha256
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".deps.gz"
+
+
+def index_path_for(audit_path: str) -> Path:
+    """Where the index for an audit JSON file lives."""
+    return Path(audit_path).with_suffix(INDEX_SUFFIX)
+
+
+def audit_gaps(audit: dict) -> list:
+    """Reasons an audit's `formulas` list does not hold every formula in full."""
+    gaps = []
+    if audit.get("truncated"):
+        gaps.append("formula scan was truncated at max_cells; re-run the audit with --max-cells 0")
+    cut = sum(1 for f in audit.get("formulas", []) if f.get("length", 0) > len(f["formula"]))
+    if cut:
+        gaps.append(f"{cut} formula(s) longer than the stored text; their references past the cut are missing")
+    return gaps
+
+
+def audit_source(audit_path: str) -> dict:
+    """Size, mtime and SHA-256 of an audit JSON file."""
+    st = os.stat(audit_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(audit_path)}
+
+
+def _pack(values) -> str:
+    return base64.b64encode(array('i', values).tobytes()).decode('ascii')
+
+
+def _unpack(data: str, byteorder: str) -> array:
+    values = array('i')
+    values.frombytes(base64.b64decode(data))
+    if byteorder != sys.byteorder:
+        values.byteswap()
+    return values
+
+
+class _RangeTree:
+    """Segment tree over the row spans of one sheet's ranges, for stabbing queries.
+
+    Row bounds are compressed to the ranges' own start and end rows; each
+    range is stored at the O(log n) tree slots covering its rows, so the
+    ranges containing a row are the ones on that row's leaf-to-root path.
+    """
+
+    __slots__ = ("bounds", "slots")
+
+    def __init__(self, ranges: list):
+        self.bounds = sorted({r[2] for r in ranges} | {r[4] + 1 for r in ranges})
+        m = len(self.bounds)
+        self.slots = [[] for _ in range(2 * m)]
+        for r in ranges:
+            lo = bisect_left(self.bounds, r[2]) + m
+            hi = bisect_left(self.bounds, r[4] + 1) + m
+            while lo < hi:
+                if lo & 1:
+                    self.slots[lo].append(r)
+                    lo += 1
+                if hi & 1:
+                    hi -= 1
+                    self.slots[hi].append(r)
+                lo >>= 1
+                hi >>= 1
+
+    def stab(self, row: int, col: int) -> list:
+        """Ranges containing (row, col)."""
+        i = bisect_right(self.bounds, row) - 1
+        if i < 0:
+            return []
+        found = []
+        i += len(self.bounds)
+        while i:
+            found.extend(r for r in self.slots[i] if r[3] <= col <= r[5])
+            i >>= 1
+        return found
+
+
+class DependencyIndex:
+    """Queryable precedent/dependent graph of a workbook's formulas."""
+
+    def __init__(self, cells: list, formula_count: int, node_count: int, ranges: list,
+                 prec_offsets, prec_targets, dep_offsets, dep_targets, gaps: list = None, source: dict = None):
+        self.cells = cells
+        self.formula_count = formula_count
+        self.node_count = node_count
+        self.ranges = ranges  # [node id, sheet_key, r1, c1, r2, c2, address]
+        self.prec_offsets = prec_offsets
+        self.prec_targets = prec_targets
+        self.dep_offsets = dep_offsets
+        self.dep_targets = dep_targets
+        self.gaps = gaps or []  # audit_gaps() of the audit the index was built from
+        self.source = source  # audit_source() of that audit's JSON file
+        self._range_by_node = {r[0]: r for r in ranges}
+        self._cell_ids = None
+        self._range_trees = None
+
+    @classmethod
+    def from_formulas(cls, formulas_by_cell: dict) -> "DependencyIndex":
+        references_by_cell = {
+            cell_addr: extract_references_from_formula(formula)
+            for cell_addr, formula in formulas_by_cell.items()
+        }
+        graph = DependencyGraph.from_formulas(formulas_by_cell, references_by_cell, include_inputs=True)
+        ranges = sorted(
+            [node, *target, graph.format_address(target[0], target[1], target[2], target[3], target[4])]
+            for target, node in graph.range_nodes.items()
+        )
+        prec_offsets = array('i', graph.offsets)
+        prec_targets = array('i', graph.targets)
+        dep_offsets, dep_targets = reverse_csr(graph.node_count, prec_offsets, prec_targets)
+        return cls(graph.cells, graph.formula_count, graph.node_count, ranges,
+                   prec_offsets, prec_targets, dep_offsets, dep_targets)
+
+    @classmethod
+    def from_audit(cls, audit: dict, allow_partial: bool = False) -> "DependencyIndex":
+        """Build from an extract_formulas result dict.
+
+        Raises ValueError when the audit's formulas are incomplete (see
+        audit_gaps) unless `allow_partial`, in which case the gaps are kept
+        on the index.
+        """
+        gaps = audit_gaps(audit)
+        if gaps and not allow_partial:
+            raise ValueError("Audit formulas are incomplete (allow partial to index anyway): " + "; ".join(gaps))
+        index = cls.from_formulas({f["cell"]: f["formula"] for f in audit.get("formulas", [])})
+        index.gaps = gaps
+        return index
+
+    def is_current(self, audit_path: str) -> bool:
+        """Whether the index was built from the audit file as it is now."""
+        if not self.source:
+            return False
+        st = os.stat(audit_path)
+        if (st.st_size, st.st_mtime_ns) == (self.source["size"], self.source["mtime_ns"]):
+            return True
+        return st.st_size == self.source["size"] and file_sha256(audit_path) == self.source["sha256"]
+
+    def save(self, path: str):
+        data = {
+            "version": INDEX_VERSION,
+            "byteorder": sys.byteorder,
+            "formula_count": self.formula_count,
+            "node_count": self.node_count,
+            "gaps": self.gaps,
+            "source": self.source,
+            "cells": self.cells,
+            "ranges": self.ranges,
+            "precedents": [_pack(self.prec_offsets), _pack(self.prec_targets)],
+            "dependents": [_pack(self.dep_offsets), _pack(self.dep_targets)],
+        }
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> "DependencyIndex":
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported dependency index version: {data.get('version')}")
+        order = data["byteorder"]
+        return cls(data["cells"], data["formula_count"], data["node_count"], data["ranges"],
+                   *(_unpack(part, order) for part in data["precedents"]),
+                   *(_unpack(part, order) for part in data["dependents"]),
+                   gaps=data["gaps"], source=data["source"])
+
+    # === Queries ===
+
+    def _position(self, cell_addr: str) -> tuple:
+        parsed = split_cell_address(cell_addr)
+        if parsed is None:
+            raise ValueError(f"Not a cell address: {cell_addr}")
+        sheet, row, col = parsed
+        return sheet_key(sheet), row, col
+
+    def node_for(self, cell_addr: str) -> int:
+        """Node id of a cell, or None if no formula reads or holds it."""
+        if self._cell_ids is None:
+            # Stored addresses are unquoted and $-free, so upper() is their key
+            self._cell_ids = {}
+            for node, addr in enumerate(self.cells):
+                self._cell_ids.setdefault(addr.upper(), node)
+        sheet, row, col = self._position(cell_addr)
+        return self._cell_ids.get(f"{sheet}!{get_column_letter(col)}{row}" if sheet else
+                                  f"{get_column_letter(col)}{row}")
+
+    def _walk(self, starts: list, offsets, targets, transitive: bool) -> list:
+        """Breadth-first walk; helper nodes are passed through, cells collected."""
+        seen = set(starts)
+        queue = deque(starts)
+        found = []
+        cell_count = len(self.cells)
+        while queue:
+            v = queue.popleft()
+            for pos in range(offsets[v], offsets[v + 1]):
+                w = targets[pos]
+                if w in seen:
+                    continue
+                seen.add(w)
+                if w < cell_count:
+                    found.append(w)
+                    if not transitive:
+                        continue
+                queue.append(w)
+        return found
+
+    def precedents(self, cell_addr: str, transitive: bool = True) -> dict:
+        """Cells and ranges that feed a cell, directly or through other formulas."""
+        node = self.node_for(cell_addr)
+        if node is None or node >= self.formula_count:
+            return {"cell": cell_addr, "cells": [], "ranges": []}
+        found = self._walk([node], self.prec_offsets, self.prec_targets, transitive)
+        range_nodes = self._ranges_reached([node] + [n for n in found if n < self.formula_count],
+                                           transitive)
+        return {
+            "cell": cell_addr,
+            "cells": [self.cells[n] for n in sorted(found)],
+            "ranges": [self._range_by_node[n][-1] for n in sorted(range_nodes)],
+        }
+
+    def _ranges_reached(self, formula_nodes: list, transitive: bool) -> set:
+        sources = formula_nodes if transitive else formula_nodes[:1]
+        reached = set()
+        for v in sources:
+            for pos in range(self.prec_offsets[v], self.prec_offsets[v + 1]):
+                w = self.prec_targets[pos]
+                if w in self._range_by_node:
+                    reached.add(w)
+        return reached
+
+    def ranges_containing(self, cell_addr: str) -> list:
+        """Node ids of the referenced ranges that contain a cell."""
+        if self._range_trees is None:
+            by_sheet = defaultdict(list)
+            for r in self.ranges:
+                by_sheet[r[1]].append(r)
+            self._range_trees = {sheet: _RangeTree(ranges) for sheet, ranges in by_sheet.items()}
+        sheet, row, col = self._position(cell_addr)
+        tree = self._range_trees.get(sheet)
+        return sorted(r[0] for r in tree.stab(row, col)) if tree else []
+
+    def dependents(self, cell_addr: str, transitive: bool = True) -> dict:
+        """Formula cells that read a cell, directly or through other formulas."""
+        node = self.node_for(cell_addr)
+        # A cell node is already linked from the ranges covering it; a cell
+        # that is not referenced on its own can only be read through ranges
+        starts = [node] if node is not None else self.ranges_containing(cell_addr)
+        found = self._walk(starts, self.dep_offsets, self.dep_targets, transitive)
+        return {"cell": cell_addr, "dependents": [self.cells[n] for n in sorted(found)]}
+
+    def longest_chain(self) -> list:
+        """Longest precedent chain, from the final dependent down to its deepest input.
+
+        Cells already on the current path are skipped, so circular references
+        are cut rather than followed.
+        """
+        cell_count = len(self.cells)
+        offsets, targets = self.prec_offsets, self.prec_targets
+        depth = array('i', [-1]) * self.node_count
+        best_next = array('i', [-1]) * self.node_count
+        on_path = bytearray(self.node_count)
+
+        for root in range(self.formula_count):
+            if depth[root] != -1:
+                continue
+            on_path[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                v, pos = frame
+                if pos < offsets[v + 1]:
+                    frame[1] = pos + 1
+                    w = targets[pos]
+                    if depth[w] == -1 and not on_path[w]:
+                        on_path[w] = 1
+                        work.append([w, offsets[w]])
+                    continue
+                work.pop()
+                on_path[v] = 0
+                deepest, nxt = 0, -1
+                for p in range(offsets[v], offsets[v + 1]):
+                    w = targets[p]
+                    if depth[w] > deepest:
+                        deepest, nxt = depth[w], w
+                depth[v] = deepest + (1 if v < cell_count else 0)
+                best_next[v] = nxt
+
+        if not self.formula_count:
+            return []
+        v = max(range(self.formula_count), key=lambda n: depth[n])
+        chain = []
+        while v != -1:
+            if v < cell_count:
+                chain.append(self.cells[v])
+            v = best_next[v]
+        return chain
+
+    def fan_in_hotspots(self, top: int = 10) -> list:
+        """Cells read by the most formula references, directly or via ranges.
+
+        A cell with a node counts its direct readers plus the readers of
+        every range covering it. Cells read only through ranges have no
+        node: they are ranked on the same expanded range membership and
+        listed as blocks of equally read cells, `{"range", "cells",
+        "references"}`, which may also contain listed cells.
+        """
+        cell_count = len(self.cells)
+        offsets, targets = self.dep_offsets, self.dep_targets
+        weight = array('i', [0]) * self.node_count
+
+        def readers(v):
+            return sum(1 if p < cell_count else weight[p]
+                       for p in targets[offsets[v]:offsets[v + 1]])
+
+        # Ranges are read by formula cells only; segment nodes by ranges or
+        # by their parent segment, which always has the smaller id.
+        for r in self.ranges:
+            weight[r[0]] = readers(r[0])
+        for v in range(cell_count, self.node_count):
+            if v not in self._range_by_node:
+                weight[v] = readers(v)
+        counts = [(readers(v), 0, v, {"cell": self.cells[v]}) for v in range(cell_count)]
+        blocks = self._range_blocks(weight)
+        ranked = heapq.nsmallest(top, [(-n, kind, order, entry)
+                                       for n, kind, order, entry in counts + blocks if n])
+        return [dict(entry, references=-n) for n, _, _, entry in ranked]
+
+    def _range_blocks(self, weight) -> list:
+        """(references, 1, order, entry) for the blocks of cells read through ranges.
+
+        Sweeps each sheet's ranges by row: between two range boundaries the
+        per-column reader counts are constant, and column runs with the same
+        count that continue down the next band are merged into one block.
+        """
+        by_sheet = defaultdict(list)
+        for r in self.ranges:
+            if weight[r[0]]:
+                by_sheet[r[1]].append(r)
+        blocks = []
+        for sheet_ranges in by_sheet.values():
+            prefix = sheet_ranges[0][6].rsplit('!', 1)[0] + '!' if '!' in sheet_ranges[0][6] else ''
+            cols = sorted({r[3] for r in sheet_ranges} | {r[5] + 1 for r in sheet_ranges})
+            events = defaultdict(list)
+            for r in sheet_ranges:
+                events[r[2]].append((r, weight[r[0]]))
+                events[r[4] + 1].append((r, -weight[r[0]]))
+            column_weight = [0] * len(cols)
+            open_blocks = {}  # (first col slot, last col slot, references) -> first row
+            for row in sorted(events):
+                for r, delta in events[row]:
+                    for slot in range(bisect_left(cols, r[3]), bisect_left(cols, r[5] + 1)):
+                        column_weight[slot] += delta
+                runs = {}
+                slot = 0
+                while slot < len(cols) - 1:
+                    n = column_weight[slot]
+                    end = slot
+                    while end + 1 < len(cols) - 1 and column_weight[end + 1] == n:
+                        end += 1
+                    if n:
+                        runs[(slot, end, n)] = open_blocks.get((slot, end, n), row)
+                    slot = end + 1
+                for key, first in open_blocks.items():
+                    if key not in runs:
+                        blocks.append(self._block(prefix, cols, key, first, row - 1))
+                open_blocks = runs  # empty after the last range ends
+        return blocks
+
+    @staticmethod
+    def _block(prefix: str, cols: list, key: tuple, first_row: int, last_row: int) -> tuple:
+        lo, hi, references = key
+        c1, c2 = cols[lo], cols[hi + 1] - 1
+        coord = f"{get_column_letter(c1)}{first_row}"
+        if (first_row, c1) != (last_row, c2):
+            coord += f":{get_column_letter(c2)}{last_row}"
+        entry = {"range": prefix + coord, "cells": (last_row - first_row + 1) * (c2 - c1 + 1)}
+        return references, 1, (prefix, first_row, c1), entry
+
+
+def build_index(audit_path: str, allow_partial: bool = False) -> Path:
+    """Build the index for an audit JSON file and save it next to it."""
+    source = audit_source(audit_path)
+    with open(audit_path, encoding='utf-8') as f:
+        audit = json.load(f)
+    path = index_path_for(audit_path)
+    index = DependencyIndex.from_audit(audit, allow_partial)
+    index.source = source
+    index.save(path)
+    return path
+
+
+def open_index(audit_path: str, allow_partial: bool = False) -> DependencyIndex:
+    """Index for an audit JSON file, (re)built if missing or out of date."""
+    path = index_path_for(audit_path)
+    if path.exists():
+        try:
+            index = DependencyIndex.load(path)
+        except ValueError:
+            index = None  # Written by an older version
+        if index is not None and index.is_current(audit_path) and (allow_partial or not index.gaps):
+            return index
+    return DependencyIndex.load(build_index(audit_path, allow_partial))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the precedent/dependent index of an audited workbook.")
+    audit_args = argparse.ArgumentParser(add_help=False)
+    audit_args.add_argument("audit")
+    audit_args.add_argument("--allow-partial", action="store_true",
+                            help="Index a truncated audit or one with cut formula text")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", parents=[audit_args], help="Build the index next to an audit JSON file")
+    for name in ("precedents", "dependents"):
+        p = sub.add_parser(name, parents=[audit_args], help=f"Transitive {name} of a cell")
+        p.add_argument("cell", help="Cell address, e.g. 'Model!B12'")
+        p.add_argument("--direct", action="store_true", help="Only direct (one-step) links")
+    sub.add_parser("longest-chain", parents=[audit_args], help="Longest precedent chain")
+    p = sub.add_parser("hotspots", parents=[audit_args], help="Cells read by the most formulas")
+    p.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            path = build_index(args.audit, args.allow_partial)
+            print(json.dumps({"index": str(path), "gaps": DependencyIndex.load(path).gaps}))
+            return
+        index = open_index(args.audit, args.allow_partial)
+    except ValueError as e:
+        parser.exit(1, f"Error: {e}\n")
+    for gap in index.gaps:
+        print(f"Warning: partial index: {gap}", file=sys.stderr)
+    if args.command == "precedents":
+        result = index.precedents(args.cell, transitive=not args.direct)
+    elif args.command == "dependents":
+        result = index.dependents(args.cell, transitive=not args.direct)
+    elif args.command == "longest-chain":
+        chain = index.longest_chain()
+        result = {"length": len(chain), "chain": chain}
+    else:
+        result = {"hotspots": index.fan_in_hotspots(args.top)}
+    if index.gaps:
+        result["gaps"] = index.gaps
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
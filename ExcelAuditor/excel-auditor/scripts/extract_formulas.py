@@ -3,19 +3,43 @@
 
 import sys
 import json
+import math
 import re
+import zipfile
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from collections import defaultdict
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.worksheet.formula import ArrayFormula
+
+from xlsx_reader import (
+    XlsxWorkbook, worksheet_parts, read_hidden_dimensions, read_sheet_properties, read_workbook_metadata,
+)
+from calc_cost import profile_calc_cost
+from dependency_graph import DependencyGraph
+from formula_cache import parse_formula
+from formula_store import FormulaList, cell_formulas, formula_texts
+from profiler import NULL_PROFILER, Profiler, run_profiled
+from spill_store import MemoryBudget, dump_json
+from recalc_engine import find_stale_cached_values
 
 # Try to import xlrd for XLS support
 try:
-    import xlrd
+    from xls_reader import XlsWorkbook
     HAS_XLRD = True
 except ImportError:
     HAS_XLRD = False
 
+# NumPy vectorizes the override and hidden-cell checks; pure Python otherwise
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 # Excel error values to detect
 EXCEL_ERRORS = {'#REF!', '#DIV/0!', '#VALUE!', '#N/A', '#NAME?', '#NULL!', '#NUM!', '#GETTING_DATA'}
 
@@ -48,13 +72,7 @@ def normalize_formula_pattern(formula: str) -> str:
     Replaces row numbers with {R} and specific values with placeholders
     to enable pattern matching across rows.
     """
-    # Replace row numbers (keeping column letters intact)
-    pattern = re.sub(r'([A-Z]+)(\d+)', r'\1{R}', formula)
-    # Replace literal numbers (but not in function names)
-    pattern = re.sub(r'(?<![A-Z])(\d+\.?\d*)(?![A-Z{])', '{N}', pattern)
-    # Replace quoted strings
-    pattern = re.sub(r'"[^"]*"', '"{S}"', pattern)
-    return pattern
+    return parse_formula(formula).normalized_pattern
 
 
 def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
@@ -71,7 +89,8 @@ def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
     findings = []
 
     # Group formulas by sheet and column
-    col_formulas = defaultdict(list)  # (sheet, col) -> [(row, formula, cell_addr)]
+    col_formulas = defaultdict(list)  # (sheet, col) -> [(row, signature, formula, cell_addr)]
+    pattern_text = {}  # signature -> R1C1 text
 
     for cell_addr, formula in formulas_by_cell.items():
         # Parse cell address
@@ -84,7 +103,13 @@ def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
         parsed = parse_cell_reference(cell_ref)
         if parsed:
             col, row = parsed
-            col_formulas[(sheet, col)].append((row, formula, cell_addr))
+            # Copies of one formula share an R1C1 form, so they share a signature
+            record = parse_formula(formula)
+            col_idx = column_index_from_string(col)
+            signature = record.signature(row, col_idx)
+            if signature not in pattern_text:
+                pattern_text[signature] = record.r1c1(row, col_idx)
+            col_formulas[(sheet, col)].append((row, signature, formula, cell_addr))
 
     # Analyze each column for pattern breaks
     for (sheet, col), cell_list in col_formulas.items():
@@ -94,21 +119,18 @@ def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
         # Sort by row
         cell_list.sort(key=lambda x: x[0])
 
-        # Normalize formulas to patterns
-        patterns = [(row, normalize_formula_pattern(formula), formula, addr)
-                   for row, formula, addr in cell_list]
-
         # Count pattern occurrences
         pattern_counts = defaultdict(list)
-        for row, pattern, formula, addr in patterns:
-            pattern_counts[pattern].append((row, formula, addr))
+        for row, signature, formula, addr in cell_list:
+            pattern_counts[signature].append((row, formula, addr))
 
         # Find dominant pattern (if any)
         if not pattern_counts:
             continue
 
         sorted_patterns = sorted(pattern_counts.items(), key=lambda x: -len(x[1]))
-        dominant_pattern, dominant_cells = sorted_patterns[0]
+        dominant_signature, dominant_cells = sorted_patterns[0]
+        dominant_pattern = pattern_text[dominant_signature]
 
         if len(dominant_cells) < 3:
             continue  # No clear pattern
@@ -140,6 +162,7 @@ def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
 
                         findings.append({
                             "type": "formula_inconsistency",
+                            "axis": "column",
                             "severity": severity,
                             "cell": addr,
                             "sheet": sheet,
@@ -158,108 +181,262 @@ def detect_formula_inconsistencies(wb, formulas_by_cell: dict) -> list:
     return findings
 
 
-def detect_hardcoded_overrides(wb, max_rows: int = 2000) -> list:
-    """Detect hardcoded values in columns that predominantly contain formulas.
-
-    THE MAGIC NUMBER FINDER - spots where someone replaced a formula with a
-    hardcoded value, often to hide calculation problems or manipulate results.
+def detect_row_formula_inconsistencies(sheet_name: str, matrix: "CellMatrix", formulas,
+                                       pattern_text: list) -> list:
+    """Detect formulas that break the pattern copied along a row.
 
-    Returns list of forensic findings.
+    The row-axis twin of detect_formula_inconsistencies, for models whose
+    periods run across columns: one month overridden in a 60-month
+    projection shows up here, not in any column. Each row's formula cells
+    are run-length encoded by pattern ID (`matrix.pattern_ids`) in one pass,
+    so the check is linear in cells. `formulas` are the scan's formula
+    records (in matrix order) and `pattern_text` maps pattern IDs to R1C1
+    text. Findings use the column detector's schema, with "axis": "row".
     """
-    findings = []
+    breaks = []  # (row, col, formula index, dominant formula index, dominant count, total, surrounded, pattern ID)
+    offsets, cols, kinds, pattern_ids = matrix.row_offsets, matrix.cols, matrix.kinds, matrix.pattern_ids
+    formula_idx = 0
+    for row_idx in range(1, len(offsets) + 1):
+        end = offsets[row_idx] if row_idx < len(offsets) else len(cols)
+        # Runs of consecutive formula cells sharing a pattern: [pattern ID, first col, last col, cells, first formula index]
+        runs = []
+        counts = {}
+        for i in range(offsets[row_idx - 1], end):
+            if kinds[i] != KIND_FORMULA:
+                continue
+            pattern_id = pattern_ids[formula_idx]
+            if pattern_id >= 0:
+                if runs and runs[-1][0] == pattern_id:
+                    runs[-1][2] = cols[i]
+                    runs[-1][3] += 1
+                else:
+                    runs.append([pattern_id, cols[i], cols[i], 1, formula_idx])
+                counts[pattern_id] = counts.get(pattern_id, 0) + 1
+            formula_idx += 1
+
+        if len(runs) < 2:
+            continue  # no formulas, or one unbroken run
+        total = sum(counts.values())
+        dominant = max(counts, key=counts.get)  # first seen wins ties
+        dominant_count = counts[dominant]
+        if dominant_count < 3 or dominant_count / total < 0.7:
+            continue  # No clear pattern
 
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
+        dominant_runs = [run for run in runs if run[0] == dominant]
+        first_col, last_col = dominant_runs[0][1], dominant_runs[-1][2]
+        for pattern_id, start, stop, length, index in runs:
+            if pattern_id == dominant or counts[pattern_id] > 2:
+                continue
+            # A minority run holds at most two cells: its first and last
+            for offset, col_idx in enumerate((start, stop)[:length]):
+                # Dominant cells lie on at least one side; both sides is critical
+                surrounded = first_col < col_idx < last_col
+                breaks.append((row_idx, col_idx, index + offset, dominant_runs[0][4],
+                               dominant_count, total, surrounded, dominant))
 
-        if not ws.max_row or not ws.max_column:
-            continue
+    if not breaks:
+        return []
 
-        # Analyze each column
-        for col_idx in range(1, min(ws.max_column + 1, 100)):  # Limit columns
-            col_letter = get_column_letter(col_idx)
+    # Fetch the formula texts involved in one pass (formulas may be spilled to disk)
+    wanted = {b[2] for b in breaks} | {b[3] for b in breaks}
+    texts = {i: text for i, text in enumerate(formula_texts(formulas)) if i in wanted}
 
-            formula_cells = []
-            value_cells = []
+    findings = []
+    for row_idx, col_idx, index, dominant_index, dominant_count, total, surrounded, dominant in breaks:
+        col = get_column_letter(col_idx)
+        formula = texts[index]
+        sample_dominant = texts[dominant_index]
+        if surrounded:  # Surrounded by dominant pattern
+            severity = "critical"
+            narrative = f"SUSPICIOUS: Formula pattern break detected"
+        else:
+            severity = "high"
+            narrative = f"WARNING: Formula pattern deviation detected"
 
-            # Start from row 2 (skip headers)
-            for row_idx in range(2, min(ws.max_row + 1, max_rows)):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell_addr = f"{sheet_name}!{col_letter}{row_idx}"
+        findings.append({
+            "type": "formula_inconsistency",
+            "axis": "row",
+            "severity": severity,
+            "cell": f"{sheet_name}!{col}{row_idx}",
+            "sheet": sheet_name,
+            "column": col,
+            "row": row_idx,
+            "actual_formula": formula,
+            "expected_pattern": pattern_text[dominant],
+            "sample_expected": sample_dominant,
+            "pattern_adherence": f"{dominant_count}/{total} cells follow pattern",
+            "narrative": f"{narrative} in row {row_idx} of '{sheet_name}'. "
+                        f"Column {col} has '{formula}' while {dominant_count} other cells in the row "
+                        f"follow pattern '{sample_dominant[:60]}...'. "
+                        f"This could indicate a manual override, copy error, or intentional manipulation."
+        })
 
-                if cell.value is None:
-                    continue
+    return findings
 
-                if isinstance(cell.value, str) and cell.value.startswith('='):
-                    formula_cells.append((row_idx, cell.value, cell_addr))
-                elif isinstance(cell.value, (int, float)):
-                    value_cells.append((row_idx, cell.value, cell_addr))
 
-            # Look for columns that are mostly formulas but have some values
-            total = len(formula_cells) + len(value_cells)
-            if total < 5:
-                continue
+def detect_hardcoded_overrides(sheet_name: str, matrix: "CellMatrix", header_row: tuple) -> list:
+    """Detect hardcoded values in columns that predominantly contain formulas.
 
-            formula_pct = len(formula_cells) / total
-
-            # If column is 70%+ formulas, flag hardcoded values as suspicious
-            if formula_pct >= 0.7 and value_cells:
-                # Get header for context
-                header_cell = ws.cell(row=1, column=col_idx)
-                header = str(header_cell.value) if header_cell.value else f"Column {col_letter}"
-
-                for row_idx, value, cell_addr in value_cells:
-                    # Check if surrounded by formulas
-                    formula_rows = [r for r, _, _ in formula_cells]
-                    prev_formula = [r for r in formula_rows if r < row_idx]
-                    next_formula = [r for r in formula_rows if r > row_idx]
-
-                    if prev_formula and next_formula:
-                        severity = "high"
-                        narrative_prefix = "SUSPICIOUS OVERRIDE"
-                    elif prev_formula or next_formula:
-                        severity = "medium"
-                        narrative_prefix = "POTENTIAL OVERRIDE"
-                    else:
-                        continue
-
-                    # Check if value looks like a "magic number"
-                    is_round = isinstance(value, (int, float)) and value == round(value, 0)
-                    is_large = isinstance(value, (int, float)) and abs(value) > 10000
-
-                    if is_round and is_large:
-                        severity = "critical" if severity == "high" else "high"
-                        narrative_prefix = "CRITICAL: Suspicious round number"
-
-                    # Sample neighboring formula
-                    sample_formula = formula_cells[0][1] if formula_cells else "Unknown"
-
-                    findings.append({
-                        "type": "hardcoded_override",
-                        "severity": severity,
-                        "cell": cell_addr,
-                        "sheet": sheet_name,
-                        "column": col_letter,
-                        "column_header": header,
-                        "row": row_idx,
-                        "hardcoded_value": value,
-                        "column_formula_ratio": f"{len(formula_cells)}/{total} cells have formulas",
-                        "sample_formula": sample_formula[:100],
-                        "is_round_number": is_round,
-                        "narrative": f"{narrative_prefix} in '{header}' (column {col_letter}) of '{sheet_name}'. "
-                                    f"Row {row_idx} contains hardcoded value {value:,.2f} while "
-                                    f"{len(formula_cells)} other cells in this column contain formulas like "
-                                    f"'{sample_formula[:50]}...'. This value may have been manually inserted "
-                                    f"to override a calculation."
-                    })
+    THE MAGIC NUMBER FINDER - spots where someone replaced a formula with a
+    hardcoded value, often to hide calculation problems or manipulate results.
+
+    `matrix` is the sheet's CellMatrix from the single read pass (rows 2 and
+    below are checked), and `header_row` holds the row 1 values used to
+    label each column. The per-column formula ratio, surrounded-by-formulas
+    and round-number checks run as NumPy array operations when NumPy is
+    installed.
+
+    Returns list of forensic findings.
+    """
+    if HAS_NUMPY:
+        flagged = _flag_overrides_numpy(matrix)
+    else:
+        flagged = _flag_overrides_python(matrix)
+
+    findings = []
+    for col_idx, row_idx, number_idx, formula_count, total, both_sides in flagged:
+        col_letter = get_column_letter(col_idx)
+        value = matrix.number(number_idx)
+        cell_addr = f"{sheet_name}!{col_letter}{row_idx}"
+
+        # Get header for context
+        header_value = header_row[col_idx - 1] if col_idx <= len(header_row) else None
+        header = str(header_value) if header_value else f"Column {col_letter}"
+
+        if both_sides:
+            severity = "high"
+            narrative_prefix = "SUSPICIOUS OVERRIDE"
+        else:
+            severity = "medium"
+            narrative_prefix = "POTENTIAL OVERRIDE"
+
+        # Check if value looks like a "magic number"
+        is_round = isinstance(value, (int, float)) and value == round(value, 0)
+        is_large = isinstance(value, (int, float)) and abs(value) > 10000
+
+        if is_round and is_large:
+            severity = "critical" if severity == "high" else "high"
+            narrative_prefix = "CRITICAL: Suspicious round number"
+
+        # Sample neighboring formula
+        sample_formula = matrix.first_formulas[col_idx]
+
+        findings.append({
+            "type": "hardcoded_override",
+            "severity": severity,
+            "cell": cell_addr,
+            "sheet": sheet_name,
+            "column": col_letter,
+            "column_header": header,
+            "row": row_idx,
+            "hardcoded_value": value,
+            "column_formula_ratio": f"{formula_count}/{total} cells have formulas",
+            "sample_formula": sample_formula[:100],
+            "is_round_number": is_round,
+            "narrative": f"{narrative_prefix} in '{header}' (column {col_letter}) of '{sheet_name}'. "
+                        f"Row {row_idx} contains hardcoded value {value:,.2f} while "
+                        f"{formula_count} other cells in this column contain formulas like "
+                        f"'{sample_formula[:50]}...'. This value may have been manually inserted "
+                        f"to override a calculation."
+        })
 
     return findings
 
 
-def detect_hidden_content(wb) -> dict:
+def _flag_overrides_numpy(matrix: "CellMatrix") -> list:
+    """Numeric cells below row 1 in columns that are 70%+ formulas, next to a formula.
+
+    Returns (col, row, number index, column formula count, column total,
+    formulas on both sides) tuples ordered by column, then row.
+    """
+    rows, cols, kinds = matrix.as_arrays()
+    if not len(cols):
+        return []
+    body = rows >= 2
+    is_formula = body & (kinds == KIND_FORMULA)
+    is_number = np.isin(kinds, NUMERIC_KINDS)
+    number_idx = np.cumsum(is_number) - 1
+    is_number &= body
+
+    width = int(cols.max()) + 1
+    formula_count = np.bincount(cols[is_formula], minlength=width)
+    total = formula_count + np.bincount(cols[is_number], minlength=width)
+
+    # Look for columns that are mostly formulas but have some values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mostly_formulas = (total >= 5) & (formula_count / total >= 0.7) & (total > formula_count)
+    candidates = np.flatnonzero(is_number & mostly_formulas[cols])
+    if not len(candidates):
+        return []
+
+    # Cells arrive in row order, so a column's first and last formula rows
+    # come from the first occurrences in forward and reverse order
+    formula_cols = cols[is_formula]
+    formula_rows = rows[is_formula]
+    first_row = np.full(width, np.iinfo(np.int64).max, dtype=np.int64)
+    last_row = np.zeros(width, dtype=np.int64)
+    uniq, first = np.unique(formula_cols, return_index=True)
+    first_row[uniq] = formula_rows[first]
+    uniq, last = np.unique(formula_cols[::-1], return_index=True)
+    last_row[uniq] = formula_rows[::-1][last]
+
+    cand_cols = cols[candidates]
+    cand_rows = rows[candidates]
+    prev_formula = first_row[cand_cols] < cand_rows
+    next_formula = last_row[cand_cols] > cand_rows
+    keep = prev_formula | next_formula
+    order = np.lexsort((cand_rows[keep], cand_cols[keep]))
+
+    cand_cols = cand_cols[keep][order].tolist()
+    return list(zip(
+        cand_cols,
+        cand_rows[keep][order].tolist(),
+        number_idx[candidates][keep][order].tolist(),
+        formula_count[cand_cols].tolist(),
+        total[cand_cols].tolist(),
+        (prev_formula & next_formula)[keep][order].tolist(),
+    ))
+
+
+def _flag_overrides_python(matrix: "CellMatrix") -> list:
+    """Pure-Python equivalent of _flag_overrides_numpy."""
+    formula_count = defaultdict(int)
+    first_row, last_row = {}, {}
+    numbers = defaultdict(list)  # col -> [(row, number index)]
+    number_idx = 0
+    for row_idx, col_idx, kind in matrix.iter_cells():
+        if kind in NUMERIC_KINDS:
+            if row_idx >= 2:
+                numbers[col_idx].append((row_idx, number_idx))
+            number_idx += 1
+        elif kind == KIND_FORMULA and row_idx >= 2:
+            formula_count[col_idx] += 1
+            first_row.setdefault(col_idx, row_idx)
+            last_row[col_idx] = row_idx
+
+    flagged = []
+    for col_idx in sorted(numbers):
+        count = formula_count[col_idx]
+        total = count + len(numbers[col_idx])
+        if total < 5 or count / total < 0.7:
+            continue
+        for row_idx, idx in numbers[col_idx]:
+            prev_formula = count and first_row[col_idx] < row_idx
+            next_formula = count and last_row[col_idx] > row_idx
+            if prev_formula or next_formula:
+                flagged.append((col_idx, row_idx, idx, count, total, bool(prev_formula and next_formula)))
+    return flagged
+
+
+def detect_hidden_content(sheets: list) -> dict:
     """Build complete inventory of hidden content - sheets, rows, columns.
 
     Hidden content is a major forensic red flag - often used to conceal
     calculations, data, or manipulation.
+
+    `sheets` is the per-sheet metadata gathered by the streaming pass: name,
+    sheet_state, max_row, max_column, hidden_rows, hidden_columns and the
+    non-empty cell counts of the sheet and of its hidden rows/columns.
     """
     inventory = {
         "hidden_sheets": [],
@@ -271,65 +448,62 @@ def detect_hidden_content(wb) -> dict:
     }
 
     # Check sheets
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
+    for sheet in sheets:
+        sheet_name = sheet["name"]
+        max_row = sheet["max_row"]
+        max_column = sheet["max_column"]
 
         # Check sheet visibility
-        if ws.sheet_state == 'hidden':
+        if sheet["sheet_state"] == 'hidden':
             inventory["hidden_sheets"].append({
                 "name": sheet_name,
-                "rows": ws.max_row,
-                "cols": ws.max_column
+                "rows": max_row,
+                "cols": max_column
             })
             inventory["narrative"].append(
                 f"HIDDEN SHEET: '{sheet_name}' is hidden from view but contains "
-                f"{ws.max_row} rows and {ws.max_column} columns of data."
+                f"{max_row} rows and {max_column} columns of data."
             )
-        elif ws.sheet_state == 'veryHidden':
+        elif sheet["sheet_state"] == 'veryHidden':
             inventory["very_hidden_sheets"].append({
                 "name": sheet_name,
-                "rows": ws.max_row,
-                "cols": ws.max_column
+                "rows": max_row,
+                "cols": max_column
             })
             inventory["narrative"].append(
                 f"VERY HIDDEN SHEET (VBA-hidden): '{sheet_name}' is programmatically hidden "
-                f"and cannot be unhidden through normal Excel UI. Contains {ws.max_row} rows. "
+                f"and cannot be unhidden through normal Excel UI. Contains {max_row} rows. "
                 f"This level of concealment is highly suspicious."
             )
 
-        # Check for hidden rows (sample first 1000 rows)
-        if ws.max_row:
-            for row_idx in range(1, min(ws.max_row + 1, 1000)):
-                try:
-                    rd = ws.row_dimensions.get(row_idx)
-                    if rd and rd.hidden:
-                        inventory["hidden_rows"].append({
-                            "sheet": sheet_name,
-                            "row": row_idx
-                        })
-                except:
-                    pass
-
-        # Check for hidden columns (sample first 50 columns)
-        if ws.max_column:
-            for col_idx in range(1, min(ws.max_column + 1, 50)):
-                try:
-                    col_letter = get_column_letter(col_idx)
-                    cd = ws.column_dimensions.get(col_letter)
-                    if cd and cd.hidden:
-                        inventory["hidden_columns"].append({
-                            "sheet": sheet_name,
-                            "column": col_letter
-                        })
-                except:
-                    pass
-
-    # Estimate hidden cell count
+        # Hidden rows and columns within the used range
+        for row_idx in sheet["hidden_rows"]:
+            if row_idx <= max_row:
+                inventory["hidden_rows"].append({
+                    "sheet": sheet_name,
+                    "row": row_idx
+                })
+
+        for col_idx in sorted(sheet["hidden_columns"]):
+            if col_idx <= max_column:
+                inventory["hidden_columns"].append({
+                    "sheet": sheet_name,
+                    "column": get_column_letter(col_idx)
+                })
+
+    # Count hidden cells: exact when the streaming pass counted them
     hidden_cell_count = 0
-    for hs in inventory["hidden_sheets"] + inventory["very_hidden_sheets"]:
-        hidden_cell_count += (hs.get("rows", 0) or 0) * (hs.get("cols", 0) or 0)
-    hidden_cell_count += len(inventory["hidden_rows"]) * 50  # Estimate 50 cols per hidden row
-    hidden_cell_count += len(inventory["hidden_columns"]) * 100  # Estimate 100 rows per hidden col
+    if all("cell_count" in sheet for sheet in sheets):
+        for sheet in sheets:
+            if sheet["sheet_state"] in ('hidden', 'veryHidden'):
+                hidden_cell_count += sheet["cell_count"]
+            else:
+                hidden_cell_count += sheet["hidden_cell_count"]
+    else:
+        for hs in inventory["hidden_sheets"] + inventory["very_hidden_sheets"]:
+            hidden_cell_count += (hs.get("rows", 0) or 0) * (hs.get("cols", 0) or 0)
+        hidden_cell_count += len(inventory["hidden_rows"]) * 50  # Estimate 50 cols per hidden row
+        hidden_cell_count += len(inventory["hidden_columns"]) * 100  # Estimate 100 rows per hidden col
     inventory["total_hidden_cells_estimate"] = hidden_cell_count
 
     # Add summary narratives
@@ -394,6 +568,12 @@ def calculate_risk_score(forensic_findings: dict) -> dict:
         score += min(20, len(critical_hardcoded) * 6)
         factors.append(f"Suspicious hardcoded values: {len(critical_hardcoded)} (+{min(20, len(critical_hardcoded) * 6)})")
 
+    # Stale cached values (high)
+    stale = forensic_findings.get("stale_cached_values", [])
+    if stale:
+        score += min(20, len(stale) * 8)
+        factors.append(f"Stale cached values: {len(stale)} (+{min(20, len(stale) * 8)})")
+
     # Hidden content (medium to high)
     hidden = forensic_findings.get("hidden_content", {})
     very_hidden = len(hidden.get("very_hidden_sheets", []))
@@ -461,6 +641,12 @@ def calculate_risk_score(forensic_findings: dict) -> dict:
                 "reason": f"Hardcoded override ({hc.get('hardcoded_value', '?')})",
                 "severity": hc["severity"]
             })
+    for sv in stale:
+        high_risk_cells.append({
+            "cell": sv["cell"],
+            "reason": f"Stale cached value ({sv.get('cached_value', '?')} vs {sv.get('recalculated_value', '?')})",
+            "severity": sv["severity"]
+        })
 
     risk["high_risk_cells"] = high_risk_cells[:20]  # Limit to top 20
 
@@ -519,6 +705,14 @@ def generate_forensic_narrative(forensic_findings: dict, filename: str) -> str:
             sections.append(f"  • {hc['narrative'][:200]}")
         sections.append("")
 
+    # Stale cached values
+    stale = forensic_findings.get("stale_cached_values", [])
+    if stale:
+        sections.append(f"STALE CACHED VALUES ({len(stale)} detected):")
+        for sv in stale[:3]:
+            sections.append(f"  • {sv['narrative'][:200]}")
+        sections.append("")
+
     # Hidden content
     hidden = forensic_findings.get("hidden_content", {})
     if hidden.get("narrative") and hidden["narrative"][0] != "No hidden content detected.":
@@ -538,98 +732,121 @@ def generate_forensic_narrative(forensic_findings: dict, filename: str) -> str:
     return "\n".join(sections)
 
 def extract_references_from_formula(formula: str) -> list:
-    """Extract cell and range references from a formula."""
-    refs = []
-    # Match cell references like A1, $A$1, Sheet1!A1, 'Sheet Name'!A1
-    pattern = r"(?:'[^']+'!|[A-Za-z_]+!)?(?:\$?[A-Za-z]+\$?\d+(?::\$?[A-Za-z]+\$?\d+)?)"
-    matches = re.findall(pattern, formula)
-    return matches
+    """Extract cell and range references from a formula.
+
+    Handles A1, A1:B2, A:A and 1:1 forms, each with an optional
+    `Sheet1!`, `'Sheet Name'!` or external `[1]Sheet1!` prefix.
+    """
+    return list(parse_formula(formula).references)
 
 def extract_functions_from_formula(formula: str) -> list:
     """Extract function names from a formula."""
-    pattern = r'([A-Z][A-Z0-9_.]+)\s*\('
-    return re.findall(pattern, formula.upper())
+    return list(parse_formula(formula).functions)
 
 def calculate_nesting_depth(formula: str) -> int:
     """Calculate maximum nesting depth of a formula."""
-    max_depth = 0
-    current_depth = 0
-    for char in formula:
-        if char == '(':
-            current_depth += 1
-            max_depth = max(max_depth, current_depth)
-        elif char == ')':
-            current_depth -= 1
-    return max_depth
+    return parse_formula(formula).depth
 
-def detect_circular_references(wb, formulas_by_cell: dict) -> list:
-    """Detect circular references by building a dependency graph.
+def build_dependency_graph(formulas_by_cell: dict, keep_targets: bool = False) -> tuple:
+    """Range-aware dependency graph of the formulas (see dependency_graph.py).
 
-    Returns list of cells involved in circular references.
+    Returns (graph, references_by_cell) so callers can share the parsed
+    references.
     """
-    # Build dependency graph: cell -> cells it depends on
-    dependencies = {}
+    references_by_cell = {
+        cell_addr: extract_references_from_formula(formula)
+        for cell_addr, formula in formulas_by_cell.items()
+    }
+    graph = DependencyGraph.from_formulas(formulas_by_cell, references_by_cell, keep_targets=keep_targets)
+    return graph, references_by_cell
 
+# `[n]` workbook index of an external reference: [1]Sheet!A1, '[1]My Sheet'!A1, [1]!Name.
+# Structured references (Table1[2020], Table1[[2020]]) follow a name or bracket.
+_EXTERNAL_INDEX_RE = re.compile(r"(?<![\w\[\]])\[(\d+)\]")
+_STRING_LITERAL_RE = re.compile(r'"(?:[^"]|"")*"')
+
+def map_external_references(formulas_by_cell: dict, links: list) -> list:
+    """Formula cells grouped by the external workbook they read.
+
+    `links` are the package's external links (xlsx_reader.read_external_links),
+    whose position in workbook.xml is the `[n]` index formulas use. Returns
+    one entry per link in index order, with the formula count and sample
+    cells, plus a `missing` entry for any index with no link behind it.
+    """
+    cells_by_index = defaultdict(list)
     for cell_addr, formula in formulas_by_cell.items():
-        refs = extract_references_from_formula(formula)
-        # Normalize cell address
-        cell_upper = cell_addr.upper()
-        sheet_name = cell_upper.split('!')[0] if '!' in cell_upper else None
-
-        normalized_refs = []
-        for ref in refs:
-            # Strip $ signs and uppercase for normalization
-            ref_clean = ref.replace('$', '').upper()
-            if '!' in ref_clean:
-                normalized_refs.append(ref_clean)
-            elif sheet_name:
-                # Add sheet name if missing (also uppercased)
-                normalized_refs.append(f"{sheet_name}!{ref_clean}")
-            else:
-                normalized_refs.append(ref_clean)
-        dependencies[cell_upper] = normalized_refs
-
-    # Detect cycles using DFS with proper cycle detection
-    circular_cells = set()
-
-    def find_cycle(start_cell, current_cell, path, visited_in_path):
-        """DFS to find cycles starting from start_cell."""
-        if current_cell in visited_in_path:
-            # Found a cycle!
-            if current_cell == start_cell or current_cell in path:
-                # Mark all cells in the cycle
-                try:
-                    cycle_idx = path.index(current_cell)
-                    for c in path[cycle_idx:]:
-                        circular_cells.add(c)
-                    circular_cells.add(current_cell)
-                except ValueError:
-                    circular_cells.add(current_cell)
-            return True
-
-        visited_in_path.add(current_cell)
-        path.append(current_cell)
-
-        for dep in dependencies.get(current_cell, []):
-            # Handle range references - check first cell
-            if ':' in dep:
-                dep = dep.split(':')[0]
-
-            # Try to find this dep in our dependencies
-            if dep in dependencies:
-                if find_cycle(start_cell, dep, path, visited_in_path):
-                    circular_cells.add(current_cell)
-
-        path.pop()
-        visited_in_path.remove(current_cell)
-        return False
-
-    # Check from each cell
-    for cell in dependencies:
-        find_cycle(cell, cell, [], set())
-
-    return list(circular_cells)
+        if '[' not in formula:
+            continue
+        for index in set(_EXTERNAL_INDEX_RE.findall(_STRING_LITERAL_RE.sub('""', formula))):
+            cells_by_index[int(index)].append(cell_addr)
+
+    entries = []
+    for link in links:
+        cells = cells_by_index.pop(link["index"], [])
+        entries.append({
+            "index": link["index"],
+            "target": link["target"],
+            "sheet_names": link["sheet_names"],
+            "status": "used" if cells else "unused",
+            "formula_count": len(cells),
+            "cells": cells[:10],
+        })
+    for index in sorted(cells_by_index):
+        cells = cells_by_index[index]
+        entries.append({"index": index, "target": None, "sheet_names": [], "status": "missing",
+                        "formula_count": len(cells), "cells": cells[:10]})
+    return entries
+
+def broken_external_link_issue(entry: dict) -> dict:
+    """Formulas reading an external workbook index the package has no link for."""
+    return {
+        "type": "broken_external_link",
+        "severity": "high",
+        "cell": entry["cells"][0],
+        "detail": (f"{entry['formula_count']} formula(s) read external workbook [{entry['index']}], "
+                   f"but the workbook declares no link for it; their values cannot be refreshed")
+    }
+
+def find_circular_reference_groups(formulas_by_cell: dict) -> list:
+    """Group the cells of each circular reference.
 
+    Finds the strongly connected components of the dependency graph, so the
+    cost is linear in formulas and references. Each loop is returned as its
+    own list of cell addresses.
+    """
+    graph, _ = build_dependency_graph(formulas_by_cell)
+    return graph.circular_groups()
+
+def circular_reference_issue(circular_groups: list) -> dict:
+    """Summarize circular reference groups as a single critical issue."""
+    cells = [cell for group in circular_groups for cell in group]
+    return {
+        "type": "circular_reference",
+        "severity": "critical",
+        "cells": cells[:10],
+        "groups": len(circular_groups),
+        "detail": f"Found {len(cells)} cells involved in {len(circular_groups)} circular reference loop(s)"
+    }
+
+def slow_recalculation_issue(calc_cost: dict) -> dict:
+    """Summarize a high recalculation cost profile as a single issue."""
+    top = calc_cost["hotspots"][0]
+    return {
+        "type": "slow_recalculation",
+        "severity": "medium",
+        "cell": top["cells"],
+        "detail": (f"Recalculation cost {calc_cost['rating']} (score {calc_cost['score']}/100); "
+                   f"top hotspot {top['cells']} carries {top['share']}% of the work: "
+                   f"{'; '.join(top['reasons'])}")[:200]
+    }
+
+def detect_circular_references(wb, formulas_by_cell: dict) -> list:
+    """Detect circular references by building a dependency graph.
+
+    Returns list of cells involved in circular references.
+    """
+    groups = find_circular_reference_groups(formulas_by_cell)
+    return [cell for group in groups for cell in group]
 
 def infer_purpose_detailed(function_usage: dict, sheet_names: list, headers: list,
                            formula_count: int, named_range_count: int) -> dict:
@@ -790,120 +1007,746 @@ def infer_purpose_detailed(function_usage: dict, sheet_names: list, headers: lis
     }
 
 
-def extract_formulas(filepath: str, max_cells: int = 50000) -> dict:
-    """Extract and analyze all formulas from Excel file."""
-    result = {
-        "filename": Path(filepath).name,
-        "formulas": [],
-        "errors_found": [],
-        "volatile_functions": [],
-        "function_usage": defaultdict(int),
-        "complexity_metrics": {},
-        "issues": [],
-        "formula_patterns": defaultdict(list),  # Track similar formulas
-        "circular_references": [],  # NEW: Track circular refs
-        "purpose_analysis": {},  # NEW: Detailed purpose inference
+# === SINGLE-PASS STREAMING ENGINE ===
+#
+# The workbook is opened once for streaming and every sheet is read row by
+# row. All analyzers that need cell values are fed from that one pass. Two
+# backends produce the rows: openpyxl in read-only mode (the default) and the
+# direct iterparse reader in xlsx_reader.py. With openpyxl, hidden row/column
+# flags come from a bounded prefix scan of the sheet XML, because read-only
+# worksheets do not expose row or column dimensions.
+
+# Sampling window of purpose inference
+HEADER_COLS = 25             # header capture: first 25 columns of row 1
+
+# Largest integer a float holds exactly; bigger ones are kept aside as ints
+_EXACT_FLOAT_INT = 2 ** 53
+
+# Cell kinds of the CellMatrix; cells not stored are empty
+KIND_EMPTY, KIND_FORMULA, KIND_NUMBER, KIND_TEXT, KIND_ERROR, KIND_INTEGER, KIND_BOOLEAN = range(7)
+# Kinds counted as hardcoded numbers (int/bool keep their type in findings)
+NUMERIC_KINDS = (KIND_NUMBER, KIND_INTEGER, KIND_BOOLEAN)
+
+
+class CellMatrix:
+    """Columnar record of every non-empty cell of one sheet.
+
+    Filled during the single read pass and shared by the sheet-local
+    detectors. Cells are stored in row order, CSR style: `row_offsets[r-1]`
+    is the index of row r's first cell in `cols`/`kinds`. Numeric cells
+    also append their value and kind to `numbers`/`number_kinds`, and formula cells append the
+    sheet-local ID of their R1C1 pattern to `pattern_ids` (-1 past the
+    formula scan budget, where signatures aren't computed).
+    """
+
+    __slots__ = ("row_offsets", "cols", "kinds", "numbers", "number_kinds", "pattern_ids", "first_formulas", "big_ints")
+
+    def __init__(self):
+        self.row_offsets = array('i')
+        self.cols = array('i')
+        self.kinds = array('b')
+        self.numbers = array('d')
+        self.number_kinds = array('b')
+        self.pattern_ids = array('i')
+        self.first_formulas = {}  # col -> text of its first formula below row 1
+        self.big_ints = None  # number index -> int beyond float precision
+
+    def start_row(self):
+        self.row_offsets.append(len(self.cols))
+
+    def add_formula(self, row_idx: int, col_idx: int, formula: str, pattern_id: int = -1):
+        self.cols.append(col_idx)
+        self.kinds.append(KIND_FORMULA)
+        self.pattern_ids.append(pattern_id)
+        if row_idx >= 2 and col_idx not in self.first_formulas:
+            self.first_formulas[col_idx] = formula
+
+    def add_value(self, col_idx: int, value):
+        """Record a non-formula value: number, text, error or other (dates)."""
+        if value.__class__ is bool:
+            kind = KIND_BOOLEAN
+        elif isinstance(value, int):
+            kind = KIND_INTEGER
+            if not -_EXACT_FLOAT_INT <= value <= _EXACT_FLOAT_INT:
+                if self.big_ints is None:
+                    self.big_ints = {}
+                self.big_ints[len(self.numbers)] = value
+                value = 0
+        elif isinstance(value, float):
+            kind = KIND_NUMBER
+        else:
+            self.cols.append(col_idx)
+            self.kinds.append(KIND_ERROR if value in EXCEL_ERRORS else KIND_TEXT)
+            return
+        self.cols.append(col_idx)
+        self.kinds.append(kind)
+        self.numbers.append(value)
+        self.number_kinds.append(kind)
+
+    def number(self, i: int):
+        """The i-th numeric cell's value, with its original type."""
+        kind = self.number_kinds[i]
+        if kind == KIND_NUMBER:
+            return self.numbers[i]
+        if kind == KIND_BOOLEAN:
+            return bool(self.numbers[i])
+        if self.big_ints and i in self.big_ints:
+            return self.big_ints[i]
+        return int(self.numbers[i])
+
+    def iter_cells(self):
+        """(row, col, kind) of every stored cell, in row order."""
+        offsets = self.row_offsets
+        cols, kinds = self.cols, self.kinds
+        for row_idx in range(1, len(offsets) + 1):
+            end = offsets[row_idx] if row_idx < len(offsets) else len(cols)
+            for i in range(offsets[row_idx - 1], end):
+                yield row_idx, cols[i], kinds[i]
+
+    def as_arrays(self) -> tuple:
+        """(rows, cols, kinds) as NumPy arrays, one entry per stored cell."""
+        cols = np.frombuffer(self.cols, dtype=np.int32) if self.cols else np.zeros(0, np.int32)
+        kinds = np.frombuffer(self.kinds, dtype=np.int8) if self.kinds else np.zeros(0, np.int8)
+        offsets = np.frombuffer(self.row_offsets, dtype=np.int32) if self.row_offsets else np.zeros(0, np.int32)
+        counts = np.diff(np.append(offsets, len(cols)))
+        rows = np.repeat(np.arange(1, len(offsets) + 1, dtype=np.int64), counts)
+        return rows, cols.astype(np.int64), kinds
+
+    def count_cells(self, hidden_rows=(), hidden_columns=()) -> tuple:
+        """(non-empty cells, non-empty cells in hidden rows or columns)."""
+        total = len(self.cols)
+        if not total or not (hidden_rows or hidden_columns):
+            return total, 0
+        if HAS_NUMPY:
+            rows, cols, _ = self.as_arrays()
+            hidden = np.isin(rows, np.fromiter(hidden_rows, np.int64)) | \
+                np.isin(cols, np.fromiter(hidden_columns, np.int64))
+            return total, int(hidden.sum())
+        hidden_rows, hidden_columns = set(hidden_rows), set(hidden_columns)
+        return total, sum(1 for row_idx, col_idx, _ in self.iter_cells()
+                          if row_idx in hidden_rows or col_idx in hidden_columns)
+
+
+class SheetScan:
+    """Single-pass accumulator for one worksheet.
+
+    Every analyzer that needs cell values - formula extraction, error
+    detection, pattern grouping, header capture and the CellMatrix used by
+    the override and hidden-content checks - is fed from `feed_row`, so each
+    sheet is read once in row order. `max_cells` is the formula scan budget
+    left for this sheet (math.inf for no limit); the matrix always covers
+    every cell.
+    Formulas are kept as a compact FormulaList; with a MemoryBudget, its
+    parts spill to disk under pressure.
+    """
+
+    def __init__(self, sheet_name: str, max_cells: int, budget: MemoryBudget = None):
+        self.sheet_name = sheet_name
+        self.max_cells = max_cells
+        self.cells_processed = 0
+        self.scanning = True
+        self.truncated = False
+        self.rows_seen = 0
+        self.rows_scanned = 0
+        self.widest_row = 0
+        self.row_widths = array('i')  # width of every row fed, for trim()
+
+        self.formulas = FormulaList(budget=budget)
+        self.errors_found = []
+        self.volatile_functions = []
+        self.issues = []
+        self.function_usage = defaultdict(int)
+        self.pattern_counts = defaultdict(int)  # signature -> formula count
+        self.pattern_samples = {}  # signature -> first 5 cells
+        self.signatures = array('q')  # per formula, parallel to self.formulas
+        self.pattern_text = {}  # signature -> R1C1 text
+        self.header_row = ()
+        self.matrix = CellMatrix()
+        self.pattern_ids = {}  # signature -> sheet-local pattern ID in the matrix
+        self.cell_count = 0
+        self.hidden_cell_count = 0
+
+        # Sheet-local findings, filled in by finish()
+        self.formula_inconsistencies = []
+        self.row_inconsistencies = []
+        self.hardcoded_overrides = []
+        self.profile = None  # the sheet's phase records, when profiled (see profiler.py)
+
+    def feed_row(self, row_idx: int, values: tuple):
+        """Hand one row of cell values (column A first) to every analyzer."""
+        self.rows_seen = row_idx
+        self.widest_row = max(self.widest_row, len(values))
+        self.row_widths.append(len(values))
+        self.matrix.start_row()
+
+        if row_idx == 1:
+            self.header_row = tuple(values)
+
+        if self.scanning:
+            if self.cells_processed >= self.max_cells:
+                self.truncated = True
+                self.scanning = False
+            else:
+                self.rows_scanned += 1
+                self._scan_cells(row_idx, values)
+                return
+
+        self._collect_matrix_cells(row_idx, values)
+
+    def _scan_cells(self, row_idx: int, values: tuple):
+        sheet_name = self.sheet_name
+        matrix = self.matrix
+        for col_idx, value in enumerate(values, start=1):
+            self.cells_processed += 1
+            if value is None:
+                continue
+
+            # Check for formula
+            if value and isinstance(value, str) and value.startswith('='):
+                formula = value
+                cell_addr = f"{sheet_name}!{get_column_letter(col_idx)}{row_idx}"
+                record = parse_formula(formula)
+
+                # Track function usage
+                for func in record.functions:
+                    self.function_usage[func] += 1
+
+                # Check for volatile functions
+                volatile_used = [f for f in record.functions if f in VOLATILE_FUNCTIONS]
+                if volatile_used:
+                    self.volatile_functions.append({
+                        "cell": cell_addr,
+                        "volatile_functions": volatile_used
+                    })
+
+                # Flag complex formulas
+                if record.depth > 3:
+                    self.issues.append({
+                        "type": "high_nesting",
+                        "severity": "warning",
+                        "cell": cell_addr,
+                        "detail": f"Nesting depth: {record.depth}"
+                    })
+
+                if len(formula) > 200:
+                    self.issues.append({
+                        "type": "long_formula",
+                        "severity": "info",
+                        "cell": cell_addr,
+                        "detail": f"Formula length: {len(formula)} chars"
+                    })
+
+                # Group copies of the same formula by their R1C1 signature
+                signature = record.signature(row_idx, col_idx)
+                self._count_pattern(signature, cell_addr)
+                if signature not in self.pattern_text:
+                    self.pattern_text[signature] = record.r1c1(row_idx, col_idx)
+
+                self.formulas.add(self.sheet_name, row_idx, col_idx, formula, record)
+                pattern_id = self.pattern_ids.setdefault(signature, len(self.pattern_ids))
+                matrix.add_formula(row_idx, col_idx, formula, pattern_id)
+                continue
+
+            # Check for error values in calculated results
+            elif value in EXCEL_ERRORS:
+                self.errors_found.append({
+                    "cell": f"{sheet_name}!{get_column_letter(col_idx)}{row_idx}",
+                    "error": str(value),
+                    "severity": "critical"
+                })
+
+            matrix.add_value(col_idx, value)
+
+    def _count_pattern(self, signature: int, cell_addr: str):
+        self.signatures.append(signature)
+        count = self.pattern_counts[signature]
+        if count < 5:
+            self.pattern_samples.setdefault(signature, []).append(cell_addr)
+        self.pattern_counts[signature] = count + 1
+
+    def _collect_matrix_cells(self, row_idx: int, values: tuple):
+        matrix = self.matrix
+        for col_idx, value in enumerate(values, start=1):
+            if value is None:
+                continue
+            if isinstance(value, str) and value.startswith('='):
+                matrix.add_formula(row_idx, col_idx, value)
+            else:
+                matrix.add_value(col_idx, value)
+
+    def headers(self, max_column: int) -> list:
+        """Row 1 values of the first 25 columns, as used for purpose inference."""
+        return [str(v) for v in self.header_row[:min(max_column, HEADER_COLS)] if v]
+
+    def finish(self, hidden_rows=(), hidden_columns=(), profiler: Profiler = NULL_PROFILER):
+        """Run the sheet-local detectors once the sheet has been streamed.
+
+        Also counts the non-empty cells of the sheet and of its hidden rows
+        and columns. The matrix is dropped afterwards, which keeps the scan
+        small and picklable for the process pool. Each step is a phase of
+        `profiler`.
+        """
+        sheet = self.sheet_name
+        with profiler.phase("column_consistency", sheet=sheet) as items:
+            self._detect_inconsistencies()
+            items["findings"] = len(self.formula_inconsistencies)
+        with profiler.phase("row_consistency", sheet=sheet) as items:
+            pattern_text = [None] * len(self.pattern_ids)
+            for signature, pattern_id in self.pattern_ids.items():
+                pattern_text[pattern_id] = self.pattern_text[signature]
+            self.row_inconsistencies = detect_row_formula_inconsistencies(
+                self.sheet_name, self.matrix, self.formulas, pattern_text)
+            items["findings"] = len(self.row_inconsistencies)
+        with profiler.phase("hardcoded_overrides", sheet=sheet) as items:
+            self.hardcoded_overrides = detect_hardcoded_overrides(
+                self.sheet_name, self.matrix, self.header_row)
+            items["findings"] = len(self.hardcoded_overrides)
+        with profiler.phase("count_cells", sheet=sheet) as items:
+            self.cell_count, self.hidden_cell_count = self.matrix.count_cells(hidden_rows, hidden_columns)
+            items.update(cells=self.cell_count, hidden_cells=self.hidden_cell_count)
+        self.matrix = None
+        self.pattern_ids = None
+        self.formulas.seal()
+
+    def _detect_inconsistencies(self):
+        formulas_by_cell = dict(cell_formulas(self.formulas))
+        self.formula_inconsistencies = detect_formula_inconsistencies(None, formulas_by_cell)
+
+    def trim(self, max_cells: int) -> bool:
+        """Cut the scan back to what a smaller `max_cells` budget would cover.
+
+        Parallel workers scan every sheet with the full budget; the merge
+        then trims each sheet to the budget the serial run would have left
+        it, so both runs produce the same result. Returns True if anything
+        was cut. Override findings cover the whole sheet either way.
+        """
+        if max_cells >= self.max_cells:
+            return False
+        self.max_cells = max_cells
+
+        # The serial scan stops at the first row reached with the budget spent
+        stop_row = None
+        cells = 0
+        for row_idx in range(1, self.rows_scanned + (2 if self.truncated else 1)):
+            if cells >= max_cells:
+                stop_row = row_idx
+                break
+            cells += self.row_widths[row_idx - 1]
+        if stop_row is None:
+            return False
+
+        def before_stop(items):
+            kept = []
+            for item in items:
+                if int(_ROW_SUFFIX_RE.search(item["cell"]).group()) >= stop_row:
+                    break
+                kept.append(item)
+            return kept
+
+        self.cells_processed = cells
+        self.truncated = True
+        self.scanning = False
+        self.rows_scanned = stop_row - 1
+
+        self.formulas = self.formulas[:self.formulas.count_before_row(stop_row)]
+        signatures = self.signatures[:len(self.formulas)]
+        self.errors_found = before_stop(self.errors_found)
+        self.volatile_functions = before_stop(self.volatile_functions)
+        self.issues = before_stop(self.issues)
+        # Rows are scanned whole, so row-axis findings before the stop row still hold
+        self.row_inconsistencies = [f for f in self.row_inconsistencies if f["row"] < stop_row]
+
+        self.function_usage = defaultdict(int)
+        self.pattern_counts = defaultdict(int)
+        self.pattern_samples = {}
+        self.signatures = array('q')
+        for formula_info, signature in zip(self.formulas, signatures):
+            for func in formula_info["functions"]:
+                self.function_usage[func] += 1
+            self._count_pattern(signature, formula_info["cell"])
+        self.pattern_text = {sig: text for sig, text in self.pattern_text.items()
+                             if sig in self.pattern_counts}
+        self._detect_inconsistencies()
+        return True
+
+
+_ROW_SUFFIX_RE = re.compile(r'\d+$')
+
+
+def scan_worksheet(ws, max_cells: int, budget: MemoryBudget = None) -> SheetScan:
+    """Stream one worksheet (either backend) through a SheetScan."""
+    scan = SheetScan(ws.title, max_cells, budget)
+    for row_idx, values in enumerate(ws.iter_rows(), start=1):
+        scan.feed_row(row_idx, values)
+    return scan
+
+
+def analyze_worksheet(ws, max_cells: int, budget: MemoryBudget = None,
+                      sheet_properties: bool = False, profile: bool = False) -> tuple:
+    """Scan one worksheet and run its sheet-local detectors.
+
+    Returns (scan, sheet) where `sheet` is the hidden-content inventory
+    entry; `max_row`/`max_column` are None for sheets without a dimension.
+    With `sheet_properties`, the entry also carries the structure report's
+    dimensions, freeze panes, autofilter flag and merged-cell count.
+    With `profile`, `scan.profile` holds the timings of the sheet's phases.
+    """
+    profiler = Profiler() if profile else NULL_PROFILER
+    with profiler.phase("stream", sheet=ws.title) as items:
+        scan = scan_worksheet(ws, max_cells, budget)
+        hidden_rows, hidden_columns = ws.hidden_rows, ws.hidden_columns
+        items.update(rows=scan.rows_seen, cells=scan.cells_processed, formulas=len(scan.formulas))
+    scan.finish(hidden_rows, hidden_columns, profiler)
+    if profile:
+        scan.profile = profiler.sheet_records()
+    sheet = {
+        "name": ws.title,
+        "sheet_state": ws.sheet_state,
+        "max_row": ws.max_row,
+        "max_column": ws.max_column,
+        "hidden_rows": hidden_rows,
+        "hidden_columns": hidden_columns,
+        "cell_count": scan.cell_count,
+        "hidden_cell_count": scan.hidden_cell_count,
     }
+    if sheet_properties:
+        sheet["dimensions"] = ws.dimensions
+        sheet["freeze_panes"] = ws.freeze_panes
+        sheet["has_filters"] = ws.has_filters
+        sheet["merged_cells_count"] = ws.merged_cells_count
+    return scan, sheet
+
+
+# Workbooks opened by this worker process, reused across its sheet jobs
+_worker_workbooks = {}
+
+
+def _analyze_sheet_job(filepath: str, backend: str, index: int, max_cells: int,
+                       memory_mb: int = None, sheet_properties: bool = False, profile: bool = False) -> tuple:
+    """Process-pool entry point: analyze one sheet of a workbook."""
+    wb = _worker_workbooks.get((filepath, backend))
+    if wb is None:
+        wb = _worker_workbooks[(filepath, backend)] = READERS[backend](filepath)
+    return analyze_worksheet(wb.worksheets[index], max_cells, MemoryBudget(memory_mb) if memory_mb else None,
+                             sheet_properties, profile)
+
+
+class OpenpyxlWorksheet:
+    """Read-only openpyxl worksheet behind the XlsxWorksheet interface."""
+
+    def __init__(self, ws, filepath: str, part: str):
+        self._ws = ws
+        self._filepath = filepath
+        self._part = part
+        self._hidden = None
+        self._properties = None
+        self.title = ws.title
+        self.sheet_state = ws.sheet_state
+        self.max_row = ws.max_row
+        self.max_column = ws.max_column
+
+    def _hidden_dimensions(self) -> tuple:
+        # Read on first use, so a worker only touches its own sheet part
+        if self._hidden is None:
+            if self._part is None:
+                self._hidden = ([], [])
+            else:
+                with zipfile.ZipFile(self._filepath) as archive:
+                    self._hidden = read_hidden_dimensions(archive, self._part)
+        return self._hidden
+
+    @property
+    def hidden_rows(self) -> list:
+        return self._hidden_dimensions()[0]
+
+    @property
+    def hidden_columns(self) -> list:
+        return self._hidden_dimensions()[1]
+
+    def _sheet_properties(self) -> dict:
+        # Read-only worksheets drop these, so they cost one more pass over the part
+        if self._properties is None:
+            if self._part is None:
+                self._properties = {"freeze_panes": None, "has_filters": False, "merged_cells_count": 0}
+            else:
+                with zipfile.ZipFile(self._filepath) as archive:
+                    self._properties = read_sheet_properties(archive, self._part)
+        return self._properties
+
+    @property
+    def dimensions(self) -> str:
+        try:
+            return self._ws.calculate_dimension()
+        except ValueError:
+            return None
+
+    @property
+    def freeze_panes(self) -> str:
+        return self._sheet_properties()["freeze_panes"]
+
+    @property
+    def has_filters(self) -> bool:
+        return self._sheet_properties()["has_filters"]
+
+    @property
+    def merged_cells_count(self) -> int:
+        return self._sheet_properties()["merged_cells_count"]
+
+    def iter_rows(self):
+        """Yield value tuples; array formulas are reported by their text."""
+        for values in self._ws.iter_rows(values_only=True):
+            for value in values:
+                if value.__class__ is ArrayFormula:
+                    values = tuple(v.text if v.__class__ is ArrayFormula else v for v in values)
+                    break
+            yield values
+
+
+class OpenpyxlWorkbook:
+    """Read-only openpyxl workbook behind the XlsxWorkbook interface."""
+
+    def __init__(self, filepath: str, data_only: bool = False):
+        self._wb = load_workbook(filepath, read_only=True, data_only=data_only)
+        self._filepath = filepath
+        self._metadata = None
+        try:
+            with zipfile.ZipFile(filepath) as archive:
+                parts = worksheet_parts(archive)
+        except Exception:
+            self._wb.close()
+            raise
+        self.sheetnames = self._wb.sheetnames
+        self.epoch = self._wb.epoch
+        self.named_range_count = len(self._wb.defined_names) if hasattr(self._wb, 'defined_names') else 0
+        self.worksheets = [OpenpyxlWorksheet(ws, filepath, parts.get(ws.title))
+                           for ws in self._wb.worksheets]
+
+    @property
+    def metadata(self) -> dict:
+        """read_workbook_metadata for this package, read on first use."""
+        if self._metadata is None:
+            with zipfile.ZipFile(self._filepath) as archive:
+                self._metadata = read_workbook_metadata(archive)
+        return self._metadata
+
+    def close(self):
+        self._wb.close()
+
+
+# Streaming backends for extract_formulas(backend=...)
+BACKENDS = {
+    "openpyxl": OpenpyxlWorkbook,
+    "xml": XlsxWorkbook,
+}
+
+# Every reader SheetScan runs on; .xls files always go through xlrd
+READERS = dict(BACKENDS, xls=XlsWorkbook) if HAS_XLRD else dict(BACKENDS)
+
+
+def extract_formulas(filepath: str, max_cells: int = None, backend: str = "openpyxl",
+                     jobs: int = 1, memory_mb: int = None, recalc: bool = False,
+                     on_sheet=None, profile: bool = False) -> dict:
+    """Extract and analyze all formulas from Excel file.
+
+    The workbook is read once, streaming, through the named backend
+    ("openpyxl" or "xml"); see SheetScan. With jobs > 1, sheets are
+    analyzed in a process pool, each worker opening only its own sheet
+    part; the merged result is identical to the serial one.
+
+    `max_cells=None` (the default) scans every cell. Formulas are kept as compact records
+    (see formula_store.py): `result["formulas"]` is a FormulaList, a
+    sequence of record dicts built as they are read, which `dump_json` and
+    `json_default` serialize. With `memory_mb`, its parts spill to a temp
+    file once the process RSS passes that many MB.
+
+    With `recalc`, the scanned formulas are re-evaluated against a second,
+    data-only pass and cached values that disagree are reported in
+    `stale_cached_values` (see recalc_engine.py).
+
+    `on_sheet(scan, sheet)` is called as each sheet's scan is final, before
+    the workbook-level steps run (see ndjson_stream.py).
+
+    With `profile`, the result gets a "profile" block with the wall time,
+    CPU time, RSS and item counts of every phase, per sheet for the scan
+    (see profiler.py).
+    """
+    result = _new_result(filepath)
+    memory = MemoryBudget(memory_mb) if memory_mb else None
+    profiler = Profiler() if profile else NULL_PROFILER
 
     try:
-        wb = load_workbook(filepath, read_only=False, data_only=False)
+        with profiler.phase("load") as items:
+            wb = READERS[backend](filepath)
+            items["sheets"] = len(wb.worksheets)
     except Exception as e:
         result["error"] = f"Failed to load: {str(e)}"
         return result
 
-    cells_processed = 0
-    formulas_by_pattern = defaultdict(list)
+    with profiler.phase("scan") as items:
+        scans, sheets = scan_workbook(filepath, wb, backend, max_cells, jobs, memory, on_sheet=on_sheet,
+                                      profile=profile)
+        items.update(sheets=len(scans), cells=sum(scan.cells_processed for scan in scans),
+                     formulas=sum(len(scan.formulas) for scan in scans))
+    stale = None
+    if recalc:
+        with profiler.phase("recalc") as items:
+            stale = check_cached_values(filepath, backend, scans)
+            items["stale_cached_values"] = len(stale[0])
+    merge_sheet_scans(result, wb, scans, sheets, memory, stale, has_vba=wb.metadata["has_vba"],
+                      profiler=profiler)
+    wb.close()
+    if profile:
+        result["profile"] = profiler.report(scan.profile for scan in scans)
+    return result
 
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        sheet_formulas = []
 
-        for row in ws.iter_rows():
-            if cells_processed >= max_cells:
-                result["truncated"] = True
-                break
+def scan_workbook(filepath: str, wb, backend: str, max_cells: int = None, jobs: int = 1,
+                  memory: MemoryBudget = None, sheet_properties: bool = False, on_sheet=None,
+                  profile: bool = False) -> tuple:
+    """Run analyze_worksheet over every sheet of an open workbook, in order.
+
+    Returns (scans, sheets). `max_cells` is shared across sheets in sheet
+    order (None scans every cell); with jobs > 1 the sheets are analyzed in
+    a process pool and trimmed to the same budget afterwards. `on_sheet`,
+    if given, is called with each (scan, sheet) pair in sheet order as soon
+    as that sheet is done. `profile` is passed on to analyze_worksheet.
+    """
+    if max_cells is None:
+        max_cells = math.inf
+    memory_mb = memory.limit // (1024 * 1024) if memory is not None else None
+    cells_processed = 0
+    sheets = []
+    scans = []
 
-            for cell in row:
-                cells_processed += 1
+    pool = None
+    if jobs > 1 and len(wb.worksheets) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(wb.worksheets)))
+        # Every sheet gets the full budget; trim() applies the serial one below
+        pending = [pool.submit(_analyze_sheet_job, filepath, backend, index, max_cells, memory_mb,
+                               sheet_properties, profile)
+                   for index in range(len(wb.worksheets))]
 
-                # Check for formula
-                if cell.value and isinstance(cell.value, str) and cell.value.startswith('='):
-                    formula = cell.value
-                    cell_addr = f"{sheet_name}!{cell.coordinate}"
+    try:
+        for index, ws in enumerate(wb.worksheets):
+            budget = max_cells - cells_processed
+            if pool:
+                scan, sheet = pending[index].result()
+                scan.trim(budget)
+            else:
+                scan, sheet = analyze_worksheet(ws, budget, memory, sheet_properties, profile)
+            scans.append(scan)
+            sheets.append(sheet)
+            cells_processed += scan.cells_processed
+            if on_sheet is not None:
+                on_sheet(scan, sheet)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return scans, sheets
+
+
+def check_cached_values(filepath: str, backend: str, scans: list) -> tuple:
+    """Recalculate the scanned formulas against the workbook's cached values.
+
+    Returns (stale_cached_values findings, recalculation summary).
+    """
+    try:
+        data_wb = BACKENDS[backend](filepath, data_only=True)
+    except Exception as e:
+        return [], {"error": f"Failed to load cached values: {str(e)}"}
+    try:
+        return find_stale_cached_values(data_wb, (f for scan in scans for f in scan.formulas))
+    finally:
+        data_wb.close()
 
-                    formula_info = {
-                        "cell": cell_addr,
-                        "formula": formula[:500],  # Truncate very long formulas
-                        "length": len(formula),
-                        "functions": extract_functions_from_formula(formula),
-                        "references": extract_references_from_formula(formula)[:20],
-                        "nesting_depth": calculate_nesting_depth(formula),
-                    }
-
-                    # Track function usage
-                    for func in formula_info["functions"]:
-                        result["function_usage"][func] += 1
-
-                    # Check for volatile functions
-                    volatile_used = [f for f in formula_info["functions"] if f in VOLATILE_FUNCTIONS]
-                    if volatile_used:
-                        result["volatile_functions"].append({
-                            "cell": cell_addr,
-                            "volatile_functions": volatile_used
-                        })
 
-                    # Flag complex formulas
-                    if formula_info["nesting_depth"] > 3:
-                        result["issues"].append({
-                            "type": "high_nesting",
-                            "severity": "warning",
-                            "cell": cell_addr,
-                            "detail": f"Nesting depth: {formula_info['nesting_depth']}"
-                        })
+def _new_result(filepath: str) -> dict:
+    return {
+        "filename": Path(filepath).name,
+        "formulas": [],
+        "errors_found": [],
+        "volatile_functions": [],
+        "function_usage": defaultdict(int),
+        "complexity_metrics": {},
+        "calc_cost": {},
+        "issues": [],
+        "formula_patterns": defaultdict(list),  # Track similar formulas
+        "circular_references": [],  # NEW: Track circular refs
+        "circular_reference_groups": [],
+        "external_references": [],
+        "purpose_analysis": {},  # NEW: Detailed purpose inference
+    }
 
-                    if len(formula) > 200:
-                        result["issues"].append({
-                            "type": "long_formula",
-                            "severity": "info",
-                            "cell": cell_addr,
-                            "detail": f"Formula length: {len(formula)} chars"
-                        })
 
-                    # Create pattern key for grouping similar formulas
-                    pattern_key = re.sub(r'\d+', '#', formula)[:100]
-                    formulas_by_pattern[pattern_key].append(cell_addr)
+def merge_sheet_scans(result: dict, wb, scans: list, sheets: list, budget: MemoryBudget = None,
+                      stale: tuple = None, has_vba: bool = False, profiler: Profiler = NULL_PROFILER):
+    """Fill `result` from finished per-sheet scans, in sheet order.
 
-                    result["formulas"].append(formula_info)
+    Everything workbook-level happens here: pattern grouping, complexity
+    metrics, circular references, purpose inference, the forensic
+    detectors' roll-up, risk score and narrative. `stale` is the
+    (findings, summary) pair from check_cached_values, if it ran;
+    `has_vba` comes from the workbook package's metadata.
+    Each step is a phase of `profiler`. The detectors read the scans'
+    compact formula records, which become `result["formulas"]` as one
+    FormulaList; with a memory budget, its parts spill to disk.
+    """
+    profiler.begin("merge")
+    formulas = FormulaList(budget=budget)
+    pattern_counts = defaultdict(int)
+    pattern_samples = {}
+    pattern_text = {}
+    all_headers = []
 
-                # Check for error values in calculated results
-                elif cell.value in EXCEL_ERRORS:
-                    result["errors_found"].append({
-                        "cell": f"{sheet_name}!{cell.coordinate}",
-                        "error": str(cell.value),
-                        "severity": "critical"
-                    })
+    for scan, sheet in zip(scans, sheets):
+        # Unsized sheets (no <dimension> tag) fall back to what was streamed
+        sheet["max_row"] = max_row = sheet["max_row"] or max(scan.rows_seen, 1)
+        sheet["max_column"] = max_column = sheet["max_column"] or max(scan.widest_row, 1)
+
+        formulas.extend(scan.formulas)
+        result["errors_found"].extend(scan.errors_found)
+        result["volatile_functions"].extend(scan.volatile_functions)
+        result["issues"].extend(scan.issues)
+        for func, count in scan.function_usage.items():
+            result["function_usage"][func] += count
+        for signature, count in scan.pattern_counts.items():
+            pattern_counts[signature] += count
+        for signature, cells in scan.pattern_samples.items():
+            samples = pattern_samples.setdefault(signature, [])
+            samples.extend(cells[:5 - len(samples)])
+        for signature, r1c1 in scan.pattern_text.items():
+            pattern_text.setdefault(signature, r1c1)
+        if scan.truncated:
+            result["truncated"] = True
+
+        all_headers.extend(scan.headers(max_column))
 
     # Analyze formula consistency
-    for pattern, cells in formulas_by_pattern.items():
-        if len(cells) >= 3:  # Pattern appears in 3+ cells
-            result["formula_patterns"][pattern[:50]] = {
-                "count": len(cells),
-                "sample_cells": cells[:5]
+    for signature, count in pattern_counts.items():
+        if count >= 3:  # Pattern appears in 3+ cells
+            result["formula_patterns"][pattern_text[signature][:50]] = {
+                "count": count,
+                "sample_cells": pattern_samples[signature]
             }
 
-    # Calculate complexity metrics
-    all_nesting = [f["nesting_depth"] for f in result["formulas"]]
-    all_lengths = [f["length"] for f in result["formulas"]]
+    # Calculate complexity metrics, as running totals over the (possibly spilled) records
+    total = len(formulas)
+    nesting_sum = length_sum = max_nesting = max_length = 0
+    for depth, length in zip(formulas.depths(), formulas.lengths()):
+        nesting_sum += depth
+        length_sum += length
+        max_nesting = max(max_nesting, depth)
+        max_length = max(max_length, length)
 
     result["complexity_metrics"] = {
-        "total_formulas": len(result["formulas"]),
+        "total_formulas": total,
         "total_errors": len(result["errors_found"]),
         "volatile_function_count": len(result["volatile_functions"]),
-        "avg_nesting_depth": round(sum(all_nesting) / len(all_nesting), 2) if all_nesting else 0,
-        "max_nesting_depth": max(all_nesting) if all_nesting else 0,
-        "avg_formula_length": round(sum(all_lengths) / len(all_lengths), 1) if all_lengths else 0,
-        "max_formula_length": max(all_lengths) if all_lengths else 0,
-        "unique_patterns": len(formulas_by_pattern),
+        "avg_nesting_depth": round(nesting_sum / total, 2) if total else 0,
+        "max_nesting_depth": max_nesting,
+        "avg_formula_length": round(length_sum / total, 1) if total else 0,
+        "max_formula_length": max_length,
+        "unique_patterns": len(pattern_counts),
     }
 
     # Categorize function usage
@@ -914,40 +1757,48 @@ def extract_formulas(filepath: str, max_cells: int = 50000) -> dict:
                 category_counts[category] += count
                 break
     result["function_categories"] = dict(category_counts)
+    profiler.count(sheets=len(scans), formulas=len(formulas), patterns=len(pattern_counts))
 
     # Build formulas_by_cell for circular reference detection
-    formulas_by_cell = {}
-    for f in result["formulas"]:
-        formulas_by_cell[f["cell"]] = f["formula"]
+    profiler.begin("dependency_graph")
+    formulas_by_cell = dict(cell_formulas(formulas))
+    graph, references_by_cell = build_dependency_graph(formulas_by_cell, keep_targets=True)
+    profiler.count(formulas=graph.formula_count, nodes=graph.node_count, edges=len(graph.targets))
 
     # Detect circular references
-    circular_refs = detect_circular_references(wb, formulas_by_cell)
-    result["circular_references"] = circular_refs
-    if circular_refs:
-        result["issues"].append({
-            "type": "circular_reference",
-            "severity": "critical",
-            "cells": circular_refs[:10],
-            "detail": f"Found {len(circular_refs)} cells involved in circular references"
-        })
-
-    # Collect headers from all sheets for purpose inference
-    all_headers = []
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        if ws.max_row and ws.max_row > 0:
-            for col in range(1, min(ws.max_column + 1 if ws.max_column else 1, 26)):
-                cell = ws.cell(row=1, column=col)
-                if cell.value:
-                    all_headers.append(str(cell.value))
+    profiler.begin("circular_references")
+    circular_groups = graph.circular_groups()
+    profiler.count(groups=len(circular_groups))
+    result["circular_references"] = [cell for group in circular_groups for cell in group]
+    result["circular_reference_groups"] = circular_groups
+    if circular_groups:
+        result["issues"].append(circular_reference_issue(circular_groups))
+
+    # Estimate recalculation cost on the same graph
+    profiler.begin("calc_cost")
+    result["calc_cost"] = profile_calc_cost(graph, formulas_by_cell, references_by_cell, sheets,
+                                            VOLATILE_FUNCTIONS)
+    result["complexity_metrics"]["calc_cost_score"] = result["calc_cost"]["score"]
+    if result["calc_cost"]["rating"] in ("high", "severe"):
+        result["issues"].append(slow_recalculation_issue(result["calc_cost"]))
+    del graph, references_by_cell
+
+    # Map formulas to the external workbooks the package links to
+    profiler.begin("external_references")
+    result["external_references"] = map_external_references(formulas_by_cell,
+                                                             wb.metadata["external_links"])
+    for entry in result["external_references"]:
+        if entry["status"] == "missing":
+            result["issues"].append(broken_external_link_issue(entry))
 
     # Detailed purpose inference
+    profiler.begin("purpose")
     result["purpose_analysis"] = infer_purpose_detailed(
         function_usage=dict(result["function_usage"]),
         sheet_names=wb.sheetnames,
         headers=all_headers,
-        formula_count=len(result["formulas"]),
-        named_range_count=len(wb.defined_names) if hasattr(wb, 'defined_names') else 0
+        formula_count=len(formulas),
+        named_range_count=wb.named_range_count
     )
 
     # Keep old field for backwards compatibility but use new analysis
@@ -955,8 +1806,13 @@ def extract_formulas(filepath: str, max_cells: int = 50000) -> dict:
 
     # === FORENSIC ANALYSIS ===
 
-    # Detect formula inconsistencies (THE SMOKING GUN DETECTOR)
-    result["formula_inconsistencies"] = detect_formula_inconsistencies(wb, formulas_by_cell)
+    # Detect formula inconsistencies (THE SMOKING GUN DETECTOR), per sheet,
+    # down columns and along rows
+    profiler.begin("findings")
+    result["formula_inconsistencies"] = []
+    for scan in scans:
+        result["formula_inconsistencies"].extend(scan.formula_inconsistencies)
+        result["formula_inconsistencies"].extend(scan.row_inconsistencies)
     for inc in result["formula_inconsistencies"]:
         result["issues"].append({
             "type": "formula_inconsistency",
@@ -966,7 +1822,9 @@ def extract_formulas(filepath: str, max_cells: int = 50000) -> dict:
         })
 
     # Detect hardcoded overrides (THE MAGIC NUMBER FINDER)
-    result["hardcoded_overrides"] = detect_hardcoded_overrides(wb)
+    result["hardcoded_overrides"] = []
+    for scan in scans:
+        result["hardcoded_overrides"].extend(scan.hardcoded_overrides)
     for hc in result["hardcoded_overrides"]:
         if hc["severity"] in ("critical", "high"):
             result["issues"].append({
@@ -976,216 +1834,88 @@ def extract_formulas(filepath: str, max_cells: int = 50000) -> dict:
                 "detail": hc["narrative"][:200]
             })
 
+    # Compare cached values with a recalculation (optional second pass)
+    if stale is not None:
+        result["stale_cached_values"], result["recalculation"] = stale
+        for sv in result["stale_cached_values"]:
+            result["issues"].append({
+                "type": "stale_cached_value",
+                "severity": sv["severity"],
+                "cell": sv["cell"],
+                "detail": sv["narrative"][:200]
+            })
+
+    profiler.count(formula_inconsistencies=len(result["formula_inconsistencies"]),
+                   hardcoded_overrides=len(result["hardcoded_overrides"]))
+
     # Inventory hidden content
-    result["hidden_content"] = detect_hidden_content(wb)
+    profiler.begin("hidden_content")
+    result["hidden_content"] = detect_hidden_content(sheets)
+    profiler.count(sheets=len(sheets), hidden_cells=result["hidden_content"]["total_hidden_cells_estimate"])
 
     # Calculate risk score
+    profiler.begin("risk_score")
     forensic_data = {
         "circular_references": result["circular_references"],
         "formula_inconsistencies": result["formula_inconsistencies"],
         "hardcoded_overrides": result["hardcoded_overrides"],
+        "stale_cached_values": result.get("stale_cached_values", []),
         "hidden_content": result["hidden_content"],
         "errors_found": result["errors_found"],
         "volatile_functions": result["volatile_functions"],
-        "has_vba": False  # Will be set by structure extraction
+        "has_vba": has_vba,
     }
     result["risk_assessment"] = calculate_risk_score(forensic_data)
 
     # Generate forensic narrative (include risk_assessment in forensic_data)
+    profiler.begin("narrative")
     forensic_data["risk_assessment"] = result["risk_assessment"]
     result["forensic_narrative"] = generate_forensic_narrative(forensic_data, result["filename"])
+    profiler.end()
 
     # Convert defaultdicts to regular dicts for JSON
     result["function_usage"] = dict(result["function_usage"])
     result["formula_patterns"] = dict(result["formula_patterns"])
+    result["formulas"] = formulas
 
-    wb.close()
-    return result
-
-def extract_formulas_xls(filepath: str, max_cells: int = 50000) -> dict:
+def extract_formulas_xls(filepath: str, max_cells: int = None, jobs: int = 1,
+                         memory_mb: int = None, on_sheet=None, profile: bool = False) -> dict:
     """Extract formulas from XLS (Excel 97-2003) files using xlrd.
 
-    Note: xlrd has limited formula support - it can detect formula cells
-    but getting the actual formula text requires formatting_info=True
-    which may not work on all files.
+    Sheets are loaded on demand, one at a time, and released once scanned
+    (see xls_reader.py), then go through the same SheetScan pipeline and
+    output schema as XLSX. xlrd only exposes formula cells' cached results,
+    so formula text is limited to text cells that start with `=`; error
+    values, overrides and hidden content cover every cell.
+    `max_cells=None` scans every cell.
     """
-    result = {
-        "filename": Path(filepath).name,
-        "format": "xls",
-        "support_level": "basic",
-        "formulas": [],
-        "errors_found": [],
-        "volatile_functions": [],
-        "function_usage": defaultdict(int),
-        "complexity_metrics": {},
-        "issues": [],
-        "formula_patterns": defaultdict(list),
-        "circular_references": [],
-        "purpose_analysis": {},
-    }
-
-    try:
-        # Try to load with formatting info for formula access
-        wb = xlrd.open_workbook(filepath, formatting_info=True, on_demand=False)
-    except Exception:
-        try:
-            # Fall back to basic loading
-            wb = xlrd.open_workbook(filepath, on_demand=True)
-        except Exception as e:
-            result["error"] = f"Failed to load XLS: {str(e)}"
-            return result
-
-    cells_processed = 0
-    all_headers = []
-    formulas_by_cell = {}
-
-    for idx, sheet_name in enumerate(wb.sheet_names()):
-        try:
-            ws = wb.sheet_by_index(idx)
-
-            # Collect headers
-            if ws.nrows > 0:
-                for col in range(min(ws.ncols, 25)):
-                    try:
-                        val = ws.cell_value(0, col)
-                        if val:
-                            all_headers.append(str(val))
-                    except:
-                        pass
-
-            # Scan for formulas and errors
-            for row in range(min(ws.nrows, 1000)):  # Limit rows for performance
-                if cells_processed >= max_cells:
-                    result["truncated"] = True
-                    break
-
-                for col in range(ws.ncols):
-                    cells_processed += 1
-                    try:
-                        cell = ws.cell(row, col)
-                        cell_addr = f"{sheet_name}!{xlrd.colname(col)}{row + 1}"
-
-                        # Check for formula cells (ctype 2 with XL_CELL_FORMULA would be ideal)
-                        # xlrd's cell.ctype: 0=empty, 1=text, 2=number, 3=date, 4=bool, 5=error, 6=blank
-                        if cell.ctype == xlrd.XL_CELL_ERROR:
-                            error_code = cell.value
-                            error_map = {
-                                0x00: '#NULL!', 0x07: '#DIV/0!', 0x0F: '#VALUE!',
-                                0x17: '#REF!', 0x1D: '#NAME?', 0x24: '#NUM!', 0x2A: '#N/A'
-                            }
-                            error_str = error_map.get(error_code, f'#ERROR({error_code})')
-                            result["errors_found"].append({
-                                "cell": cell_addr,
-                                "error": error_str,
-                                "severity": "critical"
-                            })
-
-                        # For XLS, we can't easily get formula text without deeper parsing
-                        # But we can check for text that looks like a formula
-                        if cell.ctype == xlrd.XL_CELL_TEXT:
-                            val = str(cell.value)
-                            if val.startswith('='):
-                                formula = val
-                                formula_info = {
-                                    "cell": cell_addr,
-                                    "formula": formula[:500],
-                                    "length": len(formula),
-                                    "functions": extract_functions_from_formula(formula),
-                                    "references": extract_references_from_formula(formula)[:20],
-                                    "nesting_depth": calculate_nesting_depth(formula),
-                                }
-                                result["formulas"].append(formula_info)
-                                formulas_by_cell[cell_addr] = formula
-
-                                # Track function usage
-                                for func in formula_info["functions"]:
-                                    result["function_usage"][func] += 1
-
-                                # Check for volatile functions
-                                volatile_used = [f for f in formula_info["functions"] if f in VOLATILE_FUNCTIONS]
-                                if volatile_used:
-                                    result["volatile_functions"].append({
-                                        "cell": cell_addr,
-                                        "volatile_functions": volatile_used
-                                    })
-
-                    except Exception:
-                        pass
-
-        except Exception as e:
-            result["issues"].append({
-                "type": "sheet_error",
-                "severity": "warning",
-                "detail": f"Error processing sheet {sheet_name}: {str(e)[:100]}"
-            })
-
-    # Calculate complexity metrics
-    all_nesting = [f["nesting_depth"] for f in result["formulas"]]
-    all_lengths = [f["length"] for f in result["formulas"]]
-
-    result["complexity_metrics"] = {
-        "total_formulas": len(result["formulas"]),
-        "total_errors": len(result["errors_found"]),
-        "volatile_function_count": len(result["volatile_functions"]),
-        "avg_nesting_depth": round(sum(all_nesting) / len(all_nesting), 2) if all_nesting else 0,
-        "max_nesting_depth": max(all_nesting) if all_nesting else 0,
-        "avg_formula_length": round(sum(all_lengths) / len(all_lengths), 1) if all_lengths else 0,
-        "max_formula_length": max(all_lengths) if all_lengths else 0,
-        "format_note": "XLS format - limited formula extraction (formula text not always available)"
-    }
-
-    # Categorize function usage
-    category_counts = defaultdict(int)
-    for func, count in result["function_usage"].items():
-        for category, funcs in FUNCTION_CATEGORIES.items():
-            if func in funcs:
-                category_counts[category] += count
-                break
-    result["function_categories"] = dict(category_counts)
-
-    # Detect circular references if we found formulas
-    if formulas_by_cell:
-        circular_refs = detect_circular_references(None, formulas_by_cell)
-        result["circular_references"] = circular_refs
-        if circular_refs:
-            result["issues"].append({
-                "type": "circular_reference",
-                "severity": "critical",
-                "cells": circular_refs[:10],
-                "detail": f"Found {len(circular_refs)} cells involved in circular references"
-            })
-
-    # Purpose inference
-    result["purpose_analysis"] = infer_purpose_detailed(
-        function_usage=dict(result["function_usage"]),
-        sheet_names=wb.sheet_names(),
-        headers=all_headers,
-        formula_count=len(result["formulas"]),
-        named_range_count=len(wb.name_obj_list) if hasattr(wb, 'name_obj_list') else 0
-    )
-    result["inferred_purpose"] = result["purpose_analysis"]["purpose"]
-
-    # Convert defaultdicts
-    result["function_usage"] = dict(result["function_usage"])
-    result["formula_patterns"] = dict(result["formula_patterns"])
-
-    wb.release_resources()
+    result = extract_formulas(filepath, max_cells, backend="xls", jobs=jobs, memory_mb=memory_mb,
+                              on_sheet=on_sheet, profile=profile)
+    result["format"] = "xls"
+    result["support_level"] = "basic"
+    if "error" not in result:
+        result["complexity_metrics"]["format_note"] = \
+            "XLS format - limited formula extraction (formula text not always available)"
     return result
 
 
-def extract_formulas_dispatch(filepath: str, max_cells: int = 50000) -> dict:
+def extract_formulas_dispatch(filepath: str, max_cells: int = None, backend: str = "openpyxl",
+                              jobs: int = 1, memory_mb: int = None, recalc: bool = False,
+                              on_sheet=None, profile: bool = False) -> dict:
     """Extract formulas from Excel file, auto-detecting format.
 
     Supports:
-    - XLSX/XLSM/XLSB (Excel 2007+): Full support via openpyxl
-    - XLS (Excel 97-2003): Basic support via xlrd
+    - XLSX/XLSM/XLSB (Excel 2007+): Full support via openpyxl, or via the
+      direct XML reader with backend="xml"
+    - XLS (Excel 97-2003): Basic support via xlrd (no recalculation)
     """
     path = Path(filepath)
     ext = path.suffix.lower()
 
     if ext == '.xls':
         if HAS_XLRD:
-            return extract_formulas_xls(filepath, max_cells)
+            return extract_formulas_xls(filepath, max_cells, jobs=jobs, memory_mb=memory_mb,
+                                        on_sheet=on_sheet, profile=profile)
         else:
             return {
                 "filename": path.name,
@@ -1197,7 +1927,8 @@ def extract_formulas_dispatch(filepath: str, max_cells: int = 50000) -> dict:
                 "purpose_analysis": {"purpose": "unknown", "confidence": 0}
             }
     elif ext in ('.xlsx', '.xlsm', '.xlsb'):
-        result = extract_formulas(filepath, max_cells)
+        result = extract_formulas(filepath, max_cells, backend=backend, jobs=jobs, memory_mb=memory_mb,
+                                  recalc=recalc, on_sheet=on_sheet, profile=profile)
         result["format"] = ext.lstrip('.')
         result["support_level"] = "full"
         return result
@@ -1214,10 +1945,28 @@ def extract_formulas_dispatch(filepath: str, max_cells: int = 50000) -> dict:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python extract_formulas.py <excel_file>")
-        sys.exit(1)
-
-    filepath = sys.argv[1]
-    result = extract_formulas_dispatch(filepath)
-    print(json.dumps(result, indent=2, default=str))
+    parser = argparse.ArgumentParser(description="Extract and analyze formulas from an Excel file.")
+    parser.add_argument("filepath", help="Excel file (.xlsx, .xlsm, .xls)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl",
+                        help="XLSX reader: openpyxl read-only (default) or the direct XML reader")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Analyze sheets in N worker processes (default 1)")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 (the default) scans every cell")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="Spill formula lists to a temp file above this RSS")
+    parser.add_argument("--recalc", action="store_true",
+                        help="Recalculate common formulas and report stale cached values (XLSX only)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Add per-phase wall/CPU time, RSS and item counts as \"profile\"")
+    parser.add_argument("--profile-dump", metavar="FILE",
+                        help="Also write a Chrome trace (FILE.json) or cProfile stats (any other name)")
+    args = parser.parse_args()
+
+    result = run_profiled(
+        lambda: extract_formulas_dispatch(args.filepath, args.max_cells or None, backend=args.backend,
+                                          jobs=args.jobs, memory_mb=args.memory_mb, recalc=args.recalc,
+                                          profile=args.profile or bool(args.profile_dump)),
+        args.profile_dump, "extract_formulas")
+    dump_json(result, sys.stdout)
+    print()
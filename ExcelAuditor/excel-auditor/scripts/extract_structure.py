@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Extract structural metadata from an Excel file for auditing."""
 
-import sys
+import argparse
 import json
 from pathlib import Path
 from openpyxl import load_workbook
@@ -9,193 +9,79 @@ from openpyxl.utils import get_column_letter
 import zipfile
 import xml.etree.ElementTree as ET
 
+from profiler import NULL_PROFILER, Profiler, run_profiled
+from xlsx_reader import (
+    NS_MAIN, NS_REL, read_defined_names, read_external_links, read_relationships, read_sheet_dimension,
+    read_connections, read_pivot_caches, read_sheet_tables, read_workbook_metadata,
+)
+
+HEADER_COLS = 25  # headers_sample: first 25 columns of row 1
+
 # Try to import xlrd for XLS support
 try:
-    import xlrd
+    from xls_reader import XlsWorkbook
     HAS_XLRD = True
 except ImportError:
     HAS_XLRD = False
 
 
 def extract_structure_xls(filepath: str) -> dict:
-    """Extract structure from XLS (Excel 97-2003) files using xlrd."""
-    result = {
-        "filename": Path(filepath).name,
-        "format": "xls",
-        "support_level": "basic",
-        "sheets": [],
-        "named_ranges": [],
-        "tables": [],  # XLS doesn't have formal tables
-        "external_links": [],
-        "has_vba": False,
-        "has_hidden_sheets": False,
-        "file_size_mb": round(Path(filepath).stat().st_size / (1024 * 1024), 2),
-        "summary": {}
-    }
+    """Extract structure from XLS (Excel 97-2003) files using xlrd.
 
+    Sheets are loaded on demand, one at a time, for their dimensions,
+    panes, merges and header row, and released before the next one (see
+    xls_reader.py). The report has the XLSX schema.
+    """
     try:
-        # xlrd 2.0+ only supports xls, not xlsx
-        wb = xlrd.open_workbook(filepath, on_demand=True)
+        wb = XlsWorkbook(filepath)
     except Exception as e:
+        result = _new_structure(filepath, "xls", "basic")
         result["error"] = f"Failed to load XLS: {str(e)}"
         return result
 
-    # Extract sheet info
-    for idx, sheet_name in enumerate(wb.sheet_names()):
-        try:
-            ws = wb.sheet_by_index(idx)
-
-            # Determine visibility
-            visibility = "visible"
-            if hasattr(wb, 'sheet_visibility'):
-                vis = wb.sheet_visibility(idx)
-                if vis == 1:
-                    visibility = "hidden"
-                elif vis == 2:
-                    visibility = "very_hidden"
-
-            sheet_info = {
-                "name": sheet_name,
-                "visibility": visibility,
-                "dimensions": f"A1:{xlrd.colname(ws.ncols-1) if ws.ncols > 0 else 'A'}{ws.nrows}" if ws.nrows > 0 else "empty",
-                "row_count": ws.nrows,
-                "col_count": ws.ncols,
-                "has_filters": False,  # Can't easily detect in xlrd
-                "freeze_panes": None,  # Limited support in xlrd
-                "merged_cells_count": len(ws.merged_cells) if hasattr(ws, 'merged_cells') else 0,
-            }
-
-            # Sample headers (first row)
-            headers = []
-            if ws.nrows > 0:
-                for col in range(min(ws.ncols, 25)):
-                    try:
-                        cell_value = ws.cell_value(0, col)
-                        if cell_value:
-                            headers.append(str(cell_value)[:50])
-                    except:
-                        pass
-            sheet_info["headers_sample"] = headers
-
-            result["sheets"].append(sheet_info)
-
-            if visibility != "visible":
-                result["has_hidden_sheets"] = True
-
-        except Exception as e:
-            result["sheets"].append({
-                "name": sheet_name,
-                "error": str(e)[:100]
+    with wb:
+        sheets = []
+        headers = []
+        for ws in wb.worksheets:
+            rows = ws.iter_rows()
+            first_row = next(rows, ())
+            rows.close()  # unloads the sheet
+            sheets.append({
+                "name": ws.title,
+                "sheet_state": ws.sheet_state,
+                "dimensions": ws.dimensions,
+                "max_row": ws.max_row,
+                "max_column": ws.max_column,
+                "has_filters": ws.has_filters,
+                "freeze_panes": ws.freeze_panes,
+                "merged_cells_count": ws.merged_cells_count,
             })
+            headers.append([str(v) for v in first_row[:HEADER_COLS] if v])
+        return _structure_report(filepath, wb.metadata, sheets, headers, "xls")
 
-    # Extract named ranges
-    try:
-        for i in range(wb.name_obj_list.__len__() if hasattr(wb, 'name_obj_list') else 0):
-            try:
-                name_obj = wb.name_obj_list[i]
-                result["named_ranges"].append({
-                    "name": name_obj.name,
-                    "refers_to": name_obj.formula_text[:100] if hasattr(name_obj, 'formula_text') else None,
-                    "scope": "global" if name_obj.scope == -1 else f"sheet_{name_obj.scope}"
-                })
-            except:
-                pass
-    except:
-        pass
-
-    # Check for external links in formulas
-    external_patterns = set()
-    for idx in range(len(wb.sheet_names())):
-        try:
-            ws = wb.sheet_by_index(idx)
-            for row in range(min(ws.nrows, 500)):
-                for col in range(ws.ncols):
-                    try:
-                        cell = ws.cell(row, col)
-                        # xlrd cell type 2 is formula (but we get the value, not formula text usually)
-                        # For external refs, check if there's a formula with [
-                        if cell.ctype == xlrd.XL_CELL_TEXT:
-                            val = str(cell.value)
-                            if val.startswith('=') and '[' in val and ']' in val:
-                                start = val.find('[')
-                                end = val.find(']')
-                                if start < end:
-                                    external_patterns.add(val[start+1:end])
-                    except:
-                        pass
-        except:
-            pass
-
-    result["external_links"] = list(external_patterns)[:20]
-
-    # Check for VBA - xlrd doesn't directly expose this, but we can check file structure
-    try:
-        with open(filepath, 'rb') as f:
-            header = f.read(8)
-            # OLE compound document with potential VBA
-            if header[:4] == b'\xd0\xcf\x11\xe0':
-                # Could have VBA, but can't confirm without deeper parsing
-                # Mark as potential
-                result["has_vba"] = False  # Conservative - can't confirm
-    except:
-        pass
-
-    # Summary stats
-    result["summary"] = {
-        "total_sheets": len(result["sheets"]),
-        "visible_sheets": sum(1 for s in result["sheets"] if s.get("visibility") == "visible"),
-        "hidden_sheets": sum(1 for s in result["sheets"] if s.get("visibility") != "visible"),
-        "total_named_ranges": len(result["named_ranges"]),
-        "total_tables": 0,  # XLS doesn't have formal tables
-        "external_link_count": len(result["external_links"]),
-        "has_vba": result["has_vba"],
-        "risk_flags": [],
-        "format_note": "XLS format (Excel 97-2003) - basic structure extraction only"
-    }
 
-    # Add risk flags
-    if result["has_hidden_sheets"]:
-        result["summary"]["risk_flags"].append("Has hidden sheets")
-    if len(result["external_links"]) > 0:
-        result["summary"]["risk_flags"].append(f"External links: {len(result['external_links'])}")
-    if any(s.get("merged_cells_count", 0) > 50 for s in result["sheets"]):
-        result["summary"]["risk_flags"].append("Heavy use of merged cells")
-
-    wb.release_resources()
-    return result
+def extract_structure_xlsx(filepath: str, profile: bool = False) -> dict:
+    """Extract comprehensive structure from XLSX (Excel 2007+) files using openpyxl.
 
-
-def extract_structure_xlsx(filepath: str) -> dict:
-    """Extract comprehensive structure from XLSX (Excel 2007+) files using openpyxl."""
-    result = {
-        "filename": Path(filepath).name,
-        "format": "xlsx",
-        "support_level": "full",
-        "sheets": [],
-        "named_ranges": [],
-        "tables": [],
-        "external_links": [],
-        "has_vba": False,
-        "has_hidden_sheets": False,
-        "file_size_mb": round(Path(filepath).stat().st_size / (1024 * 1024), 2),
-        "summary": {}
-    }
-
-    # Check for VBA (macros) by inspecting the zip
-    try:
-        with zipfile.ZipFile(filepath, 'r') as z:
-            result["has_vba"] = any('vbaProject' in name for name in z.namelist())
-    except:
-        pass
+    With `profile`, the result gets a "profile" block timing the load, the
+    sheet and table passes and the package metadata (see profiler.py).
+    """
+    result = _new_structure(filepath, "xlsx", "full")
+    profiler = Profiler() if profile else NULL_PROFILER
 
     # Load workbook
     try:
-        wb = load_workbook(filepath, read_only=False, data_only=False)
+        with profiler.phase("load") as items:
+            wb = load_workbook(filepath, read_only=False, data_only=False)
+            items["sheets"] = len(wb.sheetnames)
+        with profiler.phase("metadata"), zipfile.ZipFile(filepath) as archive:
+            metadata = read_workbook_metadata(archive)
     except Exception as e:
         result["error"] = f"Failed to load: {str(e)}"
         return result
 
     # Extract sheet info
+    profiler.begin("sheets")
     for sheet_name in wb.sheetnames:
         ws = wb[sheet_name]
         sheet_info = {
@@ -222,20 +108,11 @@ def extract_structure_xlsx(filepath: str) -> dict:
 
         if sheet_info["visibility"] != "visible":
             result["has_hidden_sheets"] = True
-
-    # Extract named ranges
-    for name in wb.defined_names:
-        try:
-            defn = wb.defined_names[name]
-            result["named_ranges"].append({
-                "name": name,
-                "refers_to": str(defn.attr_text)[:100] if hasattr(defn, 'attr_text') else str(defn.value)[:100] if hasattr(defn, 'value') else None,
-                "scope": "global"
-            })
-        except:
-            pass
+    profiler.count(sheets=len(result["sheets"]),
+                   headers=sum(len(s["headers_sample"]) for s in result["sheets"]))
 
     # Extract tables
+    profiler.begin("tables")
     for sheet_name in wb.sheetnames:
         ws = wb[sheet_name]
         for table in ws.tables.values():
@@ -245,26 +122,22 @@ def extract_structure_xlsx(filepath: str) -> dict:
                 "range": table.ref,
                 "display_name": table.displayName
             })
+    profiler.count(tables=len(result["tables"]))
 
-    # Check for external links in formulas (basic check)
-    external_patterns = set()
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        for row in ws.iter_rows(max_row=min(ws.max_row or 0, 500)):
-            for cell in row:
-                if cell.value and isinstance(cell.value, str) and cell.value.startswith('='):
-                    formula = cell.value
-                    if '[' in formula and ']' in formula:
-                        # Extract external reference
-                        start = formula.find('[')
-                        end = formula.find(']')
-                        if start < end:
-                            ext_ref = formula[start+1:end]
-                            external_patterns.add(ext_ref)
-
-    result["external_links"] = list(external_patterns)[:20]  # Cap at 20
-
-    # Summary stats
+    profiler.begin("summary")
+    _package_structure(result, metadata)
+    _summarize_structure(result)
+    profiler.count(named_ranges=len(result["named_ranges"]), external_links=len(result["external_links"]),
+                   risk_flags=len(result["summary"]["risk_flags"]))
+
+    wb.close()
+    if profile:
+        result["profile"] = profiler.report()
+    return result
+
+
+def _summarize_structure(result: dict):
+    """Fill the summary stats and risk flags of a structure report."""
     result["summary"] = {
         "total_sheets": len(result["sheets"]),
         "visible_sheets": sum(1 for s in result["sheets"] if s["visibility"] == "visible"),
@@ -272,6 +145,8 @@ def extract_structure_xlsx(filepath: str) -> dict:
         "total_named_ranges": len(result["named_ranges"]),
         "total_tables": len(result["tables"]),
         "external_link_count": len(result["external_links"]),
+        "connection_count": len(result["connections"]),
+        "pivot_cache_count": len(result["pivot_caches"]),
         "has_vba": result["has_vba"],
         "risk_flags": []
     }
@@ -283,19 +158,260 @@ def extract_structure_xlsx(filepath: str) -> dict:
         result["summary"]["risk_flags"].append("Has hidden sheets")
     if len(result["external_links"]) > 0:
         result["summary"]["risk_flags"].append(f"External links: {len(result['external_links'])}")
+    if result["connections"]:
+        result["summary"]["risk_flags"].append(f"Data connections: {len(result['connections'])}")
     if any(s["merged_cells_count"] > 50 for s in result["sheets"]):
         result["summary"]["risk_flags"].append("Heavy use of merged cells")
 
-    wb.close()
+
+def _package_structure(result: dict, metadata: dict):
+    """Fill the workbook-level parts of a structure report from backend metadata.
+
+    For XLSX, defined names, external workbooks, data connections and pivot
+    cache sources come from workbook.xml, xl/externalLinks,
+    xl/connections.xml and the pivot cache definitions, so they are complete
+    whatever the sheet sizes and cost the same on any workbook (XLS: the
+    workbook globals). Excel's built-in `_xlnm.` names (print areas, filter
+    ranges) are left out.
+    """
+    result["has_vba"] = metadata["has_vba"]
+    result["named_ranges"] = [{"name": n["name"], "refers_to": n["refers_to"], "scope": n["scope"],
+                               "hidden": n["hidden"]}
+                              for n in metadata["defined_names"] if not n["name"].startswith("_xlnm.")]
+    result["external_links"] = metadata["external_links"]
+    result["connections"] = metadata["connections"]
+    result["pivot_caches"] = metadata["pivot_caches"]
+
+
+def structure_from_scan(filepath: str, metadata: dict, scans: list, sheets: list,
+                        file_format: str = "xlsx") -> dict:
+    """Build the extract_structure report from an audit's single pass.
+
+    `metadata` is the backend's read_workbook_metadata; `scans` and `sheets`
+    come from extract_formulas.scan_workbook run with sheet_properties, so
+    no cell is read twice.
+    """
+    headers = [scan.headers(sheet["max_column"] or 0) for scan, sheet in zip(scans, sheets)]
+    return _structure_report(filepath, metadata, sheets, headers, file_format)
+
+
+def _new_structure(filepath: str, file_format: str, support_level: str) -> dict:
+    return {
+        "filename": Path(filepath).name,
+        "format": file_format,
+        "support_level": support_level,
+        "sheets": [],
+        "named_ranges": [],
+        "tables": [],
+        "external_links": [],
+        "connections": [],
+        "pivot_caches": [],
+        "has_vba": False,
+        "has_hidden_sheets": False,
+        "file_size_mb": round(Path(filepath).stat().st_size / (1024 * 1024), 2),
+        "summary": {}
+    }
+
+
+def _structure_report(filepath: str, metadata: dict, sheets: list, headers: list, file_format: str) -> dict:
+    """Structure report from workbook metadata and per-sheet properties.
+
+    `sheets` are analyze_worksheet entries with sheet properties (or the
+    same keys) and `headers` their row-1 values, in sheet order.
+    """
+    result = _new_structure(filepath, file_format, "basic" if file_format == "xls" else "full")
+    for sheet, sheet_headers in zip(sheets, headers):
+        sheet_info = {
+            "name": sheet["name"],
+            "visibility": sheet["sheet_state"],
+            "dimensions": sheet["dimensions"] or "empty",
+            "row_count": sheet["max_row"] or 0,
+            "col_count": sheet["max_column"] or 0,
+            "has_filters": sheet["has_filters"],
+            "freeze_panes": sheet["freeze_panes"],
+            "merged_cells_count": sheet["merged_cells_count"],
+            "headers_sample": [h[:50] for h in sheet_headers],
+        }
+        result["sheets"].append(sheet_info)
+        if sheet_info["visibility"] != "visible":
+            result["has_hidden_sheets"] = True
+
+    parts = {s["name"]: s["part"] for s in metadata["sheets"] if s["part"]}
+    if parts:
+        with zipfile.ZipFile(filepath) as archive:
+            for sheet in sheets:
+                if sheet["name"] in parts:
+                    for table in read_sheet_tables(archive, parts[sheet["name"]]):
+                        result["tables"].append({
+                            "name": table["name"],
+                            "sheet": sheet["name"],
+                            "range": table["range"],
+                            "display_name": table["display_name"]
+                        })
+
+    _package_structure(result, metadata)
+    _summarize_structure(result)
+    if file_format == "xls":
+        result["summary"]["format_note"] = "XLS format (Excel 97-2003) - formula text not available"
     return result
 
 
-def extract_structure(filepath: str) -> dict:
+# Content types that flag parts worth a full audit
+_CT_VBA = "application/vnd.ms-office.vbaProject"
+_CT_CONNECTIONS = "application/vnd.openxmlformats-officedocument.spreadsheetml.connections+xml"
+_CT_PIVOT_CACHE = "application/vnd.openxmlformats-officedocument.spreadsheetml.pivotCacheDefinition+xml"
+
+# Sheets past this many cells (by their <dimension>) are flagged as large
+TRIAGE_LARGE_CELLS = 1_000_000
+
+
+def triage_structure(filepath: str) -> dict:
+    """Metadata-only first look at an XLSX workbook, with no cell parsing.
+
+    Reads [Content_Types].xml, xl/workbook.xml and its relationships, the
+    external link, connection and pivot cache parts and each sheet's
+    <dimension> header, and checks for vbaProject.bin. Returns sheet states,
+    defined names, external links, data connections, pivot cache sources,
+    VBA presence and approximate sizes, plus `needs_full_audit` with the
+    reasons.
+    Cell-level findings (formula errors, overrides, inconsistencies) need a
+    full audit; triage only says whether the metadata already warrants one.
+    """
+    path = Path(filepath)
+    result = {
+        "filename": path.name,
+        "format": path.suffix.lower().lstrip('.'),
+        "mode": "triage",
+        "sheets": [],
+        "named_ranges": [],
+        "external_links": [],
+        "connections": [],
+        "pivot_caches": [],
+        "has_vba": False,
+        "has_hidden_sheets": False,
+        "calc_mode": "auto",
+        "file_size_mb": round(path.stat().st_size / (1024 * 1024), 2),
+        "summary": {},
+        "needs_full_audit": True,
+        "triage_reasons": [],
+    }
+
+    try:
+        archive = zipfile.ZipFile(filepath)
+    except (zipfile.BadZipFile, OSError) as e:
+        result["error"] = f"Failed to open: {str(e)}"
+        result["triage_reasons"].append("Not a readable XLSX package")
+        return result
+
+    with archive:
+        names = archive.namelist()
+        if 'xl/workbook.xml' not in names:
+            result["error"] = "No xl/workbook.xml part (binary .xlsb or not a workbook); triage needs XLSX"
+            result["triage_reasons"].append("Workbook metadata unreadable without a full load")
+            return result
+
+        content_types = {}
+        if '[Content_Types].xml' in names:
+            types_root = ET.fromstring(archive.read('[Content_Types].xml'))
+            for override in types_root:
+                if override.get('PartName'):
+                    content_types[override.get('PartName').lstrip('/')] = override.get('ContentType', '')
+        type_values = set(content_types.values())
+
+        result["has_vba"] = 'xl/vbaProject.bin' in names or _CT_VBA in type_values or \
+            any(name.endswith('vbaProject.bin') for name in names)
+
+        root = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = read_relationships(archive, 'xl/_rels/workbook.xml.rels', 'xl')
+        calc = root.find(f'{{{NS_MAIN}}}calcPr')
+        if calc is not None:
+            result["calc_mode"] = calc.get('calcMode', 'auto')
+
+        sheetnames = []
+        for sheet in root.iter(f'{{{NS_MAIN}}}sheet'):
+            name = sheet.get('name')
+            sheetnames.append(name)
+            state = sheet.get('state', 'visible')
+            info = {"name": name, "visibility": state, "kind": "worksheet"}
+            rel_type, target = rels.get(sheet.get(f'{{{NS_REL}}}id'), ('', None))
+            if not rel_type.endswith('/worksheet'):
+                info["kind"] = rel_type.rsplit('/', 1)[-1] or "unknown"
+            elif target in names:
+                max_row, max_col = read_sheet_dimension(archive, target)
+                info["dimensions"] = (f"A1:{get_column_letter(max_col)}{max_row}"
+                                      if max_row else "unknown")
+                info["row_count"] = max_row or 0
+                info["col_count"] = max_col or 0
+                info["approx_cells"] = (max_row or 0) * (max_col or 0)
+                info["xml_mb"] = round(archive.getinfo(target).file_size / (1024 * 1024), 2)
+            result["sheets"].append(info)
+            if state != "visible":
+                result["has_hidden_sheets"] = True
+
+        result["named_ranges"] = read_defined_names(root, sheetnames)
+        result["external_links"] = read_external_links(archive, root, rels)
+        result["connections"] = read_connections(archive, rels)
+        result["pivot_caches"] = read_pivot_caches(archive, root, rels)
+        has_connections = bool(result["connections"]) or _CT_CONNECTIONS in type_values
+        pivot_caches = max(len(result["pivot_caches"]),
+                           sum(1 for t in content_types.values() if t == _CT_PIVOT_CACHE))
+
+    hidden = [s["name"] for s in result["sheets"] if s["visibility"] == "hidden"]
+    very_hidden = [s["name"] for s in result["sheets"] if s["visibility"] == "veryHidden"]
+    broken_names = [n["name"] for n in result["named_ranges"] if "#REF!" in n["refers_to"]]
+    approx_cells = sum(s.get("approx_cells", 0) for s in result["sheets"])
+    large_sheets = [s["name"] for s in result["sheets"] if s.get("approx_cells", 0) >= TRIAGE_LARGE_CELLS]
+
+    result["summary"] = {
+        "total_sheets": len(result["sheets"]),
+        "visible_sheets": len(result["sheets"]) - len(hidden) - len(very_hidden),
+        "hidden_sheets": len(hidden),
+        "very_hidden_sheets": len(very_hidden),
+        "total_named_ranges": len(result["named_ranges"]),
+        "broken_named_ranges": len(broken_names),
+        "external_link_count": len(result["external_links"]),
+        "has_data_connections": has_connections,
+        "pivot_caches": pivot_caches,
+        "has_vba": result["has_vba"],
+        "approx_cells": approx_cells,
+        "large_sheets": large_sheets,
+        "risk_flags": [],
+    }
+
+    reasons = result["triage_reasons"]
+    if result["has_vba"]:
+        reasons.append("Contains VBA macros")
+    if very_hidden:
+        reasons.append(f"Very hidden sheets: {', '.join(very_hidden[:5])}")
+    if hidden:
+        reasons.append(f"Hidden sheets: {', '.join(hidden[:5])}")
+    if result["external_links"]:
+        reasons.append(f"External links: {len(result['external_links'])}")
+    if result["calc_mode"] == "manual":
+        reasons.append("Manual calculation mode: cached values may be stale (audit with --recalc)")
+    if broken_names:
+        reasons.append(f"Defined names pointing at #REF!: {', '.join(broken_names[:5])}")
+    if has_connections:
+        reasons.append("Data connections to external sources")
+    result["summary"]["risk_flags"] = list(reasons)
+    result["needs_full_audit"] = bool(reasons)
+    if large_sheets:
+        result["summary"]["risk_flags"].append(
+            f"Large sheets ({', '.join(large_sheets[:5])}): use --backend xml for the full audit")
+    if not reasons:
+        reasons.append("No macros, external links, hidden sheets, broken names or manual calculation "
+                       "in the workbook metadata; cell-level checks were not run")
+    return result
+
+
+def extract_structure(filepath: str, profile: bool = False) -> dict:
     """Extract structure from Excel file, auto-detecting format.
 
     Supports:
     - XLSX/XLSM/XLSB (Excel 2007+): Full support via openpyxl
     - XLS (Excel 97-2003): Basic support via xlrd
+
+    `profile` applies to XLSX (see extract_structure_xlsx).
     """
     path = Path(filepath)
     ext = path.suffix.lower()
@@ -313,7 +429,7 @@ def extract_structure(filepath: str) -> dict:
                 "summary": {"risk_flags": ["XLS format requires xlrd library"]}
             }
     elif ext in ('.xlsx', '.xlsm', '.xlsb'):
-        return extract_structure_xlsx(filepath)
+        return extract_structure_xlsx(filepath, profile)
     else:
         return {
             "filename": path.name,
@@ -325,11 +441,24 @@ def extract_structure(filepath: str) -> dict:
         }
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python extract_structure.py <excel_file>")
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description="Extract structural metadata from an Excel file.")
+    parser.add_argument("filepath", help="Excel file (.xlsx, .xlsm, .xls)")
+    parser.add_argument("--triage", action="store_true",
+                        help="Read workbook metadata only (no cells) and say whether a full audit is needed")
+    parser.add_argument("--profile", action="store_true",
+                        help="Add per-phase wall/CPU time, RSS and item counts as \"profile\" (XLSX)")
+    parser.add_argument("--profile-dump", metavar="FILE",
+                        help="Also write a Chrome trace (FILE.json) or cProfile stats (any other name)")
+    args = parser.parse_args()
 
-    filepath = sys.argv[1]
-    result = extract_structure(filepath)
+    if args.triage:
+        result = run_profiled(lambda: triage_structure(args.filepath), args.profile_dump, "extract_structure")
+    else:
+        result = run_profiled(lambda: extract_structure(args.filepath, args.profile or bool(args.profile_dump)),
+                              args.profile_dump, "extract_structure")
     print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tokenize-once formula records shared by the formula analyzers.
+
+Each distinct formula string is lexed once into Excel tokens, and everything
+the analyzers need (functions, references, nesting depth, R1C1 pattern
+signatures) is derived from that single token list. Records are interned in an LRU keyed by
+formula text, so a formula repeated across a workbook, such as an absolute
+lookup copied down a column, is only tokenized the first time.
+"""
+
+import re
+from functools import lru_cache
+from hashlib import blake2b
+
+from openpyxl.utils import column_index_from_string
+
+FORMULA_CACHE_SIZE = 131072
+
+# Token kinds, tried in order at each position. Strings come first so their
+# contents are never read as references or functions.
+_TOKEN_RE = re.compile(r'''
+      (?P<string>"(?:[^"]|"")*")
+    | (?P<error>\#(?:N/A|[A-Za-z0-9/_]+[!?]))
+    | (?P<func>(?:_xl[a-z]+\.)*[A-Za-z_\\][A-Za-z0-9_.]*\s*\()
+    | (?P<ref>
+        (?:'(?:[^']|'')+'!|(?:\[\d+\])?[A-Za-z_][A-Za-z0-9_.]*!)?
+        (?:
+            \$?[A-Za-z]{1,3}\$?[1-9][0-9]{0,6}(?::\$?[A-Za-z]{1,3}\$?[1-9][0-9]{0,6})?
+          | \$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}
+          | \$?[1-9][0-9]{0,6}:\$?[1-9][0-9]{0,6}
+        )
+      )(?![A-Za-z0-9_(!\[.])
+    | (?P<structured>(?:[A-Za-z_\\][A-Za-z0-9_.]*)?\[(?:[^\[\]]|\[[^\]]*\])*\])
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+    | (?P<bool>(?:TRUE|FALSE)(?![A-Za-z0-9_.(]))
+    | (?P<name>(?:'(?:[^']|'')+'!|[A-Za-z0-9_.\[\]]+!)?[A-Za-z_\\][A-Za-z0-9_.?\\]*)
+    | (?P<open>\()
+    | (?P<close>\))
+    | (?P<sep>[,;])
+    | (?P<array>[{}])
+    | (?P<op><>|<=|>=|[-+*/^&=<>%:@#!])
+    | (?P<space>\s+)
+    | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+_FUNCTION_PREFIX_RE = re.compile(r'^(?:_XL[A-Z]+\.)+')
+_DIGITS_RE = re.compile(r'\d+')
+_ENDPOINT_RE = re.compile(r'^(\$?)([A-Za-z]*)(\$?)(\d*)$')
+
+
+def tokenize_formula(formula: str) -> list:
+    """Split a formula into (kind, text) tokens covering the whole string."""
+    return [(m.lastgroup, m.group()) for m in _TOKEN_RE.finditer(formula)]
+
+
+def _parse_endpoint(text: str) -> tuple:
+    """'$A5' -> (col_abs, col, row_abs, row); a missing part is 0."""
+    c_abs, col, r_abs, row = _ENDPOINT_RE.match(text).groups()
+    return (bool(c_abs), column_index_from_string(col.upper()) if col else 0,
+            bool(r_abs), int(row) if row else 0)
+
+
+def _r1c1_endpoint(endpoint: tuple, row: int, col: int) -> str:
+    c_abs, c, r_abs, r = endpoint
+    out = ''
+    if r:
+        out = f"R{r}" if r_abs else (f"R[{r - row}]" if r != row else "R")
+    if c:
+        out += f"C{c}" if c_abs else (f"C[{c - col}]" if c != col else "C")
+    return out
+
+
+def _template_endpoint(endpoint: tuple) -> str:
+    """R1C1 endpoint with relative offsets left as slots."""
+    c_abs, c, r_abs, r = endpoint
+    out = ''
+    if r:
+        out = f"R{r}" if r_abs else "R[]"
+    if c:
+        out += f"C{c}" if c_abs else "C[]"
+    return out
+
+
+def _parse_coord(coord: str) -> tuple:
+    """'$A5:B9' -> (endpoints, R1C1 template text)."""
+    endpoints = tuple(_parse_endpoint(e) for e in coord.split(':'))
+    return endpoints, ':'.join(_template_endpoint(e) for e in endpoints)
+
+
+def _normalize(formula: str) -> str:
+    pattern = []
+    for kind, text in tokenize_formula(formula):
+        if kind == 'ref':
+            # Column letters never contain digits, so every digit run is a row
+            prefix, bang, coord = text.rpartition('!')
+            text = prefix + bang + _DIGITS_RE.sub('{R}', coord)
+        elif kind == 'number':
+            text = '{N}'
+        elif kind == 'string':
+            text = '"{S}"'
+        pattern.append(text)
+    return ''.join(pattern)
+
+
+class FormulaRecord:
+    """Everything the analyzers read from one formula, derived from its tokens.
+
+    For R1C1 keys the record keeps a digest of the formula's R1C1 template
+    plus the position of each relative row/column part, so any host cell's
+    signature is a cheap integer hash.
+    """
+
+    __slots__ = ("text", "functions", "references", "depth", "relative_slots", "template_signature")
+
+    def __init__(self, formula: str):
+        functions = []
+        references = []
+        template = []
+        relative = []  # relative parts: row numbers as-is, columns negated
+        depth = max_depth = 0
+        for kind, text in tokenize_formula(formula):
+            if kind == 'ref':
+                references.append(text)
+                prefix, bang, coord = text.rpartition('!')
+                endpoints, coord_template = _parse_coord(coord)
+                for c_abs, col, r_abs, row in endpoints:
+                    if row and not r_abs:
+                        relative.append(row)
+                    if col and not c_abs:
+                        relative.append(-col)
+                template.append(prefix + bang)
+                template.append(coord_template)
+                continue
+
+            template.append(text)
+            if kind == 'func':
+                name = text[:-1].rstrip().upper()
+                if name.startswith('_XL'):
+                    name = _FUNCTION_PREFIX_RE.sub('', name)
+                functions.append(name)
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+            elif kind == 'open':
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+            elif kind == 'close':
+                depth -= 1
+
+        self.text = formula
+        self.functions = tuple(functions)
+        self.references = tuple(references)
+        self.depth = max_depth
+        self.relative_slots = tuple(relative)
+        self.template_signature = int.from_bytes(
+            blake2b(''.join(template).encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    @property
+    def normalized_pattern(self) -> str:
+        """Structural pattern: rows and literals replaced by placeholders."""
+        return _normalize(self.text)
+
+    def r1c1(self, row: int, col: int) -> str:
+        """The formula in R1C1 notation as written in the cell at (row, col)."""
+        out = []
+        for kind, text in tokenize_formula(self.text):
+            if kind == 'ref':
+                prefix, bang, coord = text.rpartition('!')
+                endpoints, _ = _parse_coord(coord)
+                text = prefix + bang + ':'.join(_r1c1_endpoint(e, row, col) for e in endpoints)
+            out.append(text)
+        return ''.join(out)
+
+    def signature(self, row: int, col: int) -> int:
+        """64-bit key shared by every cell whose formula has this R1C1 form.
+
+        Hashes the template's digest with the relative offsets; tuples of ints
+        hash the same in every process, unlike strings.
+        """
+        if not self.relative_slots:
+            return self.template_signature
+        return hash((self.template_signature,
+                     tuple([p - row if p > 0 else p + col for p in self.relative_slots])))
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def parse_formula(formula: str) -> FormulaRecord:
+    """Interned FormulaRecord for a formula string."""
+    return FormulaRecord(formula)
+
+
+def formula_cache_info():
+    """Hit/miss counters of the formula record cache."""
+    return parse_formula.cache_info()
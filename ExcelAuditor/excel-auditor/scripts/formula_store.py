@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Compact per-cell formula records for the formula scan.
+
+The scan used to keep one dict per formula cell ({"cell", "formula",
+"length", "functions", "references", "nesting_depth"}), so a column copied
+down 100,000 rows held 100,000 dicts, cell strings and function lists that
+are all the same. Here each sheet's formula cells are three parallel arrays
+(row, column, formula ID) over a `FormulaTable` that interns each distinct
+formula text once together with what is derived from it: its length,
+nesting depth, references and functions (function tuples are themselves
+interned, so copies of one formula share a single tuple). A sheet scan's
+and a merged workbook's formulas are a `FormulaList` of such parts, which
+can spill to disk under a memory budget.
+
+Both containers are sequences whose items are the legacy dicts, built only
+when they are read: `result["formulas"]` is a FormulaList, and the JSON
+writers (`dump_json`, `json_default` in spill_store.py) turn it into dicts
+as they write it. The workbook-level detectors use the array accessors
+(`cells`, `texts`, `cell_formulas`, `depths`, `lengths`) and build no dicts.
+"""
+
+import os
+import pickle
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from itertools import chain
+
+from openpyxl.utils import get_column_letter
+
+from spill_store import MemoryBudget, SpillList
+
+FORMULA_TEXT_LIMIT = 500  # characters of formula text kept per record
+REFERENCE_LIMIT = 20      # references kept per record
+
+# References are stored joined into one string (a tuple of short strings
+# costs three times as much); NUL cannot occur in a worksheet XML formula
+_REF_SEP = "\x00"
+
+
+class FormulaTable:
+    """Distinct formula texts of one sheet scan and their derived attributes."""
+
+    __slots__ = ("texts", "lengths", "depths", "functions", "references", "_ids", "_function_sets")
+
+    def __init__(self):
+        self.texts = []
+        self.lengths = array('I')
+        self.depths = array('H')
+        self.functions = []
+        self.references = []
+        self._ids = {}
+        self._function_sets = {}
+
+    def intern(self, formula: str, record) -> int:
+        """ID of `formula`, adding it from its FormulaRecord the first time."""
+        formula_id = self._ids.get(formula)
+        if formula_id is None:
+            formula_id = self._ids[formula] = len(self.texts)
+            self.texts.append(formula[:FORMULA_TEXT_LIMIT])
+            self.lengths.append(len(formula))
+            self.depths.append(record.depth)
+            self.functions.append(self._function_sets.setdefault(record.functions, record.functions))
+            self.references.append(_REF_SEP.join(record.references[:REFERENCE_LIMIT]))
+        return formula_id
+
+    def seal(self):
+        """Drop the lookup indexes once no more formulas will be added."""
+        self._ids = None
+        self._function_sets = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getstate__(self):
+        return (self.texts, self.lengths, self.depths, self.functions, self.references)
+
+    def __setstate__(self, state):
+        self.texts, self.lengths, self.depths, self.functions, self.references = state
+        self._ids = self._function_sets = None
+
+
+class FormulaRecords(Sequence):
+    """One sheet's formula cells, in scan order: (row, column, formula ID) arrays."""
+
+    __slots__ = ("sheet_name", "rows", "cols", "ids", "table")
+
+    def __init__(self, sheet_name: str, table: FormulaTable = None):
+        self.sheet_name = sheet_name
+        self.rows = array('I')
+        self.cols = array('H')
+        self.ids = array('I')
+        self.table = table if table is not None else FormulaTable()
+
+    def add(self, row: int, col: int, formula: str, record) -> int:
+        """Append a formula cell; returns its formula ID."""
+        formula_id = self.table.intern(formula, record)
+        self.rows.append(row)
+        self.cols.append(col)
+        self.ids.append(formula_id)
+        return formula_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cell(self, index: int) -> str:
+        return f"{self.sheet_name}!{get_column_letter(self.cols[index])}{self.rows[index]}"
+
+    def view(self, index: int) -> dict:
+        """The legacy JSON record of one formula cell."""
+        return self._record(self.cell(index), self.ids[index])
+
+    def _record(self, cell: str, formula_id: int) -> dict:
+        table = self.table
+        references = table.references[formula_id]
+        return {
+            "cell": cell,
+            "formula": table.texts[formula_id],
+            "length": table.lengths[formula_id],
+            "functions": list(table.functions[formula_id]),
+            "references": references.split(_REF_SEP) if references else [],
+            "nesting_depth": table.depths[formula_id],
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self.view(i) for i in range(start, stop, step)]
+            part = FormulaRecords(self.sheet_name, self.table)
+            part.rows, part.cols, part.ids = self.rows[start:stop], self.cols[start:stop], self.ids[start:stop]
+            return part
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("FormulaRecords index out of range")
+        return self.view(index)
+
+    def __iter__(self):
+        record = self._record
+        for cell, formula_id in zip(self.cells(), self.ids):
+            yield record(cell, formula_id)
+
+    def __eq__(self, other):
+        return _sequence_eq(self, other)
+
+    __hash__ = None
+
+    def cells(self):
+        sheet = self.sheet_name
+        letters = {}
+        for row, col in zip(self.rows, self.cols):
+            letter = letters.get(col)
+            if letter is None:
+                letter = letters[col] = get_column_letter(col)
+            yield f"{sheet}!{letter}{row}"
+
+    def texts(self):
+        texts = self.table.texts
+        return (texts[formula_id] for formula_id in self.ids)
+
+    def cell_formulas(self):
+        """(cell, formula text) pairs."""
+        return zip(self.cells(), self.texts())
+
+    def depths(self):
+        depths = self.table.depths
+        return (depths[formula_id] for formula_id in self.ids)
+
+    def lengths(self):
+        lengths = self.table.lengths
+        return (lengths[formula_id] for formula_id in self.ids)
+
+    def count_before_row(self, row: int) -> int:
+        """Number of records above `row` (records are in row order)."""
+        return bisect_left(self.rows, row)
+
+
+class _SpilledPart:
+    """Where a FormulaRecords part was pickled in a spill file."""
+
+    __slots__ = ("file", "offset", "length")
+
+    def __init__(self, file, offset: int, length: int):
+        self.file = file
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def load(self) -> FormulaRecords:
+        self.file.seek(self.offset)
+        return pickle.load(self.file)
+
+
+class FormulaList(Sequence):
+    """Formula records as FormulaRecords parts in order: a sheet's runs of rows, or a workbook's sheets.
+
+    With a MemoryBudget, parts move to an anonymous temp file once the
+    process RSS passes it and are read back one at a time; the list pickles
+    with every part in memory.
+    """
+
+    __slots__ = ("parts", "budget", "_file")
+
+    def __init__(self, parts=(), budget: MemoryBudget = None):
+        self.parts = []
+        self.budget = budget
+        self._file = None
+        for part in parts:
+            self.extend(part)
+
+    def add(self, sheet_name: str, row: int, col: int, formula: str, record) -> int:
+        """Append a formula cell to the last in-memory part; returns its formula ID."""
+        part = self.parts[-1] if self.parts else None
+        if not isinstance(part, FormulaRecords) or part.sheet_name != sheet_name:
+            part = FormulaRecords(sheet_name)
+            self.parts.append(part)
+        formula_id = part.add(row, col, formula, record)
+        if self.budget is not None and self.budget.exceeded():
+            self.spill()
+        return formula_id
+
+    def extend(self, records):
+        """Append a FormulaRecords part, or the parts of another FormulaList.
+
+        Parts are shared, not copied; over budget, `records` is spilled first
+        so both lists point at the same file.
+        """
+        if isinstance(records, FormulaList):
+            if self.budget is not None and self.budget.over_limit():
+                records.spill()
+            self.parts.extend(records.parts)
+        elif isinstance(records, FormulaRecords):
+            if len(records):
+                self.parts.append(records)
+        else:
+            raise TypeError("FormulaList holds FormulaRecords")
+
+    def spill(self):
+        """Move the in-memory parts to disk."""
+        for index, part in enumerate(self.parts):
+            if not isinstance(part, FormulaRecords):
+                continue
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix="excel-auditor-spill-")
+            offset = self._file.seek(0, os.SEEK_END)
+            pickle.dump(part, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.parts[index] = _SpilledPart(self._file, offset, len(part))
+            if self.budget is not None:
+                self.budget.spilled_items += len(part)
+
+    @property
+    def spilled(self) -> int:
+        """Number of records currently on disk."""
+        return sum(len(part) for part in self.parts if isinstance(part, _SpilledPart))
+
+    def seal(self):
+        for part in self.parts:
+            if isinstance(part, FormulaRecords):
+                part.table.seal()
+
+    def _loaded(self):
+        """The parts as FormulaRecords, spilled ones read back one at a time."""
+        for part in self.parts:
+            yield part.load() if isinstance(part, _SpilledPart) else part
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._slice(start, stop)
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for part in self.parts:
+                if index < len(part):
+                    return (part.load() if isinstance(part, _SpilledPart) else part).view(index)
+                index -= len(part)
+        raise IndexError("FormulaList index out of range")
+
+    def _slice(self, start: int, stop: int) -> "FormulaList":
+        result = FormulaList(budget=self.budget)
+        offset = 0
+        for part in self.parts:
+            end = offset + len(part)
+            if start <= offset and end <= stop:
+                result.parts.append(part)  # whole part, spilled or not
+            elif start < end and offset < stop:
+                records = part.load() if isinstance(part, _SpilledPart) else part
+                result.extend(records[max(start - offset, 0):stop - offset])
+            offset = end
+        return result
+
+    def __iter__(self):
+        return chain.from_iterable(self._loaded())
+
+    def __eq__(self, other):
+        return _sequence_eq(self, other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (FormulaList, (list(self._loaded()),))
+
+    def cells(self):
+        return chain.from_iterable(part.cells() for part in self._loaded())
+
+    def texts(self):
+        return chain.from_iterable(part.texts() for part in self._loaded())
+
+    def cell_formulas(self):
+        return chain.from_iterable(part.cell_formulas() for part in self._loaded())
+
+    def depths(self):
+        return chain.from_iterable(part.depths() for part in self._loaded())
+
+    def lengths(self):
+        return chain.from_iterable(part.lengths() for part in self._loaded())
+
+    def count_before_row(self, row: int) -> int:
+        """Number of records above `row` (parts of one sheet, in row order)."""
+        count = 0
+        for part in self._loaded():
+            before = part.count_before_row(row)
+            count += before
+            if before < len(part):
+                break
+        return count
+
+
+def _sequence_eq(records, other) -> bool:
+    """Item-by-item equality with any sequence of record dicts."""
+    if not isinstance(other, (Sequence, SpillList)) or isinstance(other, (str, bytes)):
+        return NotImplemented
+    return len(records) == len(other) and all(a == b for a, b in zip(records, other))
+
+
+def cell_formulas(formulas):
+    """(cell, formula text) pairs of compact records or a list of record dicts."""
+    if isinstance(formulas, (FormulaRecords, FormulaList)):
+        return formulas.cell_formulas()
+    return ((f["cell"], f["formula"]) for f in formulas)
+
+
+def formula_texts(formulas):
+    """Formula texts of compact records or a list of record dicts, in order."""
+    if isinstance(formulas, (FormulaRecords, FormulaList)):
+        return formulas.texts()
+    return (f["formula"] for f in formulas)
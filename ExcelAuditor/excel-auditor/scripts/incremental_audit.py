@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Incremental formula audit: re-analyze only the sheets that changed.
+
+Each worksheet of an XLSX is fingerprinted by the SHA-256 of its XML part
+plus the shared strings it uses (cell text lives in xl/sharedStrings.xml, not
+in the sheet part). The finished per-sheet scans of the last audit are kept in
+a manifest next to the workbook; on the next run, sheets whose fingerprint
+and scan budget still match are taken from the manifest, the rest are
+re-scanned, and all workbook-level results (patterns, circular references,
+purpose, risk score, narrative) are recomputed from the merged scans. The
+report is the same as a full `extract_formulas` run.
+
+The manifest is a pickle of internal scan state: only load manifests this
+tool wrote.
+
+Usage:
+    python incremental_audit.py <excel_file> [--manifest PATH] [--jobs N]
+"""
+
+import argparse
+import gzip
+import hashlib
+import math
+import pickle
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from extract_formulas import (
+    BACKENDS,
+    _analyze_sheet_job,
+    _new_result,
+    analyze_worksheet,
+    extract_formulas_dispatch,
+    merge_sheet_scans,
+)
+from result_cache import ANALYZER_FINGERPRINT
+from spill_store import dump_json
+from xlsx_reader import _local_name, read_date_styles, read_relationships, read_shared_strings, worksheet_parts
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".audit-manifest.gz"
+
+
+def manifest_path_for(filepath: str) -> Path:
+    path = Path(filepath)
+    return path.with_name(path.name + MANIFEST_SUFFIX)
+
+
+def _workbook_parts(archive: zipfile.ZipFile) -> tuple:
+    """(shared strings part, styles part) from the workbook relationships."""
+    strings_part = styles_part = None
+    for rel_type, target in read_relationships(archive, 'xl/_rels/workbook.xml.rels', 'xl').values():
+        if rel_type.endswith('/sharedStrings'):
+            strings_part = target
+        elif rel_type.endswith('/styles'):
+            styles_part = target
+    return strings_part, styles_part
+
+
+class _HashingReader:
+    """File wrapper that hashes every byte read through it."""
+
+    def __init__(self, src, digest):
+        self.src = src
+        self.digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.src.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _part_fingerprint(archive: zipfile.ZipFile, part: str, shared_strings: list) -> str:
+    digest = hashlib.sha256()
+    indices = []
+    sheet_data = None
+    with archive.open(part) as src:
+        # The parser sees the part through the hash, so both cover the same bytes
+        for event, elem in ET.iterparse(_HashingReader(src, digest), events=('start', 'end')):
+            tag = _local_name(elem.tag)
+            if event == 'start':
+                if tag == 'sheetData':
+                    sheet_data = elem
+            elif tag == 'c' and elem.get('t') == 's':
+                for child in elem:
+                    if _local_name(child.tag) == 'v' and (child.text or '').strip().isdigit():
+                        indices.append(child.text)
+            elif tag == 'row' and sheet_data is not None:
+                sheet_data.clear()
+    for index in indices:
+        i = int(index)
+        digest.update(b'\x00' + (shared_strings[i] if i < len(shared_strings) else '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def sheet_fingerprints(filepath: str) -> tuple:
+    """Return ({sheet name: fingerprint}, workbook context).
+
+    The context covers inputs shared by every sheet: the analyzer version
+    and which cell styles are dates (a date-styled number is not a number
+    to the override detector).
+    """
+    with zipfile.ZipFile(filepath) as archive:
+        strings_part, styles_part = _workbook_parts(archive)
+        shared_strings = read_shared_strings(archive, strings_part) if strings_part else []
+        date_ids, timedelta_ids = read_date_styles(archive, styles_part)
+        names = set(archive.namelist())
+        fingerprints = {
+            name: _part_fingerprint(archive, part, shared_strings)
+            for name, part in worksheet_parts(archive).items() if part in names
+        }
+    context = [ANALYZER_FINGERPRINT, sorted(date_ids), sorted(timedelta_ids)]
+    return fingerprints, context
+
+
+def load_manifest(path: Path, context: list) -> dict:
+    """Stored sheet entries, or {} if missing, unreadable or out of date."""
+    try:
+        with gzip.open(path, 'rb') as f:
+            manifest = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("context") != context:
+        return {}
+    return manifest.get("sheets", {})
+
+
+def save_manifest(path: Path, context: list, entries: dict):
+    with gzip.open(path, 'wb', compresslevel=1) as f:
+        pickle.dump({"version": MANIFEST_VERSION, "context": context, "sheets": entries}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _reusable(entry: dict, fingerprint: str, budget: int) -> bool:
+    """True if a stored scan gives what scanning with `budget` would."""
+    if entry is None or entry["fingerprint"] != fingerprint:
+        return False
+    scan = entry["scan"]
+    # A smaller budget is cut back by trim(); a larger one only matters if
+    # the stored scan stopped early
+    return budget <= scan.max_cells or not scan.truncated
+
+
+def extract_formulas_incremental(filepath: str, manifest_path: str = None, max_cells: int = None,
+                                 backend: str = "openpyxl", jobs: int = 1) -> dict:
+    """extract_formulas, reusing unchanged sheets' scans from the last run's manifest.
+
+    Adds an "incremental" block listing reused and re-analyzed sheets. XLS
+    workbooks have no per-sheet parts and get a full audit.
+    """
+    if Path(filepath).suffix.lower() not in ('.xlsx', '.xlsm'):
+        return extract_formulas_dispatch(filepath, max_cells, backend=backend, jobs=jobs)
+
+    result = _new_result(filepath)
+    if max_cells is None:
+        max_cells = math.inf
+    try:
+        fingerprints, context = sheet_fingerprints(filepath)
+        wb = BACKENDS[backend](filepath)
+    except Exception as e:
+        result["error"] = f"Failed to load: {str(e)}"
+        return result
+
+    manifest_path = Path(manifest_path) if manifest_path else manifest_path_for(filepath)
+    stored = load_manifest(manifest_path, context)
+
+    # Sheets whose stored scan can't be reused under any budget go to the pool up front
+    changed = [index for index, ws in enumerate(wb.worksheets)
+               if stored.get(ws.title) is None or stored[ws.title]["fingerprint"] != fingerprints.get(ws.title)]
+    pool = None
+    if jobs > 1 and len(changed) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(changed)))
+        pending = {index: pool.submit(_analyze_sheet_job, filepath, backend, index, max_cells)
+                   for index in changed}
+
+    cells_processed = 0
+    scans, sheets, entries = [], [], {}
+    reused, reanalyzed = [], []
+    try:
+        for index, ws in enumerate(wb.worksheets):
+            budget = max_cells - cells_processed
+            fingerprint = fingerprints.get(ws.title)
+            entry = stored.get(ws.title)
+            if _reusable(entry, fingerprint, budget):
+                scan, sheet = entry["scan"], dict(entry["sheet"], sheet_state=ws.sheet_state)
+                scan.trim(budget)
+                reused.append(ws.title)
+            else:
+                if pool and index in pending:
+                    scan, sheet = pending[index].result()
+                    scan.trim(budget)
+                else:
+                    scan, sheet = analyze_worksheet(ws, budget)
+                reanalyzed.append(ws.title)
+            scans.append(scan)
+            sheets.append(sheet)
+            cells_processed += scan.cells_processed
+            if fingerprint:
+                entries[ws.title] = {"fingerprint": fingerprint, "scan": scan, "sheet": sheet}
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    # Save before merging: the report is built from these scans but doesn't modify them
+    save_manifest(manifest_path, context, entries)
+    merge_sheet_scans(result, wb, scans, sheets, has_vba=wb.metadata["has_vba"])
+    wb.close()
+    result["incremental"] = {
+        "manifest": str(manifest_path),
+        "reused_sheets": reused,
+        "reanalyzed_sheets": reanalyzed,
+    }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Formula audit that re-analyzes only sheets changed since the last run.")
+    parser.add_argument("filepath", help="Excel file (.xlsx, .xlsm)")
+    parser.add_argument("--manifest", help=f"Manifest path (default: <file>{MANIFEST_SUFFIX})")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 (the default) scans every cell")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Re-analyze changed sheets in N worker processes")
+    args = parser.parse_args()
+
+    result = extract_formulas_incremental(args.filepath, args.manifest, args.max_cells or None,
+                                          backend=args.backend, jobs=args.jobs)
+    dump_json(result, sys.stdout)
+    print()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Streaming NDJSON output for the formula audit.
+
+`extract_formulas.py` returns one result dict, written as a single JSON
+document once the whole audit has finished. `stream_formulas` writes the
+same content as newline-delimited JSON records instead, one compact line
+per item, as each is produced:
+
+    {"record": "formula", "cell": "Model!C2", "formula": "=A2*B2", ...}
+    {"record": "issue", "type": "high_nesting", "severity": "warning", ...}
+    {"record": "finding", "section": "errors_found", "cell": "Model!D9", ...}
+    {"record": "summary", "fields": [...], "counts": {...}, "result": {...}}
+
+A sheet's formula, issue, error and volatile-function records are written
+(and flushed) as soon as that sheet's scan is final, so a consumer can
+start on the first sheet while later ones are still being read. The
+workbook-level findings (inconsistencies, overrides, stale cached values,
+external references, circular reference groups) and issues follow once the
+merge has run, and the summary record, always last, carries the remaining
+fields: metrics, patterns, calc cost, purpose, hidden content, risk score
+and narrative. Nothing is ever rendered as one document, so the output
+side needs no memory beyond the record being written; with `memory_mb` the
+formula lists the analysis keeps spill to disk as usual.
+
+`read_ndjson` rebuilds the legacy result dict (as parsed from the
+`extract_formulas.py` JSON) from a stream; `iter_records` yields the
+records one at a time.
+
+Usage:
+    python ndjson_stream.py <excel_file> [--backend xml] [--jobs N] [--max-cells N]
+                            [--memory-mb N] [--recalc] [--output audit.ndjson]
+    python ndjson_stream.py --read audit.ndjson     (prints the legacy JSON)
+"""
+
+import argparse
+import json
+import sys
+from itertools import islice
+
+from extract_formulas import BACKENDS, extract_formulas_dispatch
+from spill_store import dump_json, json_default
+
+NDJSON_VERSION = 1
+
+# Result lists written as one record per item: section -> record type
+STREAMED_SECTIONS = {
+    "formulas": "formula",
+    "issues": "issue",
+    "errors_found": "finding",
+    "volatile_functions": "finding",
+    "formula_inconsistencies": "finding",
+    "hardcoded_overrides": "finding",
+    "stale_cached_values": "finding",
+    "external_references": "finding",
+    "circular_reference_groups": "finding",
+}
+# Per-sheet lists, written from each finished SheetScan
+_SCAN_SECTIONS = ("formulas", "errors_found", "volatile_functions", "issues")
+
+
+class NdjsonWriter:
+    """Writes audit records to a text stream, one compact JSON object per line."""
+
+    def __init__(self, out):
+        self.out = out
+        self.counts = {section: 0 for section in STREAMED_SECTIONS}
+
+    def _write(self, section: str, item):
+        kind = STREAMED_SECTIONS[section]
+        if kind == "finding":
+            record = {"record": kind, "section": section}
+            if isinstance(item, dict):
+                record.update(item)
+            else:
+                record["cells"] = item  # a circular reference group
+        else:
+            record = {"record": kind, **item}
+        self.out.write(json.dumps(record, separators=(',', ':'), default=json_default) + "\n")
+        self.counts[section] += 1
+
+    def sheet(self, scan, sheet):
+        """`on_sheet` hook for extract_formulas: write one finished sheet's records."""
+        for section in _SCAN_SECTIONS:
+            for item in getattr(scan, section):
+                self._write(section, item)
+        self.out.flush()
+
+    def finish(self, result: dict):
+        """Write what the sheet records did not cover, then the summary.
+
+        The per-sheet items come first in each merged list, so only the
+        tail past what was already written is new.
+        """
+        for section in STREAMED_SECTIONS:
+            items = result.get(section)
+            if items:
+                for item in islice(items, self.counts[section], None):
+                    self._write(section, item)
+        rest = {key: value for key, value in result.items() if key not in STREAMED_SECTIONS}
+        if "circular_reference_groups" in result:
+            rest.pop("circular_references", None)  # the groups, flattened
+        summary = {
+            "record": "summary",
+            "version": NDJSON_VERSION,
+            "fields": list(result),
+            "counts": {section: n for section, n in self.counts.items() if section in result},
+            "result": rest,
+        }
+        self.out.write(json.dumps(summary, separators=(',', ':'), default=json_default) + "\n")
+        self.out.flush()
+
+
+def stream_formulas(filepath: str, out, max_cells: int = None, backend: str = "openpyxl",
+                    jobs: int = 1, memory_mb: int = None, recalc: bool = False) -> dict:
+    """Run extract_formulas_dispatch and write its result to `out` as NDJSON.
+
+    Returns the number of records written per section. Options are those of
+    extract_formulas_dispatch.
+    """
+    writer = NdjsonWriter(out)
+    result = extract_formulas_dispatch(filepath, max_cells, backend=backend, jobs=jobs,
+                                       memory_mb=memory_mb, recalc=recalc, on_sheet=writer.sheet)
+    writer.finish(result)
+    return writer.counts
+
+
+def iter_records(lines):
+    """Parse an NDJSON stream (file object or iterable of lines), skipping blank lines."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_ndjson(lines) -> dict:
+    """Rebuild the legacy extract_formulas result from an NDJSON stream.
+
+    Keys come back in their original order. Raises ValueError if the stream
+    ends without its summary record or is missing records.
+    """
+    sections = {section: [] for section in STREAMED_SECTIONS}
+    for record in iter_records(lines):
+        kind = record.pop("record")
+        if kind == "summary":
+            break
+        section = record.pop("section") if kind == "finding" else kind + "s"
+        if section == "circular_reference_groups":
+            record = record["cells"]
+        sections[section].append(record)
+    else:
+        raise ValueError("NDJSON stream ended before its summary record")
+
+    for section, count in record["counts"].items():
+        if len(sections[section]) != count:
+            raise ValueError(f"NDJSON stream has {len(sections[section])} {section} records, expected {count}")
+    rest = record["result"]
+    result = {}
+    for key in record["fields"]:
+        if key in STREAMED_SECTIONS:
+            result[key] = sections[key]
+        elif key == "circular_references" and key not in rest:
+            result[key] = [cell for group in sections["circular_reference_groups"] for cell in group]
+        else:
+            result[key] = rest[key]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Formula audit as streaming NDJSON records.")
+    parser.add_argument("filepath", help="Excel file (.xlsx, .xlsm, .xls), or an NDJSON file with --read")
+    parser.add_argument("--read", action="store_true",
+                        help="Rebuild the extract_formulas.py JSON from an NDJSON file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openpyxl",
+                        help="XLSX reader: openpyxl read-only (default) or the direct XML reader")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Analyze sheets in N worker processes (default 1)")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 (the default) scans every cell")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="Spill formula lists to a temp file above this RSS")
+    parser.add_argument("--recalc", action="store_true",
+                        help="Recalculate common formulas and report stale cached values (XLSX only)")
+    parser.add_argument("--output", help="Write records here instead of stdout")
+    args = parser.parse_args()
+
+    if args.read:
+        with open(args.filepath, encoding='utf-8') as f:
+            dump_json(read_ndjson(f), sys.stdout)
+        print()
+        return
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        stream_formulas(args.filepath, out, args.max_cells or None, backend=args.backend, jobs=args.jobs,
+                        memory_mb=args.memory_mb, recalc=args.recalc)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing and memory instrumentation for the extractors.
+
+With `profile=True`, `extract_formulas` and `extract_structure_xlsx` add a
+"profile" block to their result, built by a `Profiler`:
+
+    "profile": {
+        "version": 1, "wall_s": 4.91, "cpu_s": 4.87, "peak_rss_mb": 212.4,
+        "phases": [
+            {"name": "load", "start_s": 0.0, "wall_s": 0.02, "cpu_s": 0.02,
+             "rss_delta_mb": 1.2, "peak_rss_delta_mb": 0.0, "items": {"sheets": 7}},
+            {"name": "scan", ...}, {"name": "dependency_graph", ...}, ...
+        ],
+        "sheet_phases": {"stream": {"calls": 7, "wall_s": ..., "cpu_s": ..., "items": {...}}, ...},
+        "sheets": [{"name": "stream", "sheet": "Model", "pid": 4242, "start_s": ..., ...}, ...]
+    }
+
+`phases` are the workbook-level steps in the order they ran. The per-sheet
+steps of the scan (streaming the cells, the column and row inconsistency
+detectors, hardcoded overrides, cell counting) run inside `scan`, possibly
+in worker processes; `sheets` lists them one record per sheet and step, and
+`sheet_phases` totals them per step. `rss_delta_mb` is the change in RSS over
+a phase and `peak_rss_delta_mb` how far it raised the process's RSS
+high-water mark (getrusage; 0 where unavailable). `items` are what the
+phase worked through: cells, formulas, graph nodes, groups...
+
+`trace_events` turns a profile block into Chrome trace-event JSON (open it
+in chrome://tracing or Perfetto), one track per process. `run_profiled`
+backs the CLIs' `--profile-dump`: a `.json` path gets the trace, any other
+path the cProfile statistics of the whole call (`python -m pstats FILE`).
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from spill_store import current_rss
+
+# RSS high-water marks come from getrusage, which is only available on Unix
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+PROFILE_VERSION = 1
+
+
+def peak_rss() -> int:
+    """High-water RSS of this process in bytes, or None if unknown."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _mb(delta) -> float:
+    return round(delta / (1024 * 1024), 2) if delta is not None else None
+
+
+class Profiler:
+    """Records a flat sequence of named phases; a disabled one records nothing.
+
+    Use `with profiler.phase(name) as items:` around a block, or
+    `begin(name)` ... `end()` around sequential steps of a long function
+    (`begin` ends the phase still open). `items` (or `count(**items)`) sets
+    the phase's item counts.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.origin_cpu = time.process_time()
+        self.origin_peak = peak_rss() if enabled else None
+        self.phases = []
+        self._open = None
+
+    def begin(self, name: str, **labels) -> dict:
+        """Start a phase, ending the open one; returns its item counts dict."""
+        self.end()
+        items = {}
+        if self.enabled:
+            self._open = (name, labels, items, time.perf_counter(), time.process_time(),
+                          current_rss(), peak_rss())
+        return items
+
+    def end(self):
+        """End the open phase, if any."""
+        if self._open is None:
+            return
+        name, labels, items, start, cpu, rss, peak = self._open
+        self._open = None
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+        rss_after, peak_after = current_rss(), peak_rss()
+        self.phases.append({
+            "name": name,
+            **labels,
+            "start_s": round(start - self.origin, 6),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rss_delta_mb": _mb(rss_after - rss) if rss is not None and rss_after is not None else None,
+            "peak_rss_delta_mb": _mb(peak_after - peak) if peak is not None else 0.0,
+            "items": items,
+        })
+
+    def count(self, **items):
+        """Add item counts to the open phase."""
+        if self._open is not None:
+            self._open[2].update(items)
+
+    @contextmanager
+    def phase(self, name: str, **labels):
+        items = self.begin(name, **labels)
+        try:
+            yield items
+        finally:
+            self.end()
+
+    def sheet_records(self) -> dict:
+        """This profiler's phases for a SheetScan, to be merged by the parent's report."""
+        return {"pid": os.getpid(), "origin": self.origin, "phases": self.phases}
+
+    def report(self, sheet_records=()) -> dict:
+        """The "profile" block: this profiler's phases plus the scans' sheet records."""
+        self.end()
+        sheets = []
+        totals = {}
+        for record in sheet_records:
+            if not record:
+                continue
+            # perf_counter is a system-wide monotonic clock, so worker times line up
+            offset = record["origin"] - self.origin
+            for phase in record["phases"]:
+                sheets.append({**phase, "pid": record["pid"], "start_s": round(phase["start_s"] + offset, 6)})
+                total = totals.setdefault(phase["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "items": {}})
+                total["calls"] += 1
+                total["wall_s"] += phase["wall_s"]
+                total["cpu_s"] += phase["cpu_s"]
+                for key, value in phase["items"].items():
+                    total["items"][key] = total["items"].get(key, 0) + value
+        for total in totals.values():
+            total["wall_s"], total["cpu_s"] = round(total["wall_s"], 6), round(total["cpu_s"], 6)
+        peak = peak_rss()
+        return {
+            "version": PROFILE_VERSION,
+            "pid": os.getpid(),
+            "wall_s": round(time.perf_counter() - self.origin, 6),
+            "cpu_s": round(time.process_time() - self.origin_cpu, 6),
+            "peak_rss_mb": _mb(peak if peak is not None else current_rss()),
+            "peak_rss_delta_mb": _mb(peak - self.origin_peak) if self.origin_peak is not None else 0.0,
+            "phases": self.phases,
+            "sheet_phases": totals,
+            "sheets": sheets,
+        }
+
+
+NULL_PROFILER = Profiler(enabled=False)
+
+
+def trace_events(profile: dict, process_name: str = "excel-auditor") -> dict:
+    """Chrome trace-event JSON for a "profile" block (complete "X" events, microseconds)."""
+    pid = profile["pid"]
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": process_name}}]
+    workers = sorted({s["pid"] for s in profile["sheets"]} - {pid})
+    for worker in workers:
+        events.append({"name": "process_name", "ph": "M", "pid": worker, "tid": 0,
+                       "args": {"name": f"{process_name} sheet worker"}})
+
+    def event(phase, category, event_pid, tid):
+        args = {key: phase[key] for key in ("cpu_s", "rss_delta_mb", "peak_rss_delta_mb") if key in phase}
+        args.update(phase["items"])
+        name = f"{phase['name']} {phase['sheet']}" if "sheet" in phase else phase["name"]
+        return {"name": name, "cat": category, "ph": "X", "pid": event_pid, "tid": tid,
+                "ts": round(phase["start_s"] * 1e6, 1), "dur": round(phase["wall_s"] * 1e6, 1), "args": args}
+
+    events.extend(event(phase, "phase", pid, 0) for phase in profile["phases"])
+    events.extend(event(phase, "sheet", phase["pid"], 1) for phase in profile["sheets"])
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def run_profiled(func, dump_path: str = None, process_name: str = "excel-auditor"):
+    """Call func() and return its result, dumping a profile to `dump_path` if given.
+
+    A `.json` path gets the Chrome trace of the result's "profile" block;
+    any other path gets cProfile statistics of the call, readable with
+    pstats.
+    """
+    if not dump_path:
+        return func()
+    if dump_path.endswith(".json"):
+        result = func()
+        if "profile" in result:
+            with open(dump_path, 'w', encoding='utf-8') as f:
+                json.dump(trace_events(result["profile"], process_name), f)
+        return result
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(dump_path)
@@ -0,0 +1,1412 @@
+#!/usr/bin/env python3
+"""
+Lightweight recalculation of common formulas, to catch stale cached values.
+
+Excel saves each formula's last result next to the formula. When the saved
+result no longer agrees with what the formula computes from the workbook's
+own inputs, the workbook was saved in manual calculation mode, its calc
+chain is broken, or the cached value was edited. This module re-evaluates
+the formulas it understands and reports the cells whose cached value
+disagrees.
+
+Cell values come from a second, data-only pass over the workbook and are
+held per sheet as NumPy column arrays. Formula cells are grouped into
+blocks - runs of one formula copied down a column (same R1C1 signature) -
+and blocks are evaluated in dependency order. A block without internal
+dependencies is evaluated as whole-column array expressions; anything the
+array path can't express exactly (text, errors, lookups, conditional sums)
+is evaluated cell by cell, still over the column arrays.
+
+Supported: numbers, text, booleans, errors, cell and range references
+(same workbook), + - * / ^ % & and comparisons, and SUM, AVERAGE, MIN,
+MAX, COUNT, IF, IFERROR, ROUND, ABS, SUMIF, VLOOKUP, INDEX and MATCH.
+Formulas using anything else keep their cached value, which is what
+their dependents then see.
+"""
+
+import math
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900, to_excel
+
+from dependency_graph import MAX_COL, MAX_ROW, sheet_key, split_cell_address
+from formula_cache import _parse_endpoint, parse_formula, tokenize_formula
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+ERROR_VALUES = {'#REF!', '#DIV/0!', '#VALUE!', '#N/A', '#NAME?', '#NULL!', '#NUM!',
+                '#GETTING_DATA', '#SPILL!', '#CALC!'}
+
+# Formula text is kept truncated to this length by the formula scan
+MAX_FORMULA_LENGTH = 500
+
+# Shortest copied-down run worth evaluating as arrays
+VECTOR_MIN_CELLS = 8
+
+# Cached and recalculated numbers agree within this relative tolerance
+REL_TOLERANCE = 1e-9
+
+SUPPORTED_FUNCTIONS = {'SUM', 'AVERAGE', 'MIN', 'MAX', 'COUNT', 'IF', 'IFERROR', 'ROUND', 'ABS',
+                       'SUMIF', 'VLOOKUP', 'INDEX', 'MATCH'}
+
+_FUNCTION_PREFIX_RE = re.compile(r'^(?:_XL[A-Z]+\.)+')
+_COMPARISONS = ('=', '<>', '<', '>', '<=', '>=')
+_CRITERIA_RE = re.compile(r'^(<=|>=|<>|<|>|=)?(.*)$', re.DOTALL)
+
+
+class ExcelError(str):
+    """An Excel error value such as #DIV/0!, as opposed to text."""
+
+
+DIV0 = ExcelError('#DIV/0!')
+NA = ExcelError('#N/A')
+VALUE = ExcelError('#VALUE!')
+REF = ExcelError('#REF!')
+NUM = ExcelError('#NUM!')
+
+
+class Unsupported(Exception):
+    """The formula uses something outside the supported subset."""
+
+
+class _NeedScalar(Exception):
+    """A block can't be evaluated exactly as arrays; evaluate it cell by cell."""
+
+
+class Area:
+    """A rectangular range reference, resolved to one sheet."""
+
+    __slots__ = ("sheet", "r1", "c1", "r2", "c2")
+
+    def __init__(self, sheet: "SheetValues", r1: int, c1: int, r2: int, c2: int):
+        self.sheet = sheet
+        self.r1, self.c1 = min(r1, r2), min(c1, c2)
+        self.r2, self.c2 = max(r1, r2), max(c1, c2)
+
+
+# === CELL VALUES ===
+
+class SheetValues:
+    """Cell values of one sheet as NumPy column arrays, indexed by row.
+
+    `numbers[col]` holds numeric values (NaN for blank and non-numeric
+    cells); text, booleans and errors live in `others[col]` ({row: value})
+    and are flagged in `other_mask[col]`, errors also in `error_mask[col]`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.numbers = {}
+        self.other_mask = {}
+        self.error_mask = {}
+        self.others = defaultdict(dict)
+        self._prefix = {}  # (col, kind) -> prefix sums, dropped when the column changes
+        self._index = {}   # col -> lookup index, dropped when the column changes
+
+    def ensure(self, col: int, length: int):
+        """Grow column `col` to hold rows below `length`."""
+        nums = self.numbers.get(col)
+        if nums is None:
+            size = max(length, 16)
+            self.numbers[col] = np.full(size, np.nan)
+            self.other_mask[col] = np.zeros(size, dtype=bool)
+            self.error_mask[col] = np.zeros(size, dtype=bool)
+        elif len(nums) < length:
+            size = max(length, len(nums) * 2)
+            grow = size - len(nums)
+            self.numbers[col] = np.concatenate([nums, np.full(grow, np.nan)])
+            self.other_mask[col] = np.concatenate([self.other_mask[col], np.zeros(grow, dtype=bool)])
+            self.error_mask[col] = np.concatenate([self.error_mask[col], np.zeros(grow, dtype=bool)])
+
+    def get(self, row: int, col: int):
+        """A cell's value: float, str, bool, ExcelError or None for blank."""
+        nums = self.numbers.get(col)
+        if nums is None or row >= len(nums) or row < 1:
+            return None
+        if self.other_mask[col][row]:
+            return self.others[col][row]
+        value = nums[row]
+        return None if value != value else float(value)
+
+    def set(self, row: int, col: int, value):
+        self.ensure(col, row + 1)
+        self._changed(col)
+        if value is None or value.__class__ is float:
+            self.numbers[col][row] = np.nan if value is None else value
+            if self.other_mask[col][row]:
+                self.other_mask[col][row] = False
+                self.error_mask[col][row] = False
+                del self.others[col][row]
+        else:
+            self.numbers[col][row] = np.nan
+            self.other_mask[col][row] = True
+            self.error_mask[col][row] = isinstance(value, ExcelError)
+            self.others[col][row] = value
+
+    def set_numbers(self, rows, col: int, values):
+        """Store a block of numeric results in rows[0]..rows[-1] of `col`."""
+        self.ensure(col, int(rows[-1]) + 1)
+        self._changed(col)
+        lo, hi = int(rows[0]), int(rows[-1]) + 1
+        self.numbers[col][lo:hi] = values
+        mask = self.other_mask[col]
+        if mask[lo:hi].any():
+            others = self.others[col]
+            for row in np.flatnonzero(mask[lo:hi]) + lo:
+                del others[int(row)]
+            mask[lo:hi] = False
+            self.error_mask[col][lo:hi] = False
+
+    def _changed(self, col: int):
+        if self._prefix:
+            for kind in ('sum', 'count'):
+                self._prefix.pop((col, kind), None)
+        self._index.pop(col, None)
+
+    def has_errors(self, col: int, r1: int, r2: int) -> bool:
+        mask = self.error_mask.get(col)
+        return mask is not None and bool(mask[max(r1, 0):r2 + 1].any())
+
+    def prefix(self, col: int, kind: str):
+        """Prefix sums of a column's numbers ('sum') or numeric-cell count ('count')."""
+        key = (col, kind)
+        if key not in self._prefix:
+            nums = self.numbers[col]
+            data = np.nan_to_num(nums) if kind == 'sum' else ~np.isnan(nums)
+            self._prefix[key] = np.concatenate([[0], np.cumsum(data)])
+        return self._prefix[key]
+
+    def lookup_index(self, col: int) -> dict:
+        """Exact-match index of a column: lookup key -> ascending rows."""
+        index = self._index.get(col)
+        if index is None:
+            index = defaultdict(list)
+            nums = self.numbers.get(col)
+            if nums is not None:
+                rows = np.flatnonzero(~np.isnan(nums))
+                for row, value in zip(rows.tolist(), nums[rows].tolist()):
+                    index[value].append(row)
+            for row in sorted(self.others.get(col, {})):
+                index[_lookup_key(self.others[col][row])].append(row)
+            self._index[col] = index
+        return index
+
+
+def _lookup_key(value):
+    if isinstance(value, ExcelError):
+        return ('e', str(value))
+    if isinstance(value, bool):
+        return ('b', value)
+    if isinstance(value, str):
+        return ('s', value.casefold())
+    return float(value)
+
+
+def _cell_value(value, epoch):
+    """Normalize a data-only cell value: numbers as float, dates as serials."""
+    if value is None or value.__class__ is float:
+        return value
+    if value.__class__ is bool:
+        return value
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, str):
+        if value in ERROR_VALUES:
+            return ExcelError(value)
+        return value
+    if isinstance(value, (datetime, date, time, timedelta)):
+        try:
+            return float(to_excel(value, epoch))
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return str(value)
+
+
+def load_values(data_wb) -> dict:
+    """Read every sheet of a data-only workbook into SheetValues, by sheet key."""
+    epoch = getattr(data_wb, 'epoch', CALENDAR_WINDOWS_1900)
+    sheets = {}
+    for ws in data_wb.worksheets:
+        sheet = sheets[sheet_key(ws.title)] = SheetValues(ws.title)
+        columns = defaultdict(list)  # col -> [(row, value)]
+        for row_idx, values in enumerate(ws.iter_rows(), start=1):
+            for col_idx, value in enumerate(values, start=1):
+                if value is not None:
+                    columns[col_idx].append((row_idx, value))
+        for col_idx, cells in columns.items():
+            sheet.ensure(col_idx, cells[-1][0] + 1)
+            nums = sheet.numbers[col_idx]
+            for row_idx, value in cells:
+                value = _cell_value(value, epoch)
+                if value.__class__ is float:
+                    nums[row_idx] = value
+                elif value is not None:
+                    sheet.set(row_idx, col_idx, value)
+    return sheets
+
+
+# === FORMULA COMPILER ===
+#
+# Formulas compile to nested tuples. References keep relative rows/columns
+# as offsets from the host cell, so every copy of a formula (one R1C1
+# signature) shares one tree:
+#   ('num', x) ('str', s) ('bool', b) ('err', e)
+#   ('cell', sheet, r_abs, r, c_abs, c)
+#   ('area', sheet, (r_abs, r, c_abs, c), (r_abs, r, c_abs, c))
+#   ('neg', x) ('pct', x) ('op', op, a, b) ('func', NAME, [args])
+# `sheet` is a sheet key, or None for the host sheet.
+
+class _Parser:
+    def __init__(self, formula: str, row: int, col: int, sheet_keys: set):
+        self.tokens = [t for t in tokenize_formula(formula) if t[0] != 'space']
+        self.pos = 0
+        self.row, self.col = row, col
+        self.sheet_keys = sheet_keys
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.comparison()
+        if self.pos != len(self.tokens):
+            raise Unsupported(f"unexpected {self.peek()[1]!r}")
+        return node
+
+    def comparison(self):
+        node = self.concat()
+        while self.peek() in (('op', op) for op in _COMPARISONS):
+            node = ('op', self.take()[1], node, self.concat())
+        return node
+
+    def concat(self):
+        node = self.additive()
+        while self.peek() == ('op', '&'):
+            self.take()
+            node = ('op', '&', node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            node = ('op', self.take()[1], node, self.term())
+        return node
+
+    def term(self):
+        node = self.power()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            node = ('op', self.take()[1], node, self.power())
+        return node
+
+    def power(self):
+        node = self.unary()
+        while self.peek() == ('op', '^'):
+            self.take()
+            node = ('op', '^', node, self.unary())
+        return node
+
+    def unary(self):
+        # Excel negates before exponentiation: -2^2 is 4
+        if self.peek() == ('op', '-'):
+            self.take()
+            return ('neg', self.unary())
+        if self.peek() == ('op', '+'):
+            self.take()
+            return self.unary()
+        node = self.primary()
+        while self.peek() == ('op', '%'):
+            self.take()
+            node = ('pct', node)
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == 'number':
+            return ('num', float(text))
+        if kind == 'string':
+            return ('str', text[1:-1].replace('""', '"'))
+        if kind == 'bool':
+            return ('bool', text.upper() == 'TRUE')
+        if kind == 'error':
+            return ('err', ExcelError(text.upper()))
+        if kind == 'ref':
+            return self.reference(text)
+        if kind == 'open':
+            node = self.comparison()
+            if self.take()[0] != 'close':
+                raise Unsupported("unbalanced parentheses")
+            return node
+        if kind == 'func':
+            name = text[:-1].rstrip().upper()
+            if name.startswith('_XL'):
+                name = _FUNCTION_PREFIX_RE.sub('', name)
+            if name not in SUPPORTED_FUNCTIONS:
+                raise Unsupported(name)
+            return ('func', name, self.arguments())
+        raise Unsupported(f"unsupported token {text!r}")
+
+    def arguments(self) -> list:
+        args = []
+        if self.peek()[0] == 'close':
+            self.take()
+            return args
+        while True:
+            if self.peek()[0] in ('sep', 'close'):
+                args.append(('num', 0.0))  # an empty argument reads as 0
+            else:
+                args.append(self.comparison())
+            kind, _ = self.take()
+            if kind == 'close':
+                return args
+            if kind != 'sep':
+                raise Unsupported("malformed argument list")
+
+    def reference(self, text: str):
+        prefix, _, coord = text.rpartition('!')
+        sheet = None
+        if prefix:
+            if '[' in prefix:
+                raise Unsupported("external reference")
+            sheet = sheet_key(prefix)
+            if sheet not in self.sheet_keys:
+                raise Unsupported("unknown sheet")
+        endpoints = []
+        for part in coord.split(':'):
+            c_abs, c, r_abs, r = _parse_endpoint(part)
+            if not r:
+                r_abs, r = True, 1 if not endpoints else MAX_ROW  # whole column
+            elif not r_abs:
+                r -= self.row
+            if not c:
+                c_abs, c = True, 1 if not endpoints else MAX_COL  # whole row
+            elif not c_abs:
+                c -= self.col
+            endpoints.append((r_abs, r, c_abs, c))
+        if len(endpoints) == 1:
+            return ('cell', sheet) + endpoints[0]
+        return ('area', sheet, endpoints[0], endpoints[1])
+
+
+def compile_formula(formula: str, row: int, col: int, sheet_keys: set):
+    """Compile a formula (with its leading '=') written in cell (row, col)."""
+    return _Parser(formula[1:], row, col, sheet_keys).parse()
+
+
+def _references(node):
+    """Yield the 'cell' and 'area' leaves of a compiled formula."""
+    kind = node[0]
+    if kind in ('cell', 'area'):
+        yield node
+    elif kind in ('neg', 'pct'):
+        yield from _references(node[1])
+    elif kind == 'op':
+        yield from _references(node[2])
+        yield from _references(node[3])
+    elif kind == 'func':
+        for arg in node[2]:
+            yield from _references(arg)
+
+
+def _resolve(endpoint: tuple, row: int, col: int) -> tuple:
+    r_abs, r, c_abs, c = endpoint
+    return (r if r_abs else row + r), (c if c_abs else col + c)
+
+
+def _target(node, host_sheet: str, row: int, col: int) -> tuple:
+    """(sheet key, r1, c1, r2, c2) read by a reference leaf from cell (row, col)."""
+    sheet = node[1] or host_sheet
+    if node[0] == 'cell':
+        r, c = _resolve(node[2:], row, col)
+        return sheet, r, c, r, c
+    r1, c1 = _resolve(node[2], row, col)
+    r2, c2 = _resolve(node[3], row, col)
+    return sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+
+# === SCALAR EVALUATION ===
+
+def _to_number(value):
+    if value is None:
+        return 0.0
+    if value.__class__ is float:
+        return value
+    if isinstance(value, ExcelError):
+        return value
+    if value.__class__ is bool:
+        return 1.0 if value else 0.0
+    if isinstance(value, Area):
+        raise Unsupported("range used as a single value")
+    try:
+        return float(value.strip())
+    except ValueError:
+        return VALUE
+
+
+def _to_text(value) -> str:
+    if value is None:
+        return ''
+    if value.__class__ is bool:
+        return 'TRUE' if value else 'FALSE'
+    if value.__class__ is float:
+        if value == int(value) and abs(value) < 1e15:
+            return str(int(value))
+        return format(value, '.15g')
+    return value
+
+
+def _to_bool(value):
+    if value is None:
+        return False
+    if isinstance(value, ExcelError):
+        return value
+    if value.__class__ is bool:
+        return value
+    if value.__class__ is float:
+        return value != 0
+    if isinstance(value, Area):
+        raise Unsupported("range used as a condition")
+    upper = value.upper()
+    if upper in ('TRUE', 'FALSE'):
+        return upper == 'TRUE'
+    return VALUE
+
+
+def _type_rank(value) -> int:
+    return 0 if value.__class__ is float else (2 if value.__class__ is bool else 1)
+
+
+def _compare(op: str, a, b):
+    for v in (a, b):
+        if isinstance(v, ExcelError):
+            return v
+        if isinstance(v, Area):
+            raise Unsupported("range in comparison")
+    # A blank takes the type of the other side
+    if a is None:
+        a = 0.0 if b is None or b.__class__ is float else ('' if isinstance(b, str) else False)
+    if b is None:
+        b = 0.0 if a.__class__ is float else ('' if isinstance(a, str) else False)
+    ra, rb = _type_rank(a), _type_rank(b)
+    if ra != rb:
+        a, b = ra, rb
+    elif ra == 1:
+        a, b = a.casefold(), b.casefold()
+    if op == '=':
+        return a == b
+    if op == '<>':
+        return a != b
+    if op == '<':
+        return a < b
+    if op == '>':
+        return a > b
+    if op == '<=':
+        return a <= b
+    return a >= b
+
+
+def _arithmetic(op: str, a, b):
+    a, b = _to_number(a), _to_number(b)
+    if isinstance(a, ExcelError):
+        return a
+    if isinstance(b, ExcelError):
+        return b
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    if op == '/':
+        return DIV0 if b == 0 else a / b
+    # '^'
+    if a == 0 and b == 0:
+        return NUM
+    try:
+        result = a ** b
+    except (OverflowError, ZeroDivisionError):
+        return NUM if a else DIV0
+    return NUM if isinstance(result, complex) or math.isinf(result) else float(result)
+
+
+def _round(x: float, digits: int) -> float:
+    """ROUND as Excel does it: half away from zero, on the shortest decimal repr."""
+    try:
+        quantum = Decimal(1).scaleb(-digits)
+        return float(Decimal(repr(x)).quantize(quantum, rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        return x
+
+
+class Evaluator:
+    """Evaluates compiled formulas against a workbook's SheetValues."""
+
+    def __init__(self, sheets: dict):
+        self.sheets = sheets
+
+    def sheet(self, key: str) -> SheetValues:
+        return self.sheets[key]
+
+    def eval(self, node, sheet: str, row: int, col: int):
+        kind = node[0]
+        if kind == 'num' or kind == 'str' or kind == 'bool' or kind == 'err':
+            return node[1]
+        if kind == 'cell':
+            target_sheet, r, c, _, _ = _target(node, sheet, row, col)
+            if r < 1 or c < 1:
+                return REF
+            return self.sheets[target_sheet].get(r, c)
+        if kind == 'area':
+            target_sheet, r1, c1, r2, c2 = _target(node, sheet, row, col)
+            if r1 < 1 or c1 < 1:
+                return REF
+            return Area(self.sheets[target_sheet], r1, c1, r2, c2)
+        if kind == 'neg':
+            value = _to_number(self.eval(node[1], sheet, row, col))
+            return value if isinstance(value, ExcelError) else -value
+        if kind == 'pct':
+            value = _to_number(self.eval(node[1], sheet, row, col))
+            return value if isinstance(value, ExcelError) else value / 100
+        if kind == 'op':
+            op = node[1]
+            a = self.eval(node[2], sheet, row, col)
+            b = self.eval(node[3], sheet, row, col)
+            if op in _COMPARISONS:
+                return _compare(op, a, b)
+            if op == '&':
+                for v in (a, b):
+                    if isinstance(v, ExcelError):
+                        return v
+                    if isinstance(v, Area):
+                        raise Unsupported("range in concatenation")
+                return _to_text(a) + _to_text(b)
+            return _arithmetic(op, a, b)
+        return getattr(self, 'fn_' + node[1])(node[2], sheet, row, col)
+
+    def value(self, node, sheet: str, row: int, col: int):
+        """Evaluate an argument that must be a single value."""
+        value = self.eval(node, sheet, row, col)
+        if isinstance(value, Area):
+            if value.r1 == value.r2 and value.c1 == value.c2:
+                return value.sheet.get(value.r1, value.c1)
+            raise Unsupported("range used as a single value")
+        return value
+
+    def number(self, node, sheet: str, row: int, col: int):
+        return _to_number(self.value(node, sheet, row, col))
+
+    # --- aggregate functions ---
+
+    def _numbers(self, args, sheet: str, row: int, col: int):
+        """Numeric arguments of SUM-like functions: (list of arrays/floats, error)."""
+        parts = []
+        for arg in args:
+            value = self.eval(arg, sheet, row, col)
+            if isinstance(value, Area):
+                for c in range(value.c1, value.c2 + 1):
+                    nums = value.sheet.numbers.get(c)
+                    if nums is None or value.r1 >= len(nums):
+                        continue
+                    if value.sheet.has_errors(c, value.r1, value.r2):
+                        rows = np.flatnonzero(value.sheet.error_mask[c][value.r1:value.r2 + 1])
+                        return parts, value.sheet.others[c][int(rows[0]) + value.r1]
+                    chunk = nums[value.r1:value.r2 + 1]
+                    parts.append(chunk[~np.isnan(chunk)])
+                continue
+            if arg[0] == 'cell':
+                # A referenced cell counts only if it holds a number
+                if isinstance(value, ExcelError):
+                    return parts, value
+                if value.__class__ is float:
+                    parts.append(value)
+                continue
+            value = _to_number(value)
+            if isinstance(value, ExcelError):
+                return parts, value
+            parts.append(value)
+        return parts, None
+
+    def fn_SUM(self, args, sheet, row, col):
+        parts, error = self._numbers(args, sheet, row, col)
+        if error:
+            return error
+        return float(sum(float(np.sum(p)) if isinstance(p, np.ndarray) else p for p in parts))
+
+    def fn_COUNT(self, args, sheet, row, col):
+        parts, error = self._numbers(args, sheet, row, col)
+        return float(sum(len(p) if isinstance(p, np.ndarray) else 1 for p in parts))
+
+    def fn_AVERAGE(self, args, sheet, row, col):
+        parts, error = self._numbers(args, sheet, row, col)
+        if error:
+            return error
+        count = sum(len(p) if isinstance(p, np.ndarray) else 1 for p in parts)
+        if not count:
+            return DIV0
+        return self.fn_SUM(args, sheet, row, col) / count
+
+    def _extreme(self, args, sheet, row, col, pick):
+        parts, error = self._numbers(args, sheet, row, col)
+        if error:
+            return error
+        values = [float(pick(p)) if isinstance(p, np.ndarray) else p
+                  for p in parts if not isinstance(p, np.ndarray) or len(p)]
+        return float(pick(values)) if values else 0.0
+
+    def fn_MIN(self, args, sheet, row, col):
+        return self._extreme(args, sheet, row, col, np.min)
+
+    def fn_MAX(self, args, sheet, row, col):
+        return self._extreme(args, sheet, row, col, np.max)
+
+    # --- logical and rounding ---
+
+    def fn_IF(self, args, sheet, row, col):
+        if not 1 <= len(args) <= 3:
+            raise Unsupported("IF arguments")
+        condition = _to_bool(self.value(args[0], sheet, row, col))
+        if isinstance(condition, ExcelError):
+            return condition
+        if condition:
+            return self.value(args[1], sheet, row, col) if len(args) > 1 else True
+        return self.value(args[2], sheet, row, col) if len(args) > 2 else False
+
+    def fn_IFERROR(self, args, sheet, row, col):
+        if len(args) != 2:
+            raise Unsupported("IFERROR arguments")
+        value = self.value(args[0], sheet, row, col)
+        return self.value(args[1], sheet, row, col) if isinstance(value, ExcelError) else value
+
+    def fn_ROUND(self, args, sheet, row, col):
+        if len(args) != 2:
+            raise Unsupported("ROUND arguments")
+        x, digits = self.number(args[0], sheet, row, col), self.number(args[1], sheet, row, col)
+        for v in (x, digits):
+            if isinstance(v, ExcelError):
+                return v
+        return _round(x, int(digits))
+
+    def fn_ABS(self, args, sheet, row, col):
+        if len(args) != 1:
+            raise Unsupported("ABS arguments")
+        x = self.number(args[0], sheet, row, col)
+        return x if isinstance(x, ExcelError) else abs(x)
+
+    # --- conditional sums and lookups ---
+
+    def _area(self, node, sheet, row, col) -> Area:
+        value = self.eval(node, sheet, row, col)
+        if isinstance(value, ExcelError):
+            raise _AreaError(value)
+        if not isinstance(value, Area):
+            if node[0] == 'cell':
+                target_sheet, r, c, _, _ = _target(node, sheet, row, col)
+                return Area(self.sheets[target_sheet], r, c, r, c)
+            raise Unsupported("range expected")
+        return value
+
+    def fn_SUMIF(self, args, sheet, row, col):
+        if len(args) not in (2, 3):
+            raise Unsupported("SUMIF arguments")
+        try:
+            area = self._area(args[0], sheet, row, col)
+            sum_area = self._area(args[2], sheet, row, col) if len(args) == 3 else area
+        except _AreaError as e:
+            return e.error
+        criterion = self.value(args[1], sheet, row, col)
+        if isinstance(criterion, ExcelError):
+            return criterion
+        total = 0.0
+        height = area.r2 - area.r1
+        for j in range(area.c2 - area.c1 + 1):
+            rows = _matching_rows(area.sheet, area.c1 + j, area.r1, area.r2, criterion)
+            if not len(rows):
+                continue
+            c = sum_area.c1 + j
+            sum_rows = rows - area.r1 + sum_area.r1
+            if sum_area.sheet.has_errors(c, sum_area.r1, sum_area.r1 + height):
+                for r in sum_rows.tolist():
+                    value = sum_area.sheet.get(r, c)
+                    if isinstance(value, ExcelError):
+                        return value
+            nums = sum_area.sheet.numbers.get(c)
+            if nums is None:
+                continue
+            sum_rows = sum_rows[sum_rows < len(nums)]
+            total += float(np.nansum(nums[sum_rows]))
+        return total
+
+    def fn_VLOOKUP(self, args, sheet, row, col):
+        if len(args) not in (3, 4):
+            raise Unsupported("VLOOKUP arguments")
+        key = self.value(args[0], sheet, row, col)
+        try:
+            table = self._area(args[1], sheet, row, col)
+        except _AreaError as e:
+            return e.error
+        index = self.number(args[2], sheet, row, col)
+        exact = len(args) == 4 and not _to_bool(self.value(args[3], sheet, row, col))
+        for v in (key, index):
+            if isinstance(v, ExcelError):
+                return v
+        index = int(index)
+        if index < 1:
+            return VALUE
+        if index > table.c2 - table.c1 + 1:
+            return REF
+        found = _find_in_column(table.sheet, table.c1, table.r1, table.r2, key, exact)
+        if isinstance(found, ExcelError):
+            return found
+        return table.sheet.get(found, table.c1 + index - 1)
+
+    def fn_MATCH(self, args, sheet, row, col):
+        if len(args) not in (2, 3):
+            raise Unsupported("MATCH arguments")
+        key = self.value(args[0], sheet, row, col)
+        try:
+            area = self._area(args[1], sheet, row, col)
+        except _AreaError as e:
+            return e.error
+        match_type = self.number(args[2], sheet, row, col) if len(args) == 3 else 1.0
+        for v in (key, match_type):
+            if isinstance(v, ExcelError):
+                return v
+        if match_type < 0:
+            raise Unsupported("MATCH descending")
+        exact = match_type == 0
+        if area.c1 == area.c2:
+            found = _find_in_column(area.sheet, area.c1, area.r1, area.r2, key, exact)
+            return found if isinstance(found, ExcelError) else float(found - area.r1 + 1)
+        if area.r1 == area.r2:
+            values = [area.sheet.get(area.r1, c) for c in range(area.c1, area.c2 + 1)]
+            found = _find_in_list(values, key, exact)
+            return found if isinstance(found, ExcelError) else float(found + 1)
+        return NA
+
+    def fn_INDEX(self, args, sheet, row, col):
+        if len(args) not in (2, 3):
+            raise Unsupported("INDEX arguments")
+        try:
+            area = self._area(args[0], sheet, row, col)
+        except _AreaError as e:
+            return e.error
+        r = self.number(args[1], sheet, row, col)
+        c = self.number(args[2], sheet, row, col) if len(args) == 3 else None
+        for v in (r, c):
+            if isinstance(v, ExcelError):
+                return v
+        r = int(r)
+        if c is None:
+            if area.r1 == area.r2 and area.c1 != area.c2:
+                r, c = 1, r  # one-row range: the single index is a column
+            else:
+                c = 1
+        c = int(c)
+        if r < 1 or c < 1:
+            raise Unsupported("INDEX of a whole row or column")
+        if r > area.r2 - area.r1 + 1 or c > area.c2 - area.c1 + 1:
+            return REF
+        return area.sheet.get(area.r1 + r - 1, area.c1 + c - 1)
+
+
+_SKIPPED = object()
+
+
+class _AreaError(Exception):
+    def __init__(self, error):
+        self.error = error
+
+
+def _find_in_column(sheet: SheetValues, col: int, r1: int, r2: int, key, exact: bool):
+    """Row of `key` in sheet column rows r1..r2, or #N/A."""
+    if key is None:
+        raise Unsupported("blank lookup value")
+    if exact:
+        if isinstance(key, str) and ('*' in key or '?' in key):
+            raise Unsupported("wildcard lookup")
+        rows = sheet.lookup_index(col).get(_lookup_key(key), ())
+        i = bisect_left(rows, r1)
+        return rows[i] if i < len(rows) and rows[i] <= r2 else NA
+    # Approximate match: last number <= key in an ascending column
+    if key.__class__ is not float:
+        raise Unsupported("approximate lookup of a non-number")
+    nums = sheet.numbers.get(col)
+    if nums is None or r1 >= len(nums):
+        return NA
+    chunk = nums[r1:r2 + 1]
+    positions = np.flatnonzero(~np.isnan(chunk))
+    i = int(np.searchsorted(chunk[positions], key, side='right')) - 1
+    return NA if i < 0 else int(positions[i]) + r1
+
+
+def _find_in_list(values: list, key, exact: bool):
+    if key is None:
+        raise Unsupported("blank lookup value")
+    target = _lookup_key(key)
+    if exact:
+        for i, value in enumerate(values):
+            if value is not None and _lookup_key(value) == target:
+                return i
+        return NA
+    if key.__class__ is not float:
+        raise Unsupported("approximate lookup of a non-number")
+    found = NA
+    for i, value in enumerate(values):
+        if value.__class__ is float:
+            if value > key:
+                break
+            found = i
+    return found
+
+
+def _criterion(criterion):
+    """Split a SUMIF criterion into (operator, operand)."""
+    if criterion is None:
+        return '=', 0.0
+    if criterion.__class__ in (float, bool):
+        return '=', criterion
+    op, operand = _CRITERIA_RE.match(criterion).groups()
+    op = op or '='
+    try:
+        return op, float(operand)
+    except ValueError:
+        pass
+    if operand.upper() in ('TRUE', 'FALSE'):
+        return op, operand.upper() == 'TRUE'
+    if '*' in operand or '?' in operand or '~' in operand:
+        raise Unsupported("wildcard criterion")
+    return op, operand
+
+
+def _matching_rows(sheet: SheetValues, col: int, r1: int, r2: int, criterion):
+    """Rows r1..r2 of a column that meet a SUMIF criterion, as an int array."""
+    op, operand = _criterion(criterion)
+    nums = sheet.numbers.get(col)
+    if nums is None:
+        return np.zeros(0, dtype=np.int64)
+    hi = min(r2 + 1, len(nums))
+    chunk = nums[r1:hi]
+    if operand.__class__ is float:
+        with np.errstate(invalid='ignore'):
+            if op == '=':
+                mask = chunk == operand
+            elif op == '<>':
+                mask = ~(chunk == operand)
+            elif op == '<':
+                mask = chunk < operand
+            elif op == '>':
+                mask = chunk > operand
+            elif op == '<=':
+                mask = chunk <= operand
+            else:
+                mask = chunk >= operand
+        return np.flatnonzero(mask) + r1
+    if op not in ('=', '<>'):
+        raise Unsupported("text comparison criterion")
+    if operand == '':
+        blank = np.isnan(chunk) & ~sheet.other_mask[col][r1:hi]
+        return np.flatnonzero(blank if op == '=' else ~blank) + r1
+    rows = sheet.lookup_index(col).get(_lookup_key(operand), [])
+    matched = np.asarray(rows[bisect_left(rows, r1):bisect_right(rows, r2)], dtype=np.int64)
+    if op == '=':
+        return matched
+    mask = np.ones(len(chunk), dtype=bool)
+    mask[matched - r1] = False
+    return np.flatnonzero(mask) + r1
+
+
+# === ARRAY EVALUATION OF COPIED-DOWN BLOCKS ===
+
+class _VectorEvaluator:
+    """Evaluates one block (one formula copied down rows r0..r1 of a column) as arrays.
+
+    Only numeric, error-free inputs are handled; anything else raises
+    _NeedScalar and the block is evaluated cell by cell.
+    """
+
+    def __init__(self, sheets: dict, sheet: str, rows, col: int):
+        self.sheets = sheets
+        self.sheet = sheet
+        self.rows = rows
+        self.col = col
+
+    def eval(self, node):
+        kind = node[0]
+        if kind == 'num':
+            return node[1]
+        if kind == 'cell':
+            return self.cell(node)
+        if kind == 'neg':
+            return -self.numeric(self.eval(node[1]))
+        if kind == 'pct':
+            return self.numeric(self.eval(node[1])) / 100
+        if kind == 'op':
+            op = node[1]
+            a, b = self.eval(node[2]), self.eval(node[3])
+            if op in _COMPARISONS:
+                a, b = self.numeric(a), self.numeric(b)
+                return {'=': np.equal, '<>': np.not_equal, '<': np.less, '>': np.greater,
+                        '<=': np.less_equal, '>=': np.greater_equal}[op](a, b)
+            if op == '&':
+                raise _NeedScalar()
+            a, b = self.numeric(a), self.numeric(b)
+            if op == '+':
+                return a + b
+            if op == '-':
+                return a - b
+            if op == '*':
+                return a * b
+            if op == '/':
+                return a / b
+            if np.any((np.asarray(a) == 0) & (np.asarray(b) == 0)):
+                raise _NeedScalar()  # 0^0 is #NUM!
+            return np.power(a, b)
+        if kind == 'func':
+            method = getattr(self, 'fn_' + node[1], None)
+            if method is None:
+                raise _NeedScalar()
+            return method(node[2])
+        raise _NeedScalar()
+
+    @staticmethod
+    def numeric(value):
+        if isinstance(value, np.ndarray) and value.dtype == bool:
+            return value.astype(float)
+        if value.__class__ is bool:
+            return float(value)
+        return value
+
+    def _rows(self, r_abs: bool, r: int):
+        return r if r_abs else self.rows + r
+
+    def cell(self, node):
+        sheet = self.sheets[node[1] or self.sheet]
+        r_abs, r, c_abs, c = node[2:]
+        c = c if c_abs else self.col + c
+        rows = self._rows(r_abs, r)
+        lo = rows if r_abs else int(rows[0])
+        hi = rows if r_abs else int(rows[-1])
+        if lo < 1 or c < 1:
+            raise _NeedScalar()
+        nums = sheet.numbers.get(c)
+        if nums is None:
+            return 0.0
+        if hi >= len(nums):
+            sheet.ensure(c, hi + 1)
+            nums = sheet.numbers[c]
+        if sheet.other_mask[c][lo:hi + 1].any():
+            raise _NeedScalar()
+        values = nums[rows]
+        return np.nan_to_num(values) if isinstance(values, np.ndarray) else \
+            (0.0 if values != values else float(values))
+
+    def windows(self, node):
+        """Per-row [lo, hi] bounds and columns of an area argument."""
+        sheet = self.sheets[node[1] or self.sheet]
+        (ra1, r1, ca1, c1), (ra2, r2, ca2, c2) = node[2], node[3]
+        c1 = c1 if ca1 else self.col + c1
+        c2 = c2 if ca2 else self.col + c2
+        lo, hi = self._rows(ra1, r1), self._rows(ra2, r2)
+        if np.any(np.asarray(lo) < 1) or min(c1, c2) < 1 or np.any(np.asarray(hi) < np.asarray(lo)):
+            raise _NeedScalar()
+        return sheet, lo, hi, range(min(c1, c2), max(c1, c2) + 1)
+
+    def _window_totals(self, args, kind: str):
+        total = 0.0
+        for arg in args:
+            if arg[0] == 'area':
+                sheet, lo, hi, cols = self.windows(arg)
+                for c in cols:
+                    if c not in sheet.numbers:
+                        continue
+                    length = len(sheet.numbers[c])
+                    if sheet.has_errors(c, int(np.min(lo)), int(np.max(hi))):
+                        raise _NeedScalar()
+                    prefix = sheet.prefix(c, kind)
+                    total = total + prefix[np.minimum(hi, length - 1) + 1] - prefix[np.minimum(lo, length)]
+            elif arg[0] == 'cell' and kind == 'count':
+                raise _NeedScalar()  # counts depend on the referenced cells' types
+            else:
+                value = self.numeric(self.eval(arg))
+                total = total + (value if kind == 'sum' else 1.0)
+        return total
+
+    def fn_SUM(self, args):
+        return self._window_totals(args, 'sum')
+
+    def fn_AVERAGE(self, args):
+        if any(arg[0] == 'cell' for arg in args):
+            raise _NeedScalar()
+        count = self._window_totals(args, 'count')
+        if np.any(np.asarray(count) == 0):
+            raise _NeedScalar()
+        return self._window_totals(args, 'sum') / count
+
+    def _extreme(self, args, reduce, pick):
+        values = []
+        for arg in args:
+            if arg[0] == 'area':
+                sheet, lo, hi, cols = self.windows(arg)
+                if isinstance(lo, np.ndarray) or isinstance(hi, np.ndarray):
+                    raise _NeedScalar()  # moving window
+                chunks = []
+                for c in cols:
+                    nums = sheet.numbers.get(c)
+                    if nums is not None and lo < len(nums):
+                        if sheet.has_errors(c, lo, hi):
+                            raise _NeedScalar()
+                        chunk = nums[lo:hi + 1]
+                        chunks.append(chunk[~np.isnan(chunk)])
+                chunk = np.concatenate(chunks) if chunks else np.zeros(0)
+                if len(chunk):
+                    values.append(float(pick(chunk)))
+            else:
+                if arg[0] == 'cell':
+                    raise _NeedScalar()  # blank cells are skipped, not read as 0
+                values.append(self.numeric(self.eval(arg)))
+        if not values:
+            return 0.0
+        return reduce.reduce(np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in values]))
+
+    def fn_MIN(self, args):
+        return self._extreme(args, np.minimum, np.min)
+
+    def fn_MAX(self, args):
+        return self._extreme(args, np.maximum, np.max)
+
+    def fn_IF(self, args):
+        if len(args) != 3:
+            raise _NeedScalar()
+        condition = self.eval(args[0])
+        if isinstance(condition, np.ndarray) and condition.dtype != bool:
+            condition = condition != 0
+        elif condition.__class__ is float:
+            condition = condition != 0
+        a, b = self.numeric(self.eval(args[1])), self.numeric(self.eval(args[2]))
+        if isinstance(a, np.ndarray) and a.dtype == bool or isinstance(b, np.ndarray) and b.dtype == bool:
+            raise _NeedScalar()
+        with np.errstate(all='ignore'):
+            return np.where(condition, a, b)
+
+    def fn_IFERROR(self, args):
+        if len(args) != 2:
+            raise _NeedScalar()
+        value = self.eval(args[0])
+        if not np.all(np.isfinite(value)):
+            raise _NeedScalar()
+        return value
+
+    def fn_ABS(self, args):
+        if len(args) != 1:
+            raise _NeedScalar()
+        return np.abs(self.numeric(self.eval(args[0])))
+
+    def fn_ROUND(self, args):
+        if len(args) != 2 or args[1][0] != 'num':
+            raise _NeedScalar()
+        digits = int(args[1][1])
+        scaled = np.abs(self.numeric(self.eval(args[0]))) * 10.0 ** digits
+        fraction = scaled - np.floor(scaled)
+        if np.any(np.abs(fraction - 0.5) < 1e-6):
+            raise _NeedScalar()  # a tie: round on the decimal repr instead
+        x = self.numeric(self.eval(args[0]))
+        return np.sign(x) * np.floor(scaled + 0.5) / 10.0 ** digits
+
+
+# === BLOCKS, ORDERING AND COMPARISON ===
+
+class _Block:
+    __slots__ = ("sheet", "col", "r0", "r1", "tree", "cells", "order")
+
+    def __init__(self, sheet: str, col: int, row: int, tree, cell: tuple):
+        self.sheet, self.col = sheet, col
+        self.r0 = self.r1 = row
+        self.tree = tree
+        self.cells = [cell]  # (address, formula)
+        self.order = 1  # 1: rows top-down, -1: bottom-up
+
+    def targets(self):
+        """Rectangles read by the block, covering all of its rows."""
+        for leaf in _references(self.tree):
+            first = _target(leaf, self.sheet, self.r0, self.col)
+            last = _target(leaf, self.sheet, self.r1, self.col)
+            yield (first[0], min(first[1], last[1]), min(first[2], last[2]),
+                   max(first[3], last[3]), max(first[4], last[4])), leaf
+
+
+def _self_order(block: _Block, leaf) -> int:
+    """Evaluation order that lets a block read its own earlier cells, or 0."""
+    first = _target(leaf, block.sheet, block.r0, block.col)
+    last = _target(leaf, block.sheet, block.r1, block.col)
+    if first[3] < block.r0 and last[3] < block.r1:
+        return 1   # reads rows above: evaluate top-down
+    if first[1] > block.r0 and last[1] > block.r1:
+        return -1  # reads rows below: evaluate bottom-up
+    return 0
+
+
+def _values_agree(cached, recalculated) -> bool:
+    if cached.__class__ is float and recalculated.__class__ is float:
+        return abs(cached - recalculated) <= REL_TOLERANCE * max(1.0, abs(cached), abs(recalculated))
+    if cached.__class__ is bool or recalculated.__class__ is bool:
+        return cached is recalculated
+    return cached == recalculated
+
+
+def _display(value):
+    return str(value) if isinstance(value, ExcelError) else value
+
+
+class Recalculator:
+    """Recalculates a workbook's formulas and compares them with the cached values."""
+
+    def __init__(self, sheets: dict):
+        self.sheets = sheets
+        self.evaluator = Evaluator(sheets)
+        self.stats = {
+            "formulas": 0,
+            "recalculated": 0,
+            "vectorized": 0,
+            "unsupported": 0,
+            "circular": 0,
+            "not_cached": 0,
+            "stale": 0,
+            "downstream": 0,
+        }
+        self.unsupported_functions = defaultdict(int)
+        self.stale_cells = defaultdict(list)  # (sheet, col) -> sorted rows whose value changed
+        self.findings = []
+
+    def build_blocks(self, formulas) -> list:
+        """Compile formulas and group copies running down a column into blocks."""
+        sheet_keys = set(self.sheets)
+        compiled = {}  # R1C1 signature -> tree or Unsupported
+        cells = []
+        for formula_info in formulas:
+            self.stats["formulas"] += 1
+            formula = formula_info["formula"]
+            parsed = split_cell_address(formula_info["cell"])
+            if parsed is None or formula_info.get("length", len(formula)) > MAX_FORMULA_LENGTH:
+                self.stats["unsupported"] += 1
+                continue
+            sheet_name, row, col = parsed
+            sheet = sheet_key(sheet_name)
+            if sheet not in self.sheets:
+                self.stats["unsupported"] += 1
+                continue
+            signature = parse_formula(formula).signature(row, col)
+            tree = compiled.get(signature)
+            if tree is None:
+                try:
+                    tree = compile_formula(formula, row, col, sheet_keys)
+                except Unsupported as e:
+                    tree = e
+                compiled[signature] = tree
+            if isinstance(tree, Unsupported):
+                self.stats["unsupported"] += 1
+                name = str(tree)
+                if name in SUPPORTED_FUNCTIONS or not name.isupper():
+                    name = "other"
+                self.unsupported_functions[name] += 1
+                continue
+            cells.append((sheet, col, row, signature, tree, formula_info["cell"], formula))
+
+        cells.sort(key=lambda c: c[:3])
+        blocks = []
+        last = None
+        for sheet, col, row, signature, tree, address, formula in cells:
+            if last and (last[0], last[1], last[2] + 1, last[3]) == (sheet, col, row, signature):
+                block = blocks[-1]
+                block.r1 = row
+                block.cells.append((address, formula))
+            else:
+                blocks.append(_Block(sheet, col, row, tree, (address, formula)))
+            last = (sheet, col, row, signature)
+        return blocks
+
+    def order_blocks(self, blocks: list) -> list:
+        """Blocks in dependency order; blocks on a cycle are left out."""
+        by_column = defaultdict(list)  # (sheet, col) -> [(r0, r1, block id)]
+        for i, block in enumerate(blocks):
+            by_column[(block.sheet, block.col)].append((block.r0, block.r1, i))
+        starts = {key: [entry[0] for entry in entries] for key, entries in by_column.items()}
+        sheet_cols = defaultdict(list)
+        for sheet, col in sorted(by_column):
+            sheet_cols[sheet].append(col)
+
+        dependents = [set() for _ in blocks]
+        indegree = [0] * len(blocks)
+        self_orders = defaultdict(set)  # block id -> orders its reads of itself need
+        for i, block in enumerate(blocks):
+            for (sheet, r1, c1, r2, c2), leaf in block.targets():
+                cols = sheet_cols.get(sheet, [])
+                for col in cols[bisect_left(cols, c1):bisect_right(cols, c2)]:
+                    entries = by_column[(sheet, col)]
+                    k = max(bisect_right(starts[(sheet, col)], r1) - 1, 0)
+                    while k < len(entries) and entries[k][0] <= r2:
+                        lo, hi, j = entries[k]
+                        k += 1
+                        if hi < r1:
+                            continue
+                        if j == i:
+                            self_orders[i].add(_self_order(block, leaf))
+                        elif i not in dependents[j]:
+                            dependents[j].add(i)
+                            indegree[i] += 1
+
+        # A block reading itself in both directions, or its own row, is a cycle
+        cyclic = set()
+        for i, orders in self_orders.items():
+            if len(orders) == 1 and 0 not in orders:
+                blocks[i].order = orders.pop()
+            else:
+                cyclic.add(i)
+
+        ready = [i for i in range(len(blocks)) if not indegree[i]]
+        ordered = []
+        while ready:
+            i = ready.pop()
+            if i in cyclic:
+                continue  # dependents of a self-referencing block stay unreached
+            ordered.append(blocks[i])
+            for j in dependents[i]:
+                indegree[j] -= 1
+                if not indegree[j]:
+                    ready.append(j)
+        self.stats["circular"] += sum(len(b.cells) for b in blocks) - sum(len(b.cells) for b in ordered)
+        return ordered
+
+    def run(self, formulas) -> tuple:
+        for block in self.order_blocks(self.build_blocks(formulas)):
+            self.evaluate_block(block)
+        self.stats["unsupported_functions"] = dict(
+            sorted(self.unsupported_functions.items(), key=lambda x: -x[1])[:10])
+        return self.findings, self.stats
+
+    def evaluate_block(self, block: _Block):
+        sheet = self.sheets[block.sheet]
+        rows = np.arange(block.r0, block.r1 + 1)
+        cached = [sheet.get(r, block.col) for r in rows.tolist()]
+        results = None
+        if len(rows) >= VECTOR_MIN_CELLS and not self._reads_itself(block):
+            try:
+                with np.errstate(all='ignore'):
+                    values = _VectorEvaluator(self.sheets, block.sheet, rows, block.col).eval(block.tree)
+                values = np.broadcast_to(values, rows.shape)
+                if values.dtype != bool and np.all(np.isfinite(values)):
+                    results = values.astype(float)
+            except _NeedScalar:
+                results = None
+
+        if results is not None:
+            sheet.set_numbers(rows, block.col, results)
+            self.stats["vectorized"] += len(rows)
+            results = results.tolist()
+        else:
+            results = [None] * len(rows)
+            positions = range(len(rows)) if block.order == 1 else range(len(rows) - 1, -1, -1)
+            for i in positions:
+                row = block.r0 + i
+                try:
+                    value = self.evaluator.value(block.tree, block.sheet, row, block.col)
+                except Unsupported:
+                    self.stats["unsupported"] += 1
+                    self.unsupported_functions["other"] += 1
+                    results[i] = _SKIPPED  # keeps its cached value
+                    continue
+                if value is None:
+                    value = 0.0  # a formula reading a blank cell shows 0
+                sheet.set(row, block.col, value)
+                results[i] = value
+
+        for i, (value, old) in enumerate(zip(results, cached)):
+            if value is _SKIPPED:
+                continue
+            self.stats["recalculated"] += 1
+            if old is None:
+                self.stats["not_cached"] += 1
+                continue
+            if _values_agree(old, value):
+                continue
+            self.report(block, block.r0 + i, i, old, value)
+
+    def _reads_itself(self, block: _Block) -> bool:
+        for (sheet, r1, c1, r2, c2), _ in block.targets():
+            if sheet == block.sheet and c1 <= block.col <= c2 and r1 <= block.r1 and r2 >= block.r0:
+                return True
+        return False
+
+    def _precedents_stale(self, block: _Block, row: int) -> bool:
+        for leaf in _references(block.tree):
+            sheet, r1, c1, r2, c2 = _target(leaf, block.sheet, row, block.col)
+            for (stale_sheet, col), rows in self.stale_cells.items():
+                if stale_sheet == sheet and c1 <= col <= c2:
+                    i = bisect_left(rows, r1)
+                    if i < len(rows) and rows[i] <= r2:
+                        return True
+        return False
+
+    def report(self, block: _Block, row: int, i: int, cached, recalculated):
+        downstream = self._precedents_stale(block, row)
+        insort(self.stale_cells[(block.sheet, block.col)], row)
+        if downstream:
+            # Explained by a stale value upstream, which is reported itself
+            self.stats["downstream"] += 1
+            return
+        self.stats["stale"] += 1
+        address, formula = block.cells[i]
+        sheet_name = self.sheets[block.sheet].name
+        difference = None
+        if cached.__class__ is float and recalculated.__class__ is float:
+            difference = recalculated - cached
+        self.findings.append({
+            "type": "stale_cached_value",
+            "severity": "high",
+            "cell": address,
+            "sheet": sheet_name,
+            "column": get_column_letter(block.col),
+            "row": row,
+            "formula": formula,
+            "cached_value": _display(cached),
+            "recalculated_value": _display(recalculated),
+            "difference": difference,
+            "narrative": f"STALE VALUE: {address} shows {_describe(cached)} but its formula "
+                         f"'{formula[:60]}' evaluates to {_describe(recalculated)} from the workbook's "
+                         f"own inputs. The saved result no longer matches the formula, which points to "
+                         f"manual calculation mode, a broken calc chain, or an edited cached value."
+        })
+
+
+def _describe(value) -> str:
+    if value.__class__ is float:
+        return f"{value:,.2f}"
+    if isinstance(value, ExcelError) or value.__class__ is bool:
+        return str(value).upper()
+    return f"'{value}'"
+
+
+def find_stale_cached_values(data_wb, formulas) -> tuple:
+    """Recalculate `formulas` against a data-only workbook's cached values.
+
+    `data_wb` is a streaming workbook opened with data_only=True;
+    `formulas` are formula records ({"cell", "formula", "length"}) from the
+    formula scan. Returns (findings, summary). A finding is reported only
+    where the cell's own inputs agree with their cached values, so one
+    stale cell isn't repeated for every formula downstream of it.
+    """
+    if not HAS_NUMPY:
+        return [], {"error": "NumPy is required for recalculation"}
+    recalculator = Recalculator(load_values(data_wb))
+    return recalculator.run(formulas)
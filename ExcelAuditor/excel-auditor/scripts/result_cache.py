@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for extractor results.
+
+Entries are keyed by the workbook's SHA-256, its file extension (which picks
+the reader and the reported format), the analyzer version and the extraction
+options, so a re-uploaded workbook is served from disk whatever its name, and
+any change to the analyzer code invalidates old
+entries on its own. Results are stored gzip-compressed, one file per entry,
+and the cache is kept under a size limit by evicting the least recently used
+entries (an entry's mtime is bumped on every hit).
+
+Usage:
+    python result_cache.py stats [--cache-dir DIR]
+    python result_cache.py clear [--cache-dir DIR]
+    python result_cache.py get <excel_file> [--cache-dir DIR] [--max-cells N]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from audit_workbook import audit_workbook
+from extract_formulas import extract_formulas_dispatch
+from extract_structure import extract_structure
+from spill_store import json_default
+
+ANALYZER_VERSION = "1.1"
+DEFAULT_CACHE_DIR = os.environ.get(
+    "EXCEL_AUDITOR_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "excel-auditor"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ENTRY_SUFFIX = ".json.gz"
+
+# Modules whose code determines extractor output
+_ANALYZER_MODULES = ("audit_workbook.py", "extract_structure.py", "extract_formulas.py", "formula_cache.py",
+                     "formula_store.py", "dependency_graph.py", "xlsx_reader.py", "xls_reader.py",
+                     "recalc_engine.py", "calc_cost.py")
+
+
+def _analyzer_fingerprint() -> str:
+    digest = hashlib.sha256(ANALYZER_VERSION.encode('utf-8'))
+    here = Path(__file__).resolve().parent
+    for name in _ANALYZER_MODULES:
+        path = here / name
+        if path.exists():
+            digest.update(path.read_bytes())
+    return f"{ANALYZER_VERSION}+{digest.hexdigest()[:12]}"
+
+
+ANALYZER_FINGERPRINT = _analyzer_fingerprint()
+
+
+def file_sha256(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded, gzip-compressed, on-disk LRU of extractor results."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hashes = {}  # (path, size, mtime_ns) -> sha256
+
+    def workbook_hash(self, filepath: str) -> str:
+        """SHA-256 of a workbook, computed once per unchanged file."""
+        st = os.stat(filepath)
+        key = (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(filepath)
+        return self._hashes[key]
+
+    def key(self, filepath: str, analyzer: str, options: dict = None) -> str:
+        # The extension decides the reader, format and support_level, so the same bytes
+        # under .xlsx and .xlsm are separate entries
+        suffix = Path(filepath).suffix.lower()
+        spec = json.dumps([self.workbook_hash(filepath), suffix, ANALYZER_FINGERPRINT, analyzer, options or {}],
+                          sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(spec.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / (key + ENTRY_SUFFIX)
+
+    def get(self, key: str):
+        """Stored result for a key, or None."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, EOFError, ValueError):
+            # Missing, evicted by another process, or a torn write
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                f.write(json.dumps(result, separators=(',', ':'), default=json_default).encode('utf-8'))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self.evict()
+
+    def _entries(self) -> list:
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for path in self.cache_dir.glob("*/*" + ENTRY_SUFFIX):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total <= self.max_bytes:
+            return removed
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for _, _, path in entries:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        return len(entries)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "cache_dir": str(self.cache_dir),
+            "analyzer_version": ANALYZER_FINGERPRINT,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    def cached(self, filepath: str, analyzer: str, options: dict, compute):
+        """Return the cached result of compute(), computing and storing it on a miss.
+
+        Results carrying an "error", at the top level or in one of their
+        reports, are not stored: the failure may be transient (a locked or
+        half-written file).
+        """
+        key = self.key(filepath, analyzer, options)
+        result = self.get(key)
+        if result is not None:
+            # Same content may arrive under another name
+            for report in _reports(result):
+                if "filename" in report:
+                    report["filename"] = Path(filepath).name
+            return result
+        result = compute()
+        if not any(report.get("error") for report in _reports(result)):
+            self.put(key, result)
+        return result
+
+
+def _reports(result: dict) -> list:
+    """`result` and the reports nested in it (audit_workbook's structure and formulas)."""
+    return [result] + [value for value in result.values() if isinstance(value, dict)]
+
+
+def cached_extract_structure(filepath: str, cache: ResultCache) -> dict:
+    return cache.cached(filepath, "structure", {}, lambda: extract_structure(filepath))
+
+
+def cached_extract_formulas(filepath: str, cache: ResultCache, max_cells: int = None,
+                            backend: str = "openpyxl", jobs: int = 1) -> dict:
+    # Backends and job counts produce the same result (has_vba included, see
+    # test_audit_workbook.py), so only max_cells is keyed
+    return cache.cached(filepath, "formulas", {"max_cells": max_cells},
+                        lambda: extract_formulas_dispatch(filepath, max_cells, backend=backend, jobs=jobs))
+
+
+def cached_audit_workbook(filepath: str, cache: ResultCache, max_cells: int = None,
+                          backend: str = "openpyxl", jobs: int = 1) -> dict:
+    """audit_workbook's structure and formula reports, cached as one entry from one read."""
+    return cache.cached(filepath, "audit", {"max_cells": max_cells},
+                        lambda: audit_workbook(filepath, max_cells, backend=backend, jobs=jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or use the extractor result cache.")
+    parser.add_argument("command", choices=["stats", "clear", "get"])
+    parser.add_argument("filepath", nargs="?", help="Excel file (for get)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Cache size limit in MB (default 512)")
+    parser.add_argument("--max-cells", type=int, default=0,
+                        help="Formula scan budget in cells; 0 (the default) scans every cell")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir, args.max_mb * 1024 * 1024)
+    if args.command == "stats":
+        result = cache.stats()
+    elif args.command == "clear":
+        result = {"removed": cache.clear()}
+    else:
+        if not args.filepath:
+            parser.error("get needs an Excel file")
+        audit = cached_audit_workbook(args.filepath, cache, args.max_cells or None)
+        result = {"structure": audit["structure"], "formulas": audit["formulas"], "cache": cache.stats()}
+    json.dump(result, sys.stdout, indent=2, default=json_default)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Disk spill for large intermediate audit results.
+
+A full-coverage audit of a million-cell workbook produces formula lists far
+larger than the rest of the report. A `MemoryBudget` is the process RSS
+limit past which such lists move to an anonymous temp file: formula_store's
+`FormulaList` spills its compact parts against it, and `SpillList` is an
+append-only sequence that does the same for arbitrary items, in pickled
+chunks. Iteration replays the spilled chunks, then the in-memory tail, in
+append order.
+
+`dump_json` writes a report containing such lazy sequences, at any depth of
+nested dicts, item by item, producing the same text as
+`json.dump(..., indent=2)`; `json_default` lets compact `json.dumps` calls
+serialize them too (materializing the list while it is written).
+"""
+
+import json
+import os
+import pickle
+import tempfile
+from collections.abc import Sequence
+
+# RSS is read with psutil when available, else from /proc (Linux)
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+CHECK_INTERVAL = 4096  # appends between RSS checks
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or None if unknown."""
+    if HAS_PSUTIL:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryBudget:
+    """RSS limit shared by the SpillLists of one audit."""
+
+    def __init__(self, limit_mb: int):
+        self.limit = limit_mb * 1024 * 1024
+        self.spilled_items = 0
+        self._ticks = 0
+
+    def exceeded(self) -> bool:
+        """Rate-limited check; True once every CHECK_INTERVAL appends while over budget."""
+        self._ticks += 1
+        if self._ticks < CHECK_INTERVAL:
+            return False
+        self._ticks = 0
+        return self.over_limit()
+
+    def over_limit(self) -> bool:
+        """Immediate check, for callers that add items in large batches."""
+        rss = current_rss()
+        return rss is not None and rss > self.limit
+
+
+class SpillList:
+    """Append-only sequence that spills to a temp file under memory pressure.
+
+    Pickles as a plain list, so scans sent between processes or stored in
+    manifests carry their items rather than a file handle.
+    """
+
+    def __init__(self, budget: MemoryBudget = None, items=()):
+        self.budget = budget
+        self._items = list(items)
+        self._file = None
+        self._spilled = 0
+
+    def append(self, item):
+        self._items.append(item)
+        if self.budget is not None and self.budget.exceeded():
+            self.spill()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def spill(self):
+        """Move the in-memory items to disk."""
+        if not self._items:
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="excel-auditor-spill-")
+        self._file.seek(0, os.SEEK_END)
+        pickle.dump(self._items, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spilled += len(self._items)
+        if self.budget is not None:
+            self.budget.spilled_items += len(self._items)
+        self._items = []
+
+    @property
+    def spilled(self) -> int:
+        """Number of items currently on disk."""
+        return self._spilled
+
+    def __len__(self):
+        return self._spilled + len(self._items)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        if self._file is not None:
+            end = self._file.seek(0, os.SEEK_END)
+            pos = 0
+            while pos < end:
+                self._file.seek(pos)
+                chunk = pickle.load(self._file)
+                pos = self._file.tell()
+                yield from chunk
+        yield from list(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if self._spilled <= index < len(self):
+            return self._items[index - self._spilled]
+        for i, item in enumerate(self):
+            if i == index:
+                return item
+        raise IndexError("SpillList index out of range")
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._items = []
+        self._spilled = 0
+
+    def __del__(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _lazy_sequence(value) -> bool:
+    """SpillLists and other list-like containers json cannot write natively."""
+    return isinstance(value, SpillList) or (
+        isinstance(value, Sequence) and not isinstance(value, (list, tuple, str, bytes)))
+
+
+def json_default(obj):
+    """`default=` hook for json: lazy sequences as lists, anything else as str."""
+    if _lazy_sequence(obj):
+        return list(obj)
+    return str(obj)
+
+
+def _indent_json(value, indent: int, level: int) -> str:
+    text = json.dumps(value, indent=indent, default=json_default)
+    # JSON strings never contain raw newlines, so this only re-indents structure
+    return text.replace('\n', '\n' + ' ' * (indent * level))
+
+
+def _holds_lazy(value) -> bool:
+    return _lazy_sequence(value) or (isinstance(value, dict) and any(_holds_lazy(v) for v in value.values()))
+
+
+def _write_json(value, fp, indent: int, level: int):
+    if not _holds_lazy(value) or not value:
+        fp.write(_indent_json(value if not _lazy_sequence(value) else [], indent, level))
+        return
+    pad = ' ' * (indent * (level + 1))
+    if isinstance(value, dict):
+        fp.write('{')
+        for i, (key, item) in enumerate(value.items()):
+            fp.write((',' if i else '') + '\n' + pad + json.dumps(str(key)) + ': ')
+            _write_json(item, fp, indent, level + 1)
+        fp.write('\n' + ' ' * (indent * level) + '}')
+    else:
+        fp.write('[')
+        for i, item in enumerate(value):
+            fp.write((',' if i else '') + '\n' + pad + _indent_json(item, indent, level + 1))
+        fp.write('\n' + ' ' * (indent * level) + ']')
+
+
+def dump_json(result: dict, fp, indent: int = 2):
+    """json.dump(result, fp, indent=indent), streaming lazy sequences item by item."""
+    _write_json(result, fp, indent, 0)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite portfolio index.
+
+Run with: python test_audit_index.py
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from openpyxl import Workbook
+
+from audit_index import AuditIndex, iter_findings, parse_since
+from audit_workbook import audit_workbook
+
+OPTIONS = {"max_cells": 50000, "backend": "xml"}
+
+
+def save_model(path: str, very_hidden: bool = False, override: bool = False):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Model"
+    ws.append(["Units", "Price", "Revenue"])
+    for r in range(2, 31):
+        ws.append([r, 2.5, f"=IFERROR(A{r}*B{r},0)"])
+    if override:
+        ws["C15"] = 1000
+    ws["D2"] = "=[1]Rates!A1"
+    if very_hidden:
+        wb.create_sheet("Secret").sheet_state = "veryHidden"
+    wb.save(path)
+
+
+class AuditIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "drive")
+        os.makedirs(self.root)
+        save_model(self.path("clean.xlsx"))
+        save_model(self.path("hidden.xlsx"), very_hidden=True, override=True)
+        self.index = AuditIndex(os.path.join(self.tmp.name, "index.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def test_incremental_scan(self):
+        counts = self.index.scan([self.root], OPTIONS)
+        self.assertEqual((counts["files"], counts["audited"], counts["errors"]), (2, 2, 0))
+        self.assertEqual(self.index.scan([self.root], OPTIONS)["unchanged"], 2)
+
+        # A copy and a touched file are relinked by hash; changed content and a new budget are audited
+        shutil.copy(self.path("hidden.xlsx"), self.path("copy.xlsx"))
+        os.utime(self.path("clean.xlsx"), (time.time() + 5, time.time() + 5))
+        counts = self.index.scan([self.root], OPTIONS)
+        self.assertEqual((counts["unchanged"], counts["relinked"], counts["audited"]), (1, 2, 0))
+        save_model(self.path("clean.xlsx"), override=True)
+        self.assertEqual(self.index.scan([self.root], OPTIONS)["audited"], 1)
+        counts = self.index.scan([self.root], {**OPTIONS, "max_cells": None})
+        self.assertEqual((counts["audited"], counts["relinked"]), (2, 1))  # one audit per content
+        stats = self.index.stats()
+        self.assertEqual((stats["files"], stats["workbooks"]), (3, 3))  # the old clean.xlsx content remains
+
+        os.remove(self.path("copy.xlsx"))
+        self.assertEqual(self.index.prune(), {"files_removed": 1, "workbooks_removed": 1})
+        with open(self.path("broken.xlsx"), "w") as f:
+            f.write("not a zip")
+        self.assertEqual(self.index.scan([self.root], OPTIONS)["errors"], 1)
+        self.assertEqual(self.index.scan([self.root], OPTIONS)["audited"], 1)  # failures are retried
+
+    def test_query(self):
+        self.index.scan([self.root], OPTIONS)
+        rows = self.index.query(very_hidden=True, finding="hardcoded_override", severity="high",
+                                since=parse_since("30d"))
+        self.assertEqual([os.path.basename(r["path"]) for r in rows], ["hidden.xlsx"])
+        self.assertEqual(rows[0]["matches"], 1)
+        self.assertEqual(len(self.index.query(functions=["iferror"])), 2)
+        self.assertEqual(self.index.query(functions=["IFERROR", "VLOOKUP"]), [])
+        self.assertEqual(len(self.index.query(broken_links=True)), 2)
+        self.assertEqual(self.index.query(since=parse_since("2999-01-01")), [])
+        self.assertEqual(self.index.sql("SELECT COUNT(*) AS n FROM sheets WHERE visibility = 'veryHidden'"),
+                         [{"n": 1}])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.index.sql("DELETE FROM files")
+
+    def test_index_results(self):
+        audit = audit_workbook(self.path("hidden.xlsx"))
+        workbook_id = self.index.index_workbook(self.path("hidden.xlsx"), audit["structure"], audit["formulas"])
+        self.assertEqual(self.index.index_workbook(self.path("hidden.xlsx"), audit["structure"], audit["formulas"]),
+                         workbook_id)
+        findings = self.index.sql("SELECT type, severity, sheet, cell FROM findings WHERE workbook_id = ?",
+                                  (workbook_id,))
+        self.assertEqual(len(findings), len(list(iter_findings(audit["formulas"]))))
+        self.assertIn({"type": "hardcoded_override", "severity": "high", "sheet": "Model",
+                       "cell": "Model!C15"}, findings)
+        self.assertIn("broken_external_link", [f["type"] for f in findings])
+        links = self.index.sql("SELECT link_index, status, formula_count FROM external_links")
+        self.assertEqual(links, [{"link_index": 1, "status": "missing", "formula_count": 1}])
+        workbook = self.index.sql("SELECT risk_level, risk_score, sheet_count, analyzer FROM workbooks")[0]
+        self.assertEqual(workbook["risk_score"], audit["formulas"]["risk_assessment"]["workbook_score"])
+        self.assertEqual(workbook["sheet_count"], 2)
+        self.assertIsNone(workbook["analyzer"])  # re-audited by the next scan
+
+        indexed = self.index.ingest([{"file": self.path("clean.xlsx"), "status": "timeout", "error": "Timed out"},
+                                     {"file": self.path("gone.xlsx"), "status": "ok"}])
+        self.assertEqual(indexed, 1)
+        self.assertEqual(self.index.sql("SELECT error FROM workbooks WHERE error IS NOT NULL"),
+                         [{"error": "Timed out"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
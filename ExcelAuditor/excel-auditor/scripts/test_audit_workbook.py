@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-pass structure and formula audit.
+
+Run with: python test_audit_workbook.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+from openpyxl.worksheet.table import Table
+
+from audit_workbook import audit_workbook
+from extract_formulas import extract_formulas_dispatch
+from extract_structure import extract_structure
+from test_extract_structure import add_parts
+
+
+class AuditWorkbookTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Model"
+        ws.append(["Units", "Price", "Revenue", "Note"])
+        for r in range(2, 61):
+            ws.append([r, 2.5, f"=A{r}*B{r}", "x" if r % 7 == 0 else None])
+        ws["C30"] = 123  # hardcoded override in a formula column
+        ws["F2"] = "=[1]Rates!A1*2"
+        ws.freeze_panes = "B2"
+        ws.auto_filter.ref = "A1:D60"
+        for r in range(62, 66):
+            ws.merge_cells(f"A{r}:B{r}")
+        ws.add_table(Table(displayName="Sales", ref="A1:D60"))
+        inputs = wb.create_sheet("Inputs")
+        inputs.sheet_state = "hidden"
+        inputs["A1"] = "Rate"
+        inputs["B1"] = 0.1
+        wb.create_sheet("Empty")
+        self.wb = wb
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_separate_extractors(self):
+        self.wb.save(self.path)
+        for backend in ("xml", "openpyxl"):
+            result = audit_workbook(self.path, backend=backend)
+            self.assertEqual(result["structure"], extract_structure(self.path))
+            self.assertEqual(result["formulas"], extract_formulas_dispatch(self.path, backend=backend))
+        model = result["structure"]["sheets"][0]
+        self.assertEqual((model["freeze_panes"], model["has_filters"], model["merged_cells_count"]),
+                         ("B2", True, 4))
+        self.assertEqual(result["structure"]["tables"][0]["name"], "Sales")
+        self.assertEqual(result["structure"]["external_links"], [])  # no link part behind [1]
+        self.assertEqual(result["formulas"]["external_references"][0]["status"], "missing")
+
+    def test_has_vba_reaches_risk_score(self):
+        self.wb.save(self.path)
+        add_parts(self.path, vba=True)
+        result = audit_workbook(self.path, backend="xml")
+        self.assertTrue(result["structure"]["has_vba"])
+        self.assertIn("Contains VBA macros", result["structure"]["summary"]["risk_flags"])
+        risk = result["formulas"]["risk_assessment"]
+        self.assertIn("Contains VBA macros (+10)", risk["risk_factors"])
+        # The standalone extractor reads has_vba from the same package
+        self.assertEqual(extract_formulas_dispatch(self.path, backend="xml")["risk_assessment"], risk)
+
+    def test_jobs_and_fallback(self):
+        self.wb.save(self.path)
+        serial = audit_workbook(self.path, max_cells=100, backend="xml")
+        parallel = audit_workbook(self.path, max_cells=100, backend="xml", jobs=2)
+        self.assertEqual(serial, parallel)
+
+        broken = os.path.join(self.tmp.name, "broken.xlsx")
+        with open(broken, "wb") as f:
+            f.write(b"not a zip")
+        result = audit_workbook(broken)
+        self.assertIn("error", result["formulas"])
+        self.assertIn("error", result["structure"])
+        other = audit_workbook(os.path.join(self.tmp.name, "notes.ods"))
+        self.assertEqual(other["structure"]["support_level"], "unsupported")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for batch_audit.py: workbook discovery and failure isolation.
+
+Run with: python test_batch_audit.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+import batch_audit
+from batch_audit import audit_file, find_workbooks, run_batch
+from test_extract_structure import add_parts
+
+OPTIONS = {"max_cells": 50000, "backend": "openpyxl"}
+
+
+class BatchAuditTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, "sub"))
+        for name in ("a.xlsx", os.path.join("sub", "b.xlsx")):
+            wb = Workbook()
+            wb.active["A1"] = 1
+            wb.active["A2"] = "=A1*2"
+            wb.save(os.path.join(root, name))
+        with open(os.path.join(root, "broken.xlsx"), "w") as f:
+            f.write("not a zip")
+        for name in ("~$a.xlsx", "notes.txt"):
+            open(os.path.join(root, name), "w").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_workbooks(self):
+        root = self.tmp.name
+        expected = [os.path.join(root, "a.xlsx"), os.path.join(root, "broken.xlsx"),
+                    os.path.join(root, "sub", "b.xlsx")]
+        self.assertEqual(find_workbooks([root]), expected)
+        self.assertEqual(find_workbooks([os.path.join(root, "**", "*.xlsx"), os.path.join(root, "a.xlsx")]),
+                         expected)
+
+    def test_failures_are_reported_inline(self):
+        files = find_workbooks([self.tmp.name])
+        records = {os.path.basename(r["file"]): r for r in run_batch(files, OPTIONS, jobs=2, timeout=120)}
+        self.assertEqual(sorted(records), ["a.xlsx", "b.xlsx", "broken.xlsx"])
+        self.assertEqual(records["broken.xlsx"]["status"], "error")
+        self.assertEqual(records["a.xlsx"]["status"], "ok")
+        self.assertEqual([f["cell"] for f in records["b.xlsx"]["formulas"]["formulas"]], ["Sheet!A2"])
+
+    def test_timeout_replaces_worker(self):
+        # Loading a workbook takes far longer than a millisecond
+        files = [os.path.join(self.tmp.name, "a.xlsx"), os.path.join(self.tmp.name, "sub", "b.xlsx")]
+        records = list(run_batch(files, OPTIONS, jobs=1, timeout=0.001))
+        self.assertEqual([(os.path.basename(r["file"]), r["status"]) for r in records],
+                         [("a.xlsx", "timeout"), ("b.xlsx", "timeout")])
+
+    def test_cache_matches_uncached_audit(self):
+        macro = os.path.join(self.tmp.name, "macro.xlsm")
+        wb = Workbook()
+        wb.active["A1"] = "=1+1"
+        wb.save(macro)
+        add_parts(macro, vba=True)
+        cached = dict(OPTIONS, cache_dir=os.path.join(self.tmp.name, "cache"), cache_max_bytes=1 << 20)
+        try:
+            first, second = audit_file(macro, cached), audit_file(macro, cached)
+        finally:
+            batch_audit._worker_cache = None
+        uncached = audit_file(macro, OPTIONS)
+        self.assertEqual((first["cache"]["hits"], second["cache"]["hits"]), (0, 1))
+        for record in (first, second):
+            self.assertEqual(record["structure"], uncached["structure"])
+            self.assertEqual(record["formulas"], uncached["formulas"])
+        self.assertIn("Contains VBA macros (+10)", second["formulas"]["risk_assessment"]["risk_factors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
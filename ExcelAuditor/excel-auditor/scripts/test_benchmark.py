@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the benchmark harness and its workbook generator.
+
+Run with: python test_benchmark.py
+"""
+
+import copy
+import os
+import tempfile
+import unittest
+import zipfile
+
+import extract_formulas
+from benchmark import (
+    FORMULA_PHASES,
+    compare_baselines,
+    generate_workbook,
+    run_benchmark,
+    timed_phases,
+)
+from extract_formulas import extract_formulas_dispatch
+
+
+def parts(path: str) -> dict:
+    """Part contents; zip timestamps and docProps change on every save."""
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist() if not name.startswith("docProps/")}
+
+
+class GeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def test_same_seed_same_cells(self):
+        first = generate_workbook(self.path("a.xlsx"), 2000, seed=7)
+        second = generate_workbook(self.path("b.xlsx"), 2000, seed=7)
+        self.assertEqual(first, second)
+        self.assertEqual(parts(self.path("a.xlsx")), parts(self.path("b.xlsx")))
+        generate_workbook(self.path("c.xlsx"), 2000, seed=8)
+        self.assertNotEqual(parts(self.path("a.xlsx")), parts(self.path("c.xlsx")))
+        with self.assertRaises(ValueError):
+            generate_workbook(self.path("d.xlsx"), 2000, density=1)
+
+    def test_features_reach_the_audit(self):
+        spec = generate_workbook(self.path("m.xlsx"), 3000, overrides=4, hidden_sheets=2,
+                                 circular_chains=2, sheets=2)
+        result = extract_formulas_dispatch(self.path("m.xlsx"), max_cells=None, backend="xml")
+        self.assertEqual(result["complexity_metrics"]["total_formulas"], spec["formulas"])
+        self.assertEqual(sorted(o["cell"] for o in result["hardcoded_overrides"]), spec["override_cells"])
+        self.assertEqual(len(spec["override_cells"]), 4)
+        self.assertEqual(len(result["circular_reference_groups"]), 2)
+        hidden = result["hidden_content"]
+        self.assertEqual([s["name"] for s in hidden["hidden_sheets"]], ["Inputs1"])
+        self.assertEqual([s["name"] for s in hidden["very_hidden_sheets"]], ["Inputs2"])
+        self.assertEqual(hidden["total_hidden_cells_estimate"], 2 * 20 * 2)
+
+        # No unique-per-row columns, no overrides: the model columns are consistent
+        generate_workbook(self.path("clean.xlsx"), 3000, copied_ratio=1.0, overrides=0, circular_chains=0)
+        clean = extract_formulas_dispatch(self.path("clean.xlsx"), max_cells=None, backend="xml")
+        self.assertEqual(clean["hardcoded_overrides"], [])
+        self.assertEqual(clean["formula_inconsistencies"], [])
+        self.assertEqual(clean["complexity_metrics"]["unique_patterns"], 5)
+
+
+class HarnessTests(unittest.TestCase):
+    def test_baseline_schema_and_phases(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            baseline = run_benchmark([1500], backend="xml", workdir=workdir, isolate=False)
+            again = run_benchmark([1500], backend="xml", workdir=workdir, isolate=False)
+        case = baseline["cases"]["1500"]
+        self.assertIsNotNone(case["generate_s"])
+        self.assertIsNone(again["cases"]["1500"]["generate_s"])  # reused from the workdir
+        formulas = case["extract_formulas"]
+        for phase in ("scan", "column_consistency", "row_consistency", "hardcoded_overrides",
+                      "dependency_graph", "circular_references", "calc_cost", "risk_score", "other"):
+            self.assertIn(phase, formulas["phases"])
+        self.assertLessEqual(sum(p["seconds"] for p in formulas["phases"].values()),
+                             formulas["wall_s"] + 0.01)
+        self.assertEqual(formulas["findings"]["circular_reference_groups"], 1)
+        self.assertIn("load_workbook", case["extract_structure"]["phases"])
+        self.assertGreater(case["extract_structure"]["peak_rss_mb"], 0)
+        # Phase wrappers are removed afterwards
+        self.assertEqual(extract_formulas.scan_worksheet.__name__, "scan_worksheet")
+
+        with timed_phases(FORMULA_PHASES):
+            self.assertEqual(extract_formulas.scan_worksheet.__name__, "timed")
+
+        slower = copy.deepcopy(baseline)
+        slower["cases"]["1500"]["extract_formulas"]["wall_s"] += 1.0
+        slower["cases"]["1500"]["extract_formulas"]["findings"]["formulas"] += 1
+        rows = compare_baselines(baseline, slower)
+        regressions = [(r["target"], r["metric"]) for r in rows if r["regression"]]
+        self.assertEqual(regressions, [("extract_formulas", "wall_s")])
+        self.assertIn("findings", [r["metric"] for r in rows])
+        self.assertFalse(any(r["regression"] for r in compare_baselines(baseline, baseline)))
+
+    def test_isolated_run(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            baseline = run_benchmark([500], workdir=workdir, targets=("extract_formulas",))
+        case = baseline["cases"]["500"]
+        self.assertNotIn("extract_structure", case)
+        self.assertIn("scan", case["extract_formulas"]["phases"])  # timed in the worker process
+        self.assertGreaterEqual(case["extract_formulas"]["peak_rss_mb"],
+                                case["extract_formulas"]["start_rss_mb"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the recalculation cost profile.
+
+Run with: python test_calc_cost.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from calc_cost import VOLATILE_EDIT_WEIGHT, calc_cost_rating, calc_cost_score, profile_calc_cost
+from extract_formulas import VOLATILE_FUNCTIONS, build_dependency_graph, extract_formulas
+
+
+def profile(formulas: dict, sheets=({"name": "S", "max_row": 100, "max_column": 5},)) -> dict:
+    results = []
+    for keep_targets in (True, False):  # reparsing references gives the same profile
+        graph, references = build_dependency_graph(formulas, keep_targets=keep_targets)
+        results.append(profile_calc_cost(graph, formulas, references, list(sheets), VOLATILE_FUNCTIONS))
+    assert results[0] == results[1]
+    return results[0]
+
+
+class CalcCostTests(unittest.TestCase):
+    def test_range_weights_clipped_to_used_range(self):
+        result = profile({
+            "S!B1": "=SUM(A:A)",               # 100 used rows
+            "S!B2": "=SUMIFS(A1:A50,C1:C50,1)",
+            "S!B3": "=[1]Other!A1+A1",         # external read counts once
+        })
+        self.assertEqual(result["total_work"], 101 + 101 + 3)
+        self.assertEqual(result["whole_line_references"], 1)
+        self.assertEqual(result["hotspots"][0]["reasons"], ["whole-column or whole-row reference"])
+
+    def test_volatility_propagates_to_dependents(self):
+        result = profile({
+            "S!A1": "=NOW()",
+            "S!B1": "=A1+1",
+            "S!C1": "=SUM(B1:B5)",  # reaches B1 through a range
+            "S!D1": "=E1*2",
+        })
+        self.assertEqual((result["volatile_formulas"], result["volatile_dependents"]), (1, 2))
+        self.assertEqual(result["volatile_work"], 1 + 2 + 6)
+        self.assertEqual(result["weighted_work"], 1 + 2 + 6 + 2 + VOLATILE_EDIT_WEIGHT * 9)
+        by_cell = {h["cells"]: h for h in result["hotspots"]}
+        self.assertEqual(by_cell["S!A1"]["reasons"], ["volatile function: recalculates on every edit"])
+        self.assertEqual(by_cell["S!C1"]["reasons"], ["depends on volatile S!A1: recalculates on every edit"])
+        self.assertFalse(by_cell["S!D1"]["volatile"])
+
+    def test_hotspots_group_copied_blocks(self):
+        formulas = {f"S!C{r}": f"=SUM(A$1:A{r})" for r in range(1, 101)}  # running total
+        formulas.update({f"S!D{r}": f"=C{r}*2" for r in range(1, 101)})
+        result = profile(formulas)
+        top = result["hotspots"][0]
+        self.assertEqual((top["cells"], top["count"], top["column"]), ("S!C1:C100", 100, "C"))
+        self.assertEqual(top["work"], sum(1 + r for r in range(1, 101)))
+        self.assertEqual(top["reasons"], ["copied to 100 cells"])
+        self.assertEqual([h["cells"] for h in result["hotspots"]], ["S!C1:C100", "S!D1:D100"])
+        self.assertEqual(result["sheets"][0]["formulas"], 200)
+
+    def test_score_bands(self):
+        self.assertEqual([calc_cost_score(w) for w in (0, 1000, 10 ** 4, 10 ** 6, 10 ** 9)],
+                         [0, 0, 20, 60, 100])
+        self.assertEqual([calc_cost_rating(s) for s in (0, 25, 50, 75)],
+                         ["low", "moderate", "high", "severe"])
+
+    def test_full_audit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.xlsx")
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "Model"
+            for r in range(1, 2001):
+                ws.cell(r, 1, r)
+                ws.cell(r, 2, f"=SUMIF(A:A,\">\"&A{r})+RAND()")
+            wb.save(path)
+            result = extract_formulas(path, max_cells=None)
+        cost = result["calc_cost"]
+        self.assertEqual(result["complexity_metrics"]["calc_cost_score"], cost["score"])
+        self.assertEqual(cost["rating"], "severe")
+        self.assertEqual(cost["hotspots"][0]["cells"], "Model!B1:B2000")
+        issue = [i for i in result["issues"] if i["type"] == "slow_recalculation"]
+        self.assertEqual(issue[0]["cell"], "Model!B1:B2000")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Tests for reference extraction, circular reference detection and the
+precedent/dependent index.
+
+Run with: python test_dependency_graph.py
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from openpyxl.utils import get_column_letter
+
+from dependency_index import DependencyIndex, index_path_for, open_index
+
+from extract_formulas import (
+    detect_circular_references,
+    extract_references_from_formula,
+    find_circular_reference_groups,
+)
+
+
+class ReferenceExtractionTests(unittest.TestCase):
+    def test_ranges_and_sheet_prefixes(self):
+        self.assertEqual(
+            extract_references_from_formula("=SUM(A1:B5)+Sheet2!C3+SUM('My Sheet'!A:A)+SUM(1:1)"),
+            ["A1:B5", "Sheet2!C3", "'My Sheet'!A:A", "1:1"])
+
+    def test_skips_strings_functions_and_names(self):
+        self.assertEqual(extract_references_from_formula('="A1"&LOG10(B2)*Tax_2020'), ["B2"])
+
+    def test_external_prefix_kept(self):
+        self.assertEqual(extract_references_from_formula("=[1]Data!$A$1"), ["[1]Data!$A$1"])
+
+
+class CircularReferenceTests(unittest.TestCase):
+    def test_each_loop_is_its_own_group(self):
+        groups = find_circular_reference_groups({
+            "S!A1": "=B1",
+            "S!B1": "=A1+1",
+            "S!C1": "=C1*2",
+            "S!D1": "=E1",
+            "S!E1": "=D1",
+            "S!F1": "=A1+D1",
+        })
+        self.assertEqual(groups, [["S!A1", "S!B1"], ["S!C1"], ["S!D1", "S!E1"]])
+
+    def test_range_reference_cycle(self):
+        # D5 sits in the middle of the summed range, not at its first cell
+        groups = find_circular_reference_groups({
+            "S!D1": "=SUM(D2:D9)",
+            "S!D5": "=D1*2",
+            "S!D20": "=SUM(D1:D9)",
+        })
+        self.assertEqual(groups, [["S!D1", "S!D5"]])
+
+    def test_whole_column_and_cross_sheet(self):
+        groups = find_circular_reference_groups({
+            "Inputs!B2": "='Model Sheet'!C3",
+            "Model Sheet!C3": "=SUM(Inputs!B:B)",
+            "Model Sheet!C4": "=SUM(C:C)",
+        })
+        self.assertEqual(groups, [["Inputs!B2", "Model Sheet!C3"], ["Model Sheet!C4"]])
+
+    def test_sheet_names_match_case_insensitively(self):
+        cells = detect_circular_references(None, {"Sheet1!A1": "=sheet1!A2", "Sheet1!A2": "=SHEET1!A1"})
+        self.assertEqual(cells, ["Sheet1!A1", "Sheet1!A2"])
+
+    def test_external_references_ignored(self):
+        self.assertEqual(find_circular_reference_groups({"S!A1": "=[1]S!A1"}), [])
+
+    def test_no_cycle_in_running_totals(self):
+        formulas = {}
+        for r in range(1, 2001):
+            formulas[f"S!A{r}"] = f"=A{r - 1}+1" if r > 1 else "=1"
+            formulas[f"S!B{r}"] = f"=SUM($A$1:A{r})"
+        self.assertEqual(find_circular_reference_groups(formulas), [])
+
+    def test_long_chain_is_linear(self):
+        # The old DFS was exponential on this shape; this must stay fast
+        formulas = {}
+        n = 50000
+        for r in range(1, n + 1):
+            formulas[f"S!A{r}"] = f"=A{r + 1}+SUM(B$1:B{r})" if r < n else "=A1"
+            formulas[f"S!B{r}"] = f"=A{r}"
+        start = time.time()
+        groups = find_circular_reference_groups(formulas)
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]), 2 * n - 1)  # nothing reads the last B cell
+
+
+class DependencyIndexTests(unittest.TestCase):
+    FORMULAS = {
+        "Model!B2": "=Inputs!B1*2",
+        "Model!B3": "=B2+SUM(Inputs!C1:C10)",
+        "Model!B4": "=B3*Inputs!B1",
+        "Summary!A1": "=SUM(Model!B2:B4)",
+        "Summary!A2": "=A1+Model!B5",
+    }
+
+    def setUp(self):
+        self.index = DependencyIndex.from_formulas(self.FORMULAS)
+
+    def test_precedents(self):
+        self.assertEqual(self.index.precedents("Summary!A1"), {
+            "cell": "Summary!A1",
+            "cells": ["Model!B2", "Model!B3", "Model!B4", "Inputs!B1"],
+            "ranges": ["Inputs!C1:C10", "Model!B2:B4"],
+        })
+        self.assertEqual(self.index.precedents("Summary!A1", transitive=False)["cells"],
+                         ["Model!B2", "Model!B3", "Model!B4"])
+
+    def test_dependents_of_cell_only_inside_a_range(self):
+        self.assertEqual(self.index.dependents("inputs!$C$5")["dependents"],
+                         ["Model!B3", "Model!B4", "Summary!A1", "Summary!A2"])
+        self.assertEqual(self.index.dependents("Inputs!C5", transitive=False)["dependents"], ["Model!B3"])
+
+    def test_longest_chain_and_hotspots(self):
+        self.assertEqual(self.index.longest_chain(),
+                         ["Summary!A2", "Summary!A1", "Model!B4", "Model!B3", "Model!B2", "Inputs!B1"])
+        self.assertEqual(self.index.fan_in_hotspots(2), [
+            {"cell": "Model!B2", "references": 2},
+            {"cell": "Model!B3", "references": 2},
+        ])
+
+    def test_cells_read_only_through_ranges(self):
+        index = DependencyIndex.from_formulas({
+            "Model!B1": "=SUM(Inputs!A1:A5)",
+            "Model!B2": "=SUM(Inputs!A3:B8)*Inputs!A4",
+            "Model!B3": "=SUM(Inputs!A1:A5)+SUM(Inputs!A:A)",
+        })
+        self.assertEqual([index._range_by_node[n][-1] for n in index.ranges_containing("Inputs!A4")],
+                         ["Inputs!A1:A5", "Inputs!A3:B8", "Inputs!A1:A1048576"])
+        self.assertEqual(index.ranges_containing("Inputs!C4"), [])
+        self.assertEqual(index.dependents("Inputs!A2")["dependents"], ["Model!B1", "Model!B3"])
+        self.assertEqual(index.dependents("Inputs!A100")["dependents"], ["Model!B3"])
+        self.assertEqual(index.fan_in_hotspots(4), [
+            {"cell": "Inputs!A4", "references": 5},
+            {"range": "Inputs!A3:A5", "cells": 3, "references": 4},
+            {"range": "Inputs!A1:A2", "cells": 2, "references": 3},
+            {"range": "Inputs!A6:A8", "cells": 3, "references": 2},
+        ])
+
+    def test_ranges_containing_matches_a_linear_scan(self):
+        rng = random.Random(7)
+        formulas = {}
+        for r in range(1, 200):
+            c1, r1 = rng.randint(1, 6), rng.randint(1, 60)
+            c2, r2 = c1 + rng.randint(0, 3), r1 + rng.randint(0, 40)
+            formulas[f"Model!A{r}"] = f"=SUM(Data!{get_column_letter(c1)}{r1}:{get_column_letter(c2)}{r2})"
+        index = DependencyIndex.from_formulas(formulas)
+        for row in range(1, 105):
+            for col in range(1, 10):
+                expected = [r[0] for r in index.ranges
+                            if r[1] == "DATA" and r[2] <= row <= r[4] and r[3] <= col <= r[5]]
+                self.assertEqual(index.ranges_containing(f"Data!{get_column_letter(col)}{row}"), expected)
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "audit.deps.gz")
+            self.index.save(path)
+            loaded = DependencyIndex.load(path)
+        self.assertEqual(loaded.precedents("Summary!A2"), self.index.precedents("Summary!A2"))
+        self.assertEqual(loaded.dependents("Inputs!B1"), self.index.dependents("Inputs!B1"))
+        self.assertEqual(loaded.fan_in_hotspots(), self.index.fan_in_hotspots())
+
+    def _write_audit(self, path, formulas, **extra):
+        records = [{"cell": cell, "formula": formula, "length": len(formula)} for cell, formula in formulas.items()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"formulas": records, **extra}, f)
+
+    def test_index_rebuilt_when_audit_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            audit = os.path.join(tmp, "audit.json")
+            self._write_audit(audit, self.FORMULAS)
+            self.assertEqual(open_index(audit).dependents("Inputs!B1", transitive=False)["dependents"],
+                             ["Model!B2", "Model!B4"])
+            self.assertTrue(index_path_for(audit).exists())
+            self._write_audit(audit, {**self.FORMULAS, "Summary!A3": "=Inputs!B1"})
+            self.assertEqual(open_index(audit).dependents("Inputs!B1", transitive=False)["dependents"],
+                             ["Model!B2", "Model!B4", "Summary!A3"])
+            # Same content, new mtime: the hash still matches
+            os.utime(audit, (1, 1))
+            self.assertTrue(DependencyIndex.load(index_path_for(audit)).is_current(audit))
+
+    def test_incomplete_audit_refused_unless_partial_allowed(self):
+        long_formula = "=" + "+".join(f"Inputs!A{r}" for r in range(1, 200))
+        with tempfile.TemporaryDirectory() as tmp:
+            audit = os.path.join(tmp, "audit.json")
+            records = [{"cell": "Model!A1", "formula": long_formula[:500], "length": len(long_formula)}]
+            with open(audit, 'w', encoding='utf-8') as f:
+                json.dump({"formulas": records, "truncated": True}, f)
+            with self.assertRaisesRegex(ValueError, "truncated"):
+                open_index(audit)
+            index = open_index(audit, allow_partial=True)
+            self.assertEqual(len(index.gaps), 2)
+            self.assertEqual(DependencyIndex.load(index_path_for(audit)).gaps, index.gaps)
+            with self.assertRaises(ValueError):
+                open_index(audit)  # A partial index on disk is not reused either
+
+
+if __name__ == "__main__":
+    unittest.main()
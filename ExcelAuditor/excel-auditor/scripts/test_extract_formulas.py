@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Tests for the sheet-local detectors fed by the streaming pass.
+
+Run with: python test_extract_formulas.py
+"""
+
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from collections.abc import Sequence
+from unittest import mock
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+import extract_formulas
+from extract_formulas import CellMatrix, SheetScan, extract_formulas as run_extract
+from formula_store import FormulaRecords
+from spill_store import dump_json, json_default
+
+
+def scan_rows(rows: list, hidden_rows=(), hidden_columns=()) -> SheetScan:
+    scan = SheetScan("Model", float("inf"))
+    for row_idx, values in enumerate(rows, start=1):
+        scan.feed_row(row_idx, tuple(values))
+    scan.finish(hidden_rows, hidden_columns)
+    return scan
+
+
+class CellMatrixTests(unittest.TestCase):
+    def test_kinds_and_numbers(self):
+        matrix = CellMatrix()
+        matrix.start_row()
+        matrix.add_value(1, "Units")
+        matrix.add_value(2, "#REF!")
+        matrix.start_row()
+        matrix.add_formula(2, 1, "=B2", 0)
+        matrix.add_value(2, True)
+        matrix.add_value(3, 2 ** 60)
+        matrix.add_value(4, 1.5)
+        self.assertEqual(list(matrix.kinds), [
+            extract_formulas.KIND_TEXT, extract_formulas.KIND_ERROR, extract_formulas.KIND_FORMULA,
+            extract_formulas.KIND_BOOLEAN, extract_formulas.KIND_INTEGER, extract_formulas.KIND_NUMBER])
+        self.assertEqual([matrix.number(i) for i in range(3)], [True, 2 ** 60, 1.5])
+        self.assertIs(matrix.number(0), True)
+        self.assertEqual(list(matrix.iter_cells())[2:4], [(2, 1, 1), (2, 2, 6)])
+        self.assertEqual(matrix.first_formulas, {1: "=B2"})
+
+    def test_hidden_cell_counts(self):
+        rows = [["a", "b", "c"], [1, 2, 3], [4, None, 6], [None, None, None]]
+        scan = scan_rows(rows, hidden_rows=[3, 4], hidden_columns=[2])
+        self.assertEqual((scan.cell_count, scan.hidden_cell_count), (8, 4))
+
+
+class HardcodedOverrideTests(unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+        rows = [["Units", "Price", "Revenue", "Flag"]]
+        for r in range(2, 400):
+            revenue = f"=A{r}*B{r}"
+            if random.random() < 0.05:
+                revenue = random.choice([50000, 12.5, True, 2 ** 60, "n/a", "#DIV/0!"])
+            rows.append([r, 1.5, revenue, f"=C{r}>0" if r % 7 else 0])
+        rows.append([None, None, 99, None])  # below the last formula: prev only
+        self.rows = rows
+
+    def test_numpy_and_python_paths_agree(self):
+        vectorized = scan_rows(self.rows).hardcoded_overrides
+        self.assertTrue(vectorized)
+        extract_formulas.HAS_NUMPY = False
+        try:
+            fallback = scan_rows(self.rows).hardcoded_overrides
+        finally:
+            extract_formulas.HAS_NUMPY = True
+        self.assertEqual(vectorized, fallback)
+
+    def test_findings_ordered_and_classified(self):
+        findings = scan_rows(self.rows).hardcoded_overrides
+        keys = [(f["column"], f["row"]) for f in findings]
+        self.assertEqual(keys, sorted(keys))
+        last = [f for f in findings if f["column"] == "C"][-1]
+        self.assertEqual((last["row"], last["severity"]), (len(self.rows), "medium"))
+        for f in findings:
+            if f["hardcoded_value"] == 50000:
+                self.assertEqual(f["severity"], "critical")
+            self.assertNotIn(f["hardcoded_value"], ("n/a", "#DIV/0!"))
+
+    def test_matches_full_audit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.xlsx")
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "Model"
+            for values in self.rows:
+                ws.append(values)
+            ws.row_dimensions[5].hidden = True
+            wb.save(path)
+            result = run_extract(path, max_cells=None)
+        self.assertEqual(result["hardcoded_overrides"], scan_rows(self.rows).hardcoded_overrides)
+        self.assertEqual(result["hidden_content"]["total_hidden_cells_estimate"], 4)
+
+
+class RowFormulaInconsistencyTests(unittest.TestCase):
+    def projection(self) -> list:
+        header = ["Line"] + [f"M{m}" for m in range(1, 61)]
+        growth = ["Revenue", 100.0]
+        for m in range(2, 61):
+            prev = get_column_letter(m)
+            growth.append(f"={prev}2*1.02")
+        growth[31] = "=AE2*1.5"  # month 30 overridden
+        costs = ["Costs"] + [f"={get_column_letter(m + 1)}2*0.4" for m in range(1, 61)]
+        costs[60] = "=BI2*0.41"  # last month only
+        return [header, growth, costs]
+
+    def test_break_along_row(self):
+        findings = scan_rows(self.projection()).row_inconsistencies
+        by_cell = {f["cell"]: f for f in findings}
+        self.assertEqual(sorted(by_cell), ["Model!AF2", "Model!BI3"])
+        mid = by_cell["Model!AF2"]
+        self.assertEqual((mid["axis"], mid["severity"], mid["row"]), ("row", "critical", 2))
+        self.assertEqual(mid["expected_pattern"], "=RC[-1]*1.02")
+        self.assertEqual(mid["sample_expected"], "=B2*1.02")
+        self.assertEqual(mid["pattern_adherence"], "58/59 cells follow pattern")
+        self.assertEqual(by_cell["Model!BI3"]["severity"], "high")
+
+    def test_consistent_rows_and_budget(self):
+        rows = self.projection()
+        rows[1][31] = "=AE2*1.02"
+        rows[2][60] = "=BI2*0.4"
+        self.assertEqual(scan_rows(rows).row_inconsistencies, [])
+
+        scan = SheetScan("Model", 100)  # budget runs out before row 3
+        for row_idx, values in enumerate(self.projection(), start=1):
+            scan.feed_row(row_idx, tuple(values))
+        scan.finish()
+        self.assertEqual([f["cell"] for f in scan.row_inconsistencies], ["Model!AF2"])
+        scan = scan_rows(self.projection())
+        scan.trim(100)
+        self.assertEqual([f["cell"] for f in scan.row_inconsistencies], ["Model!AF2"])
+
+
+
+class ResultFormulasTests(unittest.TestCase):
+    def test_formulas_are_a_lazy_sequence_of_records(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.xlsx")
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "Model"
+            for r in range(1, 6):
+                ws.append([r, f"=A{r}*2"])
+            wb.save(path)
+            result = run_extract(path)
+        formulas = result["formulas"]
+        self.assertIsInstance(formulas, Sequence)
+        with mock.patch.object(FormulaRecords, "_record", autospec=True,
+                               side_effect=FormulaRecords._record) as built:
+            self.assertEqual(len(formulas), 5)
+            self.assertEqual(formulas[1:3].parts[0].rows.tolist(), [2, 3])
+            self.assertEqual(built.call_count, 0)
+            self.assertEqual(formulas[-1], {"cell": "Model!B5", "formula": "=A5*2", "length": 5,
+                                            "functions": [], "references": ["A5"], "nesting_depth": 0})
+            self.assertEqual(built.call_count, 1)
+        records = [formulas[i] for i in range(5)]
+        self.assertEqual(list(formulas), records)
+        self.assertEqual(json.loads(json.dumps(result, default=json_default))["formulas"], records)
+
+        # Nested reports (audit_workbook's) are written record by record too
+        report = {"structure": {}, "formulas": result}
+        out = io.StringIO()
+        dump_json(report, out)
+        self.assertEqual(out.getvalue(), json.dumps(report, indent=2, default=json_default))
+
+
+if __name__ == "__main__":
+    unittest.main()
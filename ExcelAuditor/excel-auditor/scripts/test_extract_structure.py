@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tests for structure extraction and metadata-only triage.
+
+Run with: python test_extract_structure.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from openpyxl import Workbook
+from openpyxl.workbook.defined_name import DefinedName
+
+from extract_formulas import extract_formulas
+from extract_structure import extract_structure, triage_structure
+
+EXTERNAL_LINK = (
+    '<externalLink xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<externalBook r:id="rId1"><sheetNames><sheetName val="Rates"/></sheetNames></externalBook>'
+    '</externalLink>')
+EXTERNAL_LINK_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/externalLinkPath" Target="file:///C:/Models/rates.xlsx" TargetMode="External"/>'
+    '</Relationships>')
+
+CONNECTIONS = (
+    '<connections xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<connection id="1" name="Sales DB" type="1" refreshOnLoad="1">'
+    '<dbPr connection="DSN=sales;UID=audit;PWD=hunter2;" command="SELECT * FROM orders"/>'
+    '</connection></connections>')
+PIVOT_CACHE = (
+    '<pivotCacheDefinition xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" r:id="rId1" '
+    'recordCount="49"><cacheSource type="worksheet"><worksheetSource ref="A1:C50" sheet="Model"/>'
+    '</cacheSource><cacheFields count="1"><cacheField name="A" numFmtId="0"/></cacheFields>'
+    '</pivotCacheDefinition>')
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def add_parts(path: str, external_link: bool = False, vba: bool = False, connections: bool = False,
+              pivot_cache: bool = False):
+    """Add external link, data connection, pivot cache and/or VBA parts to a saved workbook."""
+    rels = []
+    if external_link:
+        rels.append(f'<Relationship Id="rIdExt1" Type="{_REL_TYPE}/externalLink" '
+                    'Target="externalLinks/externalLink1.xml"/>')
+    if connections:
+        rels.append(f'<Relationship Id="rIdConn1" Type="{_REL_TYPE}/connections" Target="connections.xml"/>')
+    if pivot_cache:
+        rels.append(f'<Relationship Id="rIdPc1" Type="{_REL_TYPE}/pivotCacheDefinition" '
+                    'Target="pivotCache/pivotCacheDefinition1.xml"/>')
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename).decode("utf-8") if item.filename.endswith((".xml", ".rels")) \
+                else src.read(item.filename)
+            if item.filename == "xl/workbook.xml":
+                if external_link:
+                    data = data.replace("</sheets>", '</sheets><externalReferences>'
+                                        '<externalReference r:id="rIdExt1"/></externalReferences>')
+                if pivot_cache:
+                    data = data.replace("</workbook>", '<pivotCaches><pivotCache cacheId="3" r:id="rIdPc1"/>'
+                                        '</pivotCaches></workbook>')
+            elif item.filename == "xl/_rels/workbook.xml.rels":
+                data = data.replace("</Relationships>", "".join(rels) + "</Relationships>")
+            dst.writestr(item, data)
+        if external_link:
+            dst.writestr("xl/externalLinks/externalLink1.xml", EXTERNAL_LINK)
+            dst.writestr("xl/externalLinks/_rels/externalLink1.xml.rels", EXTERNAL_LINK_RELS)
+        if connections:
+            dst.writestr("xl/connections.xml", CONNECTIONS)
+        if pivot_cache:
+            dst.writestr("xl/pivotCache/pivotCacheDefinition1.xml", PIVOT_CACHE)
+        if vba:
+            dst.writestr("xl/vbaProject.bin", b"\xd0\xcf\x11\xe0")
+    shutil.move(tmp, path)
+
+
+class TriageTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Model"
+        for r in range(1, 51):
+            ws.append([r, r * 2, f"=A{r}+B{r}"])
+        wb.create_sheet("Notes")["A1"] = "read me"
+        self.wb = wb
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_clean_workbook_needs_no_full_audit(self):
+        self.wb.save(self.path)
+        result = triage_structure(self.path)
+        self.assertFalse(result["needs_full_audit"])
+        self.assertEqual(result["calc_mode"], "auto")
+        model = result["sheets"][0]
+        self.assertEqual((model["dimensions"], model["approx_cells"]), ("A1:C50", 150))
+        self.assertEqual(result["summary"]["approx_cells"], 151)
+
+        full = extract_structure(self.path)
+        self.assertEqual([(s["name"], s["dimensions"]) for s in result["sheets"]],
+                         [(s["name"], s["dimensions"]) for s in full["sheets"]])
+
+    def test_metadata_risks(self):
+        self.wb.create_sheet("Calc").sheet_state = "veryHidden"
+        self.wb.create_sheet("Old").sheet_state = "hidden"
+        self.wb.calculation.calcMode = "manual"
+        self.wb.defined_names["Rate"] = DefinedName("Rate", attr_text="Model!$A$1")
+        self.wb.defined_names["Gone"] = DefinedName("Gone", attr_text="#REF!$A$1")
+        self.wb["Model"].defined_names["Local"] = DefinedName("Local", attr_text="Model!$B$1")
+        self.wb.save(self.path)
+        add_parts(self.path, external_link=True, vba=True)
+
+        result = triage_structure(self.path)
+        self.assertTrue(result["needs_full_audit"])
+        self.assertEqual(result["triage_reasons"], [
+            "Contains VBA macros",
+            "Very hidden sheets: Calc",
+            "Hidden sheets: Old",
+            "External links: 1",
+            "Manual calculation mode: cached values may be stale (audit with --recalc)",
+            "Defined names pointing at #REF!: Gone",
+        ])
+        self.assertEqual(result["external_links"], [{
+            "index": 1, "part": "xl/externalLinks/externalLink1.xml",
+            "target": "file:///C:/Models/rates.xlsx", "sheet_names": ["Rates"], "defined_names": []}])
+        scopes = {n["name"]: n["scope"] for n in result["named_ranges"]}
+        self.assertEqual(scopes, {"Rate": "global", "Gone": "global", "Local": "Model"})
+        self.assertEqual(result["summary"]["very_hidden_sheets"], 1)
+
+    def test_not_a_package(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\xd0\xcf\x11\xe0 legacy xls")
+        result = triage_structure(self.path)
+        self.assertIn("error", result)
+        self.assertTrue(result["needs_full_audit"])
+
+
+class PackagePartTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Model"
+        for r in range(1, 51):
+            ws.append([r, r * 2, f"=A{r}+B{r}"])
+        ws["E1"] = "=[1]Rates!A1*2"
+        ws["E2"] = "='[1]Rates'!A2+SUM([2]Old!A:A)"  # [2] has no link part
+        ws["E3"] = '="[1]"&A1'
+        wb.save(self.path)
+        add_parts(self.path, external_link=True, connections=True, pivot_cache=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_structure_reads_package_parts(self):
+        result = extract_structure(self.path)
+        self.assertEqual([(l["index"], l["target"]) for l in result["external_links"]],
+                         [(1, "file:///C:/Models/rates.xlsx")])
+        self.assertEqual(result["connections"], [{
+            "id": "1", "name": "Sales DB", "type": "odbc", "source": "DSN=sales;UID=audit;PWD=***;",
+            "command": "SELECT * FROM orders", "refresh_on_load": True, "odc_file": None}])
+        cache = result["pivot_caches"][0]
+        self.assertEqual((cache["cache_id"], cache["source_type"], cache["sheet"], cache["ref"],
+                          cache["record_count"]), ("3", "worksheet", "Model", "A1:C50", 49))
+        self.assertIn("Data connections: 1", result["summary"]["risk_flags"])
+        self.assertEqual(result["summary"]["pivot_cache_count"], 1)
+
+        triage = triage_structure(self.path)
+        for key in ("external_links", "connections", "pivot_caches"):
+            self.assertEqual(triage[key], result[key])
+
+    def test_formulas_mapped_to_link_index(self):
+        result = extract_formulas(self.path, max_cells=None, backend="xml")
+        by_index = {e["index"]: e for e in result["external_references"]}
+        self.assertEqual((by_index[1]["status"], by_index[1]["cells"]), ("used", ["Model!E1", "Model!E2"]))
+        self.assertEqual(by_index[1]["target"], "file:///C:/Models/rates.xlsx")
+        self.assertEqual((by_index[2]["status"], by_index[2]["cells"]), ("missing", ["Model!E2"]))
+        broken = [i for i in result["issues"] if i["type"] == "broken_external_link"]
+        self.assertEqual(broken[0]["cell"], "Model!E2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the formula tokenizer and the shared formula record cache.
+
+Run with: python test_formula_cache.py
+"""
+
+import unittest
+
+from extract_formulas import detect_formula_inconsistencies
+from formula_cache import parse_formula, tokenize_formula
+
+
+class TokenizerTests(unittest.TestCase):
+    def test_tokens_cover_formula(self):
+        formula = "=IF('My Sheet'!B5>0.4,SUM(A1:A9)*1.5E3,\"(x\")&#N/A"
+        self.assertEqual("".join(text for _, text in tokenize_formula(formula)), formula)
+
+    def test_token_kinds(self):
+        kinds = [kind for kind, _ in tokenize_formula('=SUM(Table1[Amount],Q1!A1,"A1",TRUE,#REF!,Tax_2020)')]
+        self.assertEqual(kinds, ["op", "func", "structured", "sep", "ref", "sep", "string", "sep",
+                                 "bool", "sep", "error", "sep", "name", "close"])
+
+
+class FormulaRecordTests(unittest.TestCase):
+    def test_functions_strip_future_prefix(self):
+        self.assertEqual(parse_formula("=_xlfn.XLOOKUP(A2,B:B,C:C)+LOG10(D1)").functions, ("XLOOKUP", "LOG10"))
+
+    def test_functions_and_parens_in_strings_ignored(self):
+        record = parse_formula('=CONCAT("SUM(",A1,")")')
+        self.assertEqual(record.functions, ("CONCAT",))
+        self.assertEqual(record.depth, 1)
+        self.assertEqual(record.references, ("A1",))
+
+    def test_nesting_depth(self):
+        self.assertEqual(parse_formula("=IF(A1>0,IF(B1>0,(C1+1)*2,0),0)").depth, 3)
+
+    def test_normalized_pattern(self):
+        self.assertEqual(parse_formula('=SUM(B2:B10)*0.4+Sheet2!C$3&"x"').normalized_pattern,
+                         '=SUM(B{R}:B{R})*{N}+Sheet2!C${R}&"{S}"')
+
+    def test_records_are_interned(self):
+        self.assertIs(parse_formula("=$B$1*2"), parse_formula("=$B$1*2"))
+
+
+class R1C1SignatureTests(unittest.TestCase):
+    def test_r1c1_rendering(self):
+        record = parse_formula("=SUM($B$2:B5)+Sheet2!C:C+A4")
+        self.assertEqual(record.r1c1(5, 4), "=SUM(R2C2:RC[-2])+Sheet2!C[-1]:C[-1]+R[-1]C[-3]")
+
+    def test_copied_formulas_share_signature(self):
+        self.assertEqual(parse_formula("=A5*B5").signature(5, 3), parse_formula("=A9*B9").signature(9, 3))
+        self.assertEqual(parse_formula("=$A$1*B5").signature(5, 3), parse_formula("=$A$1*B6").signature(6, 3))
+
+    def test_off_by_one_row_differs(self):
+        self.assertNotEqual(parse_formula("=A5*B5").signature(5, 3), parse_formula("=A4*B5").signature(5, 3))
+
+    def test_absolute_and_relative_differ(self):
+        self.assertNotEqual(parse_formula("=$A5").signature(5, 2), parse_formula("=A5").signature(5, 2))
+
+    def test_inconsistency_catches_shifted_row(self):
+        formulas = {f"S!C{r}": f"=A{r}*B{r}" for r in range(2, 20)}
+        formulas["S!C9"] = "=A8*B9"
+        findings = detect_formula_inconsistencies(None, formulas)
+        self.assertEqual([(f["cell"], f["expected_pattern"], f["severity"]) for f in findings],
+                         [("S!C9", "=RC[-2]*RC[-1]", "critical")])
+
+
+if __name__ == "__main__":
+    unittest.main()
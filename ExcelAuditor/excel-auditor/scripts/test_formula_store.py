@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact formula records.
+
+Run with: python test_formula_store.py
+"""
+
+import io
+import json
+import pickle
+import unittest
+
+from formula_cache import parse_formula
+from formula_store import FormulaList, FormulaRecords, cell_formulas
+from spill_store import dump_json
+
+
+def records(sheet: str, cells) -> FormulaRecords:
+    part = FormulaRecords(sheet)
+    for row, col, formula in cells:
+        part.add(row, col, formula, parse_formula(formula))
+    return part
+
+
+class FormulaRecordsTests(unittest.TestCase):
+    def setUp(self):
+        self.model = records("Model", [(2, 3, "=A2*B2"), (3, 3, "=A3*B3"), (3, 4, "=SUM(C2:C3)"),
+                                       (5, 3, "=A2*B2"), (7, 1, "=IF(A1>0,SUM(B1:B9),1)")])
+        self.model.table.seal()
+        self.other = records("Other", [(1, 1, "=Model!C2+[1]Rates!A1")])
+
+    def test_views_are_legacy_dicts(self):
+        self.assertEqual(self.model[0], {"cell": "Model!C2", "formula": "=A2*B2", "length": 6,
+                                         "functions": [], "references": ["A2", "B2"], "nesting_depth": 0})
+        self.assertEqual(self.model[-1]["functions"], ["IF", "SUM"])
+        self.assertEqual(self.model[-1]["nesting_depth"], 2)
+        self.assertEqual(list(self.model), [self.model[i] for i in range(len(self.model))])
+        self.assertEqual(self.model[::2], [self.model[0], self.model[2], self.model[4]])
+        self.assertEqual(len(self.model.table), 4)  # C2 and C5 share one formula
+        self.assertIs(self.model.table.functions[2], parse_formula("=SUM(C2:C3)").functions)
+        with self.assertRaises(IndexError):
+            self.model[5]
+
+    def test_slices_and_rows(self):
+        self.assertEqual(self.model.count_before_row(3), 1)
+        self.assertEqual(self.model.count_before_row(6), 4)
+        top = self.model[:self.model.count_before_row(4)]
+        self.assertIsInstance(top, FormulaRecords)
+        self.assertIs(top.table, self.model.table)
+        self.assertEqual(top, list(self.model)[:3])
+        self.assertEqual(dict(cell_formulas(top)), {"Model!C2": "=A2*B2", "Model!C3": "=A3*B3",
+                                                    "Model!D3": "=SUM(C2:C3)"})
+
+    def test_pickle_round_trip(self):
+        copy = pickle.loads(pickle.dumps(self.model))
+        self.assertEqual(copy, self.model)
+        self.assertEqual(list(copy.depths()), list(self.model.depths()))
+
+    def test_formula_list(self):
+        formulas = FormulaList([self.model, FormulaRecords("Empty"), self.other])
+        legacy = list(self.model) + list(self.other)
+        self.assertEqual(len(formulas.parts), 2)
+        self.assertEqual(len(formulas), 6)
+        self.assertEqual(formulas, legacy)
+        self.assertNotEqual(formulas, legacy[:-1])
+        self.assertEqual(formulas[5], legacy[5])
+        self.assertEqual(formulas[-6], legacy[0])
+        self.assertEqual(formulas[1:4], legacy[1:4])
+        self.assertEqual(list(formulas.lengths()), [f["length"] for f in legacy])
+        self.assertEqual(formulas[5]["references"], ["Model!C2", "[1]Rates!A1"])
+        with self.assertRaises(IndexError):
+            formulas[-7]
+        with self.assertRaises(TypeError):
+            formulas.extend(legacy)
+
+        out = io.StringIO()
+        dump_json({"formulas": formulas}, out)
+        self.assertEqual(json.loads(out.getvalue()), {"formulas": legacy})
+
+    def test_spilled_parts(self):
+        formulas = FormulaList()
+        for row in range(1, 9):
+            formulas.add("Model", row, 3, f"=A{row}*B{row}", parse_formula(f"=A{row}*B{row}"))
+            if row in (3, 6):
+                formulas.spill()  # the next row starts a new part
+        legacy = list(formulas)
+        self.assertEqual([len(part) for part in formulas.parts], [3, 3, 2])
+        self.assertEqual(formulas.spilled, 6)
+        self.assertEqual([f["cell"] for f in legacy], [f"Model!C{row}" for row in range(1, 9)])
+        self.assertEqual(formulas[4], legacy[4])
+        self.assertEqual(formulas.count_before_row(5), 4)
+        top = formulas[:formulas.count_before_row(5)]
+        self.assertIsInstance(top, FormulaList)
+        self.assertEqual(top, legacy[:4])
+        self.assertEqual(formulas[2:7], legacy[2:7])
+        self.assertEqual(pickle.loads(pickle.dumps(formulas)), legacy)
+
+        workbook = FormulaList([formulas, self.other])
+        self.assertEqual(workbook.spilled, 6)  # spilled parts are shared, not copied
+        self.assertEqual(dict(cell_formulas(workbook)), dict(cell_formulas(legacy + list(self.other))))
+
+
+if __name__ == "__main__":
+    unittest.main()
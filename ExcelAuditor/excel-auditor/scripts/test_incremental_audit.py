@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental re-audits: only edited sheets are re-analyzed, and
+the report always matches a full extract_formulas run.
+
+Run with: python test_incremental_audit.py
+"""
+
+import json
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+
+from extract_formulas import extract_formulas
+from incremental_audit import extract_formulas_incremental, manifest_path_for
+from spill_store import json_default
+from test_xlsx_reader import build_excel_style_workbook
+
+
+def comparable(result: dict) -> dict:
+    result = dict(result)
+    result.pop("incremental", None)
+    return json.loads(json.dumps(result, default=json_default))
+
+
+class IncrementalAuditTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        wb.remove(wb.active)
+        for s in range(4):
+            ws = wb.create_sheet(f"S{s}")
+            ws.append(["Units", "Price", "Revenue"])
+            for r in range(2, 60):
+                ws.append([r, s + 1.5, f"=A{r}*B{r}"])
+        wb["S3"]["D2"] = "=S0!C2+D3"
+        wb["S3"]["D3"] = "=D2"
+        wb.save(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def edit(self, sheet: str, cell: str, value):
+        wb = load_workbook(self.path)
+        wb[sheet][cell] = value
+        wb.save(self.path)
+
+    def test_first_run_writes_manifest(self):
+        result = extract_formulas_incremental(self.path)
+        self.assertTrue(manifest_path_for(self.path).exists())
+        self.assertEqual(result["incremental"]["reanalyzed_sheets"], ["S0", "S1", "S2", "S3"])
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path)))
+
+    def test_only_edited_sheet_reanalyzed(self):
+        extract_formulas_incremental(self.path)
+        self.edit("S1", "C30", 999)
+        result = extract_formulas_incremental(self.path)
+        self.assertEqual(result["incremental"]["reanalyzed_sheets"], ["S1"])
+        self.assertEqual(result["incremental"]["reused_sheets"], ["S0", "S2", "S3"])
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path)))
+        self.assertIn("S1!C30", [h["cell"] for h in result["hardcoded_overrides"]])
+
+    def test_workbook_level_results_recomputed(self):
+        extract_formulas_incremental(self.path)
+        self.edit("S0", "C2", "=S3!D2")  # closes a loop through an unchanged sheet
+        result = extract_formulas_incremental(self.path)
+        self.assertEqual(result["incremental"]["reanalyzed_sheets"], ["S0"])
+        self.assertEqual(result["circular_reference_groups"], [["S0!C2", "S3!D2", "S3!D3"]])
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path)))
+
+    def test_smaller_budget_reuses_trimmed_scans(self):
+        extract_formulas_incremental(self.path)
+        result = extract_formulas_incremental(self.path, max_cells=200)
+        self.assertEqual(result["incremental"]["reanalyzed_sheets"], [])
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path, max_cells=200)))
+        result = extract_formulas_incremental(self.path)
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path)))
+
+
+
+def prefixed(data: bytes) -> bytes:
+    """Sheet XML with the main namespace on an x: prefix and single-quoted attributes."""
+    data = data.replace(b'xmlns="', b'xmlns:x="', 1)
+    data = re.sub(rb'<(/?)(\w+)(?=[\s/>])', rb'<\1x:\2', data)
+    return re.sub(rb'="([^"]*)"', rb"='\1'", data)
+
+
+class SharedStringTests(unittest.TestCase):
+    """Cell text lives in sharedStrings.xml, so editing it alone must re-analyze the sheet."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "excel.xlsx")
+        build_excel_style_workbook(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rewrite_part(self, part: str, transform):
+        with zipfile.ZipFile(self.path) as src:
+            members = [(info, src.read(info)) for info in src.infolist()]
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info, data in members:
+                dst.writestr(info, transform(data) if info.filename == part else data)
+
+    def assert_shared_string_edit_detected(self):
+        extract_formulas_incremental(self.path)
+        self.assertEqual(extract_formulas_incremental(self.path)["incremental"]["reanalyzed_sheets"], [])
+        self.rewrite_part("xl/sharedStrings.xml", lambda data: data.replace(b">Margin<", b">Spread<"))
+        result = extract_formulas_incremental(self.path)
+        self.assertEqual(result["incremental"]["reanalyzed_sheets"], ["Forecast"])
+        self.assertEqual(comparable(result), comparable(extract_formulas(self.path)))
+
+    def test_shared_string_only_edit(self):
+        self.assert_shared_string_edit_detected()
+
+    def test_shared_string_only_edit_in_prefixed_sheet_xml(self):
+        self.rewrite_part("xl/worksheets/sheet1.xml", prefixed)
+        self.assert_shared_string_edit_detected()
+
+
+if __name__ == "__main__":
+    unittest.main()
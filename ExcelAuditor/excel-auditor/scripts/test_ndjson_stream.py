@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming NDJSON formula output.
+
+Run with: python test_ndjson_stream.py
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from extract_formulas import extract_formulas_dispatch
+from ndjson_stream import iter_records, read_ndjson, stream_formulas
+from spill_store import dump_json
+
+
+def legacy_json(path: str, **options) -> dict:
+    """The extract_formulas.py document, as a consumer would parse it."""
+    out = io.StringIO()
+    dump_json(extract_formulas_dispatch(path, **options), out)
+    return json.loads(out.getvalue())
+
+
+class NdjsonStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Model"
+        ws.append(["Units", "Price", "Revenue"])
+        for r in range(2, 41):
+            ws.append([r, 2.5, f"=A{r}*B{r}"])
+        ws["C20"] = 500  # override
+        ws["D2"] = "=1/0"
+        ws["D3"] = "#DIV/0!"
+        ws["E1"] = "=NOW()"
+        ws["F1"] = "=F2+1"
+        ws["F2"] = "=F1+1"  # circular pair
+        other = wb.create_sheet("Other")
+        other["A1"] = "=IF(IF(IF(IF(1,2,3),4,5),6,7),8,9)"
+        other["A2"] = "=[1]Rates!A1"
+        wb.save(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def stream(self, **options) -> str:
+        out = io.StringIO()
+        stream_formulas(self.path, out, **options)
+        return out.getvalue()
+
+    def test_rebuilds_legacy_result(self):
+        for options in ({"backend": "xml", "max_cells": 50, "jobs": 2},
+                        {"backend": "openpyxl", "max_cells": None, "memory_mb": 1}, {"backend": "xml"}):
+            rebuilt = read_ndjson(io.StringIO(self.stream(**options)))
+            legacy = legacy_json(self.path, **options)
+            self.assertEqual(rebuilt, legacy)
+            self.assertEqual(list(rebuilt), list(legacy))
+        self.assertEqual(len(legacy["circular_reference_groups"]), 1)
+        self.assertEqual(legacy["external_references"][0]["status"], "missing")
+
+    def test_record_order(self):
+        records = list(iter_records(io.StringIO(self.stream(backend="xml"))))
+        kinds = [r["record"] for r in records]
+        self.assertEqual(kinds[-1], "summary")
+        self.assertEqual(kinds.count("summary"), 1)
+        # Each sheet's formulas come out before any workbook-level finding
+        cells = [r["cell"] for r in records if r["record"] == "formula"]
+        self.assertTrue(cells[0].startswith("Model!") and cells[-1].startswith("Other!"))
+        first_merged = next(i for i, r in enumerate(records)
+                            if r.get("section") in ("hardcoded_overrides", "circular_reference_groups"))
+        self.assertLess(max(i for i, r in enumerate(records) if r["record"] == "formula"), first_merged)
+        summary = records[-1]
+        self.assertNotIn("formulas", summary["result"])
+        self.assertNotIn("circular_references", summary["result"])
+        self.assertEqual(summary["counts"]["formulas"], len(cells))
+
+    def test_truncated_stream_and_errors(self):
+        lines = self.stream(backend="xml").splitlines(keepends=True)
+        with self.assertRaises(ValueError):
+            read_ndjson(lines[:-1])
+        with self.assertRaises(ValueError):
+            read_ndjson(lines[1:])  # first formula record lost
+
+        broken = os.path.join(self.tmp.name, "broken.xlsx")
+        with open(broken, "wb") as f:
+            f.write(b"not a zip")
+        out = io.StringIO()
+        stream_formulas(broken, out)
+        records = list(iter_records(io.StringIO(out.getvalue())))
+        self.assertEqual([r["record"] for r in records], ["summary"])
+        self.assertEqual(read_ndjson(io.StringIO(out.getvalue())), legacy_json(broken))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-phase profile of the extractors.
+
+Run with: python test_profiler.py
+"""
+
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+from extract_formulas import extract_formulas
+from extract_structure import extract_structure
+from profiler import Profiler, run_profiled, trace_events
+
+SHEET_PHASES = ["stream", "column_consistency", "row_consistency", "hardcoded_overrides", "count_cells"]
+
+
+class ProfilerTests(unittest.TestCase):
+    def test_phases_in_order_with_items(self):
+        profiler = Profiler()
+        with profiler.phase("load") as items:
+            items["sheets"] = 2
+        profiler.begin("scan")
+        profiler.count(cells=10)
+        profiler.begin("merge", sheet="Model")  # ends "scan"
+        report = profiler.report()  # ends "merge"
+        self.assertEqual([p["name"] for p in report["phases"]], ["load", "scan", "merge"])
+        self.assertEqual([p["items"] for p in report["phases"]], [{"sheets": 2}, {"cells": 10}, {}])
+        self.assertEqual(report["phases"][2]["sheet"], "Model")
+        starts = [p["start_s"] for p in report["phases"]]
+        self.assertEqual(starts, sorted(starts))
+        self.assertGreaterEqual(report["wall_s"], sum(p["wall_s"] for p in report["phases"]))
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = Profiler(enabled=False)
+        with profiler.phase("load") as items:
+            items["sheets"] = 1
+        profiler.count(cells=3)
+        self.assertEqual(profiler.phases, [])
+
+
+class ExtractorProfileTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Model"
+        for r in range(1, 40):
+            ws.append([r, 2, f"=A{r}*B{r}"])
+        wb.create_sheet("Inputs")["A1"] = "=Model!C1"
+        wb.save(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_formula_profile(self):
+        plain = extract_formulas(self.path)
+        self.assertNotIn("profile", plain)
+        for jobs in (1, 2):
+            result = extract_formulas(self.path, jobs=jobs, profile=True)
+            profile = result.pop("profile")
+            self.assertEqual(json.loads(json.dumps(result, default=list)),
+                             json.loads(json.dumps(plain, default=list)))
+            names = [p["name"] for p in profile["phases"]]
+            self.assertEqual(names[:3], ["load", "scan", "merge"])
+            self.assertIn("circular_references", names)
+            self.assertEqual(names[-1], "narrative")
+            self.assertEqual(profile["phases"][1]["items"]["formulas"], 40)
+            self.assertEqual([(p["sheet"], p["name"]) for p in profile["sheets"]],
+                             [(sheet, name) for sheet in ("Model", "Inputs") for name in SHEET_PHASES])
+            self.assertEqual(profile["sheet_phases"]["stream"]["calls"], 2)
+            self.assertEqual(profile["sheet_phases"]["stream"]["items"]["formulas"], 40)
+            if jobs > 1:
+                self.assertNotIn(profile["pid"], {p["pid"] for p in profile["sheets"]})
+
+    def test_structure_profile(self):
+        result = extract_structure(self.path, profile=True)
+        profile = result.pop("profile")
+        self.assertEqual(result, extract_structure(self.path))
+        self.assertEqual([p["name"] for p in profile["phases"]], ["load", "metadata", "sheets", "tables", "summary"])
+        self.assertEqual(profile["phases"][0]["items"], {"sheets": 2})
+
+    def test_dumps(self):
+        trace_path = os.path.join(self.tmp.name, "trace.json")
+        result = run_profiled(lambda: extract_formulas(self.path, profile=True), trace_path)
+        with open(trace_path) as f:
+            trace = json.load(f)
+        self.assertEqual(trace, trace_events(result["profile"], "excel-auditor"))
+        spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(len(spans), len(result["profile"]["phases"]) + len(result["profile"]["sheets"]))
+        self.assertIn("stream Model", {e["name"] for e in spans})
+
+        stats_path = os.path.join(self.tmp.name, "audit.prof")
+        run_profiled(lambda: extract_formulas(self.path), stats_path)
+        functions = {func for _, _, func in pstats.Stats(stats_path).stats}
+        self.assertIn("merge_sheet_scans", functions)
+
+
+if __name__ == "__main__":
+    unittest.main()
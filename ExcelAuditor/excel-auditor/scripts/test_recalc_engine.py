@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests for the recalculation engine and the stale-cached-value detector.
+
+openpyxl never writes cached formula results, so fixtures are saved with
+openpyxl and then given the cached values Excel would have written.
+
+Run with: python test_recalc_engine.py
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import zipfile
+from decimal import ROUND_HALF_UP, Decimal
+
+from openpyxl import Workbook
+
+from extract_formulas import extract_formulas
+from recalc_engine import ExcelError, Evaluator, SheetValues, compile_formula
+
+ROWS = range(2, 32)
+
+
+def save_with_cached_values(wb: Workbook, path: str, cached: dict):
+    """Save `wb`, then write cached results ({"Sheet!A1": value}) into its formula cells."""
+    wb.save(path)
+    parts = {ws.title: f"xl/worksheets/sheet{i}.xml" for i, ws in enumerate(wb.worksheets, start=1)}
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            for title, part in parts.items():
+                if item.filename == part:
+                    data = _inject(data.decode("utf-8"), title, cached).encode("utf-8")
+            dst.writestr(item, data)
+    shutil.move(tmp, path)
+
+
+def _inject(xml: str, title: str, cached: dict) -> str:
+    def repl(m):
+        value = cached.get(f"{title}!{m.group(1)}")
+        if value is None:
+            return m.group(0)
+        if isinstance(value, bool):
+            kind, text = ' t="b"', str(int(value))
+        elif isinstance(value, ExcelError):
+            kind, text = ' t="e"', value
+        elif isinstance(value, str):
+            kind, text = ' t="str"', value
+        else:
+            kind, text = '', repr(float(value))
+        return f'<c r="{m.group(1)}"{kind}><f>{m.group(2)}</f><v>{text}</v></c>'
+    return re.sub(r'<c r="([A-Z]+\d+)"><f>(.*?)</f><v\s*/></c>', repl, xml)
+
+
+def excel_round(value: float) -> float:
+    """ROUND(value, 1) as Excel computes it: half away from zero, not banker's rounding."""
+    return float(Decimal(repr(value)).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP))
+
+
+def build_model(path: str, units: dict = None, tamper: dict = None):
+    """A small model covering the supported functions, with correct cached values.
+
+    `units` overrides input values after the cache was computed (a workbook
+    saved without recalculating); `tamper` overwrites cached results.
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Model"
+    rates = wb.create_sheet("Rates")
+    for r in range(1, 41):
+        rates.cell(r, 1, r)
+        rates.cell(r, 2, r / 100)
+
+    ws.append(["Units", "Price", "Revenue", "Bonus", "Running", "Rate", "Big", "Rate2", "Label"])
+    cached = {}
+    running = 0.0
+    values = {r: (r * 7) % 23 + 1 for r in ROWS}
+    revenue = {r: values[r] * 2.5 for r in ROWS}
+    big_total = sum(revenue[r] for r in ROWS if values[r] > 10)
+    for r in ROWS:
+        ws.cell(r, 1, values[r])
+        ws.cell(r, 2, 2.5)
+        ws.cell(r, 3, f"=A{r}*B{r}")
+        ws.cell(r, 4, f"=IF(C{r}>50,ROUND(C{r}*0.1,1),0)")
+        ws.cell(r, 5, f"=E{r - 1}+C{r}" if r > 2 else f"=C{r}")
+        ws.cell(r, 6, f"=VLOOKUP(A{r},Rates!$A$1:$B$40,2,FALSE)")
+        ws.cell(r, 7, f"=SUMIF($A$2:$A$31,\">10\",$C$2:$C$31)")
+        ws.cell(r, 8, f"=INDEX(Rates!$B$1:$B$40,MATCH(A{r},Rates!$A$1:$A$40,0))")
+        ws.cell(r, 9, f"=\"Q\"&A{r}")
+        running += revenue[r]
+        cached.update({
+            f"Model!C{r}": revenue[r],
+            f"Model!D{r}": excel_round(revenue[r] * 0.1) if revenue[r] > 50 else 0,
+            f"Model!E{r}": running,
+            f"Model!F{r}": values[r] / 100,
+            f"Model!G{r}": big_total,
+            f"Model!H{r}": values[r] / 100,
+            f"Model!I{r}": f"Q{values[r]}",
+        })
+    ws["K2"] = "=AVERAGE(C2:C31)/MAX(A2:A31)"
+    cached["Model!K2"] = sum(revenue.values()) / len(revenue) / max(values.values())
+    ws["K3"] = "=NOW()"  # outside the supported subset
+    for r, value in (units or {}).items():
+        ws.cell(r, 1, value)
+    cached.update(tamper or {})
+    save_with_cached_values(wb, path, cached)
+
+
+class EvaluatorTests(unittest.TestCase):
+    def setUp(self):
+        sheet = SheetValues("S")
+        for r, value in enumerate([1.0, 2.0, "x", True, None, 5.0], start=1):
+            if value is not None:
+                sheet.set(r, 1, value)
+        sheet.set(7, 1, ExcelError("#N/A"))
+        self.evaluator = Evaluator({"S": sheet})
+
+    def evaluate(self, formula: str, row: int = 10, col: int = 2):
+        return self.evaluator.value(compile_formula(formula, row, col, {"S"}), "S", row, col)
+
+    def test_operators(self):
+        self.assertEqual(self.evaluate("=-2^2"), 4.0)
+        self.assertEqual(self.evaluate("=1+2*3-4/2"), 5.0)
+        self.assertEqual(self.evaluate("=50%"), 0.5)
+        self.assertEqual(self.evaluate("=A1&\"-\"&A3&A4"), "1-xTRUE")
+        self.assertIs(self.evaluate("=\"abc\"=\"ABC\""), True)
+        self.assertIs(self.evaluate("=A5=0"), True)  # blank compares as 0
+        self.assertEqual(self.evaluate("=1/A5"), "#DIV/0!")
+        self.assertEqual(self.evaluate("=A3+1"), "#VALUE!")
+
+    def test_functions(self):
+        self.assertEqual(self.evaluate("=SUM(A1:A6)"), 8.0)  # text and booleans skipped
+        self.assertEqual(self.evaluate("=SUM(A1:A7)"), "#N/A")
+        self.assertEqual(self.evaluate("=AVERAGE(A1:A6)"), 8.0 / 3)
+        self.assertEqual(self.evaluate("=IFERROR(A7,0)"), 0.0)
+        self.assertEqual(self.evaluate("=ROUND(2.675,2)"), 2.68)
+        self.assertEqual(self.evaluate("=MATCH(5,A1:A6,0)"), 6.0)
+        self.assertEqual(self.evaluate("=INDEX(A1:A6,3)"), "x")
+        self.assertEqual(self.evaluate("=VLOOKUP(\"X\",A1:A6,1,FALSE)"), "x")
+        self.assertEqual(self.evaluate("=SUMIF(A1:A6,\">1\")"), 7.0)
+        self.assertEqual(self.evaluate("=MAX(A1:A6,-1)"), 5.0)
+        self.assertEqual(self.evaluate("=IF(A4,\"yes\")"), "yes")
+
+
+class StaleCachedValueTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xlsx")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def audit(self, backend: str = "xml") -> dict:
+        return extract_formulas(self.path, max_cells=None, backend=backend, recalc=True)
+
+    def test_consistent_cache_is_clean(self):
+        build_model(self.path)
+        result = self.audit()
+        self.assertEqual(result["stale_cached_values"], [])
+        summary = result["recalculation"]
+        self.assertEqual(summary["formulas"], 212)
+        self.assertEqual(summary["recalculated"], 211)
+        self.assertEqual((summary["unsupported"], summary["not_cached"]), (1, 0))
+        self.assertEqual(summary["unsupported_functions"], {"NOW": 1})
+        self.assertGreater(summary["vectorized"], 0)
+
+    def test_edited_cached_value(self):
+        build_model(self.path, tamper={"Model!C10": 999.0})
+        for backend in ("xml", "openpyxl"):
+            result = self.audit(backend)
+            self.assertEqual([f["cell"] for f in result["stale_cached_values"]], ["Model!C10"])
+            finding = result["stale_cached_values"][0]
+            self.assertEqual((finding["cached_value"], finding["difference"]), (999.0, 5.0 - 999.0))
+            self.assertIn("Stale cached values: 1 (+8)", result["risk_assessment"]["risk_factors"])
+            self.assertIn("stale_cached_value", [i["type"] for i in result["issues"]])
+
+    def test_inputs_changed_without_recalculation(self):
+        build_model(self.path, units={5: 40})
+        result = self.audit()
+        roots = sorted(f["cell"] for f in result["stale_cached_values"])
+        # Dependents of C5 (bonus, running total, SUMIF) are counted, not reported
+        self.assertEqual(roots, ["Model!C5", "Model!F5", "Model!H5", "Model!I5"])
+        self.assertEqual(result["recalculation"]["downstream"], 1 + 27 + 30 + 1)
+
+    def test_off_by_default(self):
+        build_model(self.path, tamper={"Model!C10": 999.0})
+        result = extract_formulas(self.path, max_cells=None)
+        self.assertNotIn("stale_cached_values", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed extractor result cache.
+
+Run with: python test_result_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from openpyxl import Workbook
+
+from audit_workbook import audit_workbook
+from result_cache import ResultCache, cached_audit_workbook, cached_extract_formulas, cached_extract_structure
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self.book = os.path.join(self.tmp.name, "model.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        for r in range(1, 30):
+            ws.cell(r, 1, r)
+            ws.cell(r, 2, f"=A{r}*2")
+        wb.save(self.book)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_returns_stored_result(self):
+        cache = ResultCache(self.cache_dir)
+        first = cached_extract_formulas(self.book, cache)
+        second = cached_extract_formulas(self.book, cache)
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_is_content_and_options(self):
+        cache = ResultCache(self.cache_dir)
+        cached_extract_structure(self.book, cache)
+        copy = os.path.join(self.tmp.name, "renamed.xlsx")
+        shutil.copy(self.book, copy)
+        result = cached_extract_structure(copy, cache)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(result["filename"], "renamed.xlsx")
+
+        cached_extract_formulas(self.book, cache, max_cells=10)
+        cached_extract_formulas(self.book, cache, max_cells=20)
+        self.assertEqual(cache.hits, 1)
+
+    def test_audit_is_one_entry(self):
+        cache = ResultCache(self.cache_dir)
+        first = cached_audit_workbook(self.book, cache)
+        copy = os.path.join(self.tmp.name, "renamed.xlsx")
+        shutil.copy(self.book, copy)
+        second = cached_audit_workbook(copy, cache)
+        self.assertEqual((cache.hits, cache.misses, cache.stats()["entries"]), (1, 1, 1))
+        self.assertEqual(first, audit_workbook(self.book))
+        self.assertEqual(second["structure"], audit_workbook(copy)["structure"])
+        self.assertEqual([second["filename"], second["formulas"]["filename"]], ["renamed.xlsx"] * 2)
+        self.assertEqual(first["formulas"], cached_extract_formulas(self.book, cache))
+
+    def test_key_includes_file_extension(self):
+        cache = ResultCache(self.cache_dir)
+        cached_extract_structure(self.book, cache)
+        upper = os.path.join(self.tmp.name, "MODEL.XLSX")
+        shutil.copy(self.book, upper)
+        cached_extract_structure(upper, cache)
+        self.assertEqual(cache.hits, 1)
+        legacy = os.path.join(self.tmp.name, "model.xls")
+        shutil.copy(self.book, legacy)
+        result = cached_extract_structure(legacy, cache)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(result["format"], "xls")
+
+    def test_errors_not_cached(self):
+        cache = ResultCache(self.cache_dir)
+        broken = os.path.join(self.tmp.name, "broken.xlsx")
+        with open(broken, "w") as f:
+            f.write("not a zip")
+        self.assertIn("error", cached_extract_structure(broken, cache))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.cache_dir)
+        keys = []
+        for i in range(3):
+            keys.append(cache.key(self.book, "test", {"i": i}))
+            cache.put(keys[-1], {"payload": os.urandom(2000).hex()})
+            time.sleep(0.01)
+        entry_size = cache.stats()["bytes"] // 3
+        self.assertIsNotNone(cache.get(keys[0]))  # now most recently used
+        cache.max_bytes = entry_size * 2 + entry_size // 2
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for full-coverage scans: the disk spill store, and hardcoded override
+detection beyond the old 2000-row / 100-column window.
+
+Run with: python test_spill_store.py
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+import spill_store
+from extract_formulas import extract_formulas
+from spill_store import MemoryBudget, SpillList, dump_json
+
+
+class SpillListTests(unittest.TestCase):
+    def test_spilled_items_replay_in_order(self):
+        items = SpillList()
+        items.extend({"cell": f"S!A{i}"} for i in range(10))
+        items.spill()
+        items.extend({"cell": f"S!A{i}"} for i in range(10, 15))
+        self.assertEqual(items.spilled, 10)
+        self.assertEqual(len(items), 15)
+        self.assertEqual([item["cell"] for item in items], [f"S!A{i}" for i in range(15)])
+        self.assertEqual(items[3], {"cell": "S!A3"})
+        self.assertEqual(items[-1], {"cell": "S!A14"})
+        self.assertEqual(items[:2], [{"cell": "S!A0"}, {"cell": "S!A1"}])
+
+    def test_budget_triggers_spill(self):
+        saved = spill_store.CHECK_INTERVAL
+        spill_store.CHECK_INTERVAL = 10
+        try:
+            items = SpillList(MemoryBudget(1))  # any process is over 1 MB
+            items.extend(range(95))
+        finally:
+            spill_store.CHECK_INTERVAL = saved
+        self.assertEqual(items.spilled, 90)
+        self.assertEqual(list(items), list(range(95)))
+
+    def test_dump_json_matches_json_dump(self):
+        items = SpillList(items=[{"a": [1, 2]}, {"b": "x\ny"}])
+        items.spill()
+        report = {"formulas": items, "empty": SpillList(), "meta": {"n": 2, "tags": []}}
+        out = io.StringIO()
+        dump_json(report, out)
+        expected = dict(report, formulas=list(items), empty=[])
+        self.assertEqual(out.getvalue(), json.dumps(expected, indent=2))
+
+
+class FullCoverageTests(unittest.TestCase):
+    def test_overrides_found_anywhere_in_sheet(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "wide.xlsx")
+            wb = Workbook()
+            ws = wb.active
+            for r in range(2, 2600):
+                ws.cell(r, 1, r)
+                ws.cell(r, 120, f"=A{r}*2")
+            ws.cell(2400, 120, 50000)
+            wb.save(path)
+
+            capped = extract_formulas(path, max_cells=1000)
+            full = extract_formulas(path, max_cells=None, memory_mb=1)
+
+        # The override is found even when the formula scan budget stops early
+        for result in (capped, full):
+            self.assertEqual([h["cell"] for h in result["hardcoded_overrides"]], ["Sheet!DP2400"])
+        self.assertTrue(capped["truncated"])
+        self.assertNotIn("truncated", full)
+        self.assertEqual(len(full["formulas"]), 2597)
+        # Under budget the compact records spill to disk and still read back in full
+        self.assertEqual(full["formulas"].spilled, 2597)
+        self.assertEqual(full["formulas"][-1]["cell"], "Sheet!DP2599")
+
+
+if __name__ == "__main__":
+    unittest.main()
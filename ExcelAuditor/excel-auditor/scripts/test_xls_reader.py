@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-demand XLS backend (xls_reader) and the XLS audit paths.
+
+Fixtures are written with xlwt; those tests are skipped when it (or xlrd)
+is not installed. FakeXlrdTests runs the same paths against a stand-in for
+the parts of xlrd's API that xls_reader uses, so they are covered without it.
+
+Run with: python test_xls_reader.py
+"""
+
+import datetime
+import importlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import extract_formulas
+from audit_workbook import audit_workbook
+from extract_formulas import HAS_XLRD, extract_formulas_dispatch
+from extract_structure import extract_structure
+
+try:
+    import xlwt
+    HAS_XLWT = True
+except ImportError:
+    HAS_XLWT = False
+
+if HAS_XLRD:
+    from xls_reader import XlsWorkbook
+
+
+def build_xls(path: str, rows: int = 40):
+    """Workbook with values of every cell type, hidden content and a merge."""
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet("Model")
+    ws.write(0, 0, "Units")
+    ws.write(0, 1, "Price")
+    ws.write(0, 2, "Revenue")
+    for r in range(1, rows):
+        ws.write(r, 0, r)
+        ws.write(r, 1, 2.5)
+        ws.write(r, 2, r * 2.5)
+    ws.write(5, 3, "=A6+1")  # formula text stored as a string
+    ws.write(6, 3, True)
+    ws.write(7, 3, datetime.date(2020, 1, 2), xlwt.easyxf(num_format_str="YYYY-MM-DD"))
+    ws.row(8).set_cell_error(3, "#DIV/0!")
+    ws.row(3).hidden = True
+    ws.col(4).hidden = True
+    ws.write(2, 4, "hidden column")
+    ws.merge(rows + 1, rows + 1, 0, 2)
+    ws.panes_frozen = True
+    ws.horz_split_pos = 1
+    ws.vert_split_pos = 1
+    notes = wb.add_sheet("Notes")
+    notes.write(0, 0, "read me")
+    notes.visibility = 1
+    wb.save(path)
+
+
+@unittest.skipUnless(HAS_XLRD and HAS_XLWT, "xlrd and xlwt are needed for XLS fixtures")
+class XlsReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "model.xls")
+        build_xls(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rows_and_sheet_properties(self):
+        with XlsWorkbook(self.path) as wb:
+            ws = wb.worksheets[0]
+            self.assertFalse(wb.book.sheet_loaded(0))
+            rows = list(ws.iter_rows())
+            self.assertFalse(wb.book.sheet_loaded(0))  # released after the scan
+            self.assertEqual(rows[0][:4], ("Units", "Price", "Revenue", None))
+            self.assertEqual([rows[r][3] for r in range(5, 9)],
+                             ["=A6+1", True, datetime.datetime(2020, 1, 2), "#DIV/0!"])
+            self.assertEqual((ws.dimensions, ws.max_row, ws.max_column), ("A1:E42", 42, 5))
+            self.assertEqual((ws.hidden_rows, ws.hidden_columns), ([4], [5]))
+            self.assertEqual((ws.freeze_panes, ws.merged_cells_count), ("B2", 1))
+            self.assertEqual([w.sheet_state for w in wb.worksheets], ["visible", "hidden"])
+
+            rows = wb.worksheets[1].iter_rows()
+            next(rows)
+            rows.close()  # abandoned iteration also unloads
+            self.assertFalse(wb.book.sheet_loaded(1))
+            self.assertFalse(wb.metadata["has_vba"])
+
+    def test_formula_audit_has_xlsx_schema(self):
+        result = extract_formulas_dispatch(self.path, max_cells=None)
+        self.assertEqual((result["format"], result["support_level"]), ("xls", "basic"))
+        for key in ("calc_cost", "formula_inconsistencies", "hardcoded_overrides", "hidden_content",
+                    "risk_assessment", "forensic_narrative", "external_references"):
+            self.assertIn(key, result)
+        self.assertEqual([f["cell"] for f in result["formulas"]], ["Model!D6"])
+        self.assertEqual(result["errors_found"][0]["cell"], "Model!D9")
+        hidden = result["hidden_content"]
+        self.assertEqual([s["name"] for s in hidden["hidden_sheets"]], ["Notes"])
+        self.assertEqual(hidden["hidden_rows"], [{"sheet": "Model", "row": 4}])
+        self.assertEqual(result, extract_formulas_dispatch(self.path, max_cells=None, jobs=2))
+
+    def test_structure_matches_single_pass(self):
+        structure = extract_structure(self.path)
+        model = structure["sheets"][0]
+        self.assertEqual((model["visibility"], model["freeze_panes"], model["merged_cells_count"]),
+                         ("visible", "B2", 1))
+        self.assertEqual(model["headers_sample"], ["Units", "Price", "Revenue"])
+        self.assertEqual(structure["sheets"][1]["visibility"], "hidden")
+        self.assertEqual(structure["summary"]["risk_flags"], ["Has hidden sheets"])
+
+        result = audit_workbook(self.path)
+        self.assertEqual(result["structure"], structure)
+        self.assertEqual(result["formulas"], extract_formulas_dispatch(self.path))
+
+
+# xlrd cell type codes and the #DIV/0! error code
+_EMPTY, _TEXT, _NUMBER, _DATE, _BOOLEAN, _ERROR, _BLANK = range(7)
+_DIV0 = 0x07
+
+
+class FakeSheet:
+    def __init__(self, rows, visibility=0, hidden_rows=(), hidden_columns=()):
+        self.rows = rows
+        self.visibility = visibility
+        self.nrows = len(rows)
+        self.ncols = max(len(row) for row in rows)
+        self.rowinfo_map = {r: types.SimpleNamespace(hidden=True) for r in hidden_rows}
+        self.colinfo_map = {c: types.SimpleNamespace(hidden=True) for c in hidden_columns}
+        self.panes_are_frozen, self.horz_split_pos, self.vert_split_pos = True, 1, 1
+        self.merged_cells = [(41, 42, 0, 3)]
+
+    def _cells(self, r):
+        row = list(self.rows[r]) + [None] * (self.ncols - len(self.rows[r]))
+        for value in row:
+            if value is None:
+                yield _EMPTY, ""
+            elif isinstance(value, bool):
+                yield _BOOLEAN, int(value)
+            elif isinstance(value, datetime.date):
+                yield _DATE, float((value - datetime.date(1899, 12, 30)).days)
+            elif value == "#DIV/0!":
+                yield _ERROR, _DIV0
+            elif isinstance(value, str):
+                yield _TEXT, value
+            else:
+                yield _NUMBER, float(value)
+
+    def row_types(self, r):
+        return [ctype for ctype, _ in self._cells(r)]
+
+    def row_values(self, r):
+        return [value for _, value in self._cells(r)]
+
+
+class FakeBook:
+    """xlrd.Book's public API, without the private _sheet_visibility/_supbook_types lists."""
+
+    datemode = 0
+    name_obj_list = []
+
+    def __init__(self, sheets: dict):
+        self._sheets = sheets
+        self.loaded = set()
+
+    def sheet_names(self):
+        return list(self._sheets)
+
+    def sheet_by_index(self, index):
+        self.loaded.add(index)
+        return list(self._sheets.values())[index]
+
+    def sheet_loaded(self, index):
+        return index in self.loaded
+
+    def unload_sheet(self, index):
+        self.loaded.discard(index)
+
+    def release_resources(self):
+        self.loaded.clear()
+
+
+def fake_book() -> FakeBook:
+    """The build_xls workbook as FakeSheets."""
+    rows = [["Units", "Price", "Revenue"]] + [[r, 2.5, r * 2.5] for r in range(1, 40)]
+    rows[2].extend([None, "hidden column"])
+    rows[5].append("=A6+1")
+    rows[6].append(True)
+    rows[7].append(datetime.date(2020, 1, 2))
+    rows[8].append("#DIV/0!")
+    rows += [[], [None, None, None, None, None]]
+    return FakeBook({
+        "Model": FakeSheet(rows, hidden_rows=[3], hidden_columns=[4]),
+        "Notes": FakeSheet([["read me"]], visibility=1),
+    })
+
+
+def fake_xlrd_modules() -> dict:
+    """sys.modules entries standing in for xlrd and the submodules xls_reader imports."""
+    xlrd = types.ModuleType("xlrd")
+    xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_TEXT, xlrd.XL_CELL_NUMBER = _EMPTY, _TEXT, _NUMBER
+    xlrd.XL_CELL_DATE, xlrd.XL_CELL_BOOLEAN, xlrd.XL_CELL_ERROR, xlrd.XL_CELL_BLANK = \
+        _DATE, _BOOLEAN, _ERROR, _BLANK
+    xlrd.colname = lambda col: "ABCDEFGHIJ"[col]
+    xlrd.open_workbook = lambda filepath, on_demand=False, formatting_info=False: fake_book()
+    biffh = types.ModuleType("xlrd.biffh")
+    biffh.error_text_from_code = {_DIV0: "#DIV/0!"}
+    book = types.ModuleType("xlrd.book")
+    book.SUPBOOK_EXTERNAL = 2
+    compdoc = types.ModuleType("xlrd.compdoc")
+    compdoc.CompDoc = lambda mem: types.SimpleNamespace(dirlist=[])
+    xldate = types.ModuleType("xlrd.xldate")
+    xldate.XLDateError = ValueError
+    xldate.xldate_as_datetime = \
+        lambda serial, datemode: datetime.datetime(1899, 12, 30) + datetime.timedelta(days=serial)
+    return {"xlrd": xlrd, "xlrd.biffh": biffh, "xlrd.book": book, "xlrd.compdoc": compdoc,
+            "xlrd.xldate": xldate}
+
+
+class FakeXlrdTests(unittest.TestCase):
+    """The XLS paths against fake_xlrd_modules, so they run without xlrd installed."""
+
+    def setUp(self):
+        modules = mock.patch.dict(sys.modules, fake_xlrd_modules())
+        modules.start()
+        self.addCleanup(modules.stop)
+        sys.modules.pop("xls_reader", None)
+        self.xls_reader = importlib.import_module("xls_reader")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "model.xls")
+        with open(self.path, "wb") as f:
+            f.write(b"\xd0\xcf\x11\xe0" + bytes(508))
+
+    def test_rows_and_sheet_properties(self):
+        with self.xls_reader.XlsWorkbook(self.path) as wb:
+            self.assertEqual([w.sheet_state for w in wb.worksheets], ["visible", "hidden"])
+            self.assertEqual(wb.book.loaded, set())  # loaded for visibility and released
+            ws = wb.worksheets[0]
+            rows = list(ws.iter_rows())
+            self.assertEqual(wb.book.loaded, set())
+            self.assertEqual(rows[0][:4], ("Units", "Price", "Revenue", None))
+            self.assertEqual([rows[r][3] for r in range(5, 9)],
+                             ["=A6+1", True, datetime.datetime(2020, 1, 2), "#DIV/0!"])
+            self.assertEqual((ws.dimensions, ws.max_row, ws.max_column), ("A1:E42", 42, 5))
+            self.assertEqual((ws.hidden_rows, ws.hidden_columns), ([4], [5]))
+            self.assertEqual((ws.freeze_panes, ws.merged_cells_count), ("B2", 1))
+            metadata = wb.metadata
+            self.assertEqual((metadata["external_links"], metadata["has_vba"]), ([], False))
+
+    def test_formula_audit(self):
+        readers = dict(extract_formulas.READERS, xls=self.xls_reader.XlsWorkbook)
+        with mock.patch.object(extract_formulas, "HAS_XLRD", True), \
+                mock.patch.object(extract_formulas, "READERS", readers):
+            result = extract_formulas_dispatch(self.path)
+        self.assertEqual((result["format"], result["support_level"]), ("xls", "basic"))
+        self.assertEqual([f["cell"] for f in result["formulas"]], ["Model!D6"])
+        self.assertEqual(result["errors_found"][0]["cell"], "Model!D9")
+        hidden = result["hidden_content"]
+        self.assertEqual([s["name"] for s in hidden["hidden_sheets"]], ["Notes"])
+        self.assertEqual(hidden["hidden_rows"], [{"sheet": "Model", "row": 4}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the direct XML backend (xlsx_reader) against openpyxl.
+
+Also checks that the --jobs process pool reproduces the serial audit.
+
+Fixtures are built on the fly: one workbook written by openpyxl, and one
+hand-assembled in the layout Excel itself writes (shared string table,
+shared formulas, date styles), which openpyxl cannot produce.
+
+Run with: python test_xlsx_reader.py
+"""
+
+import json
+import os
+import random
+import tempfile
+import unittest
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.formula import ArrayFormula
+
+from extract_formulas import extract_formulas
+from spill_store import json_default
+from xlsx_reader import SharedFormula, XlsxWorkbook
+
+
+def build_openpyxl_workbook(path: str, rows: int = 120):
+    """Workbook with formulas, overrides, errors and hidden content."""
+    rnd = random.Random(7)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Revenue Model"
+    ws.append(["Month", "Units", "Price", "Revenue", "Cost", "Margin"])
+    for r in range(2, rows):
+        ws.cell(r, 1, f"M{r}")
+        ws.cell(r, 2, rnd.randint(1, 100))
+        ws.cell(r, 3, rnd.random() * 10)
+        ws.cell(r, 4, f"=B{r}*C{r}")
+        ws.cell(r, 5, f"=D{r}*0.4+IF(B{r}>50,SUM(B$2:B{r}),0)")
+        ws.cell(r, 6, f"=D{r}-E{r}")
+    ws.cell(50, 4, 50000)
+    ws.cell(70, 6, "=D70+E70")
+    ws.cell(80, 4, "#DIV/0!")
+    ws.cell(2, 9, "=I3+1")
+    ws.cell(3, 9, "=I2+1")
+    ws["L2"] = ArrayFormula("L2:L3", "=SUM(B2:B3*C2:C3)")
+    ws.row_dimensions[10].hidden = True
+    ws.column_dimensions["H"].hidden = True
+
+    hidden = wb.create_sheet("Lookup")
+    hidden.sheet_state = "veryHidden"
+    for r in range(1, 10):
+        hidden.cell(r, 1, r)
+        hidden.cell(r, 2, f"=A{r}*2+TODAY()")
+
+    wb.defined_names["TaxRate"] = DefinedName("TaxRate", attr_text="'Revenue Model'!$C$2")
+    wb.save(path)
+
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Forecast" sheetId="1" r:id="rId1"/></sheets>
+<definedNames><definedName name="Growth">Forecast!$B$1</definedName><definedName name="_xlnm.Print_Area" localSheetId="0">Forecast!$A$1:$E$40</definedName></definedNames>
+</workbook>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy\\-mm\\-dd"/></numFmts>
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+SHARED_STRINGS = ["Period", "Revenue", "Growth", "Cost", "Margin", "Note"]
+
+
+def build_excel_style_workbook(path: str, rows: int = 40):
+    """Workbook laid out the way Excel writes it, with shared formulas."""
+    sst = "".join(f"<si><t>{s}</t></si>" for s in SHARED_STRINGS[:-1])
+    sst += '<si><r><t>Rich </t></r><r><rPr><b/></rPr><t>note</t></r><rPh sb="0" eb="1"><t>x</t></rPh></si>'
+    shared_strings = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'{sst}</sst>'
+    )
+
+    body = ['<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>'
+            '<c r="C1" t="s"><v>2</v></c><c r="D1" t="s"><v>3</v></c>'
+            '<c r="E1" t="s"><v>4</v></c><c r="F1" t="s"><v>5</v></c></row>']
+    for r in range(2, rows + 1):
+        cells = [f'<c r="A{r}" s="1"><v>{45000 + r}</v></c>', f'<c r="B{r}"><v>{r * 100}</v></c>']
+        if r == 2:
+            cells.append(f'<c r="C{r}"><f t="shared" ref="C2:C{rows}" si="0">B2/B$2-1+LOG10(B2)</f><v>0</v></c>')
+            cells.append(f'<c r="D{r}"><f t="shared" ref="D2:E{rows}" si="1">B2*0.6+SUM($B$2:B2)</f><v>0</v></c>')
+            cells.append(f'<c r="E{r}"><f t="shared" si="1"/><v>0</v></c>')
+        elif r == 20:
+            cells.append(f'<c r="C{r}"><v>0.25</v></c>')
+            cells.append(f'<c r="D{r}"><f>B19*0.6</f><v>0</v></c>')
+            cells.append(f'<c r="E{r}"><f t="shared" si="1"/><v>0</v></c>')
+        else:
+            cells.append(f'<c r="C{r}"><f t="shared" si="0"/><v>0</v></c>')
+            cells.append(f'<c r="D{r}"><f t="shared" si="1"/><v>0</v></c>')
+            cells.append(f'<c r="E{r}"><f t="shared" si="1"/><v>0</v></c>')
+        if r == 5:
+            cells.append(f'<c r="F{r}" t="e"><f>1/0</f><v>#DIV/0!</v></c>')
+        if r == 6:
+            cells.append(f'<c r="F{r}" t="e"><v>#N/A</v></c>')
+        if r == 7:
+            cells.append(f'<c r="F{r}" t="b"><v>1</v></c>')
+        if r == 8:
+            cells.append(f'<c r="F{r}" t="inlineStr"><is><t>=not a formula</t></is></c>')
+        if r == 9:
+            cells.append(f'<c r="F{r}"><f>"Q1!A1 "&amp;A9</f><v>0</v></c>')
+        hidden = ' hidden="1"' if r in (12, 13) else ''
+        body.append(f'<row r="{r}"{hidden}>{"".join(cells)}</row>')
+
+    sheet = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<dimension ref="A1:F{rows}"/>'
+        '<cols><col min="6" max="6" width="9" hidden="1"/></cols>'
+        f'<sheetData>{"".join(body)}</sheetData></worksheet>'
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", CONTENT_TYPES)
+        z.writestr("_rels/.rels", ROOT_RELS)
+        z.writestr("xl/workbook.xml", WORKBOOK)
+        z.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+        z.writestr("xl/styles.xml", STYLES)
+        z.writestr("xl/sharedStrings.xml", shared_strings)
+        z.writestr("xl/worksheets/sheet1.xml", sheet)
+
+
+def openpyxl_rows(path: str) -> dict:
+    """Row tuples per sheet from openpyxl read-only, array formulas as text."""
+    wb = load_workbook(path, read_only=True)
+    rows = {}
+    for ws in wb.worksheets:
+        rows[ws.title] = [
+            tuple(v.text if isinstance(v, ArrayFormula) else v for v in values)
+            for values in ws.iter_rows(values_only=True)
+        ]
+    wb.close()
+    return rows
+
+
+def xml_rows(path: str) -> dict:
+    with XlsxWorkbook(path) as wb:
+        return {ws.title: list(ws.iter_rows()) for ws in wb.worksheets}
+
+
+class TestXlsxReaderParity(unittest.TestCase):
+    """The XML backend must see exactly what openpyxl sees."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.openpyxl_path = os.path.join(cls.tmp.name, "openpyxl.xlsx")
+        cls.excel_path = os.path.join(cls.tmp.name, "excel.xlsx")
+        build_openpyxl_workbook(cls.openpyxl_path)
+        build_excel_style_workbook(cls.excel_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def assert_same_audit(self, path, max_cells=50000):
+        expected = extract_formulas(path, max_cells, backend="openpyxl")
+        actual = extract_formulas(path, max_cells, backend="xml")
+        self.assertEqual(json.dumps(actual, default=json_default), json.dumps(expected, default=json_default))
+        return actual
+
+    def test_row_values_match_openpyxl(self):
+        for path in (self.openpyxl_path, self.excel_path):
+            self.assertEqual(xml_rows(path), openpyxl_rows(path))
+
+    def test_audit_matches_openpyxl_workbook(self):
+        result = self.assert_same_audit(self.openpyxl_path)
+        self.assertTrue(result["hardcoded_overrides"])
+        self.assertTrue(result["hidden_content"]["very_hidden_sheets"])
+        self.assertIn("Revenue Model!L2", [f["cell"] for f in result["formulas"]])
+
+    def test_audit_matches_excel_style_workbook(self):
+        result = self.assert_same_audit(self.excel_path)
+        cells = {f["cell"]: f["formula"] for f in result["formulas"]}
+        self.assertEqual(cells["Forecast!C3"], "=B3/B$2-1+LOG10(B3)")
+        self.assertEqual(cells["Forecast!E7"], "=C7*0.6+SUM($B$2:C7)")
+        self.assertEqual(result["hidden_content"]["hidden_rows"][0]["row"], 12)
+
+    def test_truncation_matches_openpyxl(self):
+        for max_cells in (7, 100, 1000):
+            self.assert_same_audit(self.openpyxl_path, max_cells)
+            self.assert_same_audit(self.excel_path, max_cells)
+
+    def test_hidden_rows_and_columns_listed_in_full(self):
+        path = os.path.join(self.tmp.name, "hidden.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        for r in range(1, 1601):
+            ws.append([r, r * 2])
+        ws["BJ1"] = "note"  # column 62
+        ws.row_dimensions[5].hidden = True
+        ws.row_dimensions[1500].hidden = True
+        ws.column_dimensions["BJ"].hidden = True
+        wb.save(path)
+        result = self.assert_same_audit(path, max_cells=None)
+        # Two cells in each hidden row, plus the hidden column's one cell
+        hidden = result["hidden_content"]
+        self.assertEqual(hidden["total_hidden_cells_estimate"], 5)
+        self.assertEqual([r["row"] for r in hidden["hidden_rows"]], [5, 1500])
+        self.assertEqual([c["column"] for c in hidden["hidden_columns"]], ["BJ"])
+
+
+class TestParallelSheets(unittest.TestCase):
+    """--jobs must produce exactly the serial result, budget cut-offs included."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "multi.xlsx")
+        build_openpyxl_workbook(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_parallel_matches_serial(self):
+        for backend in ("openpyxl", "xml"):
+            # 1440 ends the first sheet and cuts the second one part-way
+            for max_cells in (0, 7, 500, 1428, 1440, 50000):
+                serial = extract_formulas(self.path, max_cells, backend=backend)
+                parallel = extract_formulas(self.path, max_cells, backend=backend, jobs=3)
+                self.assertEqual(json.dumps(parallel, default=json_default),
+                                 json.dumps(serial, default=json_default), f"{backend}, max_cells={max_cells}")
+
+
+class TestSharedFormula(unittest.TestCase):
+    """Shared formula expansion follows Excel's relative-reference rules."""
+
+    def translate(self, formula, origin, dest):
+        return SharedFormula(formula, *origin).translate(*dest)
+
+    def test_relative_and_absolute_refs(self):
+        self.assertEqual(self.translate("=A1+$B1+C$1+$D$1", (1, 5), (3, 6)),
+                         "=B3+$B3+D$1+$D$1")
+
+    def test_ranges(self):
+        self.assertEqual(self.translate("=SUM(A1:B2)+SUM(C:C)+SUM(2:3)", (1, 1), (2, 2)),
+                         "=SUM(B2:C3)+SUM(D:D)+SUM(3:4)")
+
+    def test_leaves_strings_names_and_functions(self):
+        self.assertEqual(self.translate('="A1"&LOG10(A1)&Q1!B2&\'My Sheet\'!C3', (1, 1), (2, 1)),
+                         '="A1"&LOG10(A2)&Q1!B3&\'My Sheet\'!C4')
+
+    def test_out_of_range_is_ref_error(self):
+        self.assertEqual(self.translate("=A2", (3, 2), (1, 2)), "=#REF!")
+
+
+if __name__ == "__main__":
+    unittest.main()
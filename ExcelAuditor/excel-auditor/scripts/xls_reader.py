@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""On-demand XLS (Excel 97-2003) reader for the formula scan.
+
+Wraps xlrd behind the backend interface of xlsx_reader.XlsxWorkbook, so BIFF
+workbooks go through the same SheetScan pipeline and output schema as XLSX.
+The workbook is opened with `on_demand=True`: only the workbook globals are
+parsed up front, each sheet is loaded when its rows are iterated and
+unloaded (`unload_sheet`) as soon as the scan has finished with it, so peak
+memory is one sheet rather than the whole file.
+
+xlrd exposes each formula cell's cached result, not its formula text, so
+only text cells starting with `=` reach the formula analyzers; errors,
+values, hidden rows and columns, merged cells and the rest are complete.
+"""
+
+import mmap
+
+import xlrd
+from xlrd.biffh import error_text_from_code
+from xlrd.book import SUPBOOK_EXTERNAL
+from xlrd.compdoc import CompDoc
+from xlrd.xldate import XLDateError, xldate_as_datetime
+
+SHEET_STATES = {0: "visible", 1: "hidden", 2: "veryHidden"}
+_EMPTY_TYPES = (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK)
+_VBA_STORAGE = "_VBA_PROJECT_CUR"
+
+
+def read_has_vba(filepath: str) -> bool:
+    """Whether the OLE compound file carries a VBA project storage.
+
+    Only the directory sectors are read, through a memory map.
+    """
+    try:
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mem:
+            return any(entry.name == _VBA_STORAGE for entry in CompDoc(mem).dirlist)
+    except Exception:
+        return False
+
+
+class XlsWorksheet:
+    """One BIFF worksheet, loaded for the duration of `iter_rows`.
+
+    `dimensions`, `max_row`, `max_column`, hidden rows and columns, freeze
+    panes and the merged-cell count are filled in when the sheet is loaded,
+    so read them after iterating.
+    """
+
+    def __init__(self, workbook: "XlsWorkbook", index: int, title: str, sheet_state: str):
+        self.parent = workbook
+        self.index = index
+        self.title = title
+        self.sheet_state = sheet_state
+        self.dimensions = None
+        self.max_row = None
+        self.max_column = None
+        self.hidden_rows = []
+        self.hidden_columns = []
+        self.freeze_panes = None
+        self.has_filters = index in workbook.filter_sheets
+        self.merged_cells_count = 0
+
+    def _read_properties(self, sheet):
+        self.sheet_state = SHEET_STATES.get(sheet.visibility, "visible")
+        if sheet.nrows and sheet.ncols:
+            self.max_row, self.max_column = sheet.nrows, sheet.ncols
+            self.dimensions = f"A1:{xlrd.colname(sheet.ncols - 1)}{sheet.nrows}"
+        # Row and column info, panes and merges need formatting_info
+        self.hidden_rows = sorted(r + 1 for r, info in sheet.rowinfo_map.items() if info.hidden)
+        self.hidden_columns = sorted(c + 1 for c, info in sheet.colinfo_map.items() if info.hidden)
+        if sheet.panes_are_frozen and (sheet.horz_split_pos or sheet.vert_split_pos):
+            self.freeze_panes = f"{xlrd.colname(sheet.vert_split_pos)}{sheet.horz_split_pos + 1}"
+        self.merged_cells_count = len(sheet.merged_cells)
+
+    def iter_rows(self):
+        """Yield one tuple of cell values per row, starting at row 1.
+
+        Values follow the openpyxl conventions: None for empty cells, bools,
+        datetimes for date-formatted numbers and error strings such as
+        `#DIV/0!`. The sheet is unloaded when iteration ends or is abandoned.
+        """
+        book = self.parent.book
+        datemode = book.datemode
+        sheet = book.sheet_by_index(self.index)
+        try:
+            self._read_properties(sheet)
+            for r in range(sheet.nrows):
+                types = sheet.row_types(r)
+                values = sheet.row_values(r)
+                for c, ctype in enumerate(types):
+                    if ctype == xlrd.XL_CELL_NUMBER:
+                        continue
+                    if ctype in _EMPTY_TYPES:
+                        values[c] = None
+                    elif ctype == xlrd.XL_CELL_TEXT:
+                        values[c] = values[c] or None
+                    elif ctype == xlrd.XL_CELL_DATE:
+                        try:
+                            values[c] = xldate_as_datetime(values[c], datemode)
+                        except (XLDateError, ValueError, OverflowError):
+                            pass  # out of the date range: keep the serial number
+                    elif ctype == xlrd.XL_CELL_BOOLEAN:
+                        values[c] = bool(values[c])
+                    elif ctype == xlrd.XL_CELL_ERROR:
+                        values[c] = error_text_from_code.get(values[c], f"#ERROR({values[c]})")
+                yield tuple(values)
+        finally:
+            book.unload_sheet(self.index)
+
+
+class XlsWorkbook:
+    """xlrd workbook behind the XlsxWorkbook interface, sheets loaded on demand.
+
+    `data_only` is accepted for interface parity; BIFF cells only ever
+    expose cached values.
+    """
+
+    def __init__(self, filepath: str, data_only: bool = False):
+        self._filepath = filepath
+        self._metadata = None
+        try:
+            self.book = xlrd.open_workbook(filepath, on_demand=True, formatting_info=True)
+        except Exception:
+            # formatting_info is not supported by every BIFF version
+            self.book = xlrd.open_workbook(filepath, on_demand=True)
+
+        names = [n for n in self.book.name_obj_list if not (n.macro or n.binary)]
+        self.filter_sheets = {n.scope for n in names if n.builtin and n.name == "_FilterDatabase"}
+        self._names = [n for n in names if not n.builtin]
+        self.named_range_count = sum(1 for n in self._names if n.scope == -1)
+        self.sheetnames = self.book.sheet_names()
+        self.worksheets = [
+            XlsWorksheet(self, index, name, SHEET_STATES.get(self._sheet_visibility(index), "visible"))
+            for index, name in enumerate(self.sheetnames)
+        ]
+
+    def _sheet_visibility(self, index: int) -> int:
+        """The sheet's BOUNDSHEET visibility code, without loading it if possible.
+
+        xlrd only exposes `Sheet.visibility` on a loaded sheet. Its
+        workbook-level list is private, so when it is missing the sheet is
+        loaded for the attribute and unloaded again.
+        """
+        visibility = getattr(self.book, "_sheet_visibility", None)
+        if visibility is not None and index < len(visibility):
+            return visibility[index]
+        loaded = self.book.sheet_loaded(index)
+        try:
+            return self.book.sheet_by_index(index).visibility
+        finally:
+            if not loaded:
+                self.book.unload_sheet(index)
+
+    @property
+    def metadata(self) -> dict:
+        """The read_workbook_metadata schema, from the BIFF workbook globals.
+
+        External workbooks come from the SUPBOOK records; xlrd does not keep
+        their paths, so `target` is None, and only lists their types
+        privately, so a version without that list reports none. BIFF has no connection or pivot
+        cache parts to read and does not store the calculation mode globally.
+        """
+        if self._metadata is None:
+            book = self.book
+            external = sum(1 for t in getattr(book, "_supbook_types", ()) if t == SUPBOOK_EXTERNAL)
+            self._metadata = {
+                "sheets": [{"name": ws.title, "state": ws.sheet_state, "kind": "worksheet", "part": None}
+                           for ws in self.worksheets],
+                "defined_names": [{
+                    "name": n.name,
+                    "refers_to": (getattr(n.result, "text", None) or "")[:100],
+                    "scope": "global" if n.scope == -1 else (
+                        self.sheetnames[n.scope] if 0 <= n.scope < len(self.sheetnames) else f"sheet_{n.scope}"),
+                    "hidden": bool(n.hidden),
+                } for n in self._names],
+                "external_links": [{"index": index, "part": None, "target": None, "sheet_names": [],
+                                    "defined_names": []} for index in range(1, external + 1)],
+                "connections": [],
+                "pivot_caches": [],
+                "calc_mode": "unknown",
+                "has_vba": read_has_vba(self._filepath),
+            }
+        return self._metadata
+
+    def __getitem__(self, name: str) -> XlsWorksheet:
+        for ws in self.worksheets:
+            if ws.title == name:
+                return ws
+        raise KeyError(f"Worksheet {name} does not exist.")
+
+    def close(self):
+        self.book.release_resources()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
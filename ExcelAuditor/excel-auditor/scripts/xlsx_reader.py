@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+"""Streaming XLSX reader for the formula scan.
+
+Reads worksheet XML straight out of the zip with ElementTree.iterparse and
+yields plain row tuples, clearing parsed elements as it goes. Nothing but
+the cell coordinate, formula text, cached value and type is ever built, so
+memory stays roughly constant per row. Shared formulas are expanded here and
+array formulas are reported by their anchor cell.
+
+Row tuples follow openpyxl's read-only `iter_rows(values_only=True)`
+conventions (row 1 first, missing rows and cells padded with None, width
+taken from the <dimension> tag) so both backends feed SheetScan identically.
+"""
+
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils import get_column_letter, column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import (
+    CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601,
+)
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_ROW = f"{{{NS_MAIN}}}row"
+_CELL = f"{{{NS_MAIN}}}c"
+_VALUE = f"{{{NS_MAIN}}}v"
+_FORMULA = f"{{{NS_MAIN}}}f"
+_INLINE = f"{{{NS_MAIN}}}is"
+_TEXT = f"{{{NS_MAIN}}}t"
+_RUN = f"{{{NS_MAIN}}}r"
+_COL = f"{{{NS_MAIN}}}col"
+_DIMENSION = f"{{{NS_MAIN}}}dimension"
+_SHEET_DATA = f"{{{NS_MAIN}}}sheetData"
+_PANE = f"{{{NS_MAIN}}}pane"
+_AUTO_FILTER = f"{{{NS_MAIN}}}autoFilter"
+_MERGE_CELL = f"{{{NS_MAIN}}}mergeCell"
+_PIVOT_CACHE_DEFINITION = f"{{{NS_MAIN}}}pivotCacheDefinition"
+_CACHE_SOURCE = f"{{{NS_MAIN}}}cacheSource"
+_WORKSHEET_SOURCE = f"{{{NS_MAIN}}}worksheetSource"
+_CACHE_FIELDS = f"{{{NS_MAIN}}}cacheFields"
+
+# <connection type="..."> codes (ECMA-376 Part 1, 18.13.1)
+CONNECTION_TYPES = {"1": "odbc", "2": "dao", "3": "file", "4": "web", "5": "oledb", "6": "text",
+                    "7": "ado", "8": "dsp"}
+_SECRET_RE = re.compile(r'\b(password|pwd)\s*=\s*[^;]*', re.IGNORECASE)
+
+_DIGITS = "0123456789"
+
+
+def _local_name(tag: str) -> str:
+    """Strip the XML namespace from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _part_path(base_dir: str, target: str) -> str:
+    """Resolve a relationship target against the directory of its source part."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def read_relationships(archive: zipfile.ZipFile, rels_part: str, base_dir: str) -> dict:
+    """Map relationship Id -> (type, resolved part path) for a .rels part."""
+    if rels_part not in archive.namelist():
+        return {}
+    rels = ET.fromstring(archive.read(rels_part))
+    result = {}
+    for rel in rels.iter(f'{{{NS_PKG_REL}}}Relationship'):
+        target = rel.get('Target', '')
+        if rel.get('TargetMode') != 'External':
+            target = _part_path(base_dir, target)
+        result[rel.get('Id')] = (rel.get('Type', ''), target)
+    return result
+
+
+def worksheet_parts(archive: zipfile.ZipFile) -> dict:
+    """Map each worksheet name to its XML part inside an XLSX zip."""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = read_relationships(archive, 'xl/_rels/workbook.xml.rels', 'xl')
+
+    parts = {}
+    for sheet in workbook.iter(f'{{{NS_MAIN}}}sheet'):
+        rel_type, target = rels.get(sheet.get(f'{{{NS_REL}}}id'), ('', None))
+        if target and rel_type.endswith('/worksheet'):
+            parts[sheet.get('name')] = target
+    return parts
+
+
+def read_hidden_dimensions(archive: zipfile.ZipFile, part: str,
+                           max_row: int = None, max_col: int = None) -> tuple:
+    """Return (hidden_rows, hidden_columns) for a sheet part.
+
+    Reads the <cols> block and the <row> tags of the whole sheet, clearing
+    each row as it goes, so memory stays flat. As with XlsxWorksheet, rows
+    past the sheet's <dimension> are left out and columns are reported by
+    the first index of each hidden <col> span, so both backends see the same
+    hidden rows and columns. `max_row`/`max_col` limit the read to a
+    sample of the sheet's first rows and columns.
+    """
+    hidden_rows = []
+    hidden_cols = []
+    row_counter = 0
+    dimension_row = None
+    sheet_data = None
+
+    with archive.open(part) as src:
+        for event, elem in ET.iterparse(src, events=('start', 'end')):
+            tag = _local_name(elem.tag)
+            if event == 'end':
+                if tag == 'row' and sheet_data is not None:
+                    sheet_data.clear()  # drops the finished row and its cells
+                continue
+            if tag == 'sheetData':
+                sheet_data = elem
+            elif tag == 'col':
+                col_min = int(elem.get('min', 0))
+                if (max_col is None or col_min < max_col) and elem.get('hidden') in ('1', 'true'):
+                    hidden_cols.append(col_min)
+            elif tag == 'dimension':
+                try:
+                    dimension_row = range_boundaries(elem.get('ref', ''))[3]
+                except (TypeError, ValueError):
+                    dimension_row = None
+            elif tag == 'row':
+                row_counter = int(elem.get('r', row_counter + 1))
+                if max_row is not None and row_counter >= max_row:
+                    break
+                if dimension_row is not None and row_counter > dimension_row:
+                    break
+                if elem.get('hidden') in ('1', 'true'):
+                    hidden_rows.append(row_counter)
+            elif tag in ('mergeCells', 'conditionalFormatting', 'pageMargins'):
+                break
+
+    return hidden_rows, sorted(hidden_cols)
+
+
+def read_sheet_dimension(archive: zipfile.ZipFile, part: str) -> tuple:
+    """Return (max_row, max_column) from a sheet part's <dimension> tag.
+
+    Parsing stops at <sheetData>, so only the part's header is decompressed.
+    Returns (None, None) when the tag is missing or malformed.
+    """
+    with archive.open(part) as src:
+        for _, elem in ET.iterparse(src, events=('start',)):
+            if elem.tag == _DIMENSION:
+                try:
+                    _, _, max_col, max_row = range_boundaries(elem.get('ref', ''))
+                except (TypeError, ValueError):
+                    break
+                return max_row, max_col
+            if elem.tag == _SHEET_DATA:
+                break
+    return None, None
+
+
+def read_defined_names(workbook_root, sheetnames: list) -> list:
+    """Defined names from a parsed workbook.xml: name, refers_to, scope, hidden."""
+    names = []
+    for defn in workbook_root.iter(f'{{{NS_MAIN}}}definedName'):
+        local = defn.get('localSheetId')
+        scope = "global"
+        if local is not None:
+            idx = int(local)
+            scope = sheetnames[idx] if 0 <= idx < len(sheetnames) else f"sheet_{idx}"
+        names.append({
+            "name": defn.get('name'),
+            "refers_to": (defn.text or '')[:100],
+            "scope": scope,
+            "hidden": defn.get('hidden') in ('1', 'true'),
+        })
+    return names
+
+
+def read_external_links(archive: zipfile.ZipFile, workbook_root, rels: dict) -> list:
+    """External workbooks referenced by the workbook, in `[n]` formula-index order.
+
+    Formulas point at external workbooks as `[1]Sheet!A1`, where n is the
+    position of the link in workbook.xml's <externalReferences>. Each link's
+    target path comes from its externalLink part's relationships.
+    """
+    links = []
+    for index, ref in enumerate(workbook_root.iter(f'{{{NS_MAIN}}}externalReference'), start=1):
+        rel_type, part = rels.get(ref.get(f'{{{NS_REL}}}id'), ('', None))
+        link = {"index": index, "part": part, "target": None, "sheet_names": [], "defined_names": []}
+        if part and part in archive.namelist():
+            base_dir, name = posixpath.split(part)
+            link_rels = read_relationships(archive, f"{base_dir}/_rels/{name}.rels", base_dir)
+            root = ET.fromstring(archive.read(part))
+            book = root.find(f'{{{NS_MAIN}}}externalBook')
+            if book is not None:
+                link["target"] = link_rels.get(book.get(f'{{{NS_REL}}}id'), ('', None))[1]
+                link["sheet_names"] = [s.get('val') for s in book.iter(f'{{{NS_MAIN}}}sheetName')]
+                link["defined_names"] = [d.get('name') for d in book.iter(f'{{{NS_MAIN}}}definedName')]
+            elif root.find(f'{{{NS_MAIN}}}ddeLink') is not None:
+                dde = root.find(f'{{{NS_MAIN}}}ddeLink')
+                link["target"] = f"DDE:{dde.get('ddeService')}|{dde.get('ddeTopic')}"
+        links.append(link)
+    return links
+
+
+def read_connections(archive: zipfile.ZipFile, rels: dict) -> list:
+    """Data connections declared in the workbook's connections part.
+
+    Returns id, name, type, source (connection string, file or URL, with
+    passwords masked), command, refresh_on_load and odc_file per connection.
+    """
+    part = next((target for rel_type, target in rels.values() if rel_type.endswith('/connections')), None)
+    if part is None or part not in archive.namelist():
+        return []
+    connections = []
+    for conn in ET.fromstring(archive.read(part)).iter(f'{{{NS_MAIN}}}connection'):
+        db = conn.find(f'{{{NS_MAIN}}}dbPr')
+        text = conn.find(f'{{{NS_MAIN}}}textPr')
+        web = conn.find(f'{{{NS_MAIN}}}webPr')
+        source = command = None
+        if db is not None:
+            source = _SECRET_RE.sub(r'\1=***', db.get('connection', ''))
+            command = (db.get('command') or '')[:200] or None
+        elif text is not None:
+            source = text.get('sourceFile')
+        elif web is not None:
+            source = web.get('url')
+        connections.append({
+            "id": conn.get('id'),
+            "name": conn.get('name'),
+            "type": CONNECTION_TYPES.get(conn.get('type'), conn.get('type')),
+            "source": source,
+            "command": command,
+            "refresh_on_load": conn.get('refreshOnLoad') in ('1', 'true'),
+            "odc_file": conn.get('odcFile'),
+        })
+    return connections
+
+
+def read_pivot_caches(archive: zipfile.ZipFile, workbook_root, rels: dict) -> list:
+    """Pivot caches and the data each one was built from.
+
+    `source_type` is worksheet, external (a data connection, see
+    `connection_id`), consolidation or scenario. Worksheet sources give the
+    sheet and range or the defined name; a source in another workbook also
+    has its `target` path. Only the head of each cache definition is read,
+    not its shared items.
+    """
+    caches = []
+    for cache in workbook_root.iter(f'{{{NS_MAIN}}}pivotCache'):
+        _, part = rels.get(cache.get(f'{{{NS_REL}}}id'), ('', None))
+        entry = {"cache_id": cache.get('cacheId'), "part": part, "source_type": None, "sheet": None,
+                 "ref": None, "name": None, "target": None, "connection_id": None,
+                 "refresh_on_load": False, "record_count": None}
+        if part and part in archive.namelist():
+            with archive.open(part) as src:
+                for _, elem in ET.iterparse(src, events=('start',)):
+                    if elem.tag == _PIVOT_CACHE_DEFINITION:
+                        entry["refresh_on_load"] = elem.get('refreshOnLoad') in ('1', 'true')
+                        count = elem.get('recordCount')
+                        entry["record_count"] = int(count) if count and count.isdigit() else None
+                    elif elem.tag == _CACHE_SOURCE:
+                        entry["source_type"] = elem.get('type', 'worksheet')
+                        entry["connection_id"] = elem.get('connectionId')
+                    elif elem.tag == _WORKSHEET_SOURCE:
+                        entry["sheet"] = elem.get('sheet')
+                        entry["ref"] = elem.get('ref')
+                        entry["name"] = elem.get('name')
+                        rel_id = elem.get(f'{{{NS_REL}}}id')
+                        if rel_id:
+                            base_dir, name = posixpath.split(part)
+                            cache_rels = read_relationships(archive, f"{base_dir}/_rels/{name}.rels", base_dir)
+                            entry["target"] = cache_rels.get(rel_id, ('', None))[1]
+                    elif elem.tag == _CACHE_FIELDS:
+                        break
+        caches.append(entry)
+    return caches
+
+
+def read_workbook_metadata(archive: zipfile.ZipFile) -> dict:
+    """Workbook-level metadata from workbook.xml and its relationships.
+
+    Returns sheets (name, state, kind, part), defined names, external links,
+    data connections, pivot cache sources, the calculation mode and whether
+    a VBA project is present. No sheet part is read.
+    """
+    names = archive.namelist()
+    root = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = read_relationships(archive, 'xl/_rels/workbook.xml.rels', 'xl')
+
+    sheets = []
+    for sheet in root.iter(f'{{{NS_MAIN}}}sheet'):
+        rel_type, target = rels.get(sheet.get(f'{{{NS_REL}}}id'), ('', None))
+        kind = rel_type.rsplit('/', 1)[-1] or "unknown"
+        sheets.append({
+            "name": sheet.get('name'),
+            "state": sheet.get('state', 'visible'),
+            "kind": kind,
+            "part": target if kind == "worksheet" and target in names else None,
+        })
+    calc = root.find(f'{{{NS_MAIN}}}calcPr')
+    return {
+        "sheets": sheets,
+        "defined_names": read_defined_names(root, [s["name"] for s in sheets]),
+        "external_links": read_external_links(archive, root, rels),
+        "connections": read_connections(archive, rels),
+        "pivot_caches": read_pivot_caches(archive, root, rels),
+        "calc_mode": calc.get('calcMode', 'auto') if calc is not None else 'auto',
+        "has_vba": any(name.endswith('vbaProject.bin') for name in names),
+    }
+
+
+def read_sheet_tables(archive: zipfile.ZipFile, part: str) -> list:
+    """Tables (name, display_name, range) attached to a sheet part."""
+    base_dir, name = posixpath.split(part)
+    tables = []
+    for rel_type, target in read_relationships(archive, f"{base_dir}/_rels/{name}.rels", base_dir).values():
+        if rel_type.endswith('/table') and target in archive.namelist():
+            table = ET.fromstring(archive.read(target))
+            tables.append({
+                "name": table.get('name'),
+                "range": table.get('ref'),
+                "display_name": table.get('displayName'),
+            })
+    return tables
+
+
+def read_sheet_properties(archive: zipfile.ZipFile, part: str) -> dict:
+    """Freeze panes, autofilter and merged-cell count of a sheet part.
+
+    Start tags only, so rows are never built, but the whole part is
+    decompressed: the merge list and autofilter follow the cell data.
+    """
+    props = {"freeze_panes": None, "has_filters": False, "merged_cells_count": 0}
+    with archive.open(part) as src:
+        for _, elem in ET.iterparse(src, events=('start',)):
+            tag = elem.tag
+            if tag == _PANE:
+                props["freeze_panes"] = elem.get('topLeftCell')
+            elif tag == _AUTO_FILTER:
+                props["has_filters"] = elem.get('ref') is not None
+            elif tag == _MERGE_CELL:
+                props["merged_cells_count"] += 1
+            elif tag == _ROW:
+                elem.clear()
+    return props
+
+
+def _string_item_text(node) -> str:
+    """Plain text of an <si> or <is> node: direct <t> plus rich-text runs.
+
+    Phonetic runs (<rPh>) are skipped, matching openpyxl's plain-text read.
+    """
+    parts = []
+    for child in node:
+        if child.tag == _TEXT:
+            parts.append(child.text or '')
+        elif child.tag == _RUN:
+            t = child.find(_TEXT)
+            if t is not None:
+                parts.append(t.text or '')
+    return ''.join(parts)
+
+
+def read_shared_strings(archive: zipfile.ZipFile, part: str) -> list:
+    """Read the shared string table as a list of plain strings."""
+    strings = []
+    if part not in archive.namelist():
+        return strings
+    si_tag = f'{{{NS_MAIN}}}si'
+    with archive.open(part) as src:
+        for _, node in ET.iterparse(src):
+            if node.tag == si_tag:
+                strings.append(_string_item_text(node).replace('x005F_', ''))
+                node.clear()
+    return strings
+
+
+def read_date_styles(archive: zipfile.ZipFile, part: str) -> tuple:
+    """Return (date_style_ids, timedelta_style_ids) from the stylesheet.
+
+    Style ids index <cellXfs>; a numeric cell carrying one of them holds a
+    date serial, exactly as openpyxl decides it.
+    """
+    date_ids, timedelta_ids = set(), set()
+    if not part or part not in archive.namelist():
+        return date_ids, timedelta_ids
+
+    root = ET.fromstring(archive.read(part))
+    custom = {}
+    num_fmts = root.find(f'{{{NS_MAIN}}}numFmts')
+    if num_fmts is not None:
+        for fmt in num_fmts:
+            custom[int(fmt.get('numFmtId'))] = fmt.get('formatCode', '')
+
+    cell_xfs = root.find(f'{{{NS_MAIN}}}cellXfs')
+    if cell_xfs is None:
+        return date_ids, timedelta_ids
+
+    for idx, xf in enumerate(cell_xfs):
+        num_fmt_id = int(xf.get('numFmtId', 0))
+        fmt = custom.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+        if fmt is None:
+            continue
+        if is_date_format(fmt):
+            date_ids.add(idx)
+        if is_timedelta_format(fmt):
+            timedelta_ids.add(idx)
+    return date_ids, timedelta_ids
+
+
+# === SHARED FORMULA EXPANSION ===
+
+# Reference-shaped tokens in A1 notation. String literals and quoted sheet
+# names are matched first so that nothing inside them is rewritten; the
+# look-arounds keep function names (LOG10), defined names, sheet prefixes
+# (Q1!A1) and structured references ([Col1]) untouched.
+_A1_TOKEN_RE = re.compile(r'''
+      (?P<string>"(?:[^"]|"")*")
+    | (?P<sheet>'(?:[^']|'')*'!)
+    | (?<![A-Za-z0-9_.$\[@])
+      (?:
+          (?P<c_abs>\$?)(?P<col>[A-Za-z]{1,3})(?P<r_abs>\$?)(?P<row>[1-9][0-9]{0,6})
+        | (?P<c1_abs>\$?)(?P<col1>[A-Za-z]{1,3}):(?P<c2_abs>\$?)(?P<col2>[A-Za-z]{1,3})
+        | (?P<r1_abs>\$?)(?P<row1>[1-9][0-9]{0,6}):(?P<r2_abs>\$?)(?P<row2>[1-9][0-9]{0,6})
+      )
+      (?![A-Za-z0-9_(!\[])
+''', re.VERBOSE)
+
+
+class SharedFormula:
+    """A shared formula master compiled into literal text and reference slots.
+
+    Dependent cells re-render the template with their row/column offset from
+    the master, which is what Excel means by a shared formula.
+    """
+
+    __slots__ = ("row", "col", "parts")
+
+    def __init__(self, formula: str, row: int, col: int):
+        self.row = row
+        self.col = col
+        self.parts = []
+        pos = 0
+        for m in _A1_TOKEN_RE.finditer(formula):
+            if m.group('string') or m.group('sheet'):
+                continue
+            self.parts.append(formula[pos:m.start()])
+            if m.group('col'):
+                self.parts.append(('cell', m.group('c_abs'), column_index_from_string(m.group('col').upper()),
+                                   m.group('r_abs'), int(m.group('row'))))
+            elif m.group('col1'):
+                self.parts.append(('cols', m.group('c1_abs'), column_index_from_string(m.group('col1').upper()),
+                                   m.group('c2_abs'), column_index_from_string(m.group('col2').upper())))
+            else:
+                self.parts.append(('rows', m.group('r1_abs'), int(m.group('row1')),
+                                   m.group('r2_abs'), int(m.group('row2'))))
+            pos = m.end()
+        self.parts.append(formula[pos:])
+
+    def translate(self, row: int, col: int) -> str:
+        """Render the formula as it applies to the cell at (row, col)."""
+        dr = row - self.row
+        dc = col - self.col
+        out = []
+        for part in self.parts:
+            if part.__class__ is str:
+                out.append(part)
+                continue
+            kind, abs1, v1, abs2, v2 = part
+            if kind == 'cell':
+                c = v1 if abs1 else v1 + dc
+                r = v2 if abs2 else v2 + dr
+                if c < 1 or r < 1:
+                    out.append('#REF!')
+                else:
+                    out.append(f"{abs1}{get_column_letter(c)}{abs2}{r}")
+            elif kind == 'cols':
+                c1 = v1 if abs1 else v1 + dc
+                c2 = v2 if abs2 else v2 + dc
+                if c1 < 1 or c2 < 1:
+                    out.append('#REF!')
+                else:
+                    out.append(f"{abs1}{get_column_letter(c1)}:{abs2}{get_column_letter(c2)}")
+            else:
+                r1 = v1 if abs1 else v1 + dr
+                r2 = v2 if abs2 else v2 + dr
+                if r1 < 1 or r2 < 1:
+                    out.append('#REF!')
+                else:
+                    out.append(f"{abs1}{r1}:{abs2}{r2}")
+        return ''.join(out)
+
+
+def _cast_number(value: str):
+    """Convert a numeric cell string to int or float, as openpyxl does."""
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxWorksheet:
+    """One worksheet part, streamed row by row.
+
+    `dimensions`, `max_row`, `max_column`, `hidden_rows` and `hidden_columns`
+    are filled in while `iter_rows` runs (the <dimension> and <cols> blocks
+    precede the cell data), so read them after iterating. So are `freeze_panes`,
+    `has_filters` and `merged_cells_count`; the last two follow the cell data
+    and are only set once the rows have been read to the end.
+    """
+
+    def __init__(self, workbook: "XlsxWorkbook", title: str, part: str, sheet_state: str):
+        self.parent = workbook
+        self.title = title
+        self.part = part
+        self.sheet_state = sheet_state
+        self.dimensions = None
+        self.max_row = None
+        self.max_column = None
+        self.hidden_rows = []
+        self.hidden_columns = []
+        self.freeze_panes = None
+        self.has_filters = False
+        self.merged_cells_count = 0
+
+    def iter_rows(self):
+        """Yield one tuple of cell values per row, starting at row 1."""
+        wb = self.parent
+        shared_strings = wb.shared_strings
+        date_styles = wb.date_styles
+        timedelta_styles = wb.timedelta_styles
+        epoch = wb.epoch
+        col_index = wb._col_index
+        data_only = wb.data_only
+        shared_formulae = {}
+
+        self.hidden_rows = []
+        self.hidden_columns = []
+        self.freeze_panes = None
+        self.has_filters = False
+        self.merged_cells_count = 0
+        in_rows = True
+        max_col = None
+        max_row = None
+        empty_row = ()
+        next_row = 1
+        row_counter = 0
+        root = None
+
+        with wb.archive.open(self.part) as src:
+            for event, elem in ET.iterparse(src, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+
+                tag = elem.tag
+                if tag != _ROW:
+                    if not in_rows:
+                        # Trailing parts: only the merge list and autofilter are wanted
+                        if tag == _MERGE_CELL:
+                            self.merged_cells_count += 1
+                        elif tag == _AUTO_FILTER:
+                            self.has_filters = elem.get('ref') is not None
+                        continue
+                    if tag == _DIMENSION:
+                        self.dimensions = elem.get('ref')
+                        try:
+                            _, _, max_col, max_row = range_boundaries(elem.get('ref', ''))
+                        except (TypeError, ValueError):
+                            max_col = max_row = None
+                        self.max_row, self.max_column = max_row, max_col
+                        if max_col is not None:
+                            empty_row = (None,) * max_col
+                    elif tag == _COL:
+                        if elem.get('hidden') in ('1', 'true'):
+                            self.hidden_columns.append(int(elem.get('min', 0)))
+                    elif tag == _PANE:
+                        self.freeze_panes = elem.get('topLeftCell')
+                    elif tag == _SHEET_DATA:
+                        in_rows = False
+                        root.clear()
+                    continue
+
+                if not in_rows:
+                    elem.clear()
+                    if len(root):
+                        root[-1].clear()
+                    continue
+                r = elem.get('r')
+                row_counter = int(r) if r else row_counter + 1
+                if max_row is not None and row_counter > max_row:
+                    # Rows past the <dimension> are not reported
+                    in_rows = False
+                    elem.clear()
+                    root[-1].clear()
+                    continue
+                if elem.get('hidden') in ('1', 'true'):
+                    self.hidden_rows.append(row_counter)
+
+                cells = []
+                col_counter = 0
+                for c in elem:
+                    if c.tag != _CELL:
+                        continue
+                    coord = c.get('r')
+                    if coord:
+                        col_counter = col_index(coord.rstrip(_DIGITS))
+                    else:
+                        col_counter += 1
+
+                    data_type = c.get('t', 'n')
+                    # Data-only reads take a formula cell's cached value instead
+                    formula = None if data_only else c.find(_FORMULA)
+                    value = c.findtext(_VALUE) or None
+
+                    if formula is not None:
+                        f_type = formula.get('t')
+                        value = "=" + (formula.text or '')
+                        if f_type == 'shared':
+                            si = formula.get('si')
+                            if si in shared_formulae:
+                                value = shared_formulae[si].translate(row_counter, col_counter)
+                            elif value != "=":
+                                shared_formulae[si] = SharedFormula(value, row_counter, col_counter)
+                        elif f_type == 'dataTable':
+                            value = None
+                    elif value is not None:
+                        if data_type == 'n':
+                            value = _cast_number(value)
+                            style = c.get('s')
+                            if style and int(style) in date_styles:
+                                try:
+                                    value = from_excel(value, epoch,
+                                                       timedelta=int(style) in timedelta_styles)
+                                except (OverflowError, ValueError):
+                                    value = "#VALUE!"
+                        elif data_type == 's':
+                            value = shared_strings[int(value)]
+                        elif data_type == 'b':
+                            value = bool(int(value))
+                        elif data_type == 'd':
+                            value = from_ISO8601(value)
+                    elif data_type == 'inlineStr':
+                        inline = c.find(_INLINE)
+                        if inline is not None:
+                            value = _string_item_text(inline)
+
+                    cells.append((col_counter, value))
+
+                elem.clear()
+                if root is not None and len(root):
+                    root[-1].clear()  # drop processed <row> shells from <sheetData>
+
+                for _ in range(next_row, row_counter):
+                    yield empty_row
+                next_row = row_counter + 1
+
+                if max_col is not None:
+                    width = max_col
+                else:
+                    width = cells[-1][0] if cells else 0
+                values = [None] * width
+                for col, value in cells:
+                    if col <= width:
+                        values[col - 1] = value
+                yield tuple(values)
+
+
+class XlsxWorkbook:
+    """Workbook-level metadata plus streaming access to its worksheets.
+
+    Exposes the subset of the openpyxl workbook interface the auditor uses:
+    `sheetnames`, `worksheets`, `named_range_count` and `close()`, plus the
+    `metadata` both backends share. With data_only=True, formula cells
+    yield their cached values instead.
+    """
+
+    def __init__(self, filepath: str, data_only: bool = False):
+        self.data_only = data_only
+        self.archive = zipfile.ZipFile(filepath)
+        self._metadata = None
+        try:
+            self._read_workbook()
+        except Exception:
+            self.archive.close()
+            raise
+        self._col_cache = {}
+
+    def _read_workbook(self):
+        archive = self.archive
+        root = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = read_relationships(archive, 'xl/_rels/workbook.xml.rels', 'xl')
+
+        props = root.find(f'{{{NS_MAIN}}}workbookPr')
+        date1904 = props is not None and props.get('date1904') in ('1', 'true')
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        self.sheetnames = []
+        self.worksheets = []
+        for sheet in root.iter(f'{{{NS_MAIN}}}sheet'):
+            name = sheet.get('name')
+            self.sheetnames.append(name)
+            rel_type, target = rels.get(sheet.get(f'{{{NS_REL}}}id'), ('', None))
+            if target and rel_type.endswith('/worksheet') and target in archive.namelist():
+                self.worksheets.append(
+                    XlsxWorksheet(self, name, target, sheet.get('state', 'visible')))
+
+        # Workbook-scoped names only; sheet-scoped ones carry localSheetId
+        global_names = set()
+        for defn in root.iter(f'{{{NS_MAIN}}}definedName'):
+            if defn.get('localSheetId') is None:
+                global_names.add(defn.get('name'))
+        self.named_range_count = len(global_names)
+
+        strings_part = styles_part = None
+        for rel_type, target in rels.values():
+            if rel_type.endswith('/sharedStrings'):
+                strings_part = target
+            elif rel_type.endswith('/styles'):
+                styles_part = target
+        self.shared_strings = read_shared_strings(archive, strings_part) if strings_part else []
+        self.date_styles, self.timedelta_styles = read_date_styles(archive, styles_part)
+
+    @property
+    def metadata(self) -> dict:
+        """read_workbook_metadata for this package, read on first use."""
+        if self._metadata is None:
+            self._metadata = read_workbook_metadata(self.archive)
+        return self._metadata
+
+    def _col_index(self, letters: str) -> int:
+        idx = self._col_cache.get(letters)
+        if idx is None:
+            idx = self._col_cache[letters] = column_index_from_string(letters)
+        return idx
+
+    def __getitem__(self, name: str) -> XlsxWorksheet:
+        for ws in self.worksheets:
+            if ws.title == name:
+                return ws
+        raise KeyError(f"Worksheet {name} does not exist.")
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()